@@ -0,0 +1,67 @@
+"""Hierarchy closure tables
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Иерархическая таблица -> таблица замыканий
+CLOSURE_TABLES = {
+    'organizations': 'organization_closure',
+    'divisions': 'division_closure',
+}
+
+# Заполнение по текущим parent_id; глубина ограничена на случай циклов в данных
+FILL_CLOSURE_SQL = """
+    INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE chain(ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM {table}
+        UNION ALL
+        SELECT t.parent_id, chain.descendant_id, chain.depth + 1
+        FROM chain
+        JOIN {table} t ON t.id = chain.ancestor_id
+        WHERE t.parent_id IS NOT NULL AND chain.depth < 64
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth) FROM chain
+    GROUP BY ancestor_id, descendant_id
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    for table, closure in CLOSURE_TABLES.items():
+        # Создаем таблицу замыканий
+        op.create_table(
+            closure,
+            sa.Column('ancestor_id', sa.Integer(), nullable=False),
+            sa.Column('descendant_id', sa.Integer(), nullable=False),
+            sa.Column('depth', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+        )
+        op.create_index(f'ix_{closure}_descendant', closure, ['descendant_id', 'depth'], unique=False)
+
+        # Заполняем по существующим данным
+        if inspector.has_table(table):
+            op.execute(FILL_CLOSURE_SQL.format(table=table, closure=closure))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for closure in CLOSURE_TABLES.values():
+        op.drop_index(f'ix_{closure}_descendant', table_name=closure)
+        op.drop_table(closure)
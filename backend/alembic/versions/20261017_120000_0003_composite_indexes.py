@@ -0,0 +1,57 @@
+"""Composite indexes for hot filters
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Имя индекса -> (таблица, колонки); подобраны index_advisor по нагрузке
+# дерева сотрудников, карточки сотрудника, /functional-relations/ и /locations/
+COMPOSITE_INDEXES = {
+    'ix_functional_relations_manager_id_relation_type_is_active':
+        ('functional_relations', ['manager_id', 'relation_type', 'is_active']),
+    'ix_functional_relations_subordinate_id_relation_type_is_active':
+        ('functional_relations', ['subordinate_id', 'relation_type', 'is_active']),
+    'ix_staff_positions_staff_id_is_primary':
+        ('staff_positions', ['staff_id', 'is_primary']),
+    'ix_organizations_org_type_is_active_name':
+        ('organizations', ['org_type', 'is_active', 'name']),
+}
+
+
+def _has_columns(inspector, table: str, columns: Sequence[str]) -> bool:
+    if not inspector.has_table(table):
+        return False
+    return set(columns) <= {column['name'] for column in inspector.get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    for name, (table, columns) in COMPOSITE_INDEXES.items():
+        # Часть таблиц создается только схемой complete_schema.py
+        if _has_columns(inspector, table, columns):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    for name, (table, columns) in COMPOSITE_INDEXES.items():
+        if _has_columns(inspector, table, columns):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,128 @@
+"""Full-text search index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# rowid документа = id * ROWID_FACTOR + код типа (как в complete_schema.py)
+ROWID_FACTOR = 8
+
+# Тип -> (код, таблица, колонки title, колонки body)
+SEARCH_ENTITIES = {
+    'staff': (1, 'staff', ['last_name', 'first_name', 'middle_name'], ['email', 'phone', 'position']),
+    'organization': (2, 'organizations', ['name'], ['code', 'inn']),
+    'division': (3, 'divisions', ['name'], ['code']),
+    'section': (4, 'sections', ['name'], ['code']),
+    'function': (5, 'functions', ['name'], ['code']),
+    'position': (6, 'positions', ['name'], ['code']),
+    'vfp': (7, 'valuable_final_products', ['name'], []),
+}
+
+CREATE_INDEX_SQL = [
+    """
+    CREATE VIRTUAL TABLE search_index USING fts5(
+        title, body, label UNINDEXED, entity_type UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    "INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+]
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} FOR EACH ROW
+    BEGIN
+        INSERT INTO search_index (rowid, title, body, label, entity_type) VALUES ({new_document});
+    END
+    """,
+    """
+    CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} FOR EACH ROW
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * {factor} + {code};
+        INSERT INTO search_index (rowid, title, body, label, entity_type) VALUES ({new_document});
+    END
+    """,
+    """
+    CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} FOR EACH ROW
+    BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id * {factor} + {code};
+    END
+    """,
+]
+
+
+def _document_sql(entity_type: str, prefix: str = '') -> str:
+    code, _, title_columns, body_columns = SEARCH_ENTITIES[entity_type]
+
+    def normalize(sql):
+        # unicode61 не снимает «диакритику» с кириллицы: ё приводится к е явно
+        return f"replace(replace({sql}, 'ё', 'е'), 'Ё', 'Е')"
+
+    title = "trim(" + " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in title_columns) + ")"
+    body = " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in body_columns) or "''"
+    return (f"{prefix}id * {ROWID_FACTOR} + {code}, {normalize(title)}, {normalize(body)}, "
+            f"{title}, '{entity_type}'")
+
+
+def _indexed_entities(inspector):
+    for entity_type, (code, table, title_columns, body_columns) in SEARCH_ENTITIES.items():
+        # Часть таблиц создается только схемой complete_schema.py или update_vfp_schema.py
+        if inspector.has_table(table):
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            if set(title_columns + body_columns) <= existing:
+                yield entity_type, code, table, title_columns + body_columns
+
+
+def _is_sqlite() -> bool:
+    # FTS5 и синтаксис триггеров есть только в SQLite; поиск /search работает в full_api
+    # на SQLite, а в PostgreSQL индекс потребовал бы tsvector и GIN — ревизия там пропускается
+    return op.get_bind().dialect.name == 'sqlite'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _is_sqlite():
+        return
+    inspector = sa.inspect(op.get_bind())
+
+    for sql in CREATE_INDEX_SQL:
+        op.execute(sql)
+
+    for entity_type, code, table, columns in _indexed_entities(inspector):
+        for template in TRIGGERS_SQL:
+            op.execute(template.format(
+                table=table, code=code, factor=ROWID_FACTOR, columns=', '.join(columns),
+                new_document=_document_sql(entity_type, 'NEW.'),
+            ))
+        # Заполняем по существующим данным
+        op.execute(
+            "INSERT INTO search_index (rowid, title, body, label, entity_type) "
+            f"SELECT {_document_sql(entity_type)} FROM {table}"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _is_sqlite():
+        return
+    inspector = sa.inspect(op.get_bind())
+
+    for _, _, table, _ in _indexed_entities(inspector):
+        for action in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{action}")
+    op.execute("DROP TABLE search_index")
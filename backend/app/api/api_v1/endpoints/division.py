@@ -141,11 +141,18 @@ async def update_division(
                 detail="Отдел с таким названием уже существует в данной организации."
             )
     
-    # Если это обновление статуса активности, обновляем с дочерними отделами
-    if division_in.is_active is not None and division_in.is_active != division.is_active:
-        division = await crud.division.update_with_children(db, db_obj=division, obj_in=division_in)
-    else:
-        division = await crud.division.update(db, db_obj=division, obj_in=division_in)
+    try:
+        # Если это обновление статуса активности, обновляем с дочерними отделами
+        if division_in.is_active is not None and division_in.is_active != division.is_active:
+            division = await crud.division.update_with_children(db, db_obj=division, obj_in=division_in)
+        else:
+            division = await crud.division.update(db, db_obj=division, obj_in=division_in)
+    except ValueError as e:
+        # Перенос внутрь собственного поддерева (проверка по таблице замыканий)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     return division
 
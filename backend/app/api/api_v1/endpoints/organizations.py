@@ -152,7 +152,14 @@ async def update_organization(
                 detail="Организация не может быть собственным родителем"
             )
     
-    organization = await crud.organization.update(db, db_obj=organization, obj_in=organization_in)
+    try:
+        organization = await crud.organization.update(db, db_obj=organization, obj_in=organization_in)
+    except ValueError as e:
+        # Перенос внутрь собственного поддерева (проверка по таблице замыканий)
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
     return organization
 
 @router.delete("/{organization_id}", response_model=schemas.Organization)
@@ -0,0 +1,168 @@
+from typing import Optional, Type
+
+from sqlalchemy import select, insert, delete, func, literal, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+
+from app.db.base_class import Base
+
+# Ограничение глубины при перестроении (защита от циклов в parent_id)
+MAX_REBUILD_DEPTH = 64
+
+
+class HierarchyClosure:
+    """
+    Поддержка таблицы замыканий для иерархии на parent_id.
+
+    Методы изменения (add_node, move_node, remove_node) не делают commit:
+    их нужно вызывать в той же транзакции, что и изменение самой записи.
+    """
+
+    def __init__(self, model: Type[Base], closure_model: Type[Base]):
+        self.model = model
+        self.closure = closure_model
+
+    # ---------- Построители запросов ----------
+
+    def descendant_ids(self, node_id: int, *, include_self: bool = False,
+                       max_depth: Optional[int] = None) -> Select:
+        """Подзапрос id всех потомков вершины."""
+        query = select(self.closure.descendant_id).where(
+            self.closure.ancestor_id == node_id,
+            self.closure.depth >= (0 if include_self else 1)
+        )
+        if max_depth is not None:
+            query = query.where(self.closure.depth <= max_depth)
+        return query
+
+    def ancestor_ids(self, node_id: int, *, include_self: bool = False) -> Select:
+        """Подзапрос id всех предков вершины."""
+        return select(self.closure.ancestor_id).where(
+            self.closure.descendant_id == node_id,
+            self.closure.depth >= (0 if include_self else 1)
+        )
+
+    def descendants_query(self, node_id: int, *, include_self: bool = False,
+                          max_depth: Optional[int] = None) -> Select:
+        """Запрос записей всех потомков, ближайшие первыми."""
+        query = (
+            select(self.model)
+            .join(self.closure, self.closure.descendant_id == self.model.id)
+            .where(
+                self.closure.ancestor_id == node_id,
+                self.closure.depth >= (0 if include_self else 1)
+            )
+            .order_by(self.closure.depth, self.model.id)
+        )
+        if max_depth is not None:
+            query = query.where(self.closure.depth <= max_depth)
+        return query
+
+    def ancestors_query(self, node_id: int) -> Select:
+        """Запрос записей всех предков от непосредственного родителя до корня."""
+        return (
+            select(self.model)
+            .join(self.closure, self.closure.ancestor_id == self.model.id)
+            .where(self.closure.descendant_id == node_id, self.closure.depth > 0)
+            .order_by(self.closure.depth)
+        )
+
+    # ---------- Чтение ----------
+
+    async def subtree_size(self, db: AsyncSession, *, node_id: int) -> int:
+        """Количество вершин поддерева, включая саму вершину."""
+        result = await db.execute(
+            select(func.count()).select_from(self.closure).where(self.closure.ancestor_id == node_id)
+        )
+        return result.scalar_one()
+
+    async def is_descendant(self, db: AsyncSession, *, node_id: int, ancestor_id: int) -> bool:
+        """Находится ли node_id внутри поддерева ancestor_id (или совпадает с ним)."""
+        result = await db.execute(
+            select(literal(1)).select_from(self.closure).where(
+                self.closure.ancestor_id == ancestor_id,
+                self.closure.descendant_id == node_id
+            )
+        )
+        return result.first() is not None
+
+    # ---------- Изменение ----------
+
+    async def add_node(self, db: AsyncSession, *, node_id: int, parent_id: Optional[int]) -> None:
+        """Добавляет новую вершину: ссылку на себя и на всех предков родителя."""
+        await db.execute(insert(self.closure).values(ancestor_id=node_id, descendant_id=node_id, depth=0))
+        if parent_id is not None:
+            await db.execute(
+                insert(self.closure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(
+                        self.closure.ancestor_id,
+                        literal(node_id),
+                        self.closure.depth + 1
+                    ).where(self.closure.descendant_id == parent_id)
+                )
+            )
+
+    async def move_node(self, db: AsyncSession, *, node_id: int, new_parent_id: Optional[int]) -> None:
+        """Переносит поддерево вершины под нового родителя (или делает корнем)."""
+        subtree = select(self.closure.descendant_id).where(self.closure.ancestor_id == node_id)
+        await db.execute(
+            delete(self.closure).where(
+                self.closure.descendant_id.in_(subtree),
+                self.closure.ancestor_id.not_in(subtree)
+            )
+        )
+        if new_parent_id is not None:
+            above = aliased(self.closure)
+            below = aliased(self.closure)
+            await db.execute(
+                insert(self.closure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(
+                        above.ancestor_id,
+                        below.descendant_id,
+                        above.depth + below.depth + 1
+                    )
+                    # Декартово произведение «предки нового родителя» x «поддерево вершины»
+                    .select_from(above).join(below, true())
+                    .where(above.descendant_id == new_parent_id, below.ancestor_id == node_id)
+                )
+            )
+
+    async def remove_node(self, db: AsyncSession, *, node_id: int) -> None:
+        """Удаляет все пути, проходящие через вершину (потомки становятся корнями своих поддеревьев)."""
+        await db.execute(
+            delete(self.closure).where(
+                self.closure.descendant_id.in_(self.descendant_ids(node_id, include_self=True)),
+                self.closure.ancestor_id.in_(self.ancestor_ids(node_id, include_self=True))
+            )
+        )
+
+    async def rebuild(self, db: AsyncSession) -> int:
+        """Полностью перестраивает таблицу замыканий по parent_id и возвращает число строк."""
+        node = aliased(self.model)
+        parent = aliased(self.model)
+        chain = select(
+            self.model.id.label("ancestor_id"),
+            self.model.id.label("descendant_id"),
+            literal(0).label("depth")
+        ).cte("chain", recursive=True)
+        chain = chain.union_all(
+            select(node.parent_id, chain.c.descendant_id, chain.c.depth + 1)
+            .join(node, node.id == chain.c.ancestor_id)
+            .join(parent, parent.id == node.parent_id)
+            .where(chain.c.depth < MAX_REBUILD_DEPTH)
+        )
+
+        await db.execute(delete(self.closure))
+        await db.execute(
+            insert(self.closure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(chain.c.ancestor_id, chain.c.descendant_id, func.min(chain.c.depth))
+                .group_by(chain.c.ancestor_id, chain.c.descendant_id)
+            )
+        )
+        await db.commit()
+        result = await db.execute(select(func.count()).select_from(self.closure))
+        return result.scalar_one()
@@ -1,23 +1,30 @@
 from typing import List, Dict, Any, Optional, Union, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, select, func
+from sqlalchemy import and_, or_, select, func, update, exists
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.expression import true
 
 from app.crud.base import CRUDBase
+from app.crud.closure import HierarchyClosure
+from app.crud.tree import build_tree, serialize_row
 from app.models.division import Division
+from app.models.hierarchy_closure import DivisionClosure
 from app.schemas.division import DivisionCreate, DivisionUpdate
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, aliased
 
 
 class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
     """
     CRUD операции с отделами.
+    Иерархия дополнительно хранится в таблице замыканий division_closure,
+    которая обновляется в той же транзакции при создании, перемещении и удалении.
     """
     
+    closure = HierarchyClosure(Division, DivisionClosure)
+    
     def get_by_name(self, db: Session, *, name: str, organization_id: int) -> Optional[Division]:
         """
         Получить отдел по названию и организации.
@@ -140,19 +147,27 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
     ) -> List[Division]:
         """
         Получить все дочерние отделы и их потомков для указанного отдела.
+        Один запрос по таблице замыканий; без include_inactive неактивные отделы
+        исключаются вместе со всем своим поддеревом.
         """
-        descendants = []
-        children = await self.get_children(db, division_id=division_id, include_inactive=include_inactive)
-        
-        descendants.extend(children)
+        query = self.closure.descendants_query(division_id)
         
-        for child in children:
-            child_descendants = await self.get_all_descendants(
-                db, division_id=child.id, include_inactive=include_inactive
+        if not include_inactive:
+            # Отдел исключается, если он сам или любой его предок внутри поддерева неактивен
+            path = aliased(DivisionClosure)
+            path_node = aliased(Division)
+            query = query.where(
+                ~exists()
+                .where(
+                    path.descendant_id == Division.id,
+                    path.ancestor_id.in_(self.closure.descendant_ids(division_id)),
+                    path_node.id == path.ancestor_id,
+                    path_node.is_active == False
+                )
             )
-            descendants.extend(child_descendants)
-            
-        return descendants
+        
+        result = await db.execute(query)
+        return result.scalars().all()
     
     async def get_division_tree(
         self, db: AsyncSession, *, organization_id: int, include_inactive: bool = False
@@ -161,57 +176,35 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
         Получить древовидную структуру отделов для указанной организации.
         Возвращает только корневые отделы с рекурсивно загруженными дочерними элементами.
         """
-        # Получаем все отделы организации
-        filters = [Division.organization_id == organization_id]
+        return await self._load_tree(
+            db, Division.organization_id == organization_id, include_inactive=include_inactive
+        )
+    
+    async def get_tree(
+        self, db: AsyncSession, *, include_inactive: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Получить дерево всех отделов (по всем организациям).
+        """
+        return await self._load_tree(db, include_inactive=include_inactive)
+    
+    async def _load_tree(
+        self, db: AsyncSession, *filters, include_inactive: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Загрузить отделы одним запросом и собрать дерево по индексу id -> узел.
+        Отделы, чей родитель не попал в выборку (неактивен), отбрасываются вместе с поддеревом.
+        """
+        filters = list(filters)
         if not include_inactive:
             filters.append(Division.is_active == True)
-            
+        
         result = await db.execute(
             select(Division)
-            .where(and_(*filters))
-            .order_by(Division.level)
+            .where(*filters)
+            .order_by(Division.level, Division.id)
         )
-        all_Divisions = result.scalars().all()
-        
-        # Строим дерево отделов
-        Divisions_by_id = {dept.id: dept for dept in all_Divisions}
-        tree = []
-        for dept in all_Divisions:
-            # Устанавливаем дочерние отделы
-            dept_dict = jsonable_encoder(dept)
-            dept_dict["children"] = []
-            
-            # Если отдел без родителя, добавляем в корень дерева
-            if dept.parent_id is None:
-                tree.append(dept_dict)
-            # Иначе добавляем как дочерний
-            elif dept.parent_id in Divisions_by_id:
-                parent = Divisions_by_id[dept.parent_id]
-                # Находим родителя в дереве
-                parent_dict = None
-                for d in tree:
-                    if d["id"] == parent.id:
-                        parent_dict = d
-                        break
-                
-                # Если родитель найден, добавляем к нему
-                if parent_dict:
-                    parent_dict["children"].append(dept_dict)
-                # Иначе родитель может быть на более глубоком уровне
-                else:
-                    # Рекурсивный поиск родителя в дереве
-                    def find_parent_and_add_child(nodes, child_dict):
-                        for node in nodes:
-                            if node["id"] == parent.id:
-                                node["children"].append(child_dict)
-                                return True
-                            if find_parent_and_add_child(node["children"], child_dict):
-                                return True
-                        return False
-                    
-                    find_parent_and_add_child(tree, dept_dict)
-        
-        return tree
+        return build_tree(serialize_row(dept) for dept in result.scalars().all())
     
     async def create_with_parent(
         self, 
@@ -236,10 +229,66 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
         obj_in_data["level"] = level
         db_obj = self.model(**obj_in_data)
         db.add(db_obj)
+        await db.flush()
+        await self.closure.add_node(db, node_id=db_obj.id, parent_id=db_obj.parent_id)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+    
+    async def create(self, db: AsyncSession, *, obj_in: DivisionCreate) -> Division:
+        """
+        Создание отдела вместе с записями в таблице замыканий
+        """
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data)
+        db.add(db_obj)
+        await db.flush()
+        await self.closure.add_node(db, node_id=db_obj.id, parent_id=db_obj.parent_id)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+    
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: Division,
+        obj_in: Union[DivisionUpdate, Dict[str, Any]]
+    ) -> Division:
+        """
+        Обновление отдела; при смене parent_id поддерево переносится в таблице замыканий
+        """
+        old_parent_id = db_obj.parent_id
+        update_data = obj_in if isinstance(obj_in, dict) else obj_in.dict(exclude_unset=True)
+        new_parent_id = update_data.get("parent_id", old_parent_id)
+        
+        if new_parent_id != old_parent_id and new_parent_id is not None:
+            if await self.closure.is_descendant(db, node_id=new_parent_id, ancestor_id=db_obj.id):
+                raise ValueError("Нельзя переместить отдел внутрь собственного поддерева")
+        
+        for field in jsonable_encoder(db_obj):
+            if field in update_data:
+                setattr(db_obj, field, update_data[field])
+        db.add(db_obj)
+        await db.flush()
+        
+        if new_parent_id != old_parent_id:
+            await self.closure.move_node(db, node_id=db_obj.id, new_parent_id=new_parent_id)
+        
         await db.commit()
         await db.refresh(db_obj)
         return db_obj
     
+    async def remove(self, db: AsyncSession, *, id: int) -> Division:
+        """
+        Удаление отдела вместе с путями, проходящими через него, в таблице замыканий
+        """
+        obj = await self.get(db, id=id)
+        await self.closure.remove_node(db, node_id=id)
+        await db.delete(obj)
+        await db.commit()
+        return obj
+    
     async def update_with_children(
         self, 
         db: AsyncSession, 
@@ -269,19 +318,14 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
         is_active: bool
     ) -> None:
         """
-        Рекурсивное обновление активности дочерних отделов
+        Обновление активности всех потомков одним запросом по таблице замыканий
         """
-        # Получаем все дочерние отделы
-        children = await self.get_children(db, division_id=parent_id, include_inactive=True)
-        
-        for child in children:
-            # Обновляем активность
-            child.is_active = is_active
-            db.add(child)
-            
-            # Рекурсивно обновляем потомков
-            await self._update_children_activity(db, parent_id=child.id, is_active=is_active)
-        
+        await db.execute(
+            update(Division)
+            .where(Division.id.in_(self.closure.descendant_ids(parent_id)))
+            .values(is_active=is_active)
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
 
     async def move_division(
@@ -296,16 +340,17 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
             
         # Если пытаемся переместить в себя же или в своего потомка - предотвращаем
         if new_parent_id:
-            if new_parent_id == division_id:
-                return None
-                
-            # Получить всех потомков и убедиться, что новый родитель не является одним из них
-            descendants = await self.get_all_descendants(db, division_id=division_id)
-            if any(d.id == new_parent_id for d in descendants):
+            # Одна проверка по таблице замыканий (включает случай new_parent_id == division_id)
+            if await self.closure.is_descendant(db, node_id=new_parent_id, ancestor_id=division_id):
                 return None
         
-        # Обновляем родителя
+        if division.parent_id == new_parent_id:
+            return division
+        
+        # Обновляем родителя и таблицу замыканий в одной транзакции
         division.parent_id = new_parent_id
+        await db.flush()
+        await self.closure.move_node(db, node_id=division_id, new_parent_id=new_parent_id)
         await db.commit()
         await db.refresh(division)
         
@@ -362,17 +407,7 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
         """
         Получить все дочерние подразделения (включая подразделения подразделений)
         """
-        # Рекурсивный CTE для получения всей иерархии подразделений
-        cte = select(Division).filter(Division.parent_id == parent_id).cte(recursive=True)
-        cte_alias = cte.alias()
-        
-        # Добавляем подразделения подразделений
-        recursive_part = select(Division).join(cte_alias, Division.parent_id == cte_alias.c.id)
-        cte = cte.union_all(recursive_part)
-        
-        # Финальный запрос
-        query = select(Division).join(cte, Division.id == cte.c.id)
-        result = await db.execute(query)
+        result = await db.execute(self.closure.descendants_query(parent_id))
         return result.scalars().all()
         
     async def get_parent_chain(
@@ -381,18 +416,20 @@ class CRUDDivision(CRUDBase[Division, DivisionCreate, DivisionUpdate]):
         """
         Получить цепочку родительских подразделений (от непосредственного до самого верхнего)
         """
-        # Рекурсивный CTE для получения цепочки родителей
-        cte = select(Division).filter(Division.id == division_id).cte(recursive=True)
-        cte_alias = cte.alias()
-        
-        # Добавляем родителей родителей
-        recursive_part = select(Division).join(cte_alias, Division.id == cte_alias.c.parent_id)
-        cte = cte.union_all(recursive_part)
-        
-        # Финальный запрос (исключаем само подразделение)
-        query = select(Division).join(cte, Division.id == cte.c.id).filter(Division.id != division_id)
-        result = await db.execute(query)
+        result = await db.execute(self.closure.ancestors_query(division_id))
         return result.scalars().all()
+    
+    async def get_subtree_size(self, db: AsyncSession, *, division_id: int) -> int:
+        """
+        Количество подразделений в поддереве, включая само подразделение
+        """
+        return await self.closure.subtree_size(db, node_id=division_id)
+    
+    async def is_descendant(self, db: AsyncSession, *, division_id: int, ancestor_id: int) -> bool:
+        """
+        Находится ли подразделение внутри поддерева ancestor_id
+        """
+        return await self.closure.is_descendant(db, node_id=division_id, ancestor_id=ancestor_id)
 
 
 division = CRUDDivision(Division)
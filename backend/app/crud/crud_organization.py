@@ -5,11 +5,72 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, func, and_
 
 from app.crud.base import CRUDBase
+from app.crud.closure import HierarchyClosure
+from app.crud.tree import attach_children
 from app.models.organization import Organization
+from app.models.hierarchy_closure import OrganizationClosure
 from app.schemas.organization import OrganizationCreate, OrganizationUpdate, OrgType
 
 
 class CRUDOrganization(CRUDBase[Organization, OrganizationCreate, OrganizationUpdate]):
+    # Таблица замыканий organization_closure обновляется в той же транзакции,
+    # что и создание, перемещение и удаление организации
+    closure = HierarchyClosure(Organization, OrganizationClosure)
+    
+    async def create(self, db: AsyncSession, *, obj_in: OrganizationCreate) -> Organization:
+        """
+        Создать организацию вместе с записями в таблице замыканий
+        """
+        obj_in_data = jsonable_encoder(obj_in)
+        db_obj = self.model(**obj_in_data)
+        db.add(db_obj)
+        await db.flush()
+        await self.closure.add_node(db, node_id=db_obj.id, parent_id=db_obj.parent_id)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: Organization,
+        obj_in: Union[OrganizationUpdate, Dict[str, Any]]
+    ) -> Organization:
+        """
+        Обновить организацию; при смене parent_id поддерево переносится в таблице замыканий
+        """
+        old_parent_id = db_obj.parent_id
+        update_data = obj_in if isinstance(obj_in, dict) else obj_in.dict(exclude_unset=True)
+        new_parent_id = update_data.get("parent_id", old_parent_id)
+        
+        if new_parent_id != old_parent_id and new_parent_id is not None:
+            if await self.closure.is_descendant(db, node_id=new_parent_id, ancestor_id=db_obj.id):
+                raise ValueError("Нельзя переместить организацию внутрь собственного поддерева")
+        
+        for field in jsonable_encoder(db_obj):
+            if field in update_data:
+                setattr(db_obj, field, update_data[field])
+        db.add(db_obj)
+        await db.flush()
+        
+        if new_parent_id != old_parent_id:
+            await self.closure.move_node(db, node_id=db_obj.id, new_parent_id=new_parent_id)
+        
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def remove(self, db: AsyncSession, *, id: int) -> Organization:
+        """
+        Удалить организацию вместе с путями, проходящими через нее, в таблице замыканий
+        """
+        obj = await self.get(db, id=id)
+        await self.closure.remove_node(db, node_id=id)
+        await db.delete(obj)
+        await db.commit()
+        return obj
+
     async def get_multi_filtered(
         self, db: AsyncSession, *, skip: int = 0, limit: int = 100, filters: Dict = None
     ) -> List[Organization]:
@@ -59,39 +120,37 @@ class CRUDOrganization(CRUDBase[Organization, OrganizationCreate, OrganizationUp
         self, db: AsyncSession
     ) -> List[Organization]:
         """
-        Получить корневые организации (без родителя) с их дочерними элементами
+        Получить корневые организации (без родителя) с их дочерними элементами.
+        Все организации загружаются одним запросом, дерево собирается в памяти.
         """
-        # Сначала получаем все корневые организации (parent_id IS NULL)
-        query = select(self.model).filter(Organization.parent_id.is_(None))
-        result = await db.execute(query)
-        root_orgs = result.scalars().all()
-        
-        # Для каждой корневой организации загружаем дочерние элементы
-        for org in root_orgs:
-            await self._load_children_recursive(db, org)
-            
-        return root_orgs
-
-    async def _load_children_recursive(
-        self, db: AsyncSession, parent_org: Organization, depth: int = 5
-    ) -> None:
-        """
-        Рекурсивно загрузить дочерние организации для данной родительской организации
-        """
-        if depth <= 0:
-            return  # Предотвращение бесконечной рекурсии
-            
-        # Получаем дочерние организации для текущего родителя
-        query = select(self.model).filter(Organization.parent_id == parent_org.id)
-        result = await db.execute(query)
-        children = result.scalars().all()
-        
-        # Устанавливаем дочерние организации для родителя
-        parent_org.children = children
-        
-        # Рекурсивно загружаем дочерние элементы для каждой дочерней организации
-        for child in children:
-            await self._load_children_recursive(db, child, depth - 1)
+        result = await db.execute(select(self.model).order_by(Organization.id))
+        return attach_children(result.scalars().all())
+
+    async def get_descendants(
+        self, db: AsyncSession, *, org_id: int, max_depth: Optional[int] = None
+    ) -> List[Organization]:
+        """
+        Получить всех потомков организации (ближайшие первыми)
+        """
+        result = await db.execute(self.closure.descendants_query(org_id, max_depth=max_depth))
+        return result.scalars().all()
+
+    async def get_ancestors(
+        self, db: AsyncSession, *, org_id: int
+    ) -> List[Organization]:
+        """
+        Получить цепочку родительских организаций от непосредственного родителя до корня
+        """
+        result = await db.execute(self.closure.ancestors_query(org_id))
+        return result.scalars().all()
+
+    async def is_descendant(
+        self, db: AsyncSession, *, org_id: int, ancestor_id: int
+    ) -> bool:
+        """
+        Находится ли организация внутри поддерева ancestor_id
+        """
+        return await self.closure.is_descendant(db, node_id=org_id, ancestor_id=ancestor_id)
 
     async def count_children(
         self, db: AsyncSession, *, parent_id: int
@@ -178,33 +237,7 @@ class CRUDOrganization(CRUDBase[Organization, OrganizationCreate, OrganizationUp
         """
         Получить корневые организации (без родителя) с их дочерними элементами (синхронная версия)
         """
-        # Сначала получаем все корневые организации (parent_id IS NULL)
-        root_orgs = db.query(self.model).filter(Organization.parent_id.is_(None)).all()
-        
-        # Для каждой корневой организации загружаем дочерние элементы
-        for org in root_orgs:
-            self._load_children_recursive_sync(db, org)
-            
-        return root_orgs
-
-    def _load_children_recursive_sync(
-        self, db: Session, parent_org: Organization, depth: int = 5
-    ) -> None:
-        """
-        Рекурсивно загрузить дочерние организации для данной родительской организации (синхронная версия)
-        """
-        if depth <= 0:
-            return  # Предотвращение бесконечной рекурсии
-            
-        # Получаем дочерние организации для текущего родителя
-        children = db.query(self.model).filter(Organization.parent_id == parent_org.id).all()
-        
-        # Устанавливаем дочерние организации для родителя
-        parent_org.children = children
-        
-        # Рекурсивно загружаем дочерние элементы для каждой дочерней организации
-        for child in children:
-            self._load_children_recursive_sync(db, child, depth - 1)
+        return attach_children(db.query(self.model).order_by(Organization.id).all())
 
     def count_children_sync(
         self, db: Session, *, parent_id: int
@@ -0,0 +1,89 @@
+from collections import defaultdict
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from app.db.base_class import Base
+
+# Имена колонок по модели: вычисляются один раз, а не через jsonable_encoder на каждую строку
+_COLUMNS_CACHE: Dict[Type[Base], Tuple[str, ...]] = {}
+
+
+def _model_columns(model: Type[Base]) -> Tuple[str, ...]:
+    columns = _COLUMNS_CACHE.get(model)
+    if columns is None:
+        columns = tuple(column.key for column in model.__table__.columns)
+        _COLUMNS_CACHE[model] = columns
+    return columns
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def serialize_row(obj: Base, columns: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Облегченная замена jsonable_encoder для ORM-объекта: читает только колонки
+    таблицы, даты переводит в ISO-строки, Enum — в значения.
+    """
+    return {
+        name: _to_json_value(getattr(obj, name))
+        for name in (columns if columns is not None else _model_columns(type(obj)))
+    }
+
+
+def build_tree(
+    nodes: Iterable[Dict[str, Any]],
+    *,
+    id_key: str = "id",
+    parent_key: str = "parent_id",
+    children_key: str = "children",
+    orphans_as_roots: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Собирает дерево из плоского списка словарей за O(n) при любом порядке входа.
+
+    Узел без родителя становится корнем. Узел, родитель которого отсутствует
+    во входных данных (например, отфильтрован как неактивный), отбрасывается
+    вместе с поддеревом, если не задан orphans_as_roots. Узлы, образующие
+    цикл по parent_key, недостижимы из корней и в результат не попадают.
+    Порядок детей совпадает с порядком входа.
+    """
+    nodes = list(nodes)
+    by_id = {}
+    for node in nodes:
+        node[children_key] = []
+        by_id[node[id_key]] = node
+
+    roots = []
+    for node in nodes:
+        parent_id = node.get(parent_key)
+        parent = by_id.get(parent_id) if parent_id is not None else None
+        if parent is not None:
+            parent[children_key].append(node)
+        elif parent_id is None or orphans_as_roots:
+            roots.append(node)
+    return roots
+
+
+def attach_children(
+    objects: Iterable[Base],
+    *,
+    parent_attr: str = "parent_id",
+    children_attr: str = "children"
+) -> List[Base]:
+    """
+    То же для ORM-объектов: проставляет атрибут children каждому объекту
+    за один проход и возвращает корневые (без родителя).
+    """
+    objects = list(objects)
+    children_by_parent = defaultdict(list)
+    for obj in objects:
+        children_by_parent[getattr(obj, parent_attr)].append(obj)
+    for obj in objects:
+        setattr(obj, children_attr, children_by_parent.get(obj.id, []))
+    return children_by_parent.get(None, [])
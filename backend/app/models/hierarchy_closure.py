@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import Column, Integer, Index
+from app.db.base_class import Base
+
+
+class OrganizationClosure(Base):
+    """
+    Таблица замыканий иерархии организаций.
+    Для каждой пары «предок — потомок» хранится расстояние depth
+    (включая ссылку вершины на себя с depth = 0).
+    """
+    __tablename__ = "organization_closure"
+
+    ancestor_id = Column(Integer, primary_key=True, comment="ID организации-предка")
+    descendant_id = Column(Integer, primary_key=True, comment="ID организации-потомка")
+    depth = Column(Integer, nullable=False, comment="Расстояние между предком и потомком")
+
+    __table_args__ = (
+        Index("ix_organization_closure_descendant", "descendant_id", "depth"),
+    )
+
+
+class DivisionClosure(Base):
+    """
+    Таблица замыканий иерархии подразделений.
+    """
+    __tablename__ = "division_closure"
+
+    ancestor_id = Column(Integer, primary_key=True, comment="ID подразделения-предка")
+    descendant_id = Column(Integer, primary_key=True, comment="ID подразделения-потомка")
+    depth = Column(Integer, nullable=False, comment="Расстояние между предком и потомком")
+
+    __table_args__ = (
+        Index("ix_division_closure_descendant", "descendant_id", "depth"),
+    )
@@ -1,3 +1,9 @@
 """
 Пакет с тестами для приложения.
-""" 
\ No newline at end of file
+"""
+
+import tracing
+
+# Журнал приложения только в консоль: импорт full_api иначе создает api_debug.log
+# в текущем каталоге
+tracing.setup_logging(None) 
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+Тестовые базы SQLite со схемой complete_schema (ALL_SCHEMAS).
+"""
+
+import sqlite3
+from typing import Any, Iterable, Optional
+
+from complete_schema import ALL_SCHEMAS
+
+
+def apply_schema(conn: sqlite3.Connection, extra_schemas: Iterable[str] = ()) -> sqlite3.Connection:
+    """Создает в соединении таблицы, индексы и триггеры ALL_SCHEMAS и extra_schemas."""
+    for schema in ALL_SCHEMAS:
+        conn.executescript(schema)
+    for schema in extra_schemas:
+        conn.executescript(schema)
+    return conn
+
+
+def create_schema_db(database: str = ":memory:", *, row_factory: Any = None,
+                     check_same_thread: bool = True, isolation_level: Optional[str] = "",
+                     extra_schemas: Iterable[str] = ()) -> sqlite3.Connection:
+    """
+    Соединение с базой (по умолчанию в памяти) и примененной схемой.
+    Параметры соединения — как у sqlite3.connect.
+    """
+    conn = sqlite3.connect(database, check_same_thread=check_same_thread, isolation_level=isolation_level)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    return apply_schema(conn, extra_schemas)
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+
+import pytest
+from fastapi import HTTPException
+
+from async_db import AsyncDatabase
+from db_pool import SQLiteConnectionPool
+
+from .schema_db import apply_schema
+
+
+@pytest.fixture
+def db(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "async.db"), pool_size=2)
+    with pool.connection() as conn:
+        apply_schema(conn)
+    db = AsyncDatabase(pool)
+    yield db
+    db.close()
+    pool.close()
+
+
+def test_queries_run_outside_event_loop(db):
+    request_id: ContextVar[str] = ContextVar("request_id")
+
+    def where(conn):
+        return threading.current_thread().name, request_id.get()
+
+    async def scenario():
+        request_id.set("abc")
+        new_id = await db.execute("INSERT INTO sections (name, code) VALUES (?, ?)", ("Отдел", "S1"))
+        row = await db.fetchone("SELECT name FROM sections WHERE id = ?", (new_id,))
+        rows = await asyncio.gather(*(db.fetchall("SELECT id FROM sections") for _ in range(10)))
+        return row["name"], rows, await db.run(where)
+
+    name, rows, (thread_name, context_value) = asyncio.run(scenario())
+    assert name == "Отдел"
+    assert all([r["id"] for r in result] == [1] for result in rows)
+    assert thread_name.startswith("ofs-db") and thread_name != threading.current_thread().name
+    # Контекст запроса доступен в потоке БД
+    assert context_value == "abc"
+    assert db.stats()["pending"] == 0 and db.stats()["calls"] == 13
+
+
+def test_current_user_from_token(db):
+    import full_api
+
+    asyncio.run(db.execute(
+        "INSERT INTO user (email, hashed_password, is_active) VALUES ('admin@example.com', 'x', 1)"
+    ))
+    token = full_api.create_access_token({"sub": "admin@example.com"})
+
+    user = asyncio.run(full_api.get_current_user(token=token, db=db))
+    assert user.email == "admin@example.com"
+
+    unknown = full_api.create_access_token({"sub": "nobody@example.com"})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(full_api.get_current_user(token=unknown, db=db))
+    assert error.value.status_code == 401
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from async_db import AsyncDatabase
+from auth_support import AuthMetrics, PasswordHasher, TokenCache
+from db_pool import SQLiteConnectionPool
+
+from .schema_db import apply_schema
+
+
+class SlowContext:
+    """Заменяет CryptContext: «хеширование» занимает 50 мс."""
+
+    def hash(self, password):
+        time.sleep(0.05)
+        return "hashed:" + password
+
+    def verify(self, password, hashed):
+        time.sleep(0.05)
+        return hashed == "hashed:" + password
+
+
+def test_hashing_does_not_block_event_loop():
+    metrics = AuthMetrics()
+    hasher = PasswordHasher(SlowContext(), max_workers=2, max_pending=2, metrics=metrics)
+    ticks = []
+
+    async def ticker():
+        for _ in range(10):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        tick_task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(hasher.hash(f"p{i}") for i in range(5)), return_exceptions=True)
+        await tick_task
+        return results
+
+    results = asyncio.run(scenario())
+    hasher.close()
+
+    # 2 потока + 2 в очереди, пятый запрос отклонен сразу
+    assert results[:4] == ["hashed:p0", "hashed:p1", "hashed:p2", "hashed:p3"]
+    assert isinstance(results[4], HTTPException) and results[4].status_code == 503
+    # Цикл событий продолжал работать, пока шло хеширование
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.05
+    assert metrics.snapshot()["hash"]["count"] == 4
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_token_cache_expiry_and_invalidation():
+    cache = TokenCache(ttl=60)
+    cache.put("t1", "user-a", "a@example.com")
+    cache.put("t2", "user-a", "a@example.com")
+    cache.put("t3", "user-b", "b@example.com")
+    # Срок действия самого токена уже истек — не кэшируется
+    cache.put("t4", "user-b", "b@example.com", token_exp=time.time() - 1)
+
+    assert cache.get("t1") == "user-a" and cache.get("t4") is None
+    assert cache.invalidate_user("a@example.com") == 2
+    assert cache.get("t2") is None and cache.get("t3") == "user-b"
+    assert cache.stats()["hits"] == 2
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    import full_api
+
+    pool = SQLiteConnectionPool(str(tmp_path / "auth.db"), pool_size=2)
+    with pool.connection() as conn:
+        apply_schema(conn)
+        conn.executemany(
+            "INSERT INTO user (email, hashed_password, is_active, is_superuser) VALUES (?, ?, 1, ?)",
+            [("admin@example.com", "hashed:secret", 1), ("user@example.com", "hashed:secret", 0)]
+        )
+        conn.commit()
+    db = AsyncDatabase(pool)
+    monkeypatch.setattr(full_api, "password_hasher", PasswordHasher(SlowContext(), metrics=full_api.auth_metrics))
+    monkeypatch.setattr(full_api, "token_cache", TokenCache(ttl=60))
+    full_api.app.dependency_overrides[full_api.get_async_db] = lambda: db
+    yield full_api, TestClient(full_api.app)
+    full_api.app.dependency_overrides.clear()
+    db.close()
+    pool.close()
+
+
+def test_login_and_deactivation_invalidate_cached_token(api):
+    full_api, client = api
+    response = client.post("/login/access-token", data={"username": "user@example.com", "password": "secret"})
+    assert response.status_code == 200
+    user_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    admin_headers = {"Authorization": f"Bearer {full_api.create_access_token({'sub': 'admin@example.com'})}"}
+
+    assert client.get("/users/me", headers=user_headers).status_code == 200
+    assert client.get("/users/me", headers=user_headers).status_code == 200
+    assert full_api.token_cache.stats()["hits"] == 1
+
+    response = client.put("/users/2/active", json={"is_active": False}, headers=admin_headers)
+    assert response.status_code == 200 and response.json()["is_active"] is False
+    assert client.get("/users/me", headers=user_headers).status_code == 400
+
+    stats = client.get("/admin/auth", headers=admin_headers).json()
+    assert stats["latency"]["login"]["count"] >= 1
+    assert stats["latency"]["verify"]["count"] >= 1
+    assert stats["token_cache"]["invalidations"] == 1
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from batch import BatchMode, existing_ids, find_by_key
+from full_api import (
+    FunctionalRelationCreate, StaffCreate, StaffFunctionCreate,
+    create_functional_relations_batch, create_staff_batch, create_staff_functions_batch,
+)
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db():
+    db = create_schema_db(row_factory=sqlite3.Row)
+    db.execute("INSERT INTO organizations (name, code, org_type) VALUES ('Холдинг', 'H', 'holding')")
+    db.execute("INSERT INTO functions (name, code) VALUES ('Функция', 'F')")
+    db.commit()
+    yield db
+    db.close()
+
+
+def staff(email, **fields):
+    return StaffCreate(email=email, first_name="Имя", last_name="Фамилия", **fields)
+
+
+def test_staff_batch_reports_each_item(db):
+    result = create_staff_batch([
+        staff("a@example.com", organization_id=1),
+        staff("b@example.com", organization_id=42),
+        staff("c@example.com"),
+        staff("a@example.com"),
+    ], BatchMode.INSERT, db)
+
+    assert (result.created, result.updated, result.failed) == (2, 0, 2)
+    assert [item.status for item in result.items] == ["created", "error", "created", "error"]
+    assert result.items[1].detail == "Организация с ID 42 не найдена"
+    ids = [item.id for item in result.items if item.id]
+    emails = [db.execute("SELECT email FROM staff WHERE id = ?", (i,)).fetchone()[0] for i in ids]
+    assert emails == ["a@example.com", "c@example.com"]
+
+    again = create_staff_batch([staff("a@example.com")], BatchMode.INSERT, db)
+    assert again.items[0].detail == "Сотрудник с email a@example.com уже существует"
+
+
+def test_staff_batch_upsert_by_email(db):
+    first_id = create_staff_batch([staff("a@example.com")], BatchMode.INSERT, db).items[0].id
+
+    result = create_staff_batch([
+        StaffCreate(email="a@example.com", first_name="Новое", last_name="Имя"),
+        staff("b@example.com"),
+    ], BatchMode.UPSERT, db)
+
+    assert [(item.status, item.id) for item in result.items][0] == ("updated", first_id)
+    assert result.items[1].status == "created"
+    assert db.execute("SELECT first_name FROM staff WHERE id = ?", (first_id,)).fetchone()[0] == "Новое"
+    assert db.execute("SELECT COUNT(*) FROM staff").fetchone()[0] == 2
+
+
+def test_relation_batches(db):
+    create_staff_batch([staff(f"u{i}@example.com") for i in range(3)], BatchMode.INSERT, db)
+    db.execute("INSERT INTO staff_functions (staff_id, function_id, is_primary) VALUES (1, 1, 1)")
+    db.commit()
+
+    result = create_staff_functions_batch([
+        StaffFunctionCreate(staff_id=2, function_id=1),
+        StaffFunctionCreate(staff_id=1, function_id=1, commitment_percent=50),
+        StaffFunctionCreate(staff_id=9, function_id=1),
+    ], BatchMode.UPSERT, db)
+    assert [item.status for item in result.items] == ["created", "updated", "error"]
+    rows = db.execute("SELECT staff_id, commitment_percent, is_primary FROM staff_functions ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [(1, 50, 1), (2, 100, 1)]
+
+    relations = [FunctionalRelationCreate(manager_id=1, subordinate_id=2, relation_type="functional"),
+                 FunctionalRelationCreate(manager_id=2, subordinate_id=2, relation_type="functional")]
+    result = create_functional_relations_batch(relations, BatchMode.INSERT, db)
+    assert (result.created, result.failed) == (1, 1)
+    result = create_functional_relations_batch(relations[:1], BatchMode.UPSERT, db)
+    assert result.updated == 1
+
+    with pytest.raises(HTTPException):
+        create_functional_relations_batch([], BatchMode.INSERT, db)
+
+
+def test_set_based_lookups(db):
+    create_staff_batch([staff(f"u{i}@example.com") for i in range(3)], BatchMode.INSERT, db)
+    assert existing_ids(db, "staff", [1, 3, 5, None]) == {1, 3}
+    assert existing_ids(db, "organizations", [1], where="org_type = 'location'") == set()
+    assert find_by_key(db, "staff", ("email",), [("u2@example.com",), ("x@example.com",)]) == {("u2@example.com",): 3}
@@ -0,0 +1,88 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from bot_notify import BotCacheNotifier
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "notify.db")
+    create_schema_db(path, isolation_level=None).close()
+    return path
+
+
+class RecordingNotifier(BotCacheNotifier):
+    def __init__(self, db_path):
+        super().__init__(db_path, url="http://bot.invalid/cache/invalidate")
+        self.posted = []
+
+    def _post(self, names):
+        self.posted.append(names)
+
+
+def test_notifies_only_about_changed_reference_tables(db_path):
+    notifier = RecordingNotifier(db_path)
+    app = FastAPI()
+    app.middleware("http")(notifier.middleware)
+
+    @app.post("/fail/")
+    def fail():
+        return 1 / 0
+
+    @app.post("/{table}/")
+    def create(table: str, name: str):
+        db = sqlite3.connect(db_path, isolation_level=None)
+        if table == "organizations":
+            db.execute("INSERT INTO organizations (name, code, org_type) VALUES (?, ?, 'holding')", (name, name))
+        else:
+            db.execute(f"INSERT INTO {table} (name, code) VALUES (?, ?)", (name, name))
+        db.close()
+        return {"name": name}
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        assert client.post("/positions/", params={"name": "Инженер"}).status_code == 200
+        assert client.post("/sections/", params={"name": "Секция"}).status_code == 200
+        assert client.post("/organizations/", params={"name": "Холдинг"}).status_code == 200
+        assert client.post("/fail/").status_code == 500
+
+    # Секции бот не кэширует; неуспешный запрос не проверяется
+    assert notifier.posted == [["positions"], ["organizations"]]
+    assert notifier.stats() == {"enabled": True, "sent": 2, "failed": 0}
+    notifier.close()
+
+
+def test_failed_delivery_is_counted(db_path):
+    notifier = BotCacheNotifier(db_path, url="http://127.0.0.1:9/cache/invalidate", timeout=1)
+    assert asyncio.run(notifier.notify(["positions"])) is False
+    assert notifier.failed == 1
+    assert not BotCacheNotifier(db_path, url="").enabled
+
+
+def test_versions_are_read_off_the_event_loop(db_path):
+    notifier = BotCacheNotifier(db_path, url="http://bot.invalid/cache/invalidate")
+    threads = []
+    read_versions = notifier._read_versions
+
+    def recording_read():
+        threads.append(threading.current_thread())
+        return read_versions()
+
+    notifier._read_versions = recording_read
+
+    async def scenario():
+        await asyncio.gather(*(notifier.changed_tables() for _ in range(10)))
+        db = sqlite3.connect(db_path, isolation_level=None)
+        db.execute("INSERT INTO positions (name, code) VALUES ('Инженер', 'ENG')")
+        db.close()
+        return await notifier.changed_tables()
+
+    assert asyncio.run(scenario()) == ["positions"]
+    assert len(threads) == 11 and threading.main_thread() not in threads
+    notifier.close()
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from db_pool import SQLiteConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.db"), pool_size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+
+def test_connections_are_preconfigured(pool):
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+
+def test_connection_is_reused_by_same_thread(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    # Тот же поток получает то же соединение, новых соединений не создается
+    assert first is second
+    stats = pool.stats()
+    assert stats["connections_created"] == 1
+    assert stats["thread_affinity_hits"] == 1
+
+
+def test_pool_is_bounded(pool):
+    first = pool.acquire()
+    second = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    # После возврата соединения ожидающий поток его получает
+    result = {}
+    waiter = threading.Thread(target=lambda: result.setdefault("conn", pool.acquire()))
+    waiter.start()
+    pool.release(first)
+    waiter.join(timeout=1)
+
+    assert result["conn"] is first
+    assert pool.stats()["timeouts"] == 1
+    pool.release(second)
+    pool.release(result["conn"])
+
+
+def test_uncommitted_transaction_is_rolled_back_on_release(pool):
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (id INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    assert pool.stats()["rollbacks_on_release"] == 1
+
+
+def test_unhealthy_connection_is_replaced(pool):
+    pool.health_check_interval = 0
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # Имитируем «сломанное» соединение
+
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert fresh.execute("SELECT 1").fetchone()[0] == 1
+    assert pool.stats()["health_check_failures"] == 1
@@ -0,0 +1,68 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from etag import conditional_get, etag_matches, etag_middleware
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db():
+    db = create_schema_db(check_same_thread=False)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def client(db):
+    calls = []
+
+    def get_db():
+        yield db
+
+    app = FastAPI()
+    app.middleware("http")(etag_middleware)
+
+    @app.get("/organizations/", dependencies=[Depends(conditional_get(get_db, "organizations"))])
+    def organizations():
+        calls.append(1)
+        return [row[0] for row in db.execute("SELECT name FROM organizations ORDER BY id")]
+
+    client = TestClient(app)
+    client.calls = calls
+    return client
+
+
+def test_not_modified_without_reading_data(client):
+    response = client.get("/organizations/")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and etag.startswith('"')
+
+    response = client.get("/organizations/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert len(client.calls) == 1
+
+
+def test_writes_change_only_own_table_version(client, db):
+    etag = client.get("/organizations/").headers["ETag"]
+
+    db.execute("INSERT INTO sections (name, code) VALUES ('Отдел', 'S1')")
+    assert client.get("/organizations/", headers={"If-None-Match": etag}).status_code == 304
+
+    db.execute("INSERT INTO organizations (name, code, org_type) VALUES ('Холдинг', 'H', 'holding')")
+    response = client.get("/organizations/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == ["Холдинг"]
+
+    db.execute("DELETE FROM organizations")
+    assert client.get("/organizations/", headers={"If-None-Match": response.headers["ETag"]}).status_code == 200
+
+
+def test_if_none_match_parsing():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
@@ -0,0 +1,46 @@
+import csv
+import gzip
+import io
+import json
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from export import ExportFormat, export_chunks, gzip_chunks
+
+
+@pytest.fixture
+def connection():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, is_active INTEGER)")
+    db.executemany("INSERT INTO people (name, is_active) VALUES (?, ?)",
+                   [(f"Сотрудник {i}", i % 2) for i in range(25)])
+
+    @contextmanager
+    def factory():
+        yield db
+
+    yield factory
+    db.close()
+
+
+QUERY = "SELECT id, name, is_active FROM people ORDER BY id"
+
+
+def test_ndjson_is_streamed_in_batches(connection):
+    chunks = list(export_chunks(connection, QUERY, (), ExportFormat.NDJSON, batch_size=10))
+    assert len(chunks) == 3
+
+    rows = [json.loads(line) for line in b"".join(chunks).decode("utf-8").splitlines()]
+    assert len(rows) == 25
+    assert rows[1] == {"id": 2, "name": "Сотрудник 1", "is_active": 1}
+
+
+def test_csv_with_gzip(connection):
+    chunks = gzip_chunks(export_chunks(connection, QUERY, (), ExportFormat.CSV, batch_size=10))
+    text = gzip.decompress(b"".join(chunks)).decode("utf-8-sig")
+
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == ["id", "name", "is_active"]
+    assert rows[25] == ["25", "Сотрудник 24", "0"]
@@ -0,0 +1,78 @@
+import json
+import sqlite3
+
+import pytest
+
+from index_advisor import (
+    Schema, WorkloadQuery, _bind, advise, analyze_query, candidate_indexes, load_workload, measure
+)
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+        CREATE TABLE staff (id INTEGER PRIMARY KEY, name TEXT, is_active INTEGER);
+        CREATE TABLE relations (
+            id INTEGER PRIMARY KEY, manager_id INTEGER, subordinate_id INTEGER,
+            relation_type TEXT, is_active INTEGER
+        );
+        CREATE INDEX idx_relations_manager_id ON relations(manager_id);
+        CREATE INDEX idx_relations_relation_type ON relations(relation_type);
+    """)
+    db.executemany("INSERT INTO staff (id, name, is_active) VALUES (?, ?, 1)", [(i, f"s{i}") for i in range(1, 2001)])
+    db.executemany(
+        "INSERT INTO relations (manager_id, subordinate_id, relation_type, is_active) VALUES (?, ?, ?, 1)",
+        [((i - 1) // 5 or 1, i, "administrative" if i % 4 else "functional") for i in range(2, 2001)]
+    )
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_query_shape_and_candidates(db):
+    schema = Schema(db)
+    shape = analyze_query("""
+        SELECT s.name FROM relations r JOIN staff s ON s.id = r.subordinate_id
+        WHERE r.manager_id = ? AND r.relation_type = 'administrative' AND r.is_active = 1
+        ORDER BY s.name
+    """, schema)
+    assert shape.equality == {"relations": ["manager_id", "relation_type", "is_active"]}
+    assert shape.joins == {"relations": ["subordinate_id"]}
+    assert shape.order_by == {"staff": ["name"]}
+
+    candidates = candidate_indexes("relations", shape, schema)
+    # Существующий индекс по manager_id расширяется, остальные колонки — по избирательности
+    assert candidates[0] == ("manager_id", "relation_type", "is_active")
+    assert ("subordinate_id", "manager_id", "relation_type", "is_active") in candidates
+    assert candidate_indexes("staff", shape, schema) == []
+
+
+def test_advise_recommends_index_that_removes_full_scan(db):
+    workload = [WorkloadQuery(
+        "SELECT s.id FROM staff s WHERE NOT EXISTS (SELECT 1 FROM relations r WHERE r.subordinate_id = s.id"
+        " AND r.relation_type = 'administrative' AND r.is_active = 1)",
+        count=10,
+    )]
+    [recommendation] = advise(db, workload, repeat=2)
+
+    assert recommendation.table == "relations"
+    assert recommendation.columns[0] == "subordinate_id"
+    assert recommendation.gain_ms > 0
+    # Исходная база не меняется
+    assert not db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (recommendation.name,)).fetchone()
+
+
+def test_load_workload_from_fingerprints(db, tmp_path):
+    path = tmp_path / "workload.json"
+    path.write_text(json.dumps({"queries": [
+        {"sql": "SELECT id FROM relations WHERE manager_id IN (...) AND relation_type = ?", "count": 3},
+    ]}))
+    [query] = load_workload(str(path))
+    assert query.count == 3 and query.params is None
+
+    # Параметры отпечатка подставляются как NULL, запрос все равно выполняется и замеряется
+    sql = query.sql.replace("IN (...)", "IN (?)")
+    assert _bind(db, sql, query.params) == [None, None]
+    measurement = measure(db, query, 1)
+    assert measurement.plan and measurement.ms is not None and not measurement.timed_out
@@ -0,0 +1,75 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+import json_response
+from json_response import FastJSONResponse
+
+
+class Kind(str, Enum):
+    HOLDING = "holding"
+
+
+class Item(BaseModel):
+    kind: Kind
+    at: datetime
+
+
+CONTENT = {
+    "kind": Kind.HOLDING,
+    "at": datetime(2024, 1, 2, 3, 4, 5, 6),
+    "day": date(2024, 1, 2),
+    "price": Decimal("10.50"),
+    "count": Decimal("3"),
+    "item": Item(kind=Kind.HOLDING, at=datetime(2024, 1, 2)),
+    "name": "Холдинг",
+}
+
+EXPECTED = {
+    "kind": "holding",
+    "at": "2024-01-02T03:04:05.000006",
+    "day": "2024-01-02",
+    "price": 10.5,
+    "count": 3,
+    "item": {"kind": "holding", "at": "2024-01-02T00:00:00"},
+    "name": "Холдинг",
+}
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "json"])
+def backend(request):
+    previous = json_response.orjson_enabled()
+    if request.param and not json_response.ORJSON_AVAILABLE:
+        pytest.skip("orjson не установлен")
+    json_response.configure(use_orjson=request.param)
+    yield request.param
+    json_response.configure(use_orjson=previous)
+
+
+def test_same_output_for_both_backends(backend):
+    body = FastJSONResponse(CONTENT).body
+    assert json.loads(body) == EXPECTED
+    assert "Холдинг".encode("utf-8") in body
+
+
+def test_per_route_response_class(backend):
+    app = FastAPI()
+
+    @app.get("/fast", response_class=FastJSONResponse)
+    def fast():
+        return {"kind": Kind.HOLDING, "price": Decimal("1.25")}
+
+    response = TestClient(app).get("/fast")
+    assert response.json() == {"kind": "holding", "price": 1.25}
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_unsupported_type_raises():
+    with pytest.raises(TypeError):
+        json_response.dumps({"value": object()})
@@ -0,0 +1,73 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from db_pool import SQLiteConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "metrics.db"), pool_size=2)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO items (name) VALUES (?)", [("a",), ("b",)])
+        conn.commit()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def client(pool):
+    metrics.configure(enabled=True)
+    metrics.reset()
+
+    def get_db():
+        with pool.connection() as conn:
+            yield conn
+
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int, db=Depends(get_db)):
+        db.execute("SELECT 1")
+        return dict(db.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone())
+
+    yield TestClient(app)
+    metrics.reset()
+
+
+def sample(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_requests_are_labelled_by_route_template(client):
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    text = metrics.render()
+    assert 'ofs_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'ofs_http_requests_total{method="GET",route="<unmatched>",status="404"} 1' in text
+    # Два SQL-выражения на запрос: сумма 4 за два запроса, оба в корзине le="2"
+    assert 'ofs_sql_queries_per_request_sum{method="GET",route="/items/{item_id}"} 4' in text
+    assert 'ofs_sql_queries_per_request_bucket{method="GET",route="/items/{item_id}",le="2"} 2' in text
+    assert 'ofs_sql_queries_per_request_bucket{method="GET",route="/items/{item_id}",le="1"} 0' in text
+    assert sample(text, 'ofs_http_request_duration_seconds_bucket{method="GET",route="/items/{item_id}",le="+Inf"} 2')
+
+
+def test_collectors_and_disabling(client):
+    metrics.add_collector("ofs_test_value", "Тестовое значение", lambda: {"x": 3}, labelnames=("kind",))
+    try:
+        client.get("/items/1")
+        assert 'ofs_test_value{kind="x"} 3' in metrics.render()
+
+        metrics.configure(enabled=False)
+        client.get("/items/1")
+        text = metrics.render()
+        assert 'ofs_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 1' in text
+        assert 'ofs_sql_statement_duration_seconds_count{operation="SELECT"} 2' in text
+    finally:
+        metrics._collectors.pop()
+        metrics.configure(enabled=True)
@@ -0,0 +1,87 @@
+import random
+import sqlite3
+
+import pytest
+
+from org_closure import (
+    rebuild_closure, ensure_closure, get_descendant_ids, get_ancestor_ids,
+    subtree_size, is_descendant
+)
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db():
+    conn = create_schema_db()
+    yield conn
+    conn.close()
+
+
+def _add_org(db, name, parent_id=None):
+    cursor = db.execute(
+        "INSERT INTO organizations (name, code, org_type, parent_id) VALUES (?, ?, 'holding', ?)",
+        (name, name, parent_id)
+    )
+    return cursor.lastrowid
+
+
+def _closure_rows(db):
+    return sorted(db.execute("SELECT ancestor_id, descendant_id, depth FROM organization_closure"))
+
+
+def test_triggers_maintain_closure(db):
+    root = _add_org(db, "root")
+    a = _add_org(db, "a", root)
+    b = _add_org(db, "b", a)
+    c = _add_org(db, "c", root)
+
+    assert get_descendant_ids(db, "organizations", root) == [a, c, b]
+    assert get_ancestor_ids(db, "organizations", b) == [a, root]
+    assert subtree_size(db, "organizations", root) == 4
+
+    # Перенос поддерева a под c
+    db.execute("UPDATE organizations SET parent_id = ? WHERE id = ?", (c, a))
+    assert get_ancestor_ids(db, "organizations", b) == [a, c, root]
+    assert is_descendant(db, "organizations", b, c)
+
+    # Удаление промежуточной вершины отрывает ее поддерево
+    db.execute("UPDATE organizations SET parent_id = NULL WHERE parent_id = ?", (a,))
+    db.execute("DELETE FROM organizations WHERE id = ?", (a,))
+    assert get_ancestor_ids(db, "organizations", b) == []
+    assert get_descendant_ids(db, "organizations", root) == [c]
+
+
+def test_move_into_own_subtree_is_rejected(db):
+    root = _add_org(db, "root")
+    child = _add_org(db, "child", root)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.execute("UPDATE organizations SET parent_id = ? WHERE id = ?", (child, root))
+    assert get_ancestor_ids(db, "organizations", child) == [root]
+
+
+def test_random_moves_match_rebuild(db):
+    rng = random.Random(7)
+    ids = []
+    for i in range(40):
+        ids.append(_add_org(db, f"org{i}", rng.choice(ids) if ids else None))
+
+    for _ in range(100):
+        node, parent = rng.choice(ids), rng.choice(ids + [None])
+        if parent is not None and is_descendant(db, "organizations", parent, node):
+            continue
+        db.execute("UPDATE organizations SET parent_id = ? WHERE id = ?", (parent, node))
+
+    maintained = _closure_rows(db)
+    rebuild_closure(db, "organizations")
+    assert _closure_rows(db) == maintained
+
+
+def test_ensure_closure_fills_missing_rows(db):
+    root = _add_org(db, "root")
+    _add_org(db, "child", root)
+    db.execute("DELETE FROM organization_closure")
+
+    assert ensure_closure(db) == {"organization_closure": 3}
+    assert subtree_size(db, "organizations", root) == 2
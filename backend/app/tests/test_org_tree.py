@@ -0,0 +1,50 @@
+from benchmarks.common import create_test_db, seed_org_structure, count_queries
+from org_tree import build_org_hierarchy
+
+
+def test_hierarchy_query_count_is_constant():
+    small = create_test_db()
+    seed_org_structure(small, holdings=1, legal_entities=1, divisions=1, sub_divisions=1)
+    large = create_test_db()
+    seed_org_structure(large, holdings=3, legal_entities=4, divisions=5, sub_divisions=4)
+
+    with count_queries(small) as small_stats:
+        build_org_hierarchy(small)
+    with count_queries(large) as large_stats:
+        build_org_hierarchy(large)
+
+    assert small_stats["queries"] == large_stats["queries"] == 4
+
+
+def test_hierarchy_structure():
+    conn = create_test_db()
+    seed_org_structure(conn, holdings=1, legal_entities=2, divisions=1, sub_divisions=1, sections=1, functions=1)
+
+    tree = build_org_hierarchy(conn)
+
+    assert len(tree) == 1
+    holding = tree[0]
+    assert holding["entity_type"] == "organization"
+    assert holding["org_type"] == "holding"
+    # Сначала дочерние организации, затем подразделения
+    assert [child["entity_type"] for child in holding["children"]] == ["organization", "organization", "division"]
+
+    division = holding["children"][2]
+    assert "org_type" not in division
+    # Сначала отделы подразделения, затем дочерние подразделения
+    assert [child["entity_type"] for child in division["children"]] == ["section", "division"]
+    assert division["children"][0]["children"][0]["entity_type"] == "function"
+
+
+def test_hierarchy_skips_cyclic_divisions():
+    conn = create_test_db()
+    conn.execute("INSERT INTO organizations (id, name, code, org_type) VALUES (1, 'Х', 'H', 'holding')")
+    conn.execute("INSERT INTO divisions (id, name, code, organization_id) VALUES (1, 'Д1', 'D1', 1)")
+    # Некорректные данные: Д2 и Д3 ссылаются друг на друга как на родителя
+    conn.execute("INSERT INTO divisions (id, name, code, organization_id, parent_id) VALUES (2, 'Д2', 'D2', 1, 3)")
+    conn.execute("INSERT INTO divisions (id, name, code, organization_id, parent_id) VALUES (3, 'Д3', 'D3', 1, 2)")
+    conn.commit()
+
+    tree = build_org_hierarchy(conn)
+
+    assert [child["id"] for child in tree[0]["children"]] == [1]
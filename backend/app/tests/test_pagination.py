@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from pagination import Listing, PageParams, paginate, encode_cursor
+
+
+@pytest.fixture
+def client():
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, kind TEXT, is_active INTEGER)")
+    db.executemany(
+        "INSERT INTO items (name, kind, is_active) VALUES (?, ?, ?)",
+        [(f"item{i:02d}", "a" if i % 2 else "b", i % 3 != 0) for i in range(1, 11)]
+    )
+    by_id = Listing("items")
+    by_name = Listing("items", order_by="name")
+
+    app = FastAPI()
+
+    @app.get("/items/")
+    def items(kind: str = None, page: PageParams = Depends()):
+        conditions, params = (["kind = ?"], [kind]) if kind else ([], [])
+        return paginate(db, by_id, page, conditions, params)
+
+    @app.get("/items-by-name/")
+    def items_by_name(page: PageParams = Depends()):
+        return paginate(db, by_name, page)
+
+    yield TestClient(app)
+    db.close()
+
+
+def test_without_limit_returns_everything(client):
+    response = client.get("/items/")
+    assert len(response.json()) == 10
+    assert response.headers["X-Total-Count"] == "10"
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_cursor_walks_all_pages(client):
+    seen = []
+    url = "/items/?kind=a&limit=2"
+    while url:
+        response = client.get(url)
+        assert response.headers["X-Total-Count"] == "5"
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        url = f"/items/?kind=a&limit=2&cursor={cursor}" if cursor else None
+    assert seen == [1, 3, 5, 7, 9]
+
+
+def test_after_id_and_sort_column(client):
+    assert [item["id"] for item in client.get("/items/?after_id=8").json()] == [9, 10]
+
+    response = client.get("/items-by-name/?limit=3&after_id=5")
+    assert [item["name"] for item in response.json()] == ["item06", "item07", "item08"]
+    assert response.headers["X-Next-Cursor"] == encode_cursor(8, "item08")
+
+    # Позиция в сортировке по имени берется из записи: неизвестный after_id — ошибка, а не пустая страница
+    assert client.get("/items-by-name/?limit=3&after_id=999").status_code == 400
+
+
+def test_sort_column_with_nulls():
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, name TEXT)")
+    # NULL идут первыми; у записей с именами id меньше, чем у части NULL
+    db.executemany("INSERT INTO notes (name) VALUES (?)", [("b",), (None,), ("a",), (None,), (None,), ("c",)])
+    by_name = Listing("notes", order_by="name")
+    app = FastAPI()
+
+    @app.get("/notes-by-name/")
+    def notes_by_name(page: PageParams = Depends()):
+        return paginate(db, by_name, page)
+
+    client = TestClient(app)
+    seen = []
+    url = "/notes-by-name/?limit=2"
+    while url:
+        response = client.get(url)
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        url = f"/notes-by-name/?limit=2&cursor={cursor}" if cursor else None
+    assert seen == [2, 4, 5, 3, 1, 6]
+
+    assert [item["id"] for item in client.get("/notes-by-name/?after_id=4").json()] == [5, 3, 1, 6]
+    # Курсор без k для листинга с сортировкой не угадывает позицию
+    assert client.get(f"/notes-by-name/?cursor={encode_cursor(4)}").status_code == 400
+    db.close()
+
+
+def test_fields_projection(client):
+    response = client.get("/items/?fields=is_active&limit=2")
+    assert response.json() == [{"id": 1, "is_active": True}, {"id": 2, "is_active": True}]
+
+    # Порядок fields= не влияет на выборку: поля идут в порядке колонок таблицы
+    first = client.get("/items/?fields=is_active,name&limit=2").json()
+    second = client.get("/items/?fields=name,is_active&limit=2").json()
+    assert first == second and list(first[0]) == list(second[0])
+
+    response = client.get("/items/?fields=name,password")
+    assert response.status_code == 400
+
+
+def test_invalid_cursor(client):
+    assert client.get("/items/?cursor=not-a-cursor").status_code == 400
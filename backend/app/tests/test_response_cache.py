@@ -0,0 +1,107 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from etag import conditional_get, etag_middleware
+from response_cache import ResponseCache
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+@pytest.fixture
+def db(db_path):
+    db = create_schema_db(db_path, check_same_thread=False, isolation_level=None)
+    yield db
+    db.close()
+
+
+def make_client(db, cache):
+    calls = []
+
+    def get_db():
+        yield db
+
+    app = FastAPI()
+    app.middleware("http")(etag_middleware)
+    app.middleware("http")(cache.middleware)
+    cache.cache_route("/sections/", "sections")
+
+    @app.get("/sections/", dependencies=[Depends(conditional_get(get_db, "sections"))])
+    def sections(limit: int = 10):
+        calls.append(limit)
+        return [row[0] for row in db.execute("SELECT name FROM sections ORDER BY id LIMIT ?", (limit,))]
+
+    @app.post("/sections/")
+    def create_section(name: str):
+        db.execute("INSERT INTO sections (name, code) VALUES (?, ?)", (name, name))
+        return {"name": name}
+
+    client = TestClient(app)
+    client.calls = calls
+    return client
+
+
+def test_hits_and_invalidation_on_write(db, db_path):
+    cache = ResponseCache(db_path)
+    client = make_client(db, cache)
+
+    first = client.get("/sections/")
+    second = client.get("/sections/")
+    assert second.json() == first.json() == []
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert client.calls == [10]
+
+    # Другие параметры запроса — отдельная запись
+    client.get("/sections/?limit=1")
+    assert client.calls == [10, 1]
+
+    client.post("/sections/?name=Отдел")
+    assert cache.stats()["entries"] == 0
+    assert client.get("/sections/").json() == ["Отдел"]
+
+    # Запись в базу в обход API замечается при следующем чтении
+    db.execute("INSERT INTO sections (name, code) VALUES ('Склад', 'S2')")
+    assert client.get("/sections/").json() == ["Отдел", "Склад"]
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+    assert stats["invalidations"] == 3
+    cache.close()
+
+
+def test_not_modified_from_cache(db, db_path):
+    cache = ResponseCache(db_path)
+    client = make_client(db, cache)
+    etag = client.get("/sections/").headers["ETag"]
+
+    response = client.get("/sections/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert client.calls == [10]
+    cache.close()
+
+
+def test_memory_budget_evicts_least_recently_used(db, db_path):
+    cache = ResponseCache(db_path)
+    client = make_client(db, cache)
+    client.get("/sections/?limit=1")
+    entry_size = cache.stats()["size_bytes"]
+    cache.clear()
+    cache.max_bytes = entry_size * 4 + 2
+
+    for limit in range(1, 6):
+        client.get(f"/sections/?limit={limit}")
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["size_bytes"] <= cache.max_bytes
+
+    client.calls.clear()
+    client.get("/sections/?limit=5")
+    client.get("/sections/?limit=1")
+    assert client.calls == [1]
+    cache.close()
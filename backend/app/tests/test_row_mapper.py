@@ -0,0 +1,68 @@
+import json
+import sqlite3
+from datetime import date, datetime
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, Field, TypeAdapter
+
+import row_mapper
+from row_mapper import get_mapper, map_row, map_rows
+
+
+class Item(BaseModel):
+    name: str
+    is_active: bool = True
+    metrics: Optional[dict] = None
+    start_date: date = Field(default_factory=date.today)
+    id: int
+    created_at: datetime
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.execute("""CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, is_active INTEGER,
+                  metrics TEXT, extra TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+    db.execute("INSERT INTO items (name, is_active, metrics, extra) VALUES ('a', 0, '{\"k\": [1]}', 'x')")
+    db.execute("INSERT INTO items (name, is_active, created_at) VALUES ('b', 1, '2024-01-02T03:04:05.5+03:00')")
+    yield db
+    db.close()
+
+
+def test_matches_pydantic_serialization(db):
+    rows = db.execute("SELECT id, name, is_active, metrics, extra, created_at FROM items").fetchall()
+    adapter = TypeAdapter(Item)
+    expected = []
+    for row in rows:
+        item = dict(row, metrics=json.loads(row["metrics"]) if row["metrics"] else None)
+        expected.append(adapter.dump_python(adapter.validate_python(item), mode="json"))
+
+    mapped = map_rows(db.execute("SELECT id, name, is_active, metrics, extra, created_at FROM items"), Item)
+
+    assert mapped == expected
+    assert list(mapped[0]) == list(Item.model_fields)
+    assert mapped[0]["start_date"] == date.today().isoformat()
+
+
+def test_mapper_is_cached_per_columns(db):
+    row = db.execute("SELECT id, name, is_active, created_at FROM items").fetchone()
+    assert get_mapper(row.keys(), Item) is get_mapper(tuple(row.keys()), Item)
+    assert get_mapper(row.keys(), Item) is not get_mapper(row.keys(), Item, partial=True)
+    assert map_row(row, Item)["is_active"] is False
+
+
+def test_mapper_cache_is_bounded(db, monkeypatch):
+    monkeypatch.setattr(row_mapper, "MAX_MAPPERS", 2)
+    first = get_mapper(("id", "name"), Item)
+    get_mapper(("id", "extra"), Item)
+    get_mapper(("id", "is_active"), Item)
+
+    assert len(row_mapper._MAPPERS) <= 2
+    assert get_mapper(("id", "name"), Item) is not first
+
+
+def test_partial_keeps_selected_columns(db):
+    row = db.execute("SELECT id, extra, is_active FROM items").fetchone()
+    assert get_mapper(row.keys(), Item, partial=True)(row) == {"id": 1, "extra": "x", "is_active": False}
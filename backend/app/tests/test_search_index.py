@@ -0,0 +1,97 @@
+import pytest
+
+from search_index import ensure_search_index, match_expression, rebuild_search_index, search
+from update_vfp_schema import VFP_SCHEMA
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db():
+    conn = create_schema_db()
+    yield conn
+    conn.close()
+
+
+def _add_staff(db, last_name, first_name, email, position=None):
+    cursor = db.execute(
+        "INSERT INTO staff (last_name, first_name, email, position) VALUES (?, ?, ?, ?)",
+        (last_name, first_name, email, position)
+    )
+    return cursor.lastrowid
+
+
+def _found(db, query, **kwargs):
+    results, _, _ = search(db, query, **kwargs)
+    return [(item["entity_type"], item["id"]) for item in results]
+
+
+def test_match_expression_quotes_words():
+    assert match_expression('Иван OR "NEAR(') == '"Иван"* "OR"* "NEAR"*'
+    assert match_expression("Пётр") == '"Петр"*'
+    assert match_expression("  -- ") is None
+
+
+def test_triggers_keep_index_in_sync(db):
+    staff_id = _add_staff(db, "Иванов", "Сергей", "ivanov@example.com")
+    org_id = db.execute(
+        "INSERT INTO organizations (name, code, inn, org_type) VALUES ('Рога и копыта', 'RK', '7701234567', 'legal_entity')"
+    ).lastrowid
+
+    assert _found(db, "ива") == [("staff", staff_id)]
+    assert _found(db, "7701") == [("organization", org_id)]
+
+    db.execute("UPDATE staff SET last_name = 'Петров' WHERE id = ?", (staff_id,))
+    assert _found(db, "ива") == []
+    assert _found(db, "петр") == [("staff", staff_id)]
+
+    db.execute("DELETE FROM staff WHERE id = ?", (staff_id,))
+    assert _found(db, "петр") == []
+
+
+def test_yo_case_and_all_words(db):
+    first = _add_staff(db, "Ёлкин", "Пётр", "elkin@example.com")
+    _add_staff(db, "Елкина", "Анна", "elkina@example.com")
+
+    assert len(_found(db, "ЕЛК")) == 2
+    assert _found(db, "елк пет") == [("staff", first)]
+
+
+def test_title_ranks_above_body_and_type_filter(db):
+    in_body = _add_staff(db, "Сидоров", "Олег", "o@example.com", position="Инженер")
+    in_title = db.execute("INSERT INTO positions (name, code) VALUES ('Инженер', 'ENG')").lastrowid
+
+    assert _found(db, "инженер") == [("position", in_title), ("staff", in_body)]
+    assert _found(db, "инженер", types=["staff"]) == [("staff", in_body)]
+    with pytest.raises(ValueError):
+        search(db, "инженер", types=["unknown"])
+
+
+def test_cursor_pagination(db):
+    ids = [_add_staff(db, f"Кузнецов{i}", "Иван", f"k{i}@example.com") for i in range(7)]
+
+    seen, cursor = [], None
+    while True:
+        results, total, cursor = search(db, "кузнецов", limit=3, cursor=cursor)
+        assert total == 7
+        seen.extend(item["id"] for item in results)
+        if cursor is None:
+            break
+    assert sorted(seen) == ids
+
+
+def test_ensure_rebuilds_missing_documents_and_vfp_triggers(db):
+    staff_id = _add_staff(db, "Смирнов", "Павел", "s@example.com")
+    db.execute("DELETE FROM search_index")
+    db.executescript(VFP_SCHEMA)
+    db.execute("INSERT INTO valuable_final_products (entity_type, entity_id, name) VALUES ('division', 1, 'Выпуск продукции')")
+
+    assert ensure_search_index(db) == {"staff": 1, "vfp": 1}
+    assert ensure_search_index(db) == {}
+    assert _found(db, "смирн") == [("staff", staff_id)]
+
+    vfp_id = db.execute(
+        "INSERT INTO valuable_final_products (entity_type, entity_id, name) VALUES ('section', 2, 'Продажи')"
+    ).lastrowid
+    assert _found(db, "продаж") == [("vfp", vfp_id)]
+    assert rebuild_search_index(db, "vfp") == {"vfp": 2}
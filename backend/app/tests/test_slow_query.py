@@ -0,0 +1,100 @@
+import logging
+
+import pytest
+
+from db_pool import SQLiteConnectionPool
+from slow_query import SlowQueryLog, fingerprint, full_scans
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "slow.db"), pool_size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, kind TEXT)")
+        conn.executemany("INSERT INTO items (name, kind) VALUES (?, ?)", [(f"n{i}", "a") for i in range(50)])
+        conn.commit()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def log(pool):
+    log = SlowQueryLog(pool.db_path, threshold_ms=1000)
+    log.configure(enabled=True)
+    yield log
+    log.configure(enabled=False)
+    log.close()
+
+
+def test_fingerprint_strips_literals_and_in_lists():
+    sql = """SELECT * FROM staff
+             WHERE name = 'O''Brien' AND id IN (?, ?,?) AND age > 42 LIMIT 10;"""
+    assert fingerprint(sql) == "SELECT * FROM staff WHERE name = ? AND id IN (...) AND age > ? LIMIT ?"
+    assert fingerprint("SELECT t1.id FROM t1") == "SELECT t1.id FROM t1"
+
+
+def test_full_scans_ignore_index_lookups():
+    plan = ["SCAN staff", "SEARCH positions USING INTEGER PRIMARY KEY (rowid=?)",
+            "SCAN sp USING COVERING INDEX idx_sp", "SCAN CONSTANT ROW", "SCAN TABLE divisions AS d"]
+    assert full_scans(plan) == ["staff", "divisions"]
+
+
+def test_statistics_by_fingerprint(pool, log):
+    with pool.connection() as conn:
+        for i in range(1, 11):
+            conn.execute("SELECT * FROM items WHERE id = ?", (i,)).fetchone()
+        conn.execute("SELECT count(*) FROM items WHERE kind = 'a'").fetchone()
+
+    top = {row["sql"]: row for row in log.top(order_by="count")}
+    assert top["SELECT * FROM items WHERE id = ?"]["count"] == 10
+    assert top["SELECT count(*) FROM items WHERE kind = ?"]["count"] == 1
+    assert top["SELECT * FROM items WHERE id = ?"]["slow_count"] == 0
+    assert log.top(limit=1, order_by="count")[0]["sql"] == "SELECT * FROM items WHERE id = ?"
+    with pytest.raises(ValueError):
+        log.top(order_by="name")
+
+
+def test_slow_query_is_logged_with_plan(pool, log, caplog):
+    log.configure(threshold_ms=0, capture_params=True)
+    with caplog.at_level(logging.WARNING, logger="ofs_api.slow_query"):
+        with pool.connection() as conn:
+            conn.execute("SELECT * FROM items WHERE kind = ?", ("a",)).fetchall()
+
+    [record] = [r for r in caplog.records if r.name == "ofs_api.slow_query"]
+    message = record.getMessage()
+    assert "[SCAN: items]" in message
+    assert "SELECT * FROM items WHERE kind = ?" in message and "('a',)" in message
+
+    [row] = [row for row in log.top() if row["sql"] == "SELECT * FROM items WHERE kind = ?"]
+    assert row["full_scans"] == ["items"] and row["slow_count"] == 1
+    # EXPLAIN выполняется в отдельном соединении и в статистику не попадает
+    assert not any(row["sql"].startswith("EXPLAIN") for row in log.top())
+
+
+def test_params_are_kept_only_when_captured_and_never_for_auth(pool, log, caplog):
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE "user" (id INTEGER PRIMARY KEY, email TEXT, hashed_password TEXT)')
+        conn.execute("SELECT * FROM items WHERE kind = ?", ("a",)).fetchall()
+        conn.execute("SELECT * FROM items WHERE kind = 'secret-kind'").fetchall()
+        log.configure(threshold_ms=0, capture_params=True)
+        with caplog.at_level(logging.WARNING, logger="ofs_api.slow_query"):
+            conn.execute('INSERT INTO "user" (email, hashed_password) VALUES (?, ?)', ("a@b.c", "$2b$hash"))
+            conn.execute("SELECT * FROM user WHERE email = 'a@b.c'").fetchall()
+        conn.commit()
+
+    workload = {item["fingerprint"]: item for item in log.workload()}
+    # Без захвата параметры не сохранялись
+    assert workload["SELECT * FROM items WHERE kind = ?"]["params"] is None
+    # ...и текст с литералами тоже: вместо него отпечаток
+    assert workload["SELECT * FROM items WHERE kind = ?"]["sql"] == "SELECT * FROM items WHERE kind = ?"
+    for key in ('INSERT INTO "user" (email, hashed_password) VALUES (?, ?)', "SELECT * FROM user WHERE email = ?"):
+        assert workload[key]["params"] is None and workload[key]["sql"] == key
+    messages = " ".join(r.getMessage() for r in caplog.records if r.name == "ofs_api.slow_query")
+    assert "a@b.c" not in messages and "$2b$hash" not in messages
+
+    with pool.connection() as conn:
+        conn.execute("SELECT * FROM items WHERE kind = 'b'").fetchall()
+    assert {item["sql"] for item in log.workload()} >= {"SELECT * FROM items WHERE kind = 'b'"}
+    # Выключение захвата удаляет уже сохраненные тексты
+    log.configure(capture_params=False)
+    assert all(item["sql"] == item["fingerprint"] and item["params"] is None for item in log.workload())
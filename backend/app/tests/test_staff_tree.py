@@ -0,0 +1,46 @@
+from benchmarks.common import create_test_db, seed_staff, count_queries
+from staff_tree import build_staff_tree
+
+
+def _ids(nodes):
+    return [node["id"] for node in nodes]
+
+
+def test_staff_tree_query_count_is_constant():
+    conn = create_test_db()
+    seed_staff(conn, count=200, fanout=3)
+
+    with count_queries(conn) as stats:
+        tree = build_staff_tree(conn)
+
+    assert stats["queries"] == 4
+    assert _ids(tree) == [1]
+    assert _ids(tree[0]["children"]) == [2, 3, 4]
+    assert tree[0]["children"][0]["position"] == "Должность 1"
+
+
+def test_staff_tree_subtree_and_depth():
+    conn = create_test_db()
+    seed_staff(conn, count=40, fanout=3)
+
+    tree = build_staff_tree(conn, root_id=2, max_depth=1)
+
+    assert _ids(tree) == [2]
+    assert _ids(tree[0]["children"]) == [5, 6, 7]
+    assert all(child["children"] == [] for child in tree[0]["children"])
+
+
+def test_staff_tree_stops_on_cycles():
+    conn = create_test_db()
+    seed_staff(conn, count=10, fanout=2)
+    # Некорректные данные: сотрудник 2 административно подчинен своему подчиненному 4
+    conn.execute(
+        "INSERT INTO functional_relations (manager_id, subordinate_id, relation_type) VALUES (4, 2, 'administrative')"
+    )
+    conn.commit()
+
+    tree = build_staff_tree(conn)
+
+    node_2 = next(child for child in tree[0]["children"] if child["id"] == 2)
+    node_4 = next(child for child in node_2["children"] if child["id"] == 4)
+    assert 2 not in _ids(node_4["children"])
@@ -0,0 +1,74 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tracing
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(tracing.tracing_middleware)
+
+    @app.get("/staff/")
+    def staff():
+        return {"traced": tracing.tracing_enabled()}
+
+    @app.get("/locations/")
+    def locations():
+        return {"traced": tracing.tracing_enabled()}
+
+    yield TestClient(app)
+    tracing.configure(default_sample_rate=0.0, sample_rates={"/staff": None}, header_enabled=False)
+
+
+def test_requests_are_not_traced_by_default(client):
+    response = client.get("/staff/")
+    assert response.json() == {"traced": False}
+    assert tracing.TRACE_ID_HEADER not in response.headers
+
+
+def test_trace_header_is_ignored_unless_enabled(client):
+    response = client.get("/staff/", headers={"X-Trace": "1"})
+    assert response.json() == {"traced": False}
+    assert tracing.get_config()["header_enabled"] is False
+
+
+def test_trace_header_forces_tracing(client, caplog):
+    tracing.configure(header_enabled=True)
+    with caplog.at_level(logging.DEBUG, logger="ofs_api.trace"):
+        response = client.get("/staff/", headers={"X-Trace": "1"})
+
+    assert response.json() == {"traced": True}
+    trace_id = response.headers[tracing.TRACE_ID_HEADER]
+    assert any(trace_id in record.getMessage() for record in caplog.records)
+
+
+def test_trace_id_header_is_validated(client):
+    tracing.configure(header_enabled=True)
+    headers = {"X-Trace": "1", tracing.TRACE_ID_HEADER: "req-42_a"}
+    assert client.get("/staff/", headers=headers).headers[tracing.TRACE_ID_HEADER] == "req-42_a"
+
+    for bad in ("x" * 65, "id 2026-10-17 - ofs_api - INFO - forged", "a;b"):
+        headers[tracing.TRACE_ID_HEADER] = bad
+        trace_id = client.get("/staff/", headers=headers).headers[tracing.TRACE_ID_HEADER]
+        assert trace_id != bad and tracing.TRACE_ID_PATTERN.fullmatch(trace_id)
+
+
+def test_sample_rate_is_per_route(client):
+    tracing.configure(sample_rates={"/staff": 1.0})
+
+    assert client.get("/staff/").json() == {"traced": True}
+    assert client.get("/locations/").json() == {"traced": False}
+    assert tracing.sample_rate_for("/staff/1") == 1.0
+
+
+def test_invalid_config_is_not_applied_partially():
+    with pytest.raises(ValueError):
+        tracing.configure(levels={"ofs_api.test": "DEBUG", "root": "LOUD"})
+    assert logging.getLogger("ofs_api.test").level == logging.NOTSET
+
+    with pytest.raises(ValueError):
+        tracing.configure(sample_rates={"/staff": 2})
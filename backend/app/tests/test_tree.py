@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy.orm import declarative_base
+
+from app.crud.tree import build_tree, attach_children, serialize_row
+
+# Своя метадата: тестовая таблица не попадает в Base.metadata приложения
+# (create_all, автогенерация миграций)
+NodeBase = declarative_base()
+
+
+class TreeTestNode(NodeBase):
+    __tablename__ = "tree_test_nodes"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    parent_id = Column(Integer)
+    created_at = Column(DateTime)
+
+
+def test_build_tree_handles_any_order():
+    # Дети идут раньше родителей — раньше такие узлы терялись
+    nodes = [
+        {"id": 4, "parent_id": 3},
+        {"id": 3, "parent_id": 2},
+        {"id": 2, "parent_id": 1},
+        {"id": 5, "parent_id": 1},
+        {"id": 1, "parent_id": None},
+    ]
+    tree = build_tree(nodes)
+
+    assert [node["id"] for node in tree] == [1]
+    assert [child["id"] for child in tree[0]["children"]] == [2, 5]
+    assert tree[0]["children"][0]["children"][0]["children"][0]["id"] == 4
+
+
+def test_build_tree_orphans_and_cycles():
+    nodes = [
+        {"id": 1, "parent_id": None},
+        {"id": 2, "parent_id": 99},  # родитель отфильтрован
+        {"id": 3, "parent_id": 4},   # цикл 3 <-> 4
+        {"id": 4, "parent_id": 3},
+    ]
+    assert [node["id"] for node in build_tree([dict(n) for n in nodes])] == [1]
+    assert [node["id"] for node in build_tree(nodes, orphans_as_roots=True)] == [1, 2]
+
+
+def test_attach_children_and_serialize_row():
+    root = TreeTestNode(id=1, name="root", parent_id=None, created_at=datetime(2025, 1, 2, 3, 4, 5))
+    child = TreeTestNode(id=2, name="child", parent_id=1)
+
+    assert attach_children([child, root]) == [root]
+    assert root.children == [child]
+    assert serialize_row(root) == {
+        "id": 1, "name": "root", "parent_id": None, "created_at": "2025-01-02T03:04:05"
+    }
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from update_vfp_schema import VFP_SCHEMA
+from vfp_rollup import VfpRollup, ensure_vfp_versioning, metric_values
+
+from .schema_db import create_schema_db
+
+
+@pytest.fixture
+def db():
+    conn = create_schema_db(extra_schemas=[VFP_SCHEMA])
+    ensure_vfp_versioning(conn)
+    conn.executescript("""
+        INSERT INTO organizations (id, name, code, org_type) VALUES (1, 'Холдинг', 'H', 'holding');
+        INSERT INTO organizations (id, name, code, org_type, parent_id) VALUES (2, 'Юрлицо', 'LE', 'legal_entity', 1);
+        INSERT INTO divisions (id, name, code, organization_id) VALUES (10, 'Департамент', 'D', 2);
+        INSERT INTO divisions (id, name, code, organization_id, parent_id) VALUES (11, 'Отдел продаж', 'D1', 2, 10);
+        INSERT INTO sections (id, name, code) VALUES (20, 'Секция', 'S');
+        INSERT INTO division_sections (division_id, section_id) VALUES (11, 20), (10, 20);
+        INSERT INTO functions (id, name, code) VALUES (30, 'Функция', 'F');
+        INSERT INTO section_functions (section_id, function_id) VALUES (20, 30);
+    """)
+    yield conn
+    conn.close()
+
+
+def _add_vfp(db, entity_type, entity_id, progress, status="in_progress", metrics=None, is_active=1):
+    cursor = db.execute(
+        "INSERT INTO valuable_final_products (entity_type, entity_id, name, status, progress, metrics, is_active)"
+        " VALUES (?, ?, 'ЦКП', ?, ?, ?, ?)",
+        (entity_type, entity_id, status, progress, json.dumps(metrics) if metrics else None, is_active)
+    )
+    db.commit()
+    return cursor.lastrowid
+
+
+def _node(rollup, db, node_type, node_id):
+    [node] = rollup.get(db, node_type, node_id)
+    return node
+
+
+def test_metric_values_flattens_numbers():
+    assert metric_values('{"a": 1, "b": {"c": 2.5, "d": "x"}, "e": true}') == {"a": 1, "b.c": 2.5}
+    assert metric_values("not json") == {}
+
+
+def test_rollup_up_the_hierarchy_counts_each_vfp_once(db):
+    _add_vfp(db, "function", 30, 40, metrics={"revenue": 100})
+    _add_vfp(db, "division", 11, 80, status="completed", metrics={"revenue": 50})
+    _add_vfp(db, "organization", 2, None, status="blocked")
+    _add_vfp(db, "division", 10, 100, is_active=0)
+    rollup = VfpRollup()
+
+    # Секция входит в оба подразделения, но ЦКП функции учтен в департаменте один раз
+    assert _node(rollup, db, "division", 10) == {
+        "node_type": "division", "node_id": 10, "name": "Департамент", "vfp_count": 2, "progress": 60.0,
+        "status_counts": {"completed": 1, "in_progress": 1}, "metrics": {"revenue": 150},
+    }
+    holding = _node(rollup, db, "organization", 1)
+    assert holding["vfp_count"] == 3 and holding["progress"] == 60.0
+    assert holding["status_counts"] == {"blocked": 1, "completed": 1, "in_progress": 1}
+    assert _node(rollup, db, "section", 20)["vfp_count"] == 1
+    assert [node["node_type"] for node in rollup.get(db)] == ["all", "organization", "organization",
+                                                              "division", "division", "section"]
+    assert rollup.get(db, "division", 999) is None
+    with pytest.raises(ValueError):
+        rollup.get(db, "function")
+
+
+def test_incremental_update_matches_rebuild(db):
+    rollup = VfpRollup()
+    first = _add_vfp(db, "section", 20, 10, metrics={"cost": 5})
+    rollup.get(db)
+
+    second = _add_vfp(db, "function", 30, 30, metrics={"cost": 7})
+    rollup.apply(db, second)
+    db.execute("UPDATE valuable_final_products SET progress = 90, status = 'completed' WHERE id = ?", (first,))
+    db.commit()
+    rollup.apply(db, first)
+    db.execute("DELETE FROM valuable_final_products WHERE id = ?", (second,))
+    db.commit()
+    rollup.apply(db, second)
+
+    incremental = rollup.get(db)
+    assert rollup.stats()["rebuilds"] == 1 and rollup.stats()["incremental_updates"] == 3
+    assert incremental == VfpRollup().get(db)
+    assert _node(rollup, db, "organization", 2)["status_counts"] == {"completed": 1}
+
+
+def test_other_changes_trigger_rebuild(db):
+    rollup = VfpRollup()
+    _add_vfp(db, "division", 11, 50)
+    assert _node(rollup, db, "organization", 1)["vfp_count"] == 1
+
+    # Подразделение перенесено в другой холдинг: иерархия изменилась
+    db.execute("INSERT INTO organizations (id, name, code, org_type) VALUES (3, 'Другой', 'H2', 'holding')")
+    db.execute("UPDATE divisions SET organization_id = 3 WHERE id IN (10, 11)")
+    db.commit()
+    assert _node(rollup, db, "organization", 1)["vfp_count"] == 0
+    assert _node(rollup, db, "organization", 3)["vfp_count"] == 1
+
+    # Запись в ЦКП в обход API и затем apply() для другой записи: сводка пересчитывается
+    _add_vfp(db, "division", 10, 70)
+    vfp_id = _add_vfp(db, "section", 20, 90)
+    rollup.apply(db, vfp_id)
+    assert _node(rollup, db, "division", 10)["vfp_count"] == 3
+    assert rollup.stats()["rebuilds"] == 3
@@ -0,0 +1,111 @@
+"""
+Асинхронный доступ к базе данных для async-эндпоинтов.
+
+Синхронные эндпоинты (def) занимают поток из общего пула потоков Starlette
+на все время запроса, а async-функции, вызывающие sqlite3 напрямую, блокируют
+цикл событий. AsyncDatabase выполняет работу с базой в собственном пуле
+потоков размером с пул соединений: каждый поток берет соединение из db_pool
+(уже настроенное — WAL, row_factory и прочие PRAGMA), выполняет функцию
+и возвращает соединение. Цикл событий в это время обслуживает другие запросы.
+
+Эндпоинт переводится на этот путь явно:
+
+    @app.get("/positions/{position_id}")
+    async def read_position(position_id: int, db: AsyncDatabase = Depends(get_async_db)):
+        row = await db.fetchone("SELECT * FROM positions WHERE id = ?", (position_id,))
+
+Синхронный код, принимающий соединение первым аргументом (paginate,
+row_response и т.п.), вызывается через run: `await db.run(paginate, LISTING, page)`.
+Все, что передано в run, выполняется в одном соединении, поэтому несколько
+запросов одной транзакции нужно объединять в одну функцию.
+"""
+
+import asyncio
+import contextvars
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from db_pool import SQLiteConnectionPool
+
+
+def _fetchone(conn: sqlite3.Connection, sql: str, params: Sequence) -> Optional[sqlite3.Row]:
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn: sqlite3.Connection, sql: str, params: Sequence) -> List[sqlite3.Row]:
+    return conn.execute(sql, params).fetchall()
+
+
+def _execute(conn: sqlite3.Connection, sql: str, params: Sequence) -> int:
+    cursor = conn.execute(sql, params)
+    conn.commit()
+    return cursor.lastrowid
+
+
+class AsyncDatabase:
+    """Выполнение функций над соединениями пула в отдельных потоках, без блокировки цикла событий."""
+
+    def __init__(self, pool: SQLiteConnectionPool, max_workers: Optional[int] = None):
+        self.pool = pool
+        # Потоков не больше, чем соединений: поток не ждет соединение, занятое другим потоком пула
+        self.max_workers = max_workers or pool.pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._calls = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="ofs-db"
+                    )
+        return self._executor
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        with self.pool.connection() as conn:
+            return func(conn, *args, **kwargs)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет func(conn, *args, **kwargs) в потоке БД и возвращает результат."""
+        with self._lock:
+            self._pending += 1
+            self._calls += 1
+        # Контекст (trace id запроса и т.п.) переносится в поток БД
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._call, func, args, kwargs)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[sqlite3.Row]:
+        return await self.run(_fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        return await self.run(_fetchall, sql, params)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Выполняет изменяющий запрос с commit; возвращает lastrowid."""
+        return await self.run(_execute, sql, params)
+
+    def close(self) -> None:
+        """Дожидается начатых операций и останавливает потоки."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "started": self._executor is not None,
+                "pending": self._pending,
+                "calls": self._calls,
+            }
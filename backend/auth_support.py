@@ -0,0 +1,222 @@
+"""
+Аутентификация без блокировки цикла событий.
+
+- PasswordHasher выполняет bcrypt (pwd_context.hash / verify) в ограниченном
+  пуле потоков: bcrypt отпускает GIL, поэтому потоки работают параллельно,
+  а цикл событий продолжает обслуживать запросы. Одновременно считается не
+  больше max_workers хешей; если в очереди уже max_pending запросов,
+  новые получают 503 вместо бесконечного ожидания.
+- TokenCache хранит проверенные JWT -> User на короткое время (TTL, но не
+  дольше срока действия токена), чтобы get_current_user не декодировал
+  токен и не читал таблицу user на каждый запрос. При деактивации
+  пользователя его записи удаляются (invalidate_user); изменения в обход
+  API вступают в силу не позже чем через TTL.
+- AuthMetrics собирает задержки операций аутентификации (вход, регистрация,
+  проверка токена, хеширование) и число ошибок.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Потоков для bcrypt
+HASH_WORKERS = int(os.environ.get("OFS_AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Сколько запросов может ждать свободный поток, прежде чем отвечать 503
+HASH_MAX_PENDING = int(os.environ.get("OFS_AUTH_HASH_MAX_PENDING", "64"))
+# Время жизни проверенного токена в кэше, секунды (0 — кэш выключен)
+TOKEN_CACHE_TTL = float(os.environ.get("OFS_AUTH_TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_MAX_ENTRIES = 10000
+
+# Сколько последних измерений хранить для перцентилей
+_LATENCY_SAMPLES = 1000
+
+
+class AuthMetrics:
+    """Задержки и ошибки операций аутентификации."""
+
+    def __init__(self, samples: int = _LATENCY_SAMPLES):
+        self._lock = threading.Lock()
+        self._samples = samples
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, operation: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(operation, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+            counts["count"] += 1
+            counts["errors"] += int(error)
+            counts["total"] += seconds
+            counts["max"] = max(counts["max"], seconds)
+            self._latencies.setdefault(operation, deque(maxlen=self._samples)).append(seconds)
+
+    def timed(self, operation: str) -> Callable:
+        """Декоратор async-функции: время выполнения и ошибки записываются в operation."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                error = True
+                try:
+                    result = await func(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    self.observe(operation, time.perf_counter() - started, error)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Счетчики и перцентили (по последним измерениям) в миллисекундах."""
+        with self._lock:
+            result = {}
+            for operation, counts in self._counts.items():
+                ordered = sorted(self._latencies[operation])
+
+                def percentile(q):
+                    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+                result[operation] = {
+                    "count": counts["count"],
+                    "errors": counts["errors"],
+                    "avg_ms": round(counts["total"] / counts["count"] * 1000, 3),
+                    "p50_ms": percentile(0.50),
+                    "p95_ms": percentile(0.95),
+                    "p99_ms": percentile(0.99),
+                    "max_ms": round(counts["max"] * 1000, 3),
+                }
+            return result
+
+
+class PasswordHasher:
+    """Хеширование и проверка паролей в ограниченном пуле потоков."""
+
+    def __init__(self, context, max_workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING,
+                 metrics: Optional[AuthMetrics] = None):
+        self.context = context
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ofs-bcrypt")
+            return self._executor
+
+    async def _run(self, operation: str, func: Callable, *args) -> Any:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Слишком много одновременных запросов аутентификации, повторите позже",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            call = functools.partial(contextvars.copy_context().run, func, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if self.metrics is not None:
+                self.metrics.observe(operation, time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", self.context.verify, plain_password, hashed_password)
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "rejected": self.rejected,
+            }
+
+
+class TokenCache:
+    """Проверенные токены -> пользователь, с TTL и удалением по email."""
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # token -> (user, email, expires_at); порядок вставки — для вытеснения самых старых
+        self._entries: "OrderedDict[str, Tuple[Any, str, float]]" = OrderedDict()
+        self.hits = self.misses = self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                if entry[2] > time.monotonic():
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user: Any, email: str, token_exp: Optional[float] = None) -> None:
+        """token_exp — поле exp токена (Unix-время): запись не переживет сам токен."""
+        if self.ttl <= 0:
+            return
+        lifetime = self.ttl
+        if token_exp is not None:
+            lifetime = min(lifetime, token_exp - time.time())
+            if lifetime <= 0:
+                return
+        with self._lock:
+            self._entries[token] = (user, email, time.monotonic() + lifetime)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, email: str) -> int:
+        """Удаляет все токены пользователя (деактивация, смена прав)."""
+        with self._lock:
+            tokens = [token for token, entry in self._entries.items() if entry[1] == email]
+            for token in tokens:
+                del self._entries[token]
+            self.invalidations += len(tokens)
+            return len(tokens)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,205 @@
+"""
+Пакетное создание и обновление записей (эндпоинты /.../batch).
+
+Вместо тысяч одиночных POST клиент присылает массив элементов. Эндпоинт
+проверяет внешние ключи сразу для всего пакета (existing_ids — выборки
+с IN), находит уже существующие записи по естественному ключу (find_by_key)
+и записывает все корректные элементы одним executemany в одной транзакции
+(write_batch). Ответ содержит результат для каждого элемента в порядке запроса:
+
+    {"created": 2, "updated": 1, "failed": 1,
+     "items": [{"index": 0, "status": "created", "id": 15}, ...,
+               {"index": 3, "status": "error", "detail": "Должность с ID 9 не найдена"}]}
+
+Ошибочные элементы не мешают записи остальных. Режим upsert обновляет
+существующие записи с тем же естественным ключом, режим insert (по умолчанию)
+только создает новые.
+"""
+
+import sqlite3
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+# Максимальный размер одного пакета
+MAX_BATCH_SIZE = 5000
+
+# Сколько значений подставлять в один IN (...): SQLite ограничивает число параметров
+_IN_CHUNK = 500
+
+
+class BatchMode(str, Enum):
+    INSERT = "insert"
+    UPSERT = "upsert"
+
+
+class BatchItemStatus(str, Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    ERROR = "error"
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: BatchItemStatus
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    items: List[BatchItemResult] = []
+
+
+def check_batch_size(items: Sequence) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="Пакет не содержит элементов")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком большой пакет: {len(items)} элементов (максимум {MAX_BATCH_SIZE})"
+        )
+
+
+def _chunks(values: List, size: int = _IN_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def existing_ids(db: sqlite3.Connection, table: str, ids: Iterable[Optional[int]],
+                 where: str = "") -> Set[int]:
+    """Какие из ids есть в таблице (where — дополнительное условие, например на тип)."""
+    wanted = sorted({value for value in ids if value is not None})
+    found: Set[int] = set()
+    for chunk in _chunks(wanted):
+        placeholders = ", ".join("?" for _ in chunk)
+        query = f"SELECT id FROM {table} WHERE id IN ({placeholders})"
+        if where:
+            query += f" AND {where}"
+        found.update(row[0] for row in db.execute(query, chunk))
+    return found
+
+
+def find_by_key(db: sqlite3.Connection, table: str, key_columns: Sequence[str],
+                keys: Iterable[Tuple]) -> Dict[Tuple, int]:
+    """
+    id существующих записей по естественному ключу.
+
+    Выборка идет по первой колонке ключа (IN), остальные сравниваются в Python.
+    Если ключ встречается несколько раз, возвращается последняя запись.
+    """
+    wanted = set(keys)
+    first_values = sorted({key[0] for key in wanted})
+    columns = ", ".join(key_columns)
+    found: Dict[Tuple, int] = {}
+    for chunk in _chunks(first_values):
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor = db.execute(
+            f"SELECT id, {columns} FROM {table} WHERE {key_columns[0]} IN ({placeholders}) ORDER BY id",
+            chunk
+        )
+        for row in cursor:
+            key = tuple(row[1:])
+            if key in wanted:
+                found[key] = row[0]
+    return found
+
+
+class Batch:
+    """
+    Результаты обработки пакета: ошибки проверок и строки для записи.
+
+    Эндпоинт вызывает fail(index, detail) для отклоненных элементов
+    и add(index, values, existing_id) для принятых, затем write_batch.
+    """
+
+    def __init__(self):
+        self.errors: Dict[int, str] = {}
+        self._keys: Dict[Tuple, int] = {}
+        self.inserts: List[Tuple[int, Tuple]] = []
+        self.updates: List[Tuple[int, Tuple, int]] = []
+
+    def fail(self, index: int, detail: str) -> None:
+        self.errors.setdefault(index, detail)
+
+    def failed(self, index: int) -> bool:
+        return index in self.errors
+
+    def claim(self, index: int, key: Tuple) -> bool:
+        """Запоминает естественный ключ элемента; повтор ключа внутри пакета — ошибка."""
+        first = self._keys.setdefault(key, index)
+        if first != index:
+            self.fail(index, f"Ключ {key} повторяет элемент {first} этого пакета")
+            return False
+        return True
+
+    def add(self, index: int, values: Tuple, existing_id: Optional[int] = None) -> None:
+        if existing_id is None:
+            self.inserts.append((index, values))
+        else:
+            self.updates.append((index, values, existing_id))
+
+
+def _sequence(db: sqlite3.Connection, table: str) -> int:
+    # Для таблиц с AUTOINCREMENT новые id всегда больше значения в sqlite_sequence
+    row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    return row[0] if row else 0
+
+
+def write_batch(db: sqlite3.Connection, table: str, columns: Sequence[str], batch: Batch,
+                before_write: Optional[Callable[[sqlite3.Connection], None]] = None) -> BatchResult:
+    """
+    Записывает принятые элементы пакета одной транзакцией и собирает результат.
+
+    Вставка и обновление выполняются через executemany. id новых записей
+    берутся одной выборкой: транзакция начинается с BEGIN IMMEDIATE, поэтому
+    все id больше прежнего значения sqlite_sequence принадлежат этому пакету.
+    before_write выполняется в той же транзакции (например, сброс is_primary).
+    """
+    created_ids: List[int] = []
+    if batch.inserts or batch.updates:
+        if db.in_transaction:
+            db.commit()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if before_write is not None:
+                before_write(db)
+            if batch.inserts:
+                sequence = _sequence(db, table)
+                db.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    [values for _, values in batch.inserts]
+                )
+                created_ids = [row[0] for row in db.execute(
+                    f"SELECT id FROM {table} WHERE id > ? ORDER BY id", (sequence,)
+                )]
+                if len(created_ids) != len(batch.inserts):
+                    raise sqlite3.IntegrityError("число созданных записей не совпадает с пакетом")
+            if batch.updates:
+                assignments = ", ".join(f"{column} = ?" for column in columns)
+                db.executemany(
+                    f"UPDATE {table} SET {assignments} WHERE id = ?",
+                    [values + (existing_id,) for _, values, existing_id in batch.updates]
+                )
+            db.commit()
+        except sqlite3.Error as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Ошибка при пакетной записи: {str(e)}")
+
+    items = [BatchItemResult(index=index, status=BatchItemStatus.ERROR, detail=detail)
+             for index, detail in batch.errors.items()]
+    items += [BatchItemResult(index=index, status=BatchItemStatus.CREATED, id=new_id)
+              for (index, _), new_id in zip(batch.inserts, created_ids)]
+    items += [BatchItemResult(index=index, status=BatchItemStatus.UPDATED, id=existing_id)
+              for index, _, existing_id in batch.updates]
+    items.sort(key=lambda item: item.index)
+    return BatchResult(
+        created=len(batch.inserts),
+        updated=len(batch.updates),
+        failed=len(batch.errors),
+        items=items,
+    )
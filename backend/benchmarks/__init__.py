@@ -0,0 +1,12 @@
+"""
+Бенчмарки производительности OFS Global API.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_org_hierarchy
+"""
+
+import tracing
+
+# Журнал приложения только в консоль: импорт full_api иначе создает api_debug.log
+# в текущем каталоге и пишет туда каждый запрос нагрузки
+tracing.setup_logging(None)
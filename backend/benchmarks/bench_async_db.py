@@ -0,0 +1,155 @@
+"""
+Нагрузочный тест: синхронный эндпоинт в пуле потоков против async-эндпоинта с AsyncDatabase.
+
+В отдельном процессе поднимается uvicorn-сервер с двумя вариантами одного и того же
+запроса карточки сотрудника (как /staff/{staff_id}):
+- «threadpool» — def-эндпоинт с Depends(get_db): поток из пула Starlette
+  на весь запрос, соединение берется из db_pool;
+- «async_db» — async-эндпоинт, запрос выполняется в потоке AsyncDatabase.
+
+Одновременно с нагрузкой раз в 10 мс запрашивается /ping без обращения к БД:
+его задержка показывает, насколько занят цикл событий и пул потоков.
+
+    python -m benchmarks.bench_async_db [запросов_на_уровень]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI
+
+from async_db import AsyncDatabase
+from benchmarks.common import create_test_db, seed_staff
+from db_pool import SQLiteConnectionPool
+from full_api import Staff
+from row_mapper import row_response
+
+STAFF_COUNT = 5000
+REQUESTS = 3000
+CONCURRENCY = [10, 100, 500]
+
+QUERY = "SELECT * FROM staff WHERE id = ?"
+
+
+def build_app(db_path):
+    pool = SQLiteConnectionPool(db_path)
+    async_db = AsyncDatabase(pool)
+    app = FastAPI()
+
+    def get_db():
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    @app.get("/threadpool/{staff_id}")
+    def read_sync(staff_id: int, db=Depends(get_db)):
+        return row_response(db.execute(QUERY, (staff_id,)).fetchone(), Staff)
+
+    @app.get("/async_db/{staff_id}")
+    async def read_async(staff_id: int):
+        return row_response(await async_db.fetchone(QUERY, (staff_id,)), Staff)
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    return app
+
+
+def serve(db_path, port):
+    uvicorn.run(build_app(db_path), port=port, log_level="warning", backlog=4096)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Сервер не запустился")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def load(client, path, total, concurrency):
+    latencies = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.get(f"{path}/{i % STAFF_COUNT + 1}")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started), latencies
+
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/ping")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else 0.0
+
+
+async def run(base_url, total):
+    limits = httpx.Limits(max_connections=max(CONCURRENCY), max_keepalive_connections=max(CONCURRENCY))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client, \
+            httpx.AsyncClient(base_url=base_url, timeout=60) as probe_client:
+        await load(client, "/threadpool", 200, 10)
+        await load(client, "/async_db", 200, 10)
+        print(f"{'путь':<12} {'клиентов':>8} {'запр/с':>8} {'p50, мс':>8} {'p99, мс':>8} {'/ping p99, мс':>14}")
+        for concurrency in CONCURRENCY:
+            for path in ("/threadpool", "/async_db"):
+                stop, ping = asyncio.Event(), []
+                prober = asyncio.create_task(probe(probe_client, stop, ping))
+                rps, latencies = await load(client, path, total, concurrency)
+                stop.set()
+                await prober
+                print(f"{path[1:]:<12} {concurrency:>8} {rps:>8.0f} {percentile(latencies, 50):>8.1f} "
+                      f"{percentile(latencies, 99):>8.1f} {percentile(ping, 99):>14.1f}")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ofs_bench_"), "bench.db")
+    conn = create_test_db(db_path)
+    seed_staff(conn, count=STAFF_COUNT)
+    conn.close()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(db_path, port), daemon=True)
+    server.start()
+    try:
+        wait_for_port(port)
+        asyncio.run(run(f"http://127.0.0.1:{port}", total))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк массовой загрузки: одиночные POST против пакетных эндпоинтов.
+
+Вызываются сами функции эндпоинтов на одном соединении (без HTTP), поэтому
+в реальной загрузке разница больше: одиночный вариант платит еще и за
+запрос/ответ на каждый элемент.
+
+- «одиночные» — create_staff_function / create_functional_relation для каждого
+  элемента: проверки по одной строке, INSERT, commit и повторный SELECT;
+- «пакет» — /staff-functions/batch и /functional-relations/batch: проверки
+  выборками с IN и executemany в одной транзакции.
+
+    python -m benchmarks.bench_batch [число_элементов]
+"""
+
+import sys
+
+from batch import BatchMode
+from benchmarks.common import create_test_db, seed_staff, timer
+from full_api import (
+    FunctionalRelationCreate, RelationType, StaffFunctionCreate,
+    create_functional_relation, create_functional_relations_batch,
+    create_staff_function, create_staff_functions_batch,
+)
+
+ITEM_COUNT = 2000
+
+
+def staff_function_items(conn, count):
+    staff_ids = [row[0] for row in conn.execute("SELECT id FROM staff ORDER BY id")]
+    conn.execute("INSERT INTO functions (name, code) VALUES ('Функция', 'BF')")
+    function_id = conn.execute("SELECT id FROM functions WHERE code = 'BF'").fetchone()[0]
+    conn.commit()
+    return [StaffFunctionCreate(staff_id=staff_ids[i % len(staff_ids)], function_id=function_id,
+                                is_primary=False)
+            for i in range(count)]
+
+
+def relation_items(conn, count):
+    staff_ids = [row[0] for row in conn.execute("SELECT id FROM staff ORDER BY id")]
+    return [FunctionalRelationCreate(manager_id=staff_ids[i % len(staff_ids)],
+                                     subordinate_id=staff_ids[(i + 1) % len(staff_ids)],
+                                     relation_type=RelationType.PROJECT)
+            for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ITEM_COUNT
+    conn = create_test_db()
+    seed_staff(conn, count=count)
+    # Как у соединений из пула (db_pool): commit каждой одиночной записи не бесплатен
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    cases = [
+        ("staff_functions", staff_function_items(conn, count),
+         create_staff_function, create_staff_functions_batch),
+        ("functional_relations", relation_items(conn, count),
+         create_functional_relation, create_functional_relations_batch),
+    ]
+    print(f"{'таблица':<22} {'элементов':>9} {'одиночные, мс':>14} {'пакет, мс':>10} {'ускорение':>10}")
+    for name, items, create_one, create_batch in cases:
+        with timer() as single:
+            for item in items:
+                create_one(item, conn)
+        with timer() as batched:
+            result = create_batch(items, BatchMode.INSERT, conn)
+        assert result.created == len(items)
+        print(f"{name:<22} {len(items):>9} {single['ms']:>14.1f} {batched['ms']:>10.1f} "
+              f"{single['ms'] / batched['ms']:>9.1f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Бенчмарк выгрузки сотрудников: полный список в памяти против потоковой выгрузки.
+
+Сравнивает пиковое потребление памяти (tracemalloc) и время при 100k+ строк:
+- «список» — как /staff/ без limit: все строки в список словарей, затем один JSON-документ;
+- NDJSON/CSV (опционально с gzip) — как /export/staff: пачки из курсора сразу в байты.
+
+    python -m benchmarks.bench_export [число_сотрудников]
+"""
+
+import json
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+from benchmarks.common import create_test_db, seed_staff, timer
+from export import ExportFormat, export_chunks, gzip_chunks
+from pagination import Listing
+
+STAFF_COUNT = 100_000
+
+COLUMNS = [
+    "id", "email", "first_name", "last_name", "middle_name", "phone",
+    "position", "description", "is_active", "organization_id",
+    "primary_organization_id", "location_id", "registration_address",
+    "actual_address", "telegram_id", "vk", "instagram",
+    "created_at", "updated_at",
+]
+QUERY = f"SELECT {', '.join(COLUMNS)} FROM staff ORDER BY id"
+
+
+def full_list(conn):
+    convert = Listing("staff").convert(COLUMNS)
+    rows = [convert(row) for row in conn.execute(QUERY).fetchall()]
+    body = json.dumps(rows, ensure_ascii=False).encode("utf-8")
+    return len(body)
+
+
+def streamed(conn, fmt, gzip=False):
+    @contextmanager
+    def connection():
+        yield conn
+
+    chunks = export_chunks(connection, QUERY, (), fmt, Listing("staff").convert(COLUMNS))
+    if gzip:
+        chunks = gzip_chunks(chunks)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    with timer() as elapsed:
+        size = func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed["ms"], peak / 1024 / 1024
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else STAFF_COUNT
+    conn = create_test_db()
+    seed_staff(conn, count=count)
+    conn.row_factory = None
+
+    print(f"Сотрудников: {count}")
+    print(f"{'вариант':<16} {'размер, МБ':>11} {'время, мс':>10} {'пик памяти, МБ':>15}")
+    variants = [
+        ("список + JSON", full_list, ()),
+        ("NDJSON", streamed, (ExportFormat.NDJSON,)),
+        ("NDJSON + gzip", streamed, (ExportFormat.NDJSON, True)),
+        ("CSV", streamed, (ExportFormat.CSV,)),
+        ("CSV + gzip", streamed, (ExportFormat.CSV, True)),
+    ]
+    for name, func, args in variants:
+        size, ms, peak = measure(func, conn, *args)
+        print(f"{name:<16} {size / 1024 / 1024:>11.1f} {ms:>10.0f} {peak:>15.1f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
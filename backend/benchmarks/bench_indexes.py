@@ -0,0 +1,165 @@
+"""
+Бенчмарк составных индексов: снятие нагрузки, советник и сравнение до/после.
+
+1. Создается база с индексами «как раньше» (по одной колонке) и заполняется
+   сотрудниками, связями, локациями и ЦКП.
+2. Через TestClient к full_api выполняются самые нагруженные запросы: дерево
+   сотрудников, карточка сотрудника, фильтры /functional-relations/, /vfp/
+   и /locations/; журнал медленных запросов (slow_query) снимает нагрузку.
+3. index_advisor предлагает индексы по этой нагрузке.
+4. Нагрузка воспроизводится на копиях базы со старыми индексами и со схемой
+   complete_schema (составные индексы); выводится время каждого запроса,
+   план которого изменился.
+
+    python -m benchmarks.bench_indexes [сотрудников]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+from benchmarks.common import create_test_db, seed_org_structure, seed_staff, timer
+from complete_schema import ALL_SCHEMAS
+from index_advisor import WorkloadQuery, advise, measure
+
+STAFF_COUNT = 5000
+LOCATIONS = 3000
+REPEAT = 5
+
+# Индексы до миграции, в исходном порядке создания: без статистики (ANALYZE)
+# планировщик выбирает между равноценными индексами в том числе по этому порядку
+OLD_INDEXES = """
+DROP INDEX IF EXISTS idx_organizations_org_type_is_active_name;
+DROP INDEX IF EXISTS idx_staff_positions_staff_id_is_primary;
+DROP INDEX IF EXISTS idx_functional_relations_manager_id_relation_type_is_active;
+DROP INDEX IF EXISTS idx_functional_relations_subordinate_id_relation_type_is_active;
+DROP INDEX idx_organizations_parent_id;
+DROP INDEX idx_staff_positions_position_id;
+DROP INDEX idx_staff_positions_division_id;
+DROP INDEX idx_staff_positions_location_id;
+DROP INDEX idx_staff_positions_is_primary;
+DROP INDEX idx_staff_positions_is_active;
+DROP INDEX idx_staff_positions_dates;
+DROP INDEX idx_functional_relations_relation_type;
+DROP INDEX idx_functional_relations_dates;
+
+CREATE INDEX idx_organizations_parent_id ON organizations(parent_id);
+CREATE INDEX idx_organizations_org_type ON organizations(org_type);
+CREATE INDEX idx_staff_positions_staff_id ON staff_positions(staff_id);
+CREATE INDEX idx_staff_positions_position_id ON staff_positions(position_id);
+CREATE INDEX idx_staff_positions_division_id ON staff_positions(division_id);
+CREATE INDEX idx_staff_positions_location_id ON staff_positions(location_id);
+CREATE INDEX idx_staff_positions_is_primary ON staff_positions(is_primary);
+CREATE INDEX idx_staff_positions_is_active ON staff_positions(is_active);
+CREATE INDEX idx_staff_positions_dates ON staff_positions(start_date, end_date);
+CREATE INDEX idx_functional_relations_manager_id ON functional_relations(manager_id);
+CREATE INDEX idx_functional_relations_subordinate_id ON functional_relations(subordinate_id);
+CREATE INDEX idx_functional_relations_relation_type ON functional_relations(relation_type);
+CREATE INDEX idx_functional_relations_dates ON functional_relations(start_date, end_date);
+"""
+
+VFP_STATUSES = ("not_started", "in_progress", "completed", "blocked", "delayed")
+
+
+def seed(db_path, staff_count):
+    from update_vfp_schema import VFP_SCHEMA
+
+    conn = create_test_db(db_path)
+    seed_org_structure(conn, holdings=5)
+    seed_staff(conn, count=staff_count)
+    conn.executemany(
+        "INSERT INTO organizations (name, code, org_type, is_active) VALUES (?, ?, 'location', ?)",
+        ((f"Локация {i}", f"L{i}", int(i % 5 != 0)) for i in range(LOCATIONS))
+    )
+    # История должностей: у каждого третьего есть прежняя, неосновная должность
+    conn.execute("""
+        INSERT INTO staff_positions (staff_id, position_id, is_primary, is_active)
+        SELECT staff_id, position_id, 0, 0 FROM staff_positions WHERE staff_id % 3 = 0
+    """)
+    conn.executescript(VFP_SCHEMA)
+    conn.executemany(
+        "INSERT INTO valuable_final_products (entity_type, entity_id, name, status, progress) VALUES (?, ?, ?, ?, ?)",
+        ((entity_type, i, f"ЦКП {entity_type} {i}", VFP_STATUSES[i % 5], i % 101)
+         for entity_type in ("division", "section", "function") for i in range(1, 2001))
+    )
+    conn.executescript(OLD_INDEXES)
+    conn.commit()
+    conn.close()
+
+
+def capture_workload(staff_count):
+    """Нагрузка горячих эндпоинтов, снятая журналом медленных запросов."""
+    from fastapi.testclient import TestClient
+
+    import full_api
+
+    # Без with: событие startup (init_db) применило бы новую схему к базе
+    client = TestClient(full_api.app)
+    full_api.slow_query_log.reset()
+    # Параметры нужны для воспроизведения нагрузки с реальными значениями
+    full_api.slow_query_log.configure(capture_params=True)
+    client.get("/org-structure/staff-tree").raise_for_status()
+    for i in range(1, 201):
+        staff_id = i * staff_count // 200
+        client.get(f"/org-structure/staff-info/{staff_id}").raise_for_status()
+        client.get("/functional-relations/", params={
+            "manager_id": staff_id, "relation_type": "administrative", "is_active": True,
+        }).raise_for_status()
+        client.get("/vfp/", params={"entity_type": "division", "entity_id": i, "status": VFP_STATUSES[i % 5]})
+        # limit меняется, чтобы ответ не брался из кэша ответов
+        client.get("/locations/", params={"limit": 10 + i}).raise_for_status()
+    return [
+        WorkloadQuery(item["sql"], item["params"], item["count"])
+        for item in full_api.slow_query_log.workload()
+        if not item["sql"].lstrip().upper().startswith("PRAGMA")
+    ]
+
+
+def replay(conn, workload):
+    return [measure(conn, query, REPEAT) for query in workload]
+
+
+def main():
+    staff_count = int(sys.argv[1]) if len(sys.argv) > 1 else STAFF_COUNT
+    workdir = tempfile.mkdtemp(prefix="ofs_bench_")
+    db_path = os.path.join(workdir, "full_api_new.db")
+    # full_api открывает базу по относительному пути full_api_new.db
+    os.chdir(workdir)
+    seed(db_path, staff_count)
+
+    with timer() as t:
+        workload = capture_workload(staff_count)
+    print(f"Снято {len(workload)} запросов, {sum(q.count for q in workload)} выполнений за {t['ms']:.0f} мс")
+
+    source = sqlite3.connect(db_path)
+    with timer() as t:
+        recommendations = advise(source, workload, repeat=REPEAT)
+    print(f"\nСоветник ({t['ms']:.0f} мс):")
+    for recommendation in recommendations:
+        print(f"  {recommendation.create_sql}  -- выигрыш {recommendation.gain_ms:.1f} мс")
+
+    before_db = sqlite3.connect(":memory:", isolation_level=None)
+    source.backup(before_db)
+    after_db = sqlite3.connect(":memory:", isolation_level=None)
+    source.backup(after_db)
+    source.close()
+    for schema in ALL_SCHEMAS:
+        after_db.executescript(schema)
+
+    before, after = replay(before_db, workload), replay(after_db, workload)
+    print(f"\n{'до, мс':>10} {'после, мс':>10} {'выполнений':>10}  запрос")
+    total_before = total_after = 0.0
+    for query, old, new in zip(workload, before, after):
+        if old.ms is None or new.ms is None:
+            continue
+        total_before += old.ms * query.count
+        total_after += new.ms * query.count
+        if old.plan != new.plan:
+            text = " ".join(query.sql.split())
+            print(f"{old.ms:>10.3f} {new.ms:>10.3f} {query.count:>10}  {text[:90]}")
+    print(f"\nВся нагрузка: {total_before:.1f} мс -> {total_after:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
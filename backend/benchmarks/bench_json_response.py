@@ -0,0 +1,85 @@
+"""
+Бенчмарк сериализации JSON-ответов: стандартный JSONResponse против FastJSONResponse (orjson).
+
+Два вида содержимого:
+- «готовые строки» — список dict из row_mapper (как /staff/ и /functional-relations/);
+- «объекты» — dict с datetime, Enum и Decimal; стандартный путь FastAPI
+  сначала прогоняет их через jsonable_encoder, orjson кодирует их напрямую.
+
+    python -m benchmarks.bench_json_response [число_строк]
+"""
+
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import json_response
+from benchmarks.common import create_test_db, seed_staff, timer
+from full_api import FUNCTIONAL_RELATIONS_LISTING, STAFF_LISTING, RelationType
+from json_response import FastJSONResponse
+from pagination import table_columns
+
+ROW_COUNT = 20_000
+REPEATS = 5
+
+
+def mapped_rows(conn, listing):
+    columns = listing.default_columns or table_columns(conn, listing.table)
+    rows = conn.execute(f"SELECT {', '.join(columns)} FROM {listing.table} ORDER BY id").fetchall()
+    mapper = listing.convert(columns)
+    return [mapper(row) for row in rows]
+
+
+def python_objects(count):
+    started = datetime(2024, 1, 1, 9, 0)
+    relation_types = list(RelationType)
+    return [
+        {
+            "id": i,
+            "relation_type": relation_types[i % len(relation_types)],
+            "weight": Decimal(i) / 100,
+            "created_at": started + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def best_ms(func):
+    results = []
+    for _ in range(REPEATS):
+        with timer() as elapsed:
+            func()
+        results.append(elapsed["ms"])
+    return min(results)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ROW_COUNT
+    conn = create_test_db()
+    seed_staff(conn, count=count)
+
+    payloads = [
+        ("staff", mapped_rows(conn, STAFF_LISTING), False),
+        ("functional_relations", mapped_rows(conn, FUNCTIONAL_RELATIONS_LISTING), False),
+        ("объекты", python_objects(count), True),
+    ]
+
+    json_response.configure(use_orjson=True)
+    print(f"{'содержимое':<22} {'строк':>7} {'json, мс':>9} {'orjson, мс':>11} {'ускорение':>10}")
+    for name, content, needs_encoder in payloads:
+        def standard():
+            JSONResponse(jsonable_encoder(content) if needs_encoder else content)
+
+        fast_ms = best_ms(lambda: FastJSONResponse(content))
+        std_ms = best_ms(standard)
+        print(f"{name:<22} {len(content):>7} {std_ms:>9.1f} {fast_ms:>11.1f} {std_ms / fast_ms:>9.1f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    if not json_response.ORJSON_AVAILABLE:
+        sys.exit("orjson не установлен: pip install orjson")
+    main()
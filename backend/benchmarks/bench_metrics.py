@@ -0,0 +1,104 @@
+"""
+Накладные расходы сбора метрик.
+
+1. Стоимость одного SQL-выражения: обычное sqlite3.Connection, TracingConnection
+   без подписчиков и TracingConnection с подписчиком metrics.
+2. Стоимость HTTP-запроса (карточка сотрудника через пул) без MetricsMiddleware,
+   с middleware и выключенными метриками, с включенными метриками.
+   Запросы идут через httpx.ASGITransport, без сети.
+
+    python -m benchmarks.bench_metrics [запросов]
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+import httpx
+from fastapi import Depends, FastAPI
+
+import metrics
+from benchmarks.common import create_test_db, seed_staff, timer
+from db_pool import SQLiteConnectionPool
+from sql_trace import TracingConnection
+
+STAFF_COUNT = 5000
+STATEMENTS = 100_000
+REQUESTS = 3000
+
+QUERY = "SELECT * FROM staff WHERE id = ?"
+
+
+def bench_statements(db_path):
+    print(f"{'соединение':<28} {'мкс/выражение':>14}")
+    variants = [
+        ("sqlite3.Connection", sqlite3.Connection, False),
+        ("TracingConnection", TracingConnection, False),
+        ("TracingConnection + metrics", TracingConnection, True),
+    ]
+    for name, factory, enabled in variants:
+        metrics.configure(enabled=enabled)
+        conn = sqlite3.connect(db_path, factory=factory)
+        with timer() as t:
+            for i in range(STATEMENTS):
+                conn.execute(QUERY, (i % STAFF_COUNT + 1,)).fetchone()
+        conn.close()
+        print(f"{name:<28} {t['ms'] * 1000 / STATEMENTS:>14.2f}")
+
+
+def build_app(pool, middleware):
+    app = FastAPI()
+    if middleware:
+        app.add_middleware(metrics.MetricsMiddleware)
+
+    def get_db():
+        with pool.connection() as conn:
+            yield conn
+
+    @app.get("/staff/{staff_id}")
+    def read_staff(staff_id: int, db=Depends(get_db)):
+        return dict(db.execute(QUERY, (staff_id,)).fetchone())
+
+    return app
+
+
+async def bench_requests(app, total):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):
+            await client.get(f"/staff/{i + 1}")
+        with timer() as t:
+            for i in range(total):
+                response = await client.get(f"/staff/{i % STAFF_COUNT + 1}")
+                response.raise_for_status()
+    return t["ms"] * 1000 / total
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ofs_bench_"), "bench.db")
+    conn = create_test_db(db_path)
+    seed_staff(conn, count=STAFF_COUNT)
+    conn.close()
+
+    bench_statements(db_path)
+
+    pool = SQLiteConnectionPool(db_path)
+    print(f"\n{'вариант':<28} {'мкс/запрос':>14}")
+    variants = [
+        ("без middleware", False, False),
+        ("middleware, метрики выкл.", True, False),
+        ("middleware, метрики вкл.", True, True),
+    ]
+    for name, middleware, enabled in variants:
+        metrics.configure(enabled=enabled)
+        metrics.reset()
+        per_request = asyncio.run(bench_requests(build_app(pool, middleware), total))
+        print(f"{name:<28} {per_request:>14.1f}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Бенчмарк построения /org-structure/hierarchy.
+
+Показывает, что число SQL-запросов не зависит от размера оргструктуры.
+
+    python -m benchmarks.bench_org_hierarchy
+"""
+
+from benchmarks.common import create_test_db, seed_org_structure, count_queries, timer
+from org_tree import build_org_hierarchy
+
+SIZES = [
+    dict(holdings=1, legal_entities=2, divisions=2, sub_divisions=1, sections=2, functions=1),
+    dict(holdings=2, legal_entities=3, divisions=4, sub_divisions=3, sections=3, functions=2),
+    dict(holdings=4, legal_entities=5, divisions=8, sub_divisions=5, sections=4, functions=3),
+    dict(holdings=8, legal_entities=8, divisions=12, sub_divisions=8, sections=5, functions=3),
+]
+
+
+def main():
+    print(f"{'узлов':>8} {'запросов':>9} {'время, мс':>10}")
+    for size in SIZES:
+        conn = create_test_db()
+        counts = seed_org_structure(conn, **size)
+        nodes = sum(counts.values())
+        with count_queries(conn) as stats, timer() as elapsed:
+            build_org_hierarchy(conn)
+        print(f"{nodes:>8} {stats['queries']:>9} {elapsed['ms']:>10.1f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
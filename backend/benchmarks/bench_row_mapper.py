@@ -0,0 +1,74 @@
+"""
+Бенчмарк преобразования строк в ответ API: строк в секунду до и после row_mapper.
+
+- «dict + pydantic» — как раньше: dict(row) (или dict, собранный вручную),
+  затем FastAPI валидирует список через response_model и сериализует обратно;
+- «row_mapper» — скомпилированный преобразователь сразу строит JSON-совместимый dict.
+
+В обоих вариантах учитывается и итоговый json.dumps, как в JSONResponse.
+
+    python -m benchmarks.bench_row_mapper [число_сотрудников]
+"""
+
+import json
+import sys
+from typing import List
+
+from pydantic import TypeAdapter
+
+from benchmarks.common import create_test_db, seed_staff, timer
+from full_api import STAFF_LISTING, Staff
+from row_mapper import get_mapper
+
+STAFF_COUNT = 20_000
+REPEATS = 5
+
+QUERY = f"SELECT {', '.join(STAFF_LISTING.default_columns)} FROM staff ORDER BY id"
+
+
+def render(content) -> bytes:
+    # Те же параметры, что у starlette JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def validated(rows, columns):
+    adapter = TypeAdapter(List[Staff])
+    content = adapter.dump_python(adapter.validate_python([dict(row) for row in rows]), mode="json")
+    return render(content)
+
+
+def mapped(rows, columns):
+    mapper = get_mapper(columns, Staff)
+    return render([mapper(row) for row in rows])
+
+
+def best_ms(func, *args):
+    results = []
+    for _ in range(REPEATS):
+        with timer() as elapsed:
+            func(*args)
+        results.append(elapsed["ms"])
+    return min(results)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else STAFF_COUNT
+    conn = create_test_db()
+    seed_staff(conn, count=count)
+    cursor = conn.execute(QUERY)
+    columns = [description[0] for description in cursor.description]
+    rows = cursor.fetchall()
+
+    assert validated(rows, columns) == mapped(rows, columns)
+
+    print(f"Сотрудников: {count}")
+    print(f"{'вариант':<18} {'время, мс':>10} {'строк/с':>12}")
+    for name, func in [("dict + pydantic", validated), ("row_mapper", mapped)]:
+        ms = best_ms(func, rows, columns)
+        print(f"{name:<18} {ms:>10.1f} {count / ms * 1000:>12,.0f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Бенчмарк полнотекстового поиска: FTS5 (search_index) против LIKE '%...%'.
+
+База заполняется сотрудниками (по умолчанию 100 000) с правдоподобными ФИО,
+email, телефонами и должностями, плюс оргструктура. Для набора запросов
+сравниваются:
+- LIKE по всем колонкам staff, организаций и справочников (полный просмотр
+  каждой таблицы; регистр кириллицы LIKE не различает только для ASCII,
+  поэтому сравнивается lower() с запросом в нижнем регистре — как сделал бы
+  «простой» поиск, и он все равно не находит «Ё» по «е»);
+- search_index.search: префиксный поиск по FTS5 с ранжированием, первая
+  страница и подсчет общего числа найденных.
+
+Отдельно замеряется цена триггеров индекса при вставке сотрудников: FTS5
+сбрасывает накопленные изменения на каждой точке сохранения, а выражение
+триггера — это точка сохранения, поэтому построчная вставка заметно дороже
+полной перестройки (rebuild_search_index) — ею и стоит пользоваться после
+массовой загрузки.
+
+    python -m benchmarks.bench_search [сотрудников]
+"""
+
+import random
+import sqlite3
+import statistics
+import sys
+
+from benchmarks.common import create_test_db, seed_org_structure, timer
+from complete_schema import SEARCH_ENTITIES
+from search_index import rebuild_search_index, search
+
+STAFF_COUNT = 100_000
+REPEAT = 5
+PAGE = 20
+
+LAST_NAMES = ("Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов",
+              "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов",
+              "Егоров", "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров")
+FIRST_NAMES = ("Александр", "Сергей", "Дмитрий", "Андрей", "Алексей", "Иван", "Михаил", "Артём",
+               "Пётр", "Николай", "Ольга", "Елена", "Анна", "Мария", "Татьяна", "Наталья")
+MIDDLE_NAMES = ("Александрович", "Сергеевич", "Дмитриевич", "Иванович", "Петрович", "Николаевич")
+POSITIONS = ("Инженер", "Главный инженер", "Бухгалтер", "Менеджер по продажам", "Юрист",
+             "Аналитик", "Руководитель отдела", "Кладовщик", "Водитель", "Программист")
+
+QUERIES = ("иванов", "фёдоров петр", "семенов", "инженер", "user12345", "+7900001234",
+           "продаж", "департамент", "кузнецова ольга")
+
+
+def seed(conn, staff_count):
+    rng = random.Random(42)
+    seed_org_structure(conn, holdings=5)
+    with timer() as t:
+        conn.executemany(
+            "INSERT INTO staff (email, first_name, last_name, middle_name, phone, position) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (f"user{i}@example.com", first, last + ("а" if first[-1] == "а" else ""),
+                 rng.choice(MIDDLE_NAMES), f"+7900{i:07d}", rng.choice(POSITIONS))
+                for i, first, last in (
+                    (i, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) for i in range(staff_count)
+                )
+            )
+        )
+        conn.commit()
+    return t["ms"]
+
+
+def like_search(conn, query):
+    """Поиск «как без индекса»: каждое слово — подстрока любой из колонок."""
+    results = []
+    words = query.lower().split()
+    for entity_type, (_, table, title_columns, body_columns) in SEARCH_ENTITIES.items():
+        if entity_type == "vfp":
+            continue
+        columns = title_columns + body_columns
+        condition = " AND ".join(
+            "(" + " OR ".join(f"lower({column}) LIKE ?" for column in columns) + ")" for _ in words
+        )
+        params = [f"%{word}%" for word in words for _ in columns]
+        results.extend(conn.execute(f"SELECT id FROM {table} WHERE {condition}", params).fetchall())
+    return results
+
+
+def measure(fn):
+    times = []
+    result = None
+    for _ in range(REPEAT):
+        with timer() as t:
+            result = fn()
+        times.append(t["ms"])
+    return statistics.median(times), result
+
+
+def main():
+    staff_count = int(sys.argv[1]) if len(sys.argv) > 1 else STAFF_COUNT
+
+    conn = create_test_db()
+    conn.row_factory = None
+    insert_ms = seed(conn, staff_count)
+    documents = conn.execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+    print(f"Сотрудников: {staff_count}, документов в индексе: {documents}, вставка с триггерами: {insert_ms:.0f} мс")
+
+    plain = sqlite3.connect(":memory:")
+    plain.execute("CREATE TABLE staff (id INTEGER PRIMARY KEY, email TEXT, first_name TEXT, last_name TEXT,"
+                  " middle_name TEXT, phone TEXT, position TEXT)")
+    rows = conn.execute("SELECT email, first_name, last_name, middle_name, phone, position FROM staff").fetchall()
+    with timer() as t:
+        plain.executemany("INSERT INTO staff (email, first_name, last_name, middle_name, phone, position)"
+                          " VALUES (?, ?, ?, ?, ?, ?)", rows)
+        plain.commit()
+    print(f"Та же вставка в таблицу без триггеров и индексов: {t['ms']:.0f} мс")
+    with timer() as t:
+        rebuild_search_index(conn)
+    print(f"Полная перестройка индекса: {t['ms']:.0f} мс")
+
+    print(f"\n{'запрос':<18} {'LIKE, мс':>9} {'найдено':>8} {'FTS, мс':>9} {'найдено':>8} {'ускорение':>10}")
+    for query in QUERIES:
+        like_ms, like_rows = measure(lambda: like_search(conn, query))
+        fts_ms, (_, total, _) = measure(lambda: search(conn, query, limit=PAGE))
+        print(f"{query:<18} {like_ms:>9.2f} {len(like_rows):>8} {fts_ms:>9.2f} {total:>8} "
+              f"{like_ms / fts_ms:>9.1f}x")
+
+    # Следующие страницы по курсору стоят столько же, сколько первая
+    _, _, cursor = search(conn, "иванов", limit=PAGE)
+    next_ms, _ = measure(lambda: search(conn, "иванов", limit=PAGE, cursor=cursor))
+    print(f"\nВторая страница «иванов» по курсору: {next_ms:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Бенчмарк сводки ЦКП по иерархии (vfp_rollup, GET /vfp/rollup).
+
+Оргструктура из N холдингов (подразделения с дочерними, отделы, функции),
+у каждой организации, подразделения, отдела и функции — свой ЦКП. Сравниваются:
+- «по узлу»: отдельный SQL-запрос с агрегатами по замыканиям для каждого
+  подразделения и организации — так считалась бы сводка без движка;
+- полный расчет VfpRollup (один проход по ЦКП);
+- чтение из кэша без изменений;
+- изменение одного ЦКП: apply() и чтение сводки.
+
+    python -m benchmarks.bench_vfp_rollup [холдингов]
+"""
+
+import json
+import statistics
+import sys
+
+from benchmarks.common import create_test_db, seed_org_structure, timer
+from vfp_rollup import VfpRollup, ensure_vfp_versioning
+
+HOLDINGS = 20
+REPEAT = 5
+VFP_STATUSES = ("not_started", "in_progress", "completed", "blocked", "delayed")
+
+# ЦКП поддерева подразделения: само подразделение и потомки, их отделы и функции отделов
+DIVISION_QUERY = """
+    WITH divisions_tree AS (SELECT descendant_id AS id FROM division_closure WHERE ancestor_id = ?),
+    sections_tree AS (
+        SELECT DISTINCT section_id AS id FROM division_sections WHERE division_id IN (SELECT id FROM divisions_tree)
+    ),
+    functions_tree AS (
+        SELECT DISTINCT function_id AS id FROM section_functions WHERE section_id IN (SELECT id FROM sections_tree)
+    )
+    SELECT COUNT(*), AVG(progress) FROM valuable_final_products
+    WHERE is_active = 1 AND (
+        (entity_type = 'division' AND entity_id IN (SELECT id FROM divisions_tree))
+        OR (entity_type = 'section' AND entity_id IN (SELECT id FROM sections_tree))
+        OR (entity_type = 'function' AND entity_id IN (SELECT id FROM functions_tree))
+    )
+"""
+
+ORGANIZATION_QUERY = """
+    WITH orgs_tree AS (SELECT descendant_id AS id FROM organization_closure WHERE ancestor_id = ?),
+    divisions_tree AS (SELECT id FROM divisions WHERE organization_id IN (SELECT id FROM orgs_tree)),
+    sections_tree AS (
+        SELECT DISTINCT section_id AS id FROM division_sections WHERE division_id IN (SELECT id FROM divisions_tree)
+    ),
+    functions_tree AS (
+        SELECT DISTINCT function_id AS id FROM section_functions WHERE section_id IN (SELECT id FROM sections_tree)
+    )
+    SELECT COUNT(*), AVG(progress) FROM valuable_final_products
+    WHERE is_active = 1 AND (
+        (entity_type = 'organization' AND entity_id IN (SELECT id FROM orgs_tree))
+        OR (entity_type = 'division' AND entity_id IN (SELECT id FROM divisions_tree))
+        OR (entity_type = 'section' AND entity_id IN (SELECT id FROM sections_tree))
+        OR (entity_type = 'function' AND entity_id IN (SELECT id FROM functions_tree))
+    )
+"""
+
+
+def seed(conn, holdings):
+    from update_vfp_schema import VFP_SCHEMA
+
+    counts = seed_org_structure(conn, holdings=holdings)
+    conn.executescript(VFP_SCHEMA)
+    ensure_vfp_versioning(conn)
+    for entity_type, table in (("organization", "organizations"), ("division", "divisions"),
+                               ("section", "sections"), ("function", "functions")):
+        conn.execute(
+            f"""
+            INSERT INTO valuable_final_products (entity_type, entity_id, name, status, progress, metrics)
+            SELECT '{entity_type}', id, 'ЦКП ' || name, ?, id % 101, json_object('revenue', id * 10, 'cost', id)
+            FROM {table}
+            """,
+            (VFP_STATUSES[len(entity_type) % len(VFP_STATUSES)],)
+        )
+    conn.commit()
+    return counts
+
+
+def per_node(conn):
+    results = {}
+    for (division_id,) in conn.execute("SELECT id FROM divisions").fetchall():
+        results[("division", division_id)] = conn.execute(DIVISION_QUERY, (division_id,)).fetchone()
+    for (organization_id,) in conn.execute("SELECT id FROM organizations").fetchall():
+        results[("organization", organization_id)] = conn.execute(ORGANIZATION_QUERY, (organization_id,)).fetchone()
+    return results
+
+
+def median_ms(fn):
+    times = []
+    for _ in range(REPEAT):
+        with timer() as t:
+            fn()
+        times.append(t["ms"])
+    return statistics.median(times)
+
+
+def main():
+    holdings = int(sys.argv[1]) if len(sys.argv) > 1 else HOLDINGS
+    conn = create_test_db()
+    conn.row_factory = None
+    counts = seed(conn, holdings)
+    vfps = conn.execute("SELECT COUNT(*) FROM valuable_final_products").fetchone()[0]
+    print(f"Структура: {counts}, ЦКП: {vfps}")
+
+    per_node_ms = median_ms(lambda: per_node(conn))
+    print(f"Запрос на каждый узел ({counts['divisions'] + counts['organizations']} узлов): {per_node_ms:.1f} мс")
+
+    rebuild_ms = median_ms(lambda: VfpRollup().get(conn))
+    print(f"VfpRollup, полный расчет: {rebuild_ms:.1f} мс")
+
+    rollup = VfpRollup()
+    nodes = rollup.get(conn)
+    cached_ms = median_ms(lambda: rollup.get(conn))
+    print(f"VfpRollup, чтение из кэша ({len(nodes)} узлов): {cached_ms:.2f} мс")
+
+    # Сверка с запросами по узлам: число ЦКП и средний прогресс
+    expected = per_node(conn)
+    for node in nodes:
+        key = (node["node_type"], node["node_id"])
+        if key in expected:
+            count, progress = expected[key]
+            assert node["vfp_count"] == count and node["progress"] == round(progress, 2), key
+
+    (vfp_id,) = conn.execute(
+        "SELECT id FROM valuable_final_products WHERE entity_type = 'function' ORDER BY id LIMIT 1"
+    ).fetchone()
+    times = []
+    for i in range(REPEAT):
+        conn.execute("UPDATE valuable_final_products SET progress = ?, metrics = ? WHERE id = ?",
+                     (i * 10, json.dumps({"revenue": i}), vfp_id))
+        conn.commit()
+        with timer() as t:
+            rollup.apply(conn, vfp_id)
+            rollup.get(conn, "organization", 1)
+        times.append(t["ms"])
+    assert rollup.stats()["rebuilds"] == 1
+    print(f"Изменение одного ЦКП (apply + чтение узла): {statistics.median(times):.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
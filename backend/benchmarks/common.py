@@ -0,0 +1,150 @@
+"""
+Общие утилиты для бенчмарков: временная база с полной схемой,
+генерация синтетических данных и подсчет SQL-запросов.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from complete_schema import ALL_SCHEMAS
+
+
+def create_test_db(path: str = None) -> sqlite3.Connection:
+    """Создает (временную) базу данных с полной схемой OFS Global."""
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="ofs_bench_", suffix=".db")
+        os.close(fd)
+        os.remove(path)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    for schema in ALL_SCHEMAS:
+        conn.executescript(schema)
+    conn.commit()
+    return conn
+
+
+def seed_org_structure(conn: sqlite3.Connection, holdings: int = 2, legal_entities: int = 3,
+                       divisions: int = 4, sub_divisions: int = 3, sections: int = 3,
+                       functions: int = 2) -> Dict[str, int]:
+    """
+    Заполняет базу организационной структурой заданного размера:
+    холдинги -> юр. лица; у каждого холдинга подразделения с дочерними подразделениями,
+    у каждого подразделения отделы, у каждого отдела функции.
+    """
+    counts = {"organizations": 0, "divisions": 0, "sections": 0, "functions": 0}
+    cur = conn.cursor()
+    for h in range(holdings):
+        cur.execute("INSERT INTO organizations (name, code, org_type) VALUES (?, ?, 'holding')",
+                    (f"Холдинг {h}", f"H{h}"))
+        holding_id = cur.lastrowid
+        counts["organizations"] += 1
+        for le in range(legal_entities):
+            cur.execute("INSERT INTO organizations (name, code, org_type, parent_id) VALUES (?, ?, 'legal_entity', ?)",
+                        (f"Юрлицо {h}.{le}", f"LE{h}_{le}", holding_id))
+            counts["organizations"] += 1
+        for d in range(divisions):
+            cur.execute("INSERT INTO divisions (name, code, organization_id) VALUES (?, ?, ?)",
+                        (f"Департамент {h}.{d}", f"D{h}_{d}", holding_id))
+            parent_div = cur.lastrowid
+            div_ids = [parent_div]
+            counts["divisions"] += 1
+            for sd in range(sub_divisions):
+                cur.execute("INSERT INTO divisions (name, code, organization_id, parent_id) VALUES (?, ?, ?, ?)",
+                            (f"Отдел {h}.{d}.{sd}", f"D{h}_{d}_{sd}", holding_id, parent_div))
+                div_ids.append(cur.lastrowid)
+                counts["divisions"] += 1
+            for div_id in div_ids:
+                for s in range(sections):
+                    cur.execute("INSERT INTO sections (name, code) VALUES (?, ?)",
+                                (f"Секция {div_id}.{s}", f"S{div_id}_{s}"))
+                    section_id = cur.lastrowid
+                    counts["sections"] += 1
+                    cur.execute("INSERT INTO division_sections (division_id, section_id) VALUES (?, ?)",
+                                (div_id, section_id))
+                    for f in range(functions):
+                        cur.execute("INSERT INTO functions (name, code) VALUES (?, ?)",
+                                    (f"Функция {section_id}.{f}", f"F{section_id}_{f}"))
+                        counts["functions"] += 1
+                        cur.execute("INSERT INTO section_functions (section_id, function_id) VALUES (?, ?)",
+                                    (section_id, cur.lastrowid))
+    conn.commit()
+    return counts
+
+
+def seed_staff(conn: sqlite3.Connection, count: int = 1000, fanout: int = 5,
+               positions: int = 20, side_relation_every: int = 7) -> Dict[str, int]:
+    """
+    Заполняет базу сотрудниками: административное дерево с заданным ветвлением
+    (сотрудник i подчиняется сотруднику (i - 1) // fanout), основные должности
+    и неадминистративные связи для каждого side_relation_every-го сотрудника.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM organizations ORDER BY id LIMIT 1")
+    row = cur.fetchone()
+    organization_id = row[0] if row else None
+
+    position_ids = []
+    for p in range(positions):
+        cur.execute("INSERT INTO positions (name, code) VALUES (?, ?)", (f"Должность {p}", f"BP{p}"))
+        position_ids.append(cur.lastrowid)
+
+    cur.executemany(
+        """
+        INSERT INTO staff (email, first_name, last_name, phone, position, is_active, organization_id)
+        VALUES (?, ?, ?, ?, ?, 1, ?)
+        """,
+        (
+            (f"user{i}@example.com", f"Имя{i % 97}", f"Фамилия{i % 89}", f"+7900{i:07d}",
+             f"Должность {i % positions}", organization_id)
+            for i in range(count)
+        )
+    )
+    cur.execute("SELECT id FROM staff ORDER BY id DESC LIMIT ?", (count,))
+    staff_ids = sorted(row[0] for row in cur.fetchall())
+
+    cur.executemany(
+        "INSERT INTO staff_positions (staff_id, position_id, is_primary) VALUES (?, ?, 1)",
+        ((staff_id, position_ids[i % positions]) for i, staff_id in enumerate(staff_ids))
+    )
+    cur.executemany(
+        "INSERT INTO functional_relations (manager_id, subordinate_id, relation_type) VALUES (?, ?, 'administrative')",
+        ((staff_ids[(i - 1) // fanout], staff_ids[i]) for i in range(1, count))
+    )
+    cur.executemany(
+        "INSERT INTO functional_relations (manager_id, subordinate_id, relation_type) VALUES (?, ?, 'functional')",
+        ((staff_ids[0], staff_ids[i]) for i in range(1, count, side_relation_every))
+    )
+    conn.commit()
+    return {"staff": count, "positions": positions}
+
+
+@contextmanager
+def count_queries(conn: sqlite3.Connection):
+    """Считает SQL-выражения, выполненные через соединение внутри блока."""
+    stats: Dict[str, Any] = {"queries": 0}
+
+    def _trace(statement):
+        stats["queries"] += 1
+
+    conn.set_trace_callback(_trace)
+    try:
+        yield stats
+    finally:
+        conn.set_trace_callback(None)
+
+
+@contextmanager
+def timer():
+    """Измеряет время выполнения блока в миллисекундах."""
+    result = {"ms": 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["ms"] = (time.perf_counter() - start) * 1000
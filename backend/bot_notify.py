@@ -0,0 +1,143 @@
+"""
+Вебхук инвалидации справочников для Telegram-бота.
+
+Бот держит в кэше списки должностей, подразделений и организаций
+(telegram_bot/reference_cache.py) и обновляет их по TTL. Чтобы изменения
+доходили до бота сразу, API после успешного изменяющего запроса сверяет
+версии этих таблиц в data_version (как response_cache) и, если какая-то
+изменилась, отправляет боту
+
+    POST OFS_BOT_CACHE_WEBHOOK_URL
+    X-Cache-Secret: OFS_BOT_CACHE_WEBHOOK_SECRET
+    {"names": ["positions", ...]}
+
+Сверка по версиям замечает и пакетные операции, и изменения триггерами,
+без отдельных вызовов в каждом эндпоинте. Выборка версий выполняется в потоке
+(asyncio.to_thread), а не в цикле событий. Отправка идет в фоне; ошибка
+только логируется — кэш бота все равно обновится по TTL.
+Без OFS_BOT_CACHE_WEBHOOK_URL уведомления выключены.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import urllib.request
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import Request
+
+from response_cache import WRITE_METHODS
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.environ.get("OFS_BOT_CACHE_WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.environ.get("OFS_BOT_CACHE_WEBHOOK_SECRET", "")
+# Таймаут отправки, секунды
+WEBHOOK_TIMEOUT = float(os.environ.get("OFS_BOT_CACHE_WEBHOOK_TIMEOUT", "3"))
+
+# Таблицы, которые бот кэширует (имена совпадают с именами списков в кэше бота)
+REFERENCE_TABLES = ("positions", "divisions", "organizations")
+
+SECRET_HEADER = "X-Cache-Secret"
+
+
+class BotCacheNotifier:
+    def __init__(self, db_path: str, url: str = WEBHOOK_URL, secret: str = WEBHOOK_SECRET,
+                 timeout: float = WEBHOOK_TIMEOUT, tables=REFERENCE_TABLES):
+        self.db_path = db_path
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self.tables = tuple(tables)
+        self._db: Optional[sqlite3.Connection] = None
+        # Соединение общее для потоков одновременных запросов
+        self._db_lock = threading.Lock()
+        self._versions: Optional[Dict[str, int]] = None
+        # Номер последней выборки и последней учтенной: выборки завершаются
+        # в потоках в произвольном порядке, устаревшая не должна затереть новую
+        self._read_seq = self._applied_seq = 0
+        # Ссылки на фоновые отправки, чтобы задачи не собрал сборщик мусора
+        self._tasks: Set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _read_versions(self) -> Tuple[int, Dict[str, int]]:
+        names = ("*",) + self.tables
+        placeholders = ", ".join("?" for _ in names)
+        versions = dict.fromkeys(names, 0)
+        with self._db_lock:
+            if self._db is None:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            versions.update(self._db.execute(
+                f"SELECT table_name, version FROM data_version WHERE table_name IN ({placeholders})", names
+            ).fetchall())
+            self._read_seq += 1
+            return self._read_seq, versions
+
+    async def changed_tables(self) -> List[str]:
+        """Справочники, изменившиеся с прошлой сверки (при первой сверке — никакие)."""
+        seq, current = await asyncio.to_thread(self._read_versions)
+        if seq < self._applied_seq:
+            # Более новую выборку уже учли, ее изменения в нее входят
+            return []
+        self._applied_seq = seq
+        previous, self._versions = self._versions, current
+        if previous is None:
+            return []
+        if previous["*"] != current["*"]:
+            # База пересоздана: версии начались заново
+            return list(self.tables)
+        return [table for table in self.tables if previous[table] != current[table]]
+
+    def _post(self, names: List[str]) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"names": names}).encode("utf-8"),
+            headers={"Content-Type": "application/json", SECRET_HEADER: self.secret},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    async def notify(self, names: List[str]) -> bool:
+        """Отправляет уведомление боту (в потоке, чтобы не блокировать цикл событий)."""
+        try:
+            await asyncio.to_thread(self._post, names)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Не удалось уведомить бота об изменении {names}: {e}")
+            return False
+        self.sent += 1
+        return True
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "sent": self.sent, "failed": self.failed}
+
+    async def middleware(self, request: Request, call_next):
+        if not self.enabled or request.method not in WRITE_METHODS:
+            return await call_next(request)
+
+        if self._versions is None:
+            # Запоминаем версии до первого изменения, иначе его не с чем сравнить
+            await self.changed_tables()
+        response = await call_next(request)
+        if response.status_code < 400:
+            changed = await self.changed_tables()
+            if changed:
+                task = asyncio.create_task(self.notify(changed))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return response
@@ -65,7 +65,11 @@ END;
 
 -- Индексы для оптимизации запросов
 CREATE INDEX IF NOT EXISTS idx_organizations_parent_id ON organizations(parent_id);
-CREATE INDEX IF NOT EXISTS idx_organizations_org_type ON organizations(org_type);
+-- Составной индекс для выборок по типу (/locations/, /organizations/?org_type=):
+-- фильтр и сортировка по name без временного B-дерева. Заменяет индекс по одному
+-- org_type, который стал его префиксом
+CREATE INDEX IF NOT EXISTS idx_organizations_org_type_is_active_name ON organizations(org_type, is_active, name);
+DROP INDEX IF EXISTS idx_organizations_org_type;
 """
 
 # Схема для таблицы подразделений
@@ -318,7 +322,9 @@ BEGIN
 END;
 
 -- Индексы для оптимизации запросов
-CREATE INDEX IF NOT EXISTS idx_staff_positions_staff_id ON staff_positions(staff_id);
+-- Основная должность сотрудника (дерево сотрудников, карточка); заменяет индекс по staff_id
+CREATE INDEX IF NOT EXISTS idx_staff_positions_staff_id_is_primary ON staff_positions(staff_id, is_primary);
+DROP INDEX IF EXISTS idx_staff_positions_staff_id;
 CREATE INDEX IF NOT EXISTS idx_staff_positions_position_id ON staff_positions(position_id);
 CREATE INDEX IF NOT EXISTS idx_staff_positions_division_id ON staff_positions(division_id);
 CREATE INDEX IF NOT EXISTS idx_staff_positions_location_id ON staff_positions(location_id);
@@ -432,12 +438,234 @@ BEGIN
 END;
 
 -- Индексы для оптимизации запросов
-CREATE INDEX IF NOT EXISTS idx_functional_relations_manager_id ON functional_relations(manager_id);
-CREATE INDEX IF NOT EXISTS idx_functional_relations_subordinate_id ON functional_relations(subordinate_id);
+-- Активные связи заданного типа от руководителя и к подчиненному (дерево сотрудников,
+-- карточка, фильтры /functional-relations/). Без них планировщик выбирает малоизбирательный
+-- индекс по relation_type, и поиск топ-менеджеров просматривает все административные связи
+-- для каждого сотрудника. Заменяют индексы по одному manager_id / subordinate_id
+CREATE INDEX IF NOT EXISTS idx_functional_relations_manager_id_relation_type_is_active
+    ON functional_relations(manager_id, relation_type, is_active);
+CREATE INDEX IF NOT EXISTS idx_functional_relations_subordinate_id_relation_type_is_active
+    ON functional_relations(subordinate_id, relation_type, is_active);
+DROP INDEX IF EXISTS idx_functional_relations_manager_id;
+DROP INDEX IF EXISTS idx_functional_relations_subordinate_id;
 CREATE INDEX IF NOT EXISTS idx_functional_relations_relation_type ON functional_relations(relation_type);
 CREATE INDEX IF NOT EXISTS idx_functional_relations_dates ON functional_relations(start_date, end_date);
 """
 
+# Шаблон таблицы замыканий (closure table) для иерархий на parent_id.
+# Для каждой пары «предок — потомок» хранится строка с расстоянием depth
+# (включая саму вершину с depth = 0), поэтому выборка всех потомков, всех предков,
+# размера поддерева и проверка «X внутри Y» выполняются одним индексным запросом.
+# Таблица поддерживается триггерами в той же транзакции, что и изменение parent_id.
+_CLOSURE_SCHEMA_TEMPLATE = """
+CREATE TABLE IF NOT EXISTS {closure} (
+    ancestor_id INTEGER NOT NULL,
+    descendant_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_{closure}_descendant ON {closure}(descendant_id, depth);
+
+-- Новая вершина: ссылка на себя и на всех предков родителя
+CREATE TRIGGER IF NOT EXISTS {table}_closure_insert
+AFTER INSERT ON {table}
+FOR EACH ROW
+BEGIN
+    INSERT INTO {closure} (ancestor_id, descendant_id, depth) VALUES (NEW.id, NEW.id, 0);
+    INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, NEW.id, depth + 1 FROM {closure} WHERE descendant_id = NEW.parent_id;
+END;
+
+-- Запрещаем перемещение вершины внутрь собственного поддерева
+CREATE TRIGGER IF NOT EXISTS {table}_closure_move_check
+BEFORE UPDATE OF parent_id ON {table}
+FOR EACH ROW
+WHEN NEW.parent_id IS NOT NULL AND NEW.parent_id IS NOT OLD.parent_id
+BEGIN
+    SELECT RAISE(ABORT, 'Нельзя переместить элемент внутрь собственного поддерева')
+    WHERE EXISTS (
+        SELECT 1 FROM {closure} WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id
+    );
+END;
+
+-- Перемещение: отрываем поддерево от старых предков и подвешиваем к новым
+CREATE TRIGGER IF NOT EXISTS {table}_closure_move
+AFTER UPDATE OF parent_id ON {table}
+FOR EACH ROW
+WHEN NEW.parent_id IS NOT OLD.parent_id
+BEGIN
+    DELETE FROM {closure}
+    WHERE descendant_id IN (SELECT descendant_id FROM {closure} WHERE ancestor_id = NEW.id)
+      AND ancestor_id NOT IN (SELECT descendant_id FROM {closure} WHERE ancestor_id = NEW.id);
+    INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+    SELECT super.ancestor_id, sub.descendant_id, super.depth + sub.depth + 1
+    FROM {closure} super, {closure} sub
+    WHERE super.descendant_id = NEW.parent_id AND sub.ancestor_id = NEW.id;
+END;
+
+-- Удаление: убираем все пути, проходящие через удаляемую вершину
+CREATE TRIGGER IF NOT EXISTS {table}_closure_delete
+AFTER DELETE ON {table}
+FOR EACH ROW
+BEGIN
+    DELETE FROM {closure}
+    WHERE descendant_id IN (SELECT descendant_id FROM {closure} WHERE ancestor_id = OLD.id)
+      AND ancestor_id IN (SELECT ancestor_id FROM {closure} WHERE descendant_id = OLD.id);
+END;
+"""
+
+# Таблица замыканий для иерархии организаций
+ORGANIZATION_CLOSURE_SCHEMA = _CLOSURE_SCHEMA_TEMPLATE.format(
+    table="organizations", closure="organization_closure"
+)
+
+# Таблица замыканий для иерархии подразделений
+DIVISION_CLOSURE_SCHEMA = _CLOSURE_SCHEMA_TEMPLATE.format(
+    table="divisions", closure="division_closure"
+)
+
+# Версии данных по таблицам для условных GET (ETag, см. etag.py).
+# Любая запись в таблицу увеличивает ее версию триггером в той же транзакции,
+# поэтому ETag проверяется чтением одной строки data_version без обращения к данным.
+# Строка '*' — случайная «эпоха» базы: после пересоздания базы версии начинаются
+# заново, и без нее старый ETag мог бы совпасть с новыми данными.
+VERSIONED_TABLES = (
+    "organizations",
+    "divisions",
+    "sections",
+    "division_sections",
+    "functions",
+    "section_functions",
+    "positions",
+    "staff",
+    "staff_positions",
+    "staff_locations",
+    "staff_functions",
+    "functional_relations",
+)
+
+_DATA_VERSION_TRIGGERS_TEMPLATE = """
+CREATE TRIGGER IF NOT EXISTS {table}_version_insert
+AFTER INSERT ON {table}
+FOR EACH ROW
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES ('{table}', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_version_update
+AFTER UPDATE ON {table}
+FOR EACH ROW
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES ('{table}', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_version_delete
+AFTER DELETE ON {table}
+FOR EACH ROW
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES ('{table}', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+"""
+
+DATA_VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_version (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO data_version (table_name, version) VALUES ('*', abs(random()) % 1000000000);
+""" + "".join(_DATA_VERSION_TRIGGERS_TEMPLATE.format(table=table) for table in VERSIONED_TABLES)
+
+# Полнотекстовый поиск (FTS5) по сотрудникам, оргструктуре, должностям и ЦКП.
+# Одна таблица search_index на все сущности; rowid документа = id * SEARCH_ROWID_FACTOR
+# + код типа, поэтому триггеры заменяют и удаляют документ по rowid без поиска.
+# title — ФИО или название (весит больше при ранжировании), body — email, телефон,
+# коды, ИНН; label — исходное название для ответа. Регистр кириллицы приводит
+# токенизатор unicode61, а «ё» заменяется на «е» здесь: unicode61 снимает диакритику
+# только с латиницы. prefix='2 3' — индексы префиксов для поиска по началу слова.
+SEARCH_ROWID_FACTOR = 8
+
+# Тип -> (код, таблица, колонки title, колонки body)
+SEARCH_ENTITIES = {
+    "staff": (1, "staff", ("last_name", "first_name", "middle_name"), ("email", "phone", "position")),
+    "organization": (2, "organizations", ("name",), ("code", "inn")),
+    "division": (3, "divisions", ("name",), ("code",)),
+    "section": (4, "sections", ("name",), ("code",)),
+    "function": (5, "functions", ("name",), ("code",)),
+    "position": (6, "positions", ("name",), ("code",)),
+    "vfp": (7, "valuable_final_products", ("name",), ()),
+}
+
+SEARCH_INDEX_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    title, body, label UNINDEXED, entity_type UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Ранжирование по умолчанию (ORDER BY rank): совпадение в названии в 10 раз важнее
+INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(10.0, 1.0)');
+"""
+
+_SEARCH_TRIGGERS_TEMPLATE = """
+CREATE TRIGGER IF NOT EXISTS {table}_search_insert
+AFTER INSERT ON {table}
+FOR EACH ROW
+BEGIN
+    INSERT INTO search_index (rowid, title, body, label, entity_type)
+    VALUES ({new_document});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_search_update
+AFTER UPDATE OF {columns} ON {table}
+FOR EACH ROW
+BEGIN
+    DELETE FROM search_index WHERE rowid = OLD.id * {factor} + {code};
+    INSERT INTO search_index (rowid, title, body, label, entity_type)
+    VALUES ({new_document});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_search_delete
+AFTER DELETE ON {table}
+FOR EACH ROW
+BEGIN
+    DELETE FROM search_index WHERE rowid = OLD.id * {factor} + {code};
+END;
+"""
+
+
+def normalize_search_text(sql: str) -> str:
+    """SQL-выражение: текст для индекса с заменой ё на е."""
+    return f"replace(replace({sql}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def search_document_sql(entity_type: str, prefix: str = "") -> str:
+    """Выражения rowid, title, body, label, entity_type документа (prefix — 'NEW.' или псевдоним)."""
+    code, _, title_columns, body_columns = SEARCH_ENTITIES[entity_type]
+    title = "trim(" + " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in title_columns) + ")"
+    body = " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in body_columns) or "''"
+    return (f"{prefix}id * {SEARCH_ROWID_FACTOR} + {code}, {normalize_search_text(title)}, "
+            f"{normalize_search_text(body)}, {title}, '{entity_type}'")
+
+
+def search_triggers_schema(entity_type: str) -> str:
+    code, table, title_columns, body_columns = SEARCH_ENTITIES[entity_type]
+    return _SEARCH_TRIGGERS_TEMPLATE.format(
+        table=table, code=code, factor=SEARCH_ROWID_FACTOR,
+        columns=", ".join(title_columns + body_columns),
+        new_document=search_document_sql(entity_type, "NEW."),
+    )
+
+
+# Таблица ЦКП создается отдельно (update_vfp_schema.py), ее триггеры ставит search_index.ensure_search_index
+SEARCH_SCHEMA = SEARCH_INDEX_SCHEMA + "".join(
+    search_triggers_schema(entity_type) for entity_type in SEARCH_ENTITIES if entity_type != "vfp"
+)
+
 # Список всех схем для инициализации базы данных
 ALL_SCHEMAS = [
     USER_SCHEMA,
@@ -452,5 +680,9 @@ ALL_SCHEMAS = [
     STAFF_POSITION_SCHEMA,
     STAFF_LOCATION_SCHEMA,
     STAFF_FUNCTION_SCHEMA,
-    FUNCTIONAL_RELATION_SCHEMA
+    FUNCTIONAL_RELATION_SCHEMA,
+    ORGANIZATION_CLOSURE_SCHEMA,
+    DIVISION_CLOSURE_SCHEMA,
+    DATA_VERSION_SCHEMA,
+    SEARCH_SCHEMA
 ] 
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Пул соединений SQLite для OFS Global API.
+
+Вместо открытия нового соединения и повторной настройки PRAGMA на каждый запрос
+пул держит ограниченное число уже настроенных соединений и раздает их потокам.
+Поток, который недавно работал с соединением, по возможности получает его же
+(привязка к потоку), что сохраняет прогретый кэш страниц и подготовленные запросы.
+Соединения создаются классом sql_trace.TracingConnection: время выражений
+доступно метрикам и журналу медленных запросов.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+from sql_trace import TracingConnection
+
+logger = logging.getLogger("ofs_api.db_pool")
+
+# Настройки соединений по умолчанию (можно переопределить переменными окружения)
+DEFAULT_POOL_SIZE = int(os.getenv("OFS_DB_POOL_SIZE", "8"))
+DEFAULT_POOL_TIMEOUT = float(os.getenv("OFS_DB_POOL_TIMEOUT", "10"))
+DEFAULT_HEALTH_CHECK_INTERVAL = float(os.getenv("OFS_DB_HEALTH_CHECK_INTERVAL", "30"))
+
+# PRAGMA, которые применяются к каждому новому соединению
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",          # Читатели не блокируют писателя
+    "synchronous": "NORMAL",        # В режиме WAL безопасно и заметно быстрее FULL
+    "cache_size": -20000,           # ~20 МБ кэша страниц на соединение (в КиБ)
+    "mmap_size": 268435456,         # 256 МБ memory-mapped I/O
+    "temp_store": "MEMORY",         # Временные таблицы и индексы в памяти
+    "busy_timeout": 5000,           # Ждем блокировку до 5 секунд вместо ошибки
+}
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время."""
+
+
+class _PooledConnection:
+    """Соединение из пула вместе со служебными данными."""
+
+    __slots__ = ("conn", "created_at", "last_used", "owner_thread")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.owner_thread: Optional[int] = None
+
+
+class SQLiteConnectionPool:
+    """
+    Ограниченный пул соединений SQLite.
+
+    - pool_size: максимальное число одновременно открытых соединений;
+    - timeout: сколько ждать свободное соединение, если все заняты;
+    - health_check_interval: соединение, простаивавшее дольше этого времени,
+      проверяется запросом SELECT 1 перед выдачей;
+    - pragmas: настройки, применяемые к каждому новому соединению;
+    - factory: класс соединения (по умолчанию TracingConnection).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        pragmas: Optional[Dict[str, Any]] = None,
+        factory: type = TracingConnection,
+    ):
+        if pool_size < 1:
+            raise ValueError("pool_size должен быть не меньше 1")
+
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.factory = factory
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._created = 0
+        self._closed = False
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "thread_affinity_hits": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "rollbacks_on_release": 0,
+        }
+
+    # ---------- Создание и проверка соединений ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _is_healthy(self, item: _PooledConnection) -> bool:
+        if time.monotonic() - item.last_used < self.health_check_interval:
+            return True
+        try:
+            item.conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Соединение с БД не прошло проверку и будет пересоздано: {e}")
+            return False
+
+    def _discard(self, item: _PooledConnection):
+        try:
+            item.conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats["connections_closed"] += 1
+            self._lock.notify()
+
+    # ---------- Выдача и возврат соединений ----------
+
+    def _take_idle(self, thread_id: int) -> Optional[_PooledConnection]:
+        """Берет свободное соединение, предпочитая то, что использовал этот поток."""
+        for index in range(len(self._idle) - 1, -1, -1):
+            if self._idle[index].owner_thread == thread_id:
+                self._stats["thread_affinity_hits"] += 1
+                return self._idle.pop(index)
+        if self._idle:
+            return self._idle.pop()
+        return None
+
+    def acquire(self) -> sqlite3.Connection:
+        """Возвращает соединение из пула, при необходимости создавая новое."""
+        thread_id = threading.get_ident()
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            item = None
+            create = False
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Пул соединений закрыт")
+
+                item = self._take_idle(thread_id)
+                if item is None:
+                    if self._created < self.pool_size:
+                        self._created += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeoutError(
+                                f"Нет свободных соединений с БД (размер пула {self.pool_size})"
+                            )
+                        self._stats["waits"] += 1
+                        self._lock.wait(remaining)
+                        continue
+
+            if create:
+                try:
+                    item = _PooledConnection(self._connect())
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._stats["connections_created"] += 1
+            elif not self._is_healthy(item):
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                self._discard(item)
+                continue
+
+            item.owner_thread = thread_id
+            item.last_used = time.monotonic()
+            with self._lock:
+                self._in_use[id(item.conn)] = item
+                self._stats["checkouts"] += 1
+            return item.conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Возвращает соединение в пул, откатывая незавершенную транзакцию."""
+        with self._lock:
+            item = self._in_use.pop(id(conn), None)
+        if item is None:
+            logger.warning("Попытка вернуть в пул соединение, которое ему не принадлежит")
+            return
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self._stats["rollbacks_on_release"] += 1
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка отката при возврате соединения в пул: {e}")
+            self._discard(item)
+            return
+
+        item.last_used = time.monotonic()
+        with self._lock:
+            if self._closed:
+                close_now = True
+            else:
+                close_now = False
+                self._idle.append(item)
+                self._lock.notify()
+        if close_now:
+            self._discard(item)
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: `with pool.connection() as conn: ...`"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    # ---------- Обслуживание ----------
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Закрывает все свободные соединения; занятые закроются при возврате."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._discard(item)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика пула для мониторинга."""
+        with self._lock:
+            result = dict(self._stats)
+            result.update({
+                "db_path": self.db_path,
+                "pool_size": self.pool_size,
+                "open_connections": self._created,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "closed": self._closed,
+            })
+        return result
+
+
+# Общие пулы процесса: по одному на файл базы данных
+_pools: Dict[str, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, **kwargs) -> SQLiteConnectionPool:
+    """
+    Возвращает общий для процесса пул для указанной базы данных,
+    создавая его при первом обращении. Так full_api и org_structure_api
+    работают с одним и тем же набором соединений.
+    """
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = SQLiteConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,79 @@
+"""
+Условные GET-запросы (ETag / If-None-Match) по версиям таблиц.
+
+Версия таблицы хранится в data_version и увеличивается триггерами при любой
+записи (см. DATA_VERSION_SCHEMA в complete_schema). Эндпоинт объявляет, от каких
+таблиц зависит его ответ:
+
+    @app.get("/organizations/", dependencies=[etag_dependency("organizations")])
+
+Зависимость читает версии этих таблиц (одна индексная выборка из data_version)
+и строит из них и URL запроса сильный ETag. Если он совпал с If-None-Match,
+запрос завершается ответом 304 еще до выполнения эндпоинта — таблицы с данными
+не читаются. Иначе ETag кладется в request.state, и etag_middleware добавляет
+его в заголовки успешного ответа.
+"""
+
+import hashlib
+import sqlite3
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi import Depends, HTTPException, Request
+
+ETAG_HEADER = "ETag"
+# Ответ можно хранить, но перед использованием нужно перепроверить по ETag
+CACHE_CONTROL = "no-cache"
+
+# Строка data_version со «эпохой» базы (меняется при пересоздании базы)
+EPOCH_KEY = "*"
+
+
+def table_versions(db: sqlite3.Connection, tables: Iterable[str]) -> Dict[str, int]:
+    """Текущие версии таблиц; таблица без записей в data_version имеет версию 0."""
+    names = [EPOCH_KEY, *tables]
+    placeholders = ", ".join("?" for _ in names)
+    rows = db.execute(
+        f"SELECT table_name, version FROM data_version WHERE table_name IN ({placeholders})", names
+    ).fetchall()
+    versions = dict.fromkeys(names, 0)
+    versions.update((row[0], row[1]) for row in rows)
+    return versions
+
+
+def compute_etag(request: Request, versions: Dict[str, int]) -> str:
+    # В ETag входит и URL: разные параметры запроса — разные представления
+    key = "|".join([request.url.path, str(request.url.query)] +
+                   [f"{name}={versions[name]}" for name in sorted(versions)])
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнение для If-None-Match (слабое, как требует RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+def conditional_get(get_db: Callable, *tables: str) -> Callable:
+    """Зависимость FastAPI: 304 при совпадении If-None-Match, иначе запоминает ETag."""
+
+    def check_etag(request: Request, db: sqlite3.Connection = Depends(get_db)) -> None:
+        etag = compute_etag(request, table_versions(db, tables))
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={ETAG_HEADER: etag, "Cache-Control": CACHE_CONTROL})
+        request.state.etag = etag
+
+    return check_etag
+
+
+async def etag_middleware(request: Request, call_next):
+    """Middleware: добавляет ETag, вычисленный зависимостью, в успешный ответ."""
+    response = await call_next(request)
+    etag = getattr(request.state, "etag", None)
+    if etag is not None and response.status_code == 200:
+        response.headers[ETAG_HEADER] = etag
+        response.headers.setdefault("Cache-Control", CACHE_CONTROL)
+    return response
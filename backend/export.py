@@ -0,0 +1,104 @@
+"""
+Потоковая выгрузка данных в NDJSON или CSV.
+
+Строки читаются из курсора SQLite пачками (fetchmany), сразу кодируются
+и отдаются через StreamingResponse, поэтому память не зависит от размера
+выгрузки. Опционально поток сжимается gzip на лету (Content-Encoding: gzip).
+"""
+
+import csv
+import io
+import json
+import sqlite3
+import zlib
+from enum import Enum
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+
+# Сколько строк читается из курсора и кодируется за один шаг
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def _ndjson_batches(columns: List[str], batches: Iterator[List[tuple]],
+                    convert: Optional[Callable[[tuple], Dict[str, Any]]]) -> Iterator[bytes]:
+    to_dict = convert or (lambda row: dict(zip(columns, row)))
+    for batch in batches:
+        yield "".join(
+            json.dumps(to_dict(row), ensure_ascii=False, default=str) + "\n" for row in batch
+        ).encode("utf-8")
+
+
+def _csv_batches(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel правильно определял UTF-8
+    yield "﻿".encode("utf-8")
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Сжимает поток байтов в формат gzip без накопления всего содержимого."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(
+    connection: Callable[[], ContextManager[sqlite3.Connection]],
+    query: str,
+    params: Sequence[Any],
+    fmt: ExportFormat,
+    convert: Optional[Callable[[tuple], Dict[str, Any]]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """
+    Генератор закодированных пачек строк. Соединение берется через connection()
+    на время итерации и возвращается, когда выгрузка завершена или клиент отключился.
+    """
+    with connection() as conn:
+        cursor = conn.execute(query, list(params))
+        columns = [description[0] for description in cursor.description]
+
+        def batches():
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield batch
+
+        if fmt == ExportFormat.CSV:
+            yield from _csv_batches(columns, batches())
+        else:
+            yield from _ndjson_batches(columns, batches(), convert)
+
+
+def export_response(chunks: Iterator[bytes], fmt: ExportFormat, filename: str,
+                    gzip: bool = False) -> StreamingResponse:
+    """Оборачивает поток в StreamingResponse с нужными заголовками."""
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[fmt], headers=headers)
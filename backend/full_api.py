@@ -2,7 +2,7 @@ import sqlite3
 import os
 import traceback  # Добавляем модуль для печати стека вызовов
 import logging    # Добавляем логирование
-from fastapi import FastAPI, HTTPException, Depends, Request, APIRouter # <--- Добавляем APIRouter
+from fastapi import FastAPI, HTTPException, Depends, Request, APIRouter, Query # <--- Добавляем APIRouter
 from fastapi.middleware.cors import CORSMiddleware  # Импортируем CORS middleware
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Dict, Any, Union
@@ -10,6 +10,24 @@ from enum import Enum
 import uvicorn
 from datetime import datetime, date, timedelta
 from complete_schema import ALL_SCHEMAS
+from db_pool import get_pool
+from org_closure import ensure_closure, is_descendant
+from search_index import ensure_search_index, search
+from vfp_rollup import NODE_TYPES as ROLLUP_NODE_TYPES, VfpRollup, ensure_vfp_versioning
+from pagination import MAX_PAGE_LIMIT, Listing, PageParams, paginate
+from row_mapper import row_response, rows_response
+from json_response import FastJSONResponse, orjson_enabled
+from export import ExportFormat, export_chunks, export_response
+from etag import conditional_get, etag_middleware
+from response_cache import ResponseCache
+from bot_notify import BotCacheNotifier
+from async_db import AsyncDatabase
+from auth_support import AuthMetrics, PasswordHasher, TokenCache
+from slow_query import SLOW_QUERY_LOG_ENABLED, SlowQueryLog
+from batch import Batch, BatchMode, BatchResult, check_batch_size, existing_ids, find_by_key, write_batch
+import tracing
+import metrics
+from fastapi.responses import PlainTextResponse
 import json
 
 # --- НОВЫЕ ИМПОРТЫ ДЛЯ АУТЕНТИФИКАЦИИ ---
@@ -18,20 +36,29 @@ from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 # --- КОНЕЦ НОВЫХ ИМПОРТОВ ---
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("api_debug.log")
-    ]
-)
+# Настройка логирования: запись в файл и консоль идет через очередь в отдельном потоке,
+# уровень задается OFS_LOG_LEVEL и меняется на лету через /admin/logging.
+# Файл журнала — OFS_LOG_FILE (пустое значение — только консоль). Тесты и бенчмарки
+# настраивают логирование заранее без файла, и этот вызов для них ничего не делает
+tracing.setup_logging(os.environ.get("OFS_LOG_FILE", "api_debug.log") or None)
 logger = logging.getLogger("ofs_api")
 
 # Имя нашей базы данных с новой схемой
 DB_PATH = "full_api_new.db"
 
+# Пул заранее настроенных соединений (WAL, synchronous=NORMAL, кэш, mmap и т.д.)
+db_pool = get_pool(DB_PATH)
+
+# Статистика SQL по отпечаткам и журнал медленных запросов с планами (см. /admin/slow-queries)
+slow_query_log = SlowQueryLog(DB_PATH)
+slow_query_log.configure(enabled=SLOW_QUERY_LOG_ENABLED)
+
+# Потоки для async-эндпоинтов: запросы к БД выполняются вне цикла событий
+async_db = AsyncDatabase(db_pool)
+
+# Сводка ЦКП по иерархии (см. vfp_rollup.py и /vfp/rollup)
+vfp_rollup = VfpRollup()
+
 # --- НОВЫЕ НАСТРОЙКИ АУТЕНТИФИКАЦИИ ---
 SECRET_KEY = "ofsglobal-super-secret-key-change-me"  # !!! ВАЖНО: Смените этот ключ!
 ALGORITHM = "HS256"
@@ -42,15 +69,38 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login/access-token")
 
 # Контекст для хеширования паролей
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Метрики аутентификации, пул потоков для bcrypt и кэш проверенных токенов (см. auth_support)
+auth_metrics = AuthMetrics()
+password_hasher = PasswordHasher(pwd_context, metrics=auth_metrics)
+token_cache = TokenCache()
 # --- КОНЕЦ НОВЫХ НАСТРОЕК ---
 
 # Создаем приложение
-app = FastAPI(title="OFS Global API", description="Гибкое API для OFS Global", version="2.0.0")
+# Ответы кодируются через orjson, если он установлен (см. json_response, OFS_JSON_BACKEND)
+app = FastAPI(title="OFS Global API", description="Гибкое API для OFS Global", version="2.0.0",
+              default_response_class=FastJSONResponse)
 
 # --- СОЗДАЕМ РОУТЕР ДЛЯ АУТЕНТИФИКАЦИИ ---
 auth_router = APIRouter(tags=["Authentication"]) # Добавляем тег для группировки в Swagger
 # --- КОНЕЦ СОЗДАНИЯ РОУТЕРА ---
 
+# Кэш ответов справочных эндпоинтов (см. response_cache.py и /admin/cache).
+# Подключается до CORS, чтобы оказаться внутри него: заголовки CORS зависят
+# от Origin конкретного запроса и не должны попадать в кэш
+response_cache = ResponseCache(DB_PATH)
+app.middleware("http")(response_cache.middleware)
+response_cache.cache_route("/positions/", "positions")
+response_cache.cache_route("/functions/", "functions")
+response_cache.cache_route("/sections/", "sections")
+response_cache.cache_route("/locations/", "organizations")
+
+# Уведомление Telegram-бота об изменении справочников, которые он кэширует
+# (см. bot_notify.py; включается переменной OFS_BOT_CACHE_WEBHOOK_URL)
+bot_notifier = BotCacheNotifier(DB_PATH)
+if bot_notifier.enabled:
+    app.middleware("http")(bot_notifier.middleware)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -58,8 +108,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Разрешаем все HTTP методы
     allow_headers=["*"],  # Разрешаем все заголовки
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "Link", "ETag"],  # Заголовки пагинации и ETag
 )
 
+# Выборочная трассировка запросов (см. tracing.py и /admin/logging)
+app.middleware("http")(tracing.tracing_middleware)
+
+# ETag для условных GET по версиям таблиц (см. etag.py)
+app.middleware("http")(etag_middleware)
+
 # Добавляем middleware для глобальной обработки ошибок
 @app.middleware("http")
 async def log_exceptions(request: Request, call_next):
@@ -70,10 +127,29 @@ async def log_exceptions(request: Request, call_next):
         logger.error(traceback.format_exc())
         raise
 
+# Метрики запросов и SQL для /metrics (см. metrics.py); подключается последним,
+# чтобы быть внешним слоем и учитывать ответы всех остальных middleware
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.add_collector("ofs_db_pool_connections", "Соединения пула БД",
+                      lambda: {"in_use": db_pool.stats()["in_use"], "idle": db_pool.stats()["idle"]},
+                      labelnames=("state",))
+metrics.add_collector("ofs_response_cache_lookups_total", "Обращения к кэшу ответов",
+                      lambda: {"hit": response_cache.hits, "miss": response_cache.misses},
+                      labelnames=("result",), type="counter")
+metrics.add_collector("ofs_response_cache_bytes", "Память, занятая кэшем ответов",
+                      lambda: response_cache.stats()["size_bytes"])
+metrics.add_collector("ofs_vfp_rollup_updates_total", "Обновления сводки ЦКП",
+                      lambda: {"rebuild": vfp_rollup.rebuilds, "incremental": vfp_rollup.incremental_updates},
+                      labelnames=("kind",), type="counter")
+metrics.add_collector("ofs_bot_cache_notifications_total", "Уведомления бота об изменении справочников",
+                      lambda: {"sent": bot_notifier.sent, "failed": bot_notifier.failed},
+                      labelnames=("result",), type="counter")
+
 # Подключаем роутер для организационной структуры, если он доступен
 try:
-    from org_structure_api import router as org_structure_router
+    from org_structure_api import router as org_structure_router, HIERARCHY_TABLES
     has_org_structure_router = True
+    response_cache.cache_route("/org-structure/hierarchy", *HIERARCHY_TABLES)
 except ImportError:
     has_org_structure_router = False
     logger.warning("Не удалось импортировать API организационной структуры")
@@ -84,6 +160,7 @@ def startup_event():
     logger.info("Выполняется событие startup: инициализация базы данных...")
     init_db()
     logger.info("Инициализация базы данных завершена.")
+    logger.info("JSON-ответы кодируются через %s", "orjson" if orjson_enabled() else "стандартный json")
 
 # ================== МОДЕЛИ PYDANTIC ==================
 
@@ -443,16 +520,25 @@ class User(UserBase):
 def get_db():
     """
     Возвращает соединение с базой данных для текущего запроса.
-    SQLite не поддерживает многопоточность, поэтому устанавливаем check_same_thread=False
-    и включаем режим WAL для улучшения конкурентного доступа.
+    Соединение берется из пула уже настроенным (row_factory, WAL и прочие PRAGMA)
+    и возвращается в пул после обработки запроса; незакоммиченная транзакция откатывается.
     """
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row  # Это позволит получать данные как словари
-    conn.execute('PRAGMA journal_mode=WAL')  # Улучшает поддержку конкурентного доступа
+    conn = db_pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        db_pool.release(conn)
+
+async def get_async_db() -> AsyncDatabase:
+    """
+    Доступ к базе для async-эндпоинтов: запросы выполняются в потоках AsyncDatabase,
+    соединение берется из пула на время каждого вызова.
+    """
+    return async_db
+
+def etag_dependency(*tables: str):
+    """Условный GET: ETag ответа зависит от версий таблиц tables, при совпадении — 304."""
+    return Depends(conditional_get(get_db, *tables))
 
 # --- НОВЫЕ УТИЛИТЫ АУТЕНТИФИКАЦИИ ---
 
@@ -475,17 +561,20 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_user_from_db(db: sqlite3.Connection, email: str) -> Optional[UserInDBBase]:
+async def get_user_from_db(db: AsyncDatabase, email: str) -> Optional[UserInDBBase]:
     """Вспомогательная функция для получения пользователя из БД по email."""
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM user WHERE email = ?", (email,))
-    user_data = cursor.fetchone()
+    user_data = await db.fetchone("SELECT * FROM user WHERE email = ?", (email,))
     if user_data:
         return UserInDBBase.model_validate(dict(user_data))
     return None
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: sqlite3.Connection = Depends(get_db)) -> User:
+@auth_metrics.timed("token")
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncDatabase = Depends(get_async_db)) -> User:
     """Зависимость FastAPI для получения текущего пользователя из токена."""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -505,7 +594,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: sqlite3.Conn
         raise credentials_exception
     
     # Возвращаем модель User (без хеша пароля)
-    return User.model_validate(user)
+    current_user = User.model_validate(user)
+    token_cache.put(token, current_user, current_user.email, payload.get("exp"))
+    return current_user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Зависимость для проверки, что пользователь активен."""
@@ -513,6 +604,12 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_superuser(current_user: User = Depends(get_current_active_user)) -> User:
+    """Зависимость для административных эндпоинтов: только суперпользователь."""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return current_user
+
 # --- КОНЕЦ НОВЫХ УТИЛИТ --- 
 
 # Инициализация базы данных, если она не существует
@@ -541,6 +638,17 @@ def init_db():
         conn.commit()
         logger.info("Применение схем завершено.")
         
+        # Заполняем таблицы замыканий иерархий, если база создана до их появления
+        rebuilt = ensure_closure(conn)
+        if rebuilt:
+            logger.info(f"Таблицы замыканий перестроены: {rebuilt}")
+        
+        # Заполняем поисковый индекс и ставим триггеры на таблицу ЦКП
+        reindexed = ensure_search_index(conn)
+        if reindexed:
+            logger.info(f"Поисковый индекс перестроен: {reindexed}")
+        ensure_vfp_versioning(conn)
+        
         # Проверяем, какие таблицы реально создались
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         existing_tables = sorted([row[0] for row in cursor.fetchall()])
@@ -568,14 +676,13 @@ def init_db():
 # --- НОВЫЕ ЭНДПОИНТЫ АУТЕНТИФИКАЦИИ (ЧЕРЕЗ РОУТЕР) ---
 
 @auth_router.post("/register", response_model=User)
-async def register_user(user_in: UserCreate, db: sqlite3.Connection = Depends(get_db)):
+@auth_metrics.timed("register")
+async def register_user(user_in: UserCreate, db: AsyncDatabase = Depends(get_async_db)):
     """Регистрация нового пользователя."""
     logger.info(f"Попытка регистрации пользователя: {user_in.email}")
     
     # Проверяем, не существует ли уже пользователь с таким email
-    cursor = db.cursor()
-    cursor.execute("SELECT id FROM user WHERE email = ?", (user_in.email,))
-    existing_user = cursor.fetchone()
+    existing_user = await db.fetchone("SELECT id FROM user WHERE email = ?", (user_in.email,))
     
     if existing_user:
         logger.warning(f"Пользователь с email {user_in.email} уже существует")
@@ -585,11 +692,11 @@ async def register_user(user_in: UserCreate, db: sqlite3.Connection = Depends(ge
         )
     
     # Хешируем пароль
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await password_hasher.hash(user_in.password)
     
     # Добавляем нового пользователя
     try:
-        cursor.execute(
+        user_id = await db.execute(
             "INSERT INTO user (email, hashed_password, full_name, is_active, is_superuser) VALUES (?, ?, ?, ?, ?)",
             (
                 user_in.email,
@@ -599,8 +706,6 @@ async def register_user(user_in: UserCreate, db: sqlite3.Connection = Depends(ge
                 user_in.is_superuser,
             )
         )
-        db.commit()
-        user_id = cursor.lastrowid
         logger.info(f"Пользователь {user_in.email} успешно зарегистрирован с ID {user_id}")
         
         # Возвращаем данные созданного пользователя (без пароля)
@@ -612,7 +717,6 @@ async def register_user(user_in: UserCreate, db: sqlite3.Connection = Depends(ge
              raise HTTPException(status_code=500, detail="Ошибка получения созданного пользователя")
 
     except sqlite3.Error as e:
-        db.rollback()
         logger.error(f"Ошибка SQLite при регистрации пользователя {user_in.email}: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -620,12 +724,13 @@ async def register_user(user_in: UserCreate, db: sqlite3.Connection = Depends(ge
         )
 
 @auth_router.post("/login/access-token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: sqlite3.Connection = Depends(get_db)):
+@auth_metrics.timed("login")
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncDatabase = Depends(get_async_db)):
     """Аутентификация пользователя и выдача JWT токена."""
     logger.info(f"Попытка входа пользователя: {form_data.username}")
     
     user = await get_user_from_db(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         logger.warning(f"Неудачная попытка входа для: {form_data.username}")
         raise HTTPException(
             status_code=401,
@@ -649,36 +754,54 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
     logger.info(f"Запрос данных для пользователя: {current_user.email}")
     return current_user
 
+class UserActiveUpdate(BaseModel):
+    is_active: bool
+
+@auth_router.put("/users/{user_id}/active", response_model=User)
+async def set_user_active(
+    user_id: int,
+    update: UserActiveUpdate,
+    db: AsyncDatabase = Depends(get_async_db),
+    current_user: User = Depends(get_current_superuser)
+):
+    """Активация или деактивация пользователя (только суперпользователь)."""
+    row = await db.fetchone("SELECT email FROM user WHERE id = ?", (user_id,))
+    if not row:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    
+    await db.execute("UPDATE user SET is_active = ? WHERE id = ?", (1 if update.is_active else 0, user_id))
+    # Уже выданные токены пользователя должны сразу перестать пропускать его
+    token_cache.invalidate_user(row["email"])
+    logger.info(f"Пользователь {current_user.email} установил is_active={update.is_active} для {row['email']}")
+    
+    user = await get_user_from_db(db, row["email"])
+    return User.model_validate(user)
+
 # --- КОНЕЦ НОВЫХ ЭНДПОИНТОВ АУТЕНТИФИКАЦИИ ---
 
 # API для организаций
-@app.get("/organizations/", response_model=List[Organization])
+ORGANIZATIONS_LISTING = Listing("organizations", Organization)
+
+@app.get("/organizations/", response_model=List[Organization], dependencies=[etag_dependency("organizations")])
 def read_organizations(
     org_type: Optional[OrgType] = None,
     parent_id: Optional[int] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
-    query = "SELECT * FROM organizations"
+    conditions = []
     params = []
-    
-    if org_type or parent_id is not None:
-        query += " WHERE"
-        
-        if org_type:
-            query += " org_type = ?"
-            params.append(org_type)
-            
-        if parent_id is not None:
-            if org_type:
-                query += " AND"
-            query += " parent_id " + ("IS NULL" if parent_id == 0 else "= ?")
-            if parent_id != 0:
-                params.append(parent_id)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+
+    if org_type:
+        conditions.append("org_type = ?")
+        params.append(org_type)
+
+    if parent_id is not None:
+        conditions.append("parent_id " + ("IS NULL" if parent_id == 0 else "= ?"))
+        if parent_id != 0:
+            params.append(parent_id)
+
+    return paginate(db, ORGANIZATIONS_LISTING, page, conditions, params)
 
 @app.post("/organizations/", response_model=Organization)
 def create_organization(organization: OrganizationCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -730,18 +853,63 @@ def create_organization(organization: OrganizationCreate, db: sqlite3.Connection
     # Получаем созданную организацию
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM organizations WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Organization)
 
 @app.get("/organizations/{organization_id}", response_model=Organization)
-def read_organization(organization_id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM organizations WHERE id = ?", (organization_id,))
-    row = cursor.fetchone()
+async def read_organization(organization_id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM organizations WHERE id = ?", (organization_id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="Организация не найдена")
     
-    return dict(row)
+    return row_response(row, Organization)
+
+@app.get("/organizations/{organization_id}/descendants", response_model=List[Organization])
+def read_organization_descendants(
+    organization_id: int,
+    max_depth: Optional[int] = None,
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Все дочерние организации на любой глубине (ближайшие первыми).
+    Один запрос по таблице замыканий organization_closure.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM organizations WHERE id = ?", (organization_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Организация не найдена")
+    
+    query = """
+        SELECT o.* FROM organization_closure c
+        JOIN organizations o ON o.id = c.descendant_id
+        WHERE c.ancestor_id = ? AND c.depth > 0
+    """
+    params = [organization_id]
+    if max_depth is not None:
+        query += " AND c.depth <= ?"
+        params.append(max_depth)
+    query += " ORDER BY c.depth, o.name"
+    
+    cursor.execute(query, params)
+    return rows_response(cursor, Organization)
+
+@app.get("/organizations/{organization_id}/ancestors", response_model=List[Organization])
+def read_organization_ancestors(organization_id: int, db: sqlite3.Connection = Depends(get_db)):
+    """
+    Цепочка родительских организаций от непосредственного родителя до корня.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM organizations WHERE id = ?", (organization_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Организация не найдена")
+    
+    cursor.execute("""
+        SELECT o.* FROM organization_closure c
+        JOIN organizations o ON o.id = c.ancestor_id
+        WHERE c.descendant_id = ? AND c.depth > 0
+        ORDER BY c.depth
+    """, (organization_id,))
+    return rows_response(cursor, Organization)
 
 @app.put("/organizations/{organization_id}", response_model=Organization)
 def update_organization(
@@ -763,6 +931,13 @@ def update_organization(
         if not parent:
             raise HTTPException(status_code=404, detail=f"Родительская организация с ID {organization.parent_id} не найдена")
         
+        # Проверяем, что организация не переносится внутрь собственного поддерева
+        if is_descendant(db, "organizations", organization.parent_id, organization_id):
+            raise HTTPException(
+                status_code=400,
+                detail="Невозможно сделать родителем организацию из собственного поддерева"
+            )
+        
         # Проверяем правила иерархии
         parent_type = parent["org_type"]
         if (organization.org_type == OrgType.LEGAL_ENTITY and parent_type != OrgType.HOLDING) or \
@@ -802,7 +977,7 @@ def update_organization(
     
     # Получаем обновленную организацию
     cursor.execute("SELECT * FROM organizations WHERE id = ?", (organization_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Organization)
 
 @app.delete("/organizations/{organization_id}", response_model=dict)
 def delete_organization(organization_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -829,33 +1004,28 @@ def delete_organization(organization_id: int, db: sqlite3.Connection = Depends(g
     return {"message": f"Организация с ID {organization_id} успешно удалена"}
 
 # API для подразделений (Division)
-@app.get("/divisions/", response_model=List[Division])
+DIVISIONS_LISTING = Listing("divisions", Division)
+
+@app.get("/divisions/", response_model=List[Division], dependencies=[etag_dependency("divisions")])
 def read_divisions(
     organization_id: Optional[int] = None,
     parent_id: Optional[int] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
-    query = "SELECT * FROM divisions"
+    conditions = []
     params = []
-    
-    if organization_id or parent_id is not None:
-        query += " WHERE"
-        
-        if organization_id:
-            query += " organization_id = ?"
-            params.append(organization_id)
-            
-        if parent_id is not None:
-            if organization_id:
-                query += " AND"
-            query += " parent_id " + ("IS NULL" if parent_id == 0 else "= ?")
-            if parent_id != 0:
-                params.append(parent_id)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+
+    if organization_id:
+        conditions.append("organization_id = ?")
+        params.append(organization_id)
+
+    if parent_id is not None:
+        conditions.append("parent_id " + ("IS NULL" if parent_id == 0 else "= ?"))
+        if parent_id != 0:
+            params.append(parent_id)
+
+    return paginate(db, DIVISIONS_LISTING, page, conditions, params)
 
 @app.post("/divisions/", response_model=Division)
 def create_division(division: DivisionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -905,18 +1075,63 @@ def create_division(division: DivisionCreate, db: sqlite3.Connection = Depends(g
     # Получаем созданное подразделение
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM divisions WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Division)
 
 @app.get("/divisions/{division_id}", response_model=Division)
-def read_division(division_id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM divisions WHERE id = ?", (division_id,))
-    row = cursor.fetchone()
+async def read_division(division_id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM divisions WHERE id = ?", (division_id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="Подразделение не найдено")
     
-    return dict(row)
+    return row_response(row, Division)
+
+@app.get("/divisions/{division_id}/descendants", response_model=List[Division])
+def read_division_descendants(
+    division_id: int,
+    max_depth: Optional[int] = None,
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Все дочерние подразделения на любой глубине (ближайшие первыми).
+    Один запрос по таблице замыканий division_closure.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM divisions WHERE id = ?", (division_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Подразделение не найдено")
+    
+    query = """
+        SELECT d.* FROM division_closure c
+        JOIN divisions d ON d.id = c.descendant_id
+        WHERE c.ancestor_id = ? AND c.depth > 0
+    """
+    params = [division_id]
+    if max_depth is not None:
+        query += " AND c.depth <= ?"
+        params.append(max_depth)
+    query += " ORDER BY c.depth, d.name"
+    
+    cursor.execute(query, params)
+    return rows_response(cursor, Division)
+
+@app.get("/divisions/{division_id}/ancestors", response_model=List[Division])
+def read_division_ancestors(division_id: int, db: sqlite3.Connection = Depends(get_db)):
+    """
+    Цепочка родительских подразделений от непосредственного родителя до корня.
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT id FROM divisions WHERE id = ?", (division_id,))
+    if not cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Подразделение не найдено")
+    
+    cursor.execute("""
+        SELECT d.* FROM division_closure c
+        JOIN divisions d ON d.id = c.ancestor_id
+        WHERE c.descendant_id = ? AND c.depth > 0
+        ORDER BY c.depth
+    """, (division_id,))
+    return rows_response(cursor, Division)
 
 @app.put("/divisions/{division_id}", response_model=Division)
 def update_division(
@@ -949,6 +1164,13 @@ def update_division(
         cursor.execute("SELECT id FROM divisions WHERE id = ?", (division.parent_id,))
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail=f"Родительское подразделение с ID {division.parent_id} не найдено")
+        
+        # Проверяем, что подразделение не переносится внутрь собственного поддерева
+        if is_descendant(db, "divisions", division.parent_id, division_id):
+            raise HTTPException(
+                status_code=400,
+                detail="Невозможно сделать родителем подразделение из собственного поддерева"
+            )
     
     # Обновляем подразделение
     try:
@@ -976,7 +1198,7 @@ def update_division(
     
     # Получаем обновленное подразделение
     cursor.execute("SELECT * FROM divisions WHERE id = ?", (division_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Division)
 
 @app.delete("/divisions/{division_id}", response_model=dict)
 def delete_division(division_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1006,12 +1228,14 @@ def delete_division(division_id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Подразделение с ID {division_id} успешно удалено"}
 
 # API для отделов (Section)
-@app.get("/sections/", response_model=List[Section])
-def read_sections(db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM sections")
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+SECTIONS_LISTING = Listing("sections", Section)
+
+@app.get("/sections/", response_model=List[Section], dependencies=[etag_dependency("sections")])
+def read_sections(
+    page: PageParams = Depends(),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    return paginate(db, SECTIONS_LISTING, page)
 
 @app.post("/sections/", response_model=Section)
 def create_section(section: SectionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1039,18 +1263,16 @@ def create_section(section: SectionCreate, db: sqlite3.Connection = Depends(get_
     # Получаем созданный отдел
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM sections WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Section)
 
 @app.get("/sections/{section_id}", response_model=Section)
-def read_section(section_id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM sections WHERE id = ?", (section_id,))
-    row = cursor.fetchone()
+async def read_section(section_id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM sections WHERE id = ?", (section_id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="Отдел не найден")
     
-    return dict(row)
+    return row_response(row, Section)
 
 @app.put("/sections/{section_id}", response_model=Section)
 def update_section(
@@ -1088,7 +1310,7 @@ def update_section(
     
     # Получаем обновленный отдел
     cursor.execute("SELECT * FROM sections WHERE id = ?", (section_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Section)
 
 @app.delete("/sections/{section_id}", response_model=dict)
 def delete_section(section_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1112,32 +1334,27 @@ def delete_section(section_id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Отдел с ID {section_id} успешно удален"}
 
 # API для связи Division-Section
-@app.get("/division-sections/", response_model=List[DivisionSection])
+DIVISION_SECTIONS_LISTING = Listing("division_sections", DivisionSection)
+
+@app.get("/division-sections/", response_model=List[DivisionSection], dependencies=[etag_dependency("division_sections")])
 def read_division_sections(
     division_id: Optional[int] = None,
     section_id: Optional[int] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
-    query = "SELECT * FROM division_sections"
+    conditions = []
     params = []
-    
-    if division_id or section_id:
-        query += " WHERE"
-        
-        if division_id:
-            query += " division_id = ?"
-            params.append(division_id)
-            
-        if section_id:
-            if division_id:
-                query += " AND"
-            query += " section_id = ?"
-            params.append(section_id)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+
+    if division_id:
+        conditions.append("division_id = ?")
+        params.append(division_id)
+
+    if section_id:
+        conditions.append("section_id = ?")
+        params.append(section_id)
+
+    return paginate(db, DIVISION_SECTIONS_LISTING, page, conditions, params)
 
 @app.post("/division-sections/", response_model=DivisionSection)
 def create_division_section(div_section: DivisionSectionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1169,7 +1386,7 @@ def create_division_section(div_section: DivisionSectionCreate, db: sqlite3.Conn
     # Получаем созданную связь
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM division_sections WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), DivisionSection)
 
 @app.delete("/division-sections/{id}", response_model=dict)
 def delete_division_section(id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1187,12 +1404,14 @@ def delete_division_section(id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Связь с ID {id} успешно удалена"}
 
 # API для функций (Function)
-@app.get("/functions/", response_model=List[Function])
-def read_functions(db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM functions")
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+FUNCTIONS_LISTING = Listing("functions", Function)
+
+@app.get("/functions/", response_model=List[Function], dependencies=[etag_dependency("functions")])
+def read_functions(
+    page: PageParams = Depends(),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    return paginate(db, FUNCTIONS_LISTING, page)
 
 @app.post("/functions/", response_model=Function)
 def create_function(function: FunctionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1219,18 +1438,16 @@ def create_function(function: FunctionCreate, db: sqlite3.Connection = Depends(g
     # Получаем созданную функцию
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM functions WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Function)
 
 @app.get("/functions/{function_id}", response_model=Function)
-def read_function(function_id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM functions WHERE id = ?", (function_id,))
-    row = cursor.fetchone()
+async def read_function(function_id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM functions WHERE id = ?", (function_id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="Функция не найдена")
     
-    return dict(row)
+    return row_response(row, Function)
 
 @app.put("/functions/{function_id}", response_model=Function)
 def update_function(
@@ -1267,7 +1484,7 @@ def update_function(
     
     # Получаем обновленную функцию
     cursor.execute("SELECT * FROM functions WHERE id = ?", (function_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Function)
 
 @app.delete("/functions/{function_id}", response_model=dict)
 def delete_function(function_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1298,32 +1515,27 @@ def delete_function(function_id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Функция с ID {function_id} успешно удалена"}
 
 # API для связи Section-Function
-@app.get("/section-functions/", response_model=List[SectionFunction])
+SECTION_FUNCTIONS_LISTING = Listing("section_functions", SectionFunction)
+
+@app.get("/section-functions/", response_model=List[SectionFunction], dependencies=[etag_dependency("section_functions")])
 def read_section_functions(
     section_id: Optional[int] = None,
     function_id: Optional[int] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
-    query = "SELECT * FROM section_functions"
+    conditions = []
     params = []
-    
-    if section_id or function_id:
-        query += " WHERE"
-        
-        if section_id:
-            query += " section_id = ?"
-            params.append(section_id)
-            
-        if function_id:
-            if section_id:
-                query += " AND"
-            query += " function_id = ?"
-            params.append(function_id)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+
+    if section_id:
+        conditions.append("section_id = ?")
+        params.append(section_id)
+
+    if function_id:
+        conditions.append("function_id = ?")
+        params.append(function_id)
+
+    return paginate(db, SECTION_FUNCTIONS_LISTING, page, conditions, params)
 
 @app.post("/section-functions/", response_model=SectionFunction)
 def create_section_function(section_function: SectionFunctionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1355,7 +1567,7 @@ def create_section_function(section_function: SectionFunctionCreate, db: sqlite3
     # Получаем созданную связь
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM section_functions WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), SectionFunction)
 
 @app.delete("/section-functions/{id}", response_model=dict)
 def delete_section_function(id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1373,18 +1585,17 @@ def delete_section_function(id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Связь с ID {id} успешно удалена"}
 
 # API для должностей (Position)
-@app.get("/positions/", response_model=List[Position])
+POSITIONS_LISTING = Listing("positions", Position)
+
+@app.get("/positions/", response_model=List[Position], dependencies=[etag_dependency("positions")])
 def read_positions(
     function_id: Optional[int] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
     if function_id:
-        cursor.execute("SELECT * FROM positions WHERE function_id = ?", (function_id,))
-    else:
-        cursor.execute("SELECT * FROM positions")
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+        return paginate(db, POSITIONS_LISTING, page, ["function_id = ?"], [function_id])
+    return paginate(db, POSITIONS_LISTING, page)
 
 @app.post("/positions/", response_model=Position)
 def create_position(position: PositionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1418,18 +1629,16 @@ def create_position(position: PositionCreate, db: sqlite3.Connection = Depends(g
     # Получаем созданную должность
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM positions WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Position)
 
 @app.get("/positions/{position_id}", response_model=Position)
-def read_position(position_id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM positions WHERE id = ?", (position_id,))
-    row = cursor.fetchone()
+async def read_position(position_id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM positions WHERE id = ?", (position_id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="Должность не найдена")
     
-    return dict(row)
+    return row_response(row, Position)
 
 @app.put("/positions/{position_id}", response_model=Position)
 def update_position(
@@ -1473,7 +1682,7 @@ def update_position(
     
     # Получаем обновленную должность
     cursor.execute("SELECT * FROM positions WHERE id = ?", (position_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), Position)
 
 @app.delete("/positions/{position_id}", response_model=dict)
 def delete_position(position_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1500,82 +1709,101 @@ def delete_position(position_id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Должность с ID {position_id} успешно удалена"}
 
 # API для сотрудников (Staff)
-@app.get("/staff/", response_model=List[Staff])
+STAFF_LISTING = Listing("staff", Staff, default_columns=(
+    "id", "email", "first_name", "last_name", "middle_name", "phone",
+    "position", "description", "is_active", "organization_id",
+    "primary_organization_id", "location_id", "registration_address",
+    "actual_address", "telegram_id", "vk", "instagram",
+    "created_at", "updated_at"
+))
+
+@app.get("/staff/", response_model=List[Staff], dependencies=[etag_dependency("staff")])
 def read_staff(
     organization_id: Optional[int] = None,
     primary_organization_id: Optional[int] = None,
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
     """
     Получить список сотрудников с возможностью фильтрации.
     """
-    # Выбираем все нужные поля, включая новые
-    query = """
-        SELECT id, email, first_name, last_name, middle_name, phone, 
-               position, description, is_active, organization_id, 
-               primary_organization_id, location_id, registration_address, 
-               actual_address, telegram_id, vk, instagram, 
-               created_at, updated_at 
-        FROM staff WHERE 1=1
-    """
+    conditions, params = _staff_filters(organization_id, primary_organization_id, is_active)
+    return paginate(db, STAFF_LISTING, page, conditions, params)
+
+def _staff_filters(organization_id: Optional[int], primary_organization_id: Optional[int],
+                   is_active: Optional[bool]):
+    """Условия WHERE для списка и выгрузки сотрудников."""
+    conditions = []
     params = []
-    
-    # ... (фильтры остаются как были)
+
     if organization_id is not None:
-        query += " AND organization_id = ?"
+        conditions.append("organization_id = ?")
         params.append(organization_id)
-        
+
     if primary_organization_id is not None:
-        query += " AND primary_organization_id = ?"
+        conditions.append("primary_organization_id = ?")
         params.append(primary_organization_id)
-    
+
     if is_active is not None:
-        query += " AND is_active = ?"
+        conditions.append("is_active = ?")
         params.append(1 if is_active else 0)
-    
-    cursor = db.execute(query, params)
-    staff_list = cursor.fetchall()
-    
-    logger.info(f"[read_staff] Найдено {len(staff_list)} записей в БД.") # Лог количества записей
-    
-    result = []
-    for i, s in enumerate(staff_list): # Добавляем индекс для логгирования
-        try:
-            logger.debug(f"[read_staff] Обработка записи {i+1}/{len(staff_list)}: ID={s['id']}, Email={s['email']}") # Возвращаем доступ по ключу
-            # Логгируем ключи, чтобы убедиться что все колонки прочитаны
-            logger.debug(f"[read_staff] Ключи для записи ID={s['id']}: {list(s.keys()) if hasattr(s, 'keys') else 'N/A'}") 
-            
-            # Возвращаем доступ по ключу s['key'] вместо s.get('key')
-            staff_entry = {
-                "id": s["id"],
-                "email": s["email"],
-                "first_name": s["first_name"],
-                "last_name": s["last_name"],
-                "middle_name": s["middle_name"],
-                "phone": s["phone"],
-                "position": s["position"], 
-                "description": s["description"],
-                "is_active": bool(s["is_active"]), # bool() сам обработает 0 или 1
-                "organization_id": s["organization_id"],
-                "primary_organization_id": s["primary_organization_id"],
-                "location_id": s["location_id"], 
-                "registration_address": s["registration_address"], 
-                "actual_address": s["actual_address"],
-                "telegram_id": s["telegram_id"],
-                "vk": s["vk"],
-                "instagram": s["instagram"],
-                "created_at": s["created_at"],
-                "updated_at": s["updated_at"]
-            }
-            result.append(staff_entry)
-            logger.debug(f"[read_staff] Запись ID={s['id']} успешно добавлена в результат.")
-        except Exception as e:
-            logger.error(f"[read_staff] Ошибка при обработке записи {i+1} (ID={s['id'] if s else 'N/A'}): {e}", exc_info=True)
-            # raise # Пока оставляем закомментированным, чтобы увидеть все ошибки
-    
-    logger.info(f"[read_staff] Успешно обработано {len(result)} записей.")
-    return result
+
+    return conditions, params
+
+# ================== ПОТОКОВАЯ ВЫГРУЗКА ==================
+
+# Плоское представление оргструктуры: одна строка на узел со ссылкой на родителя
+ORG_STRUCTURE_EXPORT_QUERY = """
+    SELECT 'organization' AS entity_type, id, name, code, org_type,
+           CASE WHEN parent_id IS NULL THEN NULL ELSE 'organization' END AS parent_type,
+           parent_id
+    FROM organizations
+    UNION ALL
+    SELECT 'division', id, name, code, NULL,
+           CASE WHEN parent_id IS NULL THEN 'organization' ELSE 'division' END,
+           COALESCE(parent_id, organization_id)
+    FROM divisions
+    UNION ALL
+    SELECT 'section', s.id, s.name, s.code, NULL, 'division', ds.division_id
+    FROM division_sections ds
+    JOIN sections s ON s.id = ds.section_id
+    UNION ALL
+    SELECT 'function', f.id, f.name, f.code, NULL, 'section', sf.section_id
+    FROM section_functions sf
+    JOIN functions f ON f.id = sf.function_id
+"""
+
+@app.get("/export/staff")
+def export_staff(
+    organization_id: Optional[int] = None,
+    primary_organization_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    format: ExportFormat = ExportFormat.NDJSON,
+    gzip: bool = False
+):
+    """
+    Потоковая выгрузка сотрудников в NDJSON или CSV (фильтры как у /staff/).
+    Строки читаются из курсора пачками, весь список в памяти не собирается.
+    """
+    conditions, params = _staff_filters(organization_id, primary_organization_id, is_active)
+    columns = list(STAFF_LISTING.default_columns)
+    query = f"SELECT {', '.join(columns)} FROM staff"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+
+    chunks = export_chunks(db_pool.connection, query, params, format, STAFF_LISTING.convert(columns, partial=True))
+    return export_response(chunks, format, "staff", gzip=gzip)
+
+@app.get("/export/org-structure")
+def export_org_structure(format: ExportFormat = ExportFormat.NDJSON, gzip: bool = False):
+    """
+    Потоковая выгрузка оргструктуры: организации, подразделения, отделы и функции
+    плоским списком (entity_type, id, ..., parent_type, parent_id).
+    """
+    chunks = export_chunks(db_pool.connection, ORG_STRUCTURE_EXPORT_QUERY, (), format)
+    return export_response(chunks, format, "org_structure", gzip=gzip)
 
 @app.post("/staff/", response_model=Staff)
 def create_staff(staff: StaffCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1638,28 +1866,51 @@ def create_staff(staff: StaffCreate, db: sqlite3.Connection = Depends(get_db)):
     if not created:
         raise HTTPException(status_code=500, detail="Не удалось получить данные созданного сотрудника")
     
-    # Формируем ответ - читаем из правильных колонок
-    return {
-        "id": created["id"],
-        "email": created["email"],
-        "first_name": created["first_name"],
-        "last_name": created["last_name"],
-        "middle_name": created["middle_name"],
-        "phone": created["phone"],
-        "position": created["position"], # Возвращаем position
-        "description": created["description"], # Возвращаем описание
-        "is_active": bool(created["is_active"]),
-        "organization_id": created["organization_id"],
-        "primary_organization_id": created["primary_organization_id"],
-        "location_id": created["location_id"],
-        "registration_address": created["registration_address"], # Возвращаем из новой колонки
-        "actual_address": created["actual_address"], # Возвращаем из новой колонки
-        "telegram_id": created["telegram_id"], # Возвращаем из новой колонки
-        "vk": created["vk"], # Возвращаем из новой колонки
-        "instagram": created["instagram"], # Возвращаем из новой колонки
-        "created_at": created["created_at"],
-        "updated_at": created["updated_at"]
-    }
+    return row_response(created, Staff)
+
+# Колонки staff, которые заполняет пакетная запись
+STAFF_BATCH_COLUMNS = (
+    "email", "first_name", "last_name", "middle_name", "phone", "description", "is_active",
+    "organization_id", "primary_organization_id", "location_id",
+    "registration_address", "actual_address", "telegram_id", "vk", "instagram",
+)
+
+@app.post("/staff/batch", response_model=BatchResult)
+def create_staff_batch(
+    items: List[StaffCreate],
+    mode: BatchMode = BatchMode.INSERT,
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Создать сотрудников пакетом (mode=upsert — обновить существующих с тем же email).
+    """
+    check_batch_size(items)
+    organization_ids = existing_ids(db, "organizations", [
+        org_id for staff in items
+        for org_id in (staff.organization_id, staff.primary_organization_id, staff.location_id)
+    ])
+    existing = find_by_key(db, "staff", ("email",), [(staff.email,) for staff in items])
+    
+    batch = Batch()
+    for index, staff in enumerate(items):
+        for org_id in (staff.organization_id, staff.primary_organization_id):
+            if org_id is not None and org_id not in organization_ids:
+                batch.fail(index, f"Организация с ID {org_id} не найдена")
+        if staff.location_id is not None and staff.location_id not in organization_ids:
+            batch.fail(index, f"Локация с ID {staff.location_id} не найдена")
+        key = (staff.email,)
+        if mode == BatchMode.INSERT and key in existing:
+            batch.fail(index, f"Сотрудник с email {staff.email} уже существует")
+        if batch.failed(index) or not batch.claim(index, key):
+            continue
+        batch.add(index, (
+            staff.email, staff.first_name, staff.last_name, staff.middle_name, staff.phone,
+            staff.description, 1 if staff.is_active else 0,
+            staff.organization_id, staff.primary_organization_id, staff.location_id,
+            staff.registration_address, staff.actual_address, staff.telegram_id, staff.vk, staff.instagram,
+        ), existing.get(key))
+    
+    return write_batch(db, "staff", STAFF_BATCH_COLUMNS, batch)
 
 @app.post("/staff-positions/", response_model=StaffPosition)
 def create_staff_position(staff_position: StaffPositionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1714,7 +1965,56 @@ def create_staff_position(staff_position: StaffPositionCreate, db: sqlite3.Conne
     # Получаем созданную связь
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM staff_positions WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), StaffPosition)
+
+STAFF_POSITION_BATCH_COLUMNS = (
+    "staff_id", "position_id", "division_id", "location_id", "is_primary", "is_active", "start_date", "end_date",
+)
+
+@app.post("/staff-positions/batch", response_model=BatchResult)
+def create_staff_positions_batch(
+    items: List[StaffPositionCreate],
+    mode: BatchMode = BatchMode.INSERT,
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Назначить должности пакетом (mode=upsert — обновить назначение с той же парой сотрудник + должность).
+    """
+    check_batch_size(items)
+    staff_ids = existing_ids(db, "staff", [item.staff_id for item in items])
+    position_ids = existing_ids(db, "positions", [item.position_id for item in items])
+    division_ids = existing_ids(db, "divisions", [item.division_id for item in items])
+    location_ids = [item.location_id for item in items]
+    organization_ids = existing_ids(db, "organizations", location_ids)
+    real_location_ids = existing_ids(db, "organizations", location_ids, where="org_type = 'location'")
+    existing = {}
+    if mode == BatchMode.UPSERT:
+        existing = find_by_key(db, "staff_positions", ("staff_id", "position_id"),
+                               [(item.staff_id, item.position_id) for item in items])
+    
+    batch = Batch()
+    for index, item in enumerate(items):
+        if item.staff_id not in staff_ids:
+            batch.fail(index, f"Сотрудник с ID {item.staff_id} не найден")
+        if item.position_id not in position_ids:
+            batch.fail(index, f"Должность с ID {item.position_id} не найдена")
+        if item.division_id is not None and item.division_id not in division_ids:
+            batch.fail(index, f"Подразделение с ID {item.division_id} не найдено")
+        if item.location_id:
+            if item.location_id not in organization_ids:
+                batch.fail(index, f"Локация с ID {item.location_id} не найдена")
+            elif item.location_id not in real_location_ids:
+                batch.fail(index, f"Организация с ID {item.location_id} не является локацией")
+        key = (item.staff_id, item.position_id)
+        if batch.failed(index) or (mode == BatchMode.UPSERT and not batch.claim(index, key)):
+            continue
+        batch.add(index, (
+            item.staff_id, item.position_id, item.division_id, item.location_id,
+            1 if item.is_primary else 0, 1 if item.is_active else 0,
+            item.start_date.isoformat(), item.end_date.isoformat() if item.end_date else None,
+        ), existing.get(key))
+    
+    return write_batch(db, "staff_positions", STAFF_POSITION_BATCH_COLUMNS, batch)
 
 @app.put("/staff-positions/{id}", response_model=StaffPosition)
 def update_staff_position(
@@ -1778,7 +2078,7 @@ def update_staff_position(
     
     # Получаем обновленную связь
     cursor.execute("SELECT * FROM staff_positions WHERE id = ?", (id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), StaffPosition)
 
 @app.delete("/staff-positions/{id}", response_model=dict)
 def delete_staff_position(id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1796,49 +2096,38 @@ def delete_staff_position(id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Связь с ID {id} успешно удалена"}
 
 # API для связи сотрудников и функций (Staff-Function)
-@app.get("/staff-functions/", response_model=List[StaffFunction])
+STAFF_FUNCTIONS_LISTING = Listing("staff_functions", StaffFunction, default_columns=(
+    "id", "staff_id", "function_id", "commitment_percent", "is_primary",
+    "date_from", "date_to", "created_at", "updated_at"
+))
+
+@app.get("/staff-functions/", response_model=List[StaffFunction], dependencies=[etag_dependency("staff_functions")])
 def read_staff_functions(
     staff_id: Optional[int] = None,
     function_id: Optional[int] = None,
     is_primary: Optional[bool] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
     """
     Получить список связей сотрудников с функциями с возможностью фильтрации.
     """
-    query = "SELECT * FROM staff_functions WHERE 1=1"
+    conditions = []
     params = []
-    
+
     if staff_id is not None:
-        query += " AND staff_id = ?"
+        conditions.append("staff_id = ?")
         params.append(staff_id)
-    
+
     if function_id is not None:
-        query += " AND function_id = ?"
+        conditions.append("function_id = ?")
         params.append(function_id)
-    
+
     if is_primary is not None:
-        query += " AND is_primary = ?"
+        conditions.append("is_primary = ?")
         params.append(1 if is_primary else 0)
-    
-    cursor = db.execute(query, params)
-    staff_functions = cursor.fetchall()
-    
-    result = []
-    for func in staff_functions:
-        result.append({
-            "id": func["id"],
-            "staff_id": func["staff_id"],
-            "function_id": func["function_id"],
-            "commitment_percent": func["commitment_percent"],
-            "is_primary": bool(func["is_primary"]),
-            "date_from": func["date_from"],
-            "date_to": func["date_to"],
-            "created_at": func["created_at"],
-            "updated_at": func["updated_at"]
-        })
-    
-    return result
+
+    return paginate(db, STAFF_FUNCTIONS_LISTING, page, conditions, params)
 
 @app.post("/staff-functions/", response_model=StaffFunction)
 def create_staff_function(staff_function: StaffFunctionCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -1887,17 +2176,58 @@ def create_staff_function(staff_function: StaffFunctionCreate, db: sqlite3.Conne
     cursor = db.execute("SELECT * FROM staff_functions WHERE id = ?", (created_id,))
     created = cursor.fetchone()
     
-    return {
-        "id": created["id"],
-        "staff_id": created["staff_id"],
-        "function_id": created["function_id"],
-        "commitment_percent": created["commitment_percent"],
-        "is_primary": bool(created["is_primary"]),
-        "date_from": created["date_from"],
-        "date_to": created["date_to"],
-        "created_at": created["created_at"],
-        "updated_at": created["updated_at"]
-    }
+    return row_response(created, StaffFunction)
+
+STAFF_FUNCTION_BATCH_COLUMNS = ("staff_id", "function_id", "commitment_percent", "is_primary", "date_from", "date_to")
+
+@app.post("/staff-functions/batch", response_model=BatchResult)
+def create_staff_functions_batch(
+    items: List[StaffFunctionCreate],
+    mode: BatchMode = BatchMode.INSERT,
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Создать связи сотрудников с функциями пакетом (mode=upsert — обновить связь
+    с той же парой сотрудник + функция).
+    
+    Как и при одиночном создании, основная функция у сотрудника одна:
+    если в пакете их несколько, основной остается последняя.
+    """
+    check_batch_size(items)
+    staff_ids = existing_ids(db, "staff", [item.staff_id for item in items])
+    function_ids = existing_ids(db, "functions", [item.function_id for item in items])
+    existing = {}
+    if mode == BatchMode.UPSERT:
+        existing = find_by_key(db, "staff_functions", ("staff_id", "function_id"),
+                               [(item.staff_id, item.function_id) for item in items])
+    
+    batch = Batch()
+    accepted = []
+    for index, item in enumerate(items):
+        if item.function_id not in function_ids:
+            batch.fail(index, f"Функция с ID {item.function_id} не найдена")
+        if item.staff_id not in staff_ids:
+            batch.fail(index, f"Сотрудник с ID {item.staff_id} не найден")
+        key = (item.staff_id, item.function_id)
+        if batch.failed(index) or (mode == BatchMode.UPSERT and not batch.claim(index, key)):
+            continue
+        accepted.append((index, item, existing.get(key)))
+    
+    primary_index = {item.staff_id: index for index, item, _ in accepted if item.is_primary}
+    for index, item, existing_id in accepted:
+        batch.add(index, (
+            item.staff_id, item.function_id, item.commitment_percent,
+            1 if primary_index.get(item.staff_id) == index else 0,
+            item.date_from.isoformat(), item.date_to.isoformat() if item.date_to else None,
+        ), existing_id)
+    
+    def reset_primary(db: sqlite3.Connection):
+        db.executemany(
+            "UPDATE staff_functions SET is_primary = 0 WHERE staff_id = ? AND is_primary = 1",
+            [(staff_id,) for staff_id in primary_index]
+        )
+    
+    return write_batch(db, "staff_functions", STAFF_FUNCTION_BATCH_COLUMNS, batch, before_write=reset_primary)
 
 @app.put("/staff-functions/{id}", response_model=StaffFunction)
 def update_staff_function(
@@ -1952,17 +2282,7 @@ def update_staff_function(
     cursor = db.execute("SELECT * FROM staff_functions WHERE id = ?", (id,))
     updated = cursor.fetchone()
     
-    return {
-        "id": updated["id"],
-        "staff_id": updated["staff_id"],
-        "function_id": updated["function_id"],
-        "commitment_percent": updated["commitment_percent"],
-        "is_primary": bool(updated["is_primary"]),
-        "date_from": updated["date_from"],
-        "date_to": updated["date_to"],
-        "created_at": updated["created_at"],
-        "updated_at": updated["updated_at"]
-    }
+    return row_response(updated, StaffFunction)
 
 @app.delete("/staff-functions/{id}", response_model=dict)
 def delete_staff_function(id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -1980,19 +2300,20 @@ def delete_staff_function(id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Связь с ID {id} успешно удалена"}
 
 # API для функциональных отношений (FunctionalRelation)
-@app.get("/functional-relations/", response_model=List[FunctionalRelation])
+FUNCTIONAL_RELATIONS_LISTING = Listing("functional_relations", FunctionalRelation)
+
+@app.get("/functional-relations/", response_model=List[FunctionalRelation], dependencies=[etag_dependency("functional_relations")])
 def read_functional_relations(
     manager_id: Optional[int] = None,
     subordinate_id: Optional[int] = None,
     relation_type: Optional[RelationType] = None,
     is_active: Optional[bool] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
-    query = "SELECT * FROM functional_relations"
     params = []
     conditions = []
-    
+
     if manager_id:
         conditions.append("manager_id = ?")
         params.append(manager_id)
@@ -2008,13 +2329,8 @@ def read_functional_relations(
     if is_active is not None:
         conditions.append("is_active = ?")
         params.append(1 if is_active else 0)
-    
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+
+    return paginate(db, FUNCTIONAL_RELATIONS_LISTING, page, conditions, params)
 
 @app.post("/functional-relations/", response_model=FunctionalRelation)
 def create_functional_relation(relation: FunctionalRelationCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -2060,18 +2376,55 @@ def create_functional_relation(relation: FunctionalRelationCreate, db: sqlite3.C
     # Получаем созданное отношение
     new_id = cursor.lastrowid
     cursor.execute("SELECT * FROM functional_relations WHERE id = ?", (new_id,))
-    return dict(cursor.fetchone())
+    return row_response(cursor.fetchone(), FunctionalRelation)
+
+FUNCTIONAL_RELATION_BATCH_COLUMNS = ("manager_id", "subordinate_id", "relation_type", "description", "is_active")
+
+@app.post("/functional-relations/batch", response_model=BatchResult)
+def create_functional_relations_batch(
+    items: List[FunctionalRelationCreate],
+    mode: BatchMode = BatchMode.INSERT,
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Создать функциональные отношения пакетом (mode=upsert — обновить отношение
+    с теми же руководителем, подчиненным и типом).
+    """
+    check_batch_size(items)
+    staff_ids = existing_ids(db, "staff", [
+        staff_id for item in items for staff_id in (item.manager_id, item.subordinate_id)
+    ])
+    existing = {}
+    if mode == BatchMode.UPSERT:
+        existing = find_by_key(db, "functional_relations", ("manager_id", "subordinate_id", "relation_type"),
+                               [(item.manager_id, item.subordinate_id, item.relation_type.value) for item in items])
+    
+    batch = Batch()
+    for index, item in enumerate(items):
+        if item.manager_id == item.subordinate_id:
+            batch.fail(index, "Сотрудник не может быть одновременно руководителем и подчиненным")
+        if item.manager_id not in staff_ids:
+            batch.fail(index, f"Руководитель с ID {item.manager_id} не найден")
+        if item.subordinate_id not in staff_ids:
+            batch.fail(index, f"Подчиненный с ID {item.subordinate_id} не найден")
+        key = (item.manager_id, item.subordinate_id, item.relation_type.value)
+        if batch.failed(index) or (mode == BatchMode.UPSERT and not batch.claim(index, key)):
+            continue
+        batch.add(index, (
+            item.manager_id, item.subordinate_id, item.relation_type.value,
+            item.description, 1 if item.is_active else 0,
+        ), existing.get(key))
+    
+    return write_batch(db, "functional_relations", FUNCTIONAL_RELATION_BATCH_COLUMNS, batch)
 
 @app.get("/functional-relations/{id}", response_model=FunctionalRelation)
-def read_functional_relation(id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM functional_relations WHERE id = ?", (id,))
-    row = cursor.fetchone()
+async def read_functional_relation(id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM functional_relations WHERE id = ?", (id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="Отношение не найдено")
     
-    return dict(row)
+    return row_response(row, FunctionalRelation)
 
 @app.delete("/functional-relations/{id}", response_model=dict)
 def delete_functional_relation(id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -2099,54 +2452,56 @@ def startup_event():
     init_db()
     logger.info("Инициализация базы данных завершена.")
 
+# Закрываем пул соединений при остановке сервера
+@app.on_event("shutdown")
+def shutdown_event():
+    logger.info("Выполняется событие shutdown: закрытие пула соединений с БД...")
+    async_db.close()
+    password_hasher.close()
+    db_pool.close()
+    response_cache.close()
+    bot_notifier.close()
+    slow_query_log.close()
+    tracing.shutdown_logging()
+
 # Подключаем роутер для организационной структуры, если он доступен
 if has_org_structure_router:
     app.include_router(org_structure_router)
 
 # ================== STAFF LOCATIONS ENDPOINTS ==================
 
-@app.get("/staff-locations/", response_model=List[StaffLocation])
+STAFF_LOCATIONS_LISTING = Listing("staff_locations", StaffLocation, default_columns=(
+    "id", "staff_id", "location_id", "is_current",
+    "date_from", "date_to", "created_at", "updated_at"
+))
+
+@app.get("/staff-locations/", response_model=List[StaffLocation], dependencies=[etag_dependency("staff_locations")])
 def read_staff_locations(
     staff_id: Optional[int] = None,
     location_id: Optional[int] = None,
     is_current: Optional[bool] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
     """
     Получить список связей сотрудников с локациями с возможностью фильтрации.
     """
-    query = "SELECT * FROM staff_locations WHERE 1=1"
+    conditions = []
     params = []
-    
+
     if staff_id is not None:
-        query += " AND staff_id = ?"
+        conditions.append("staff_id = ?")
         params.append(staff_id)
-    
+
     if location_id is not None:
-        query += " AND location_id = ?"
+        conditions.append("location_id = ?")
         params.append(location_id)
-    
+
     if is_current is not None:
-        query += " AND is_current = ?"
+        conditions.append("is_current = ?")
         params.append(1 if is_current else 0)
-    
-    cursor = db.execute(query, params)
-    staff_locations = cursor.fetchall()
-    
-    result = []
-    for loc in staff_locations:
-        result.append({
-            "id": loc["id"],
-            "staff_id": loc["staff_id"],
-            "location_id": loc["location_id"],
-            "is_current": bool(loc["is_current"]),
-            "date_from": loc["date_from"],
-            "date_to": loc["date_to"],
-            "created_at": loc["created_at"],
-            "updated_at": loc["updated_at"]
-        })
-    
-    return result
+
+    return paginate(db, STAFF_LOCATIONS_LISTING, page, conditions, params)
 
 @app.post("/staff-locations/", response_model=StaffLocation)
 def create_staff_location(staff_location: StaffLocationCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -2202,16 +2557,7 @@ def create_staff_location(staff_location: StaffLocationCreate, db: sqlite3.Conne
     cursor = db.execute("SELECT * FROM staff_locations WHERE id = ?", (created_id,))
     created = cursor.fetchone()
     
-    return {
-        "id": created["id"],
-        "staff_id": created["staff_id"],
-        "location_id": created["location_id"],
-        "is_current": bool(created["is_current"]),
-        "date_from": created["date_from"],
-        "date_to": created["date_to"],
-        "created_at": created["created_at"],
-        "updated_at": created["updated_at"]
-    }
+    return row_response(created, StaffLocation)
 
 @app.put("/staff-locations/{id}", response_model=StaffLocation)
 def update_staff_location(
@@ -2276,16 +2622,7 @@ def update_staff_location(
     cursor = db.execute("SELECT * FROM staff_locations WHERE id = ?", (id,))
     updated = cursor.fetchone()
     
-    return {
-        "id": updated["id"],
-        "staff_id": updated["staff_id"],
-        "location_id": updated["location_id"],
-        "is_current": bool(updated["is_current"]),
-        "date_from": updated["date_from"],
-        "date_to": updated["date_to"],
-        "created_at": updated["created_at"],
-        "updated_at": updated["updated_at"]
-    }
+    return row_response(updated, StaffLocation)
 
 @app.delete("/staff-locations/{id}", response_model=dict)
 def delete_staff_location(id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -2303,12 +2640,12 @@ def delete_staff_location(id: int, db: sqlite3.Connection = Depends(get_db)):
     return {"message": f"Связь локации с ID {id} успешно удалена"}
 
 @app.get("/staff/{staff_id}", response_model=Staff)
-def read_staff_member(staff_id: int, db: sqlite3.Connection = Depends(get_db)):
+async def read_staff_member(staff_id: int, db: AsyncDatabase = Depends(get_async_db)):
     """
     Получить данные конкретного сотрудника по ID.
     """
     # Выбираем все нужные поля
-    cursor = db.execute("""
+    staff = await db.fetchone("""
         SELECT id, email, first_name, last_name, middle_name, phone, 
                position, description, is_active, organization_id, 
                primary_organization_id, location_id, registration_address, 
@@ -2316,33 +2653,11 @@ def read_staff_member(staff_id: int, db: sqlite3.Connection = Depends(get_db)):
                created_at, updated_at 
         FROM staff WHERE id = ?
         """, (staff_id,))
-    staff = cursor.fetchone()
     
     if not staff:
         raise HTTPException(status_code=404, detail=f"Сотрудник с ID {staff_id} не найден")
     
-    # Формируем ответ, включая все поля
-    return {
-        "id": staff["id"],
-        "email": staff["email"],
-        "first_name": staff["first_name"],
-        "last_name": staff["last_name"],
-        "middle_name": staff["middle_name"],
-        "phone": staff["phone"],
-        "position": staff["position"], # Добавляем position
-        "description": staff["description"],
-        "is_active": bool(staff["is_active"]),
-        "organization_id": staff["organization_id"],
-        "primary_organization_id": staff["primary_organization_id"],
-        "location_id": staff["location_id"], # Добавляем location_id
-        "registration_address": staff["registration_address"], # Добавляем новые поля
-        "actual_address": staff["actual_address"],
-        "telegram_id": staff["telegram_id"],
-        "vk": staff["vk"],
-        "instagram": staff["instagram"],
-        "created_at": staff["created_at"],
-        "updated_at": staff["updated_at"]
-    }
+    return row_response(staff, Staff)
 
 @app.put("/staff/{staff_id}", response_model=Staff)
 def update_staff(staff_id: int, staff: StaffCreate, db: sqlite3.Connection = Depends(get_db)):
@@ -2410,28 +2725,7 @@ def update_staff(staff_id: int, staff: StaffCreate, db: sqlite3.Connection = Dep
     if not updated:
         raise HTTPException(status_code=500, detail="Не удалось получить данные обновленного сотрудника")
     
-    # Формируем ответ - читаем из правильных колонок
-    return {
-        "id": updated["id"],
-        "email": updated["email"],
-        "first_name": updated["first_name"],
-        "last_name": updated["last_name"],
-        "middle_name": updated["middle_name"],
-        "phone": updated["phone"],
-        "position": updated["position"], # Возвращаем position
-        "description": updated["description"], # Возвращаем описание
-        "is_active": bool(updated["is_active"]),
-        "organization_id": updated["organization_id"],
-        "primary_organization_id": updated["primary_organization_id"],
-        "location_id": updated["location_id"],
-        "registration_address": updated["registration_address"], # Возвращаем из новой колонки
-        "actual_address": updated["actual_address"], # Возвращаем из новой колонки
-        "telegram_id": updated["telegram_id"], # Возвращаем из новой колонки
-        "vk": updated["vk"], # Возвращаем из новой колонки
-        "instagram": updated["instagram"], # Возвращаем из новой колонки
-        "created_at": updated["created_at"],
-        "updated_at": updated["updated_at"]
-    }
+    return row_response(updated, Staff)
 
 @app.delete("/staff/{staff_id}", response_model=dict)
 def delete_staff(staff_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -2462,6 +2756,180 @@ def delete_staff(staff_id: int, db: sqlite3.Connection = Depends(get_db)):
     
     return {"message": f"Сотрудник с ID {staff_id} и все связанные записи успешно удалены"}
 
+# ================== ПОИСК ==================
+
+class SearchResult(BaseModel):
+    entity_type: str  # staff, organization, division, section, function, position, vfp
+    id: int
+    title: str
+    snippet: str  # Фрагмент с совпадениями, выделенными <b></b>
+    rank: float  # bm25: чем меньше, тем релевантнее
+
+@app.get("/search", response_model=List[SearchResult])
+def search_entities(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Поисковый запрос; слова ищутся по началу"),
+    types: Optional[str] = Query(None, description="Типы через запятую, например staff,division"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_LIMIT, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (X-Next-Cursor)"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Полнотекстовый поиск по сотрудникам (ФИО, email, телефон, должность),
+    организациям (название, код, ИНН), подразделениям, отделам, функциям,
+    должностям и ЦКП. Результаты упорядочены по релевантности.
+    """
+    type_list = [name.strip() for name in types.split(",") if name.strip()] if types else None
+    try:
+        results, total, next_cursor = search(db, q, type_list, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {"X-Total-Count": str(total)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return FastJSONResponse(content=results, headers=headers)
+
+# ================== НАСТРОЙКА ЛОГИРОВАНИЯ И ТРАССИРОВКИ ==================
+
+class LoggingConfigUpdate(BaseModel):
+    """Изменение уровней логгеров и долей трассировки запросов."""
+    levels: Optional[Dict[str, str]] = None  # {"root": "INFO", "ofs_api": "DEBUG"}
+    default_sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    sample_rates: Optional[Dict[str, Optional[float]]] = None  # {"/staff": 0.1}, null — удалить
+    header_enabled: Optional[bool] = None  # Учитывать заголовок X-Trace: 1 от клиентов
+
+@app.get("/admin/logging")
+def get_logging_config(current_user: User = Depends(get_current_superuser)):
+    """
+    Текущие уровни логгеров и доли трассировки по префиксам путей
+    """
+    return tracing.get_config()
+
+@app.put("/admin/logging")
+def update_logging_config(config: LoggingConfigUpdate, current_user: User = Depends(get_current_superuser)):
+    """
+    Меняет уровни логгеров и доли трассировки без перезапуска сервера
+    """
+    try:
+        result = tracing.configure(config.levels, config.default_sample_rate, config.sample_rates,
+                                   config.header_enabled)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Пользователь {current_user.email} изменил настройки логирования: {result}")
+    return result
+
+# ================== МЕТРИКИ ==================
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Метрики в текстовом формате Prometheus
+    """
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Сбор метрик отключен")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+class MetricsConfigUpdate(BaseModel):
+    enabled: bool
+    reset: bool = False  # Обнулить накопленные значения
+
+@app.put("/admin/metrics")
+def update_metrics_config(config: MetricsConfigUpdate, current_user: User = Depends(get_current_superuser)):
+    """
+    Включает или выключает сбор метрик без перезапуска сервера
+    """
+    metrics.configure(enabled=config.enabled)
+    if config.reset:
+        metrics.reset()
+    logger.info(f"Пользователь {current_user.email} изменил сбор метрик: enabled={config.enabled}, reset={config.reset}")
+    return {"enabled": metrics.enabled()}
+
+# ================== МЕДЛЕННЫЕ ЗАПРОСЫ ==================
+
+class SlowQueryConfigUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    threshold_ms: Optional[float] = Field(None, ge=0)
+    capture_params: Optional[bool] = None  # Сохранять параметры запросов (кроме аутентификации)
+    reset: bool = False  # Обнулить накопленную статистику
+
+@app.get("/admin/slow-queries")
+def get_slow_queries(
+    limit: int = 20,
+    order_by: str = "total_ms",
+    current_user: User = Depends(get_current_superuser)
+):
+    """
+    Самые тяжелые SQL-запросы по отпечаткам: число выполнений, сколько из них
+    дольше порога, сумма, перцентили и максимум в мс, план и полные просмотры таблиц.
+    order_by: total_ms, p95_ms, max_ms, count или slow_count
+    """
+    try:
+        queries = slow_query_log.top(limit, order_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**slow_query_log.stats(), "queries": queries}
+
+@app.get("/admin/slow-queries/workload")
+def get_slow_query_workload(current_user: User = Depends(get_current_superuser)):
+    """
+    Снятая нагрузка для index_advisor: по одному запросу на отпечаток (параметры —
+    только при включенном capture_params), число выполнений и суммарное время
+    """
+    return slow_query_log.workload()
+
+@app.put("/admin/slow-queries")
+def update_slow_query_config(config: SlowQueryConfigUpdate, current_user: User = Depends(get_current_superuser)):
+    """
+    Меняет порог медленного запроса и включает/выключает сбор статистики
+    """
+    result = slow_query_log.configure(config.enabled, config.threshold_ms, config.capture_params)
+    if config.reset:
+        slow_query_log.reset()
+    logger.info(f"Пользователь {current_user.email} изменил настройки журнала медленных запросов: {result}")
+    return result
+
+# ================== КЭШ ОТВЕТОВ ==================
+
+@app.get("/admin/cache")
+def get_cache_stats(current_user: User = Depends(get_current_superuser)):
+    """
+    Счетчики кэша ответов: попадания, промахи, вытеснения, инвалидации, занятая память
+    """
+    return response_cache.stats()
+
+@app.delete("/admin/cache")
+def clear_cache(current_user: User = Depends(get_current_superuser)):
+    """
+    Очищает кэш ответов
+    """
+    response_cache.clear()
+    logger.info(f"Пользователь {current_user.email} очистил кэш ответов")
+    return {"message": "Кэш ответов очищен"}
+
+@app.get("/admin/auth")
+def get_auth_stats(current_user: User = Depends(get_current_superuser)):
+    """
+    Задержки аутентификации (вход, регистрация, проверка токена, bcrypt),
+    состояние пула хеширования и кэша токенов
+    """
+    return {
+        "latency": auth_metrics.snapshot(),
+        "password_hasher": password_hasher.stats(),
+        "token_cache": token_cache.stats(),
+    }
+
+# Статистика пула соединений
+@app.get("/db-info/pool")
+def get_db_pool_stats():
+    """
+    Возвращает статистику пула соединений с базой данных
+    """
+    stats = db_pool.stats()
+    stats["async_executor"] = async_db.stats()
+    return stats
+
 # Выводим информацию о базе данных
 @app.get("/db-info")
 def get_db_info():
@@ -2514,89 +2982,77 @@ def create_vfp(vfp: VFPCreate, db: sqlite3.Connection = Depends(get_db)):
     db.commit()
     
     vfp_id = cursor.lastrowid
+    vfp_rollup.apply(db, vfp_id)
     cursor.execute("SELECT * FROM valuable_final_products WHERE id = ?", (vfp_id,))
     row = cursor.fetchone()
     
-    return {
-        "id": row[0],
-        "entity_type": row[1],
-        "entity_id": row[2],
-        "name": row[3],
-        "description": row[4],
-        "metrics": json.loads(row[5]) if row[5] else None,
-        "status": row[6],
-        "progress": row[7],
-        "start_date": row[8],
-        "target_date": row[9],
-        "is_active": bool(row[10]),
-        "created_at": row[11],
-        "updated_at": row[12]
-    }
+    return row_response(row, VFP)
+
+class VFPRollup(BaseModel):
+    node_type: str  # all, organization, division, section
+    node_id: int
+    name: Optional[str] = None
+    vfp_count: int
+    progress: Optional[float] = None  # Средний progress активных ЦКП поддерева
+    status_counts: Dict[str, int]
+    metrics: Dict[str, float]  # Суммы числовых показателей metrics
+
+# Объявлен до /vfp/{vfp_id}, иначе путь /vfp/rollup совпал бы с ним
+@app.get("/vfp/rollup", response_model=List[VFPRollup])
+def get_vfp_rollup(
+    node_type: Optional[str] = Query(None, description=f"Тип узла: {', '.join(ROLLUP_NODE_TYPES)}"),
+    node_id: Optional[int] = Query(None, description="Один узел (вместе с node_type)"),
+    db: sqlite3.Connection = Depends(get_db)
+):
+    """
+    Сводка активных ЦКП по организациям, подразделениям и отделам с учетом
+    всех вложенных узлов: число ЦКП, средний прогресс, число по статусам
+    и суммы показателей. Без node_id — все узлы, у которых есть ЦКП.
+    """
+    try:
+        result = vfp_rollup.get(db, node_type, node_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Узел {node_type} с ID {node_id} не найден")
+    return FastJSONResponse(content=result)
 
 @app.get("/vfp/{vfp_id}", response_model=VFP)
-def get_vfp(vfp_id: int, db: sqlite3.Connection = Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM valuable_final_products WHERE id = ?", (vfp_id,))
-    row = cursor.fetchone()
+async def get_vfp(vfp_id: int, db: AsyncDatabase = Depends(get_async_db)):
+    row = await db.fetchone("SELECT * FROM valuable_final_products WHERE id = ?", (vfp_id,))
     
     if not row:
         raise HTTPException(status_code=404, detail="ЦКП не найден")
     
-    return {
-        "id": row[0],
-        "entity_type": row[1],
-        "entity_id": row[2],
-        "name": row[3],
-        "description": row[4],
-        "metrics": json.loads(row[5]) if row[5] else None,
-        "status": row[6],
-        "progress": row[7],
-        "start_date": row[8],
-        "target_date": row[9],
-        "is_active": bool(row[10]),
-        "created_at": row[11],
-        "updated_at": row[12]
-    }
+    return row_response(row, VFP)
+
+VFP_LISTING = Listing("valuable_final_products", VFP, default_columns=(
+    "id", "entity_type", "entity_id", "name", "description", "metrics", "status",
+    "progress", "start_date", "target_date", "is_active", "created_at", "updated_at"
+), json_columns=("metrics",))
 
 @app.get("/vfp/", response_model=List[VFP])
 def list_vfps(
     entity_type: Optional[str] = None,
     entity_id: Optional[int] = None,
     status: Optional[str] = None,
+    page: PageParams = Depends(),
     db: sqlite3.Connection = Depends(get_db)
 ):
-    cursor = db.cursor()
-    query = "SELECT * FROM valuable_final_products WHERE 1=1"
+    conditions = []
     params = []
-    
+
     if entity_type:
-        query += " AND entity_type = ?"
+        conditions.append("entity_type = ?")
         params.append(entity_type)
     if entity_id is not None:
-        query += " AND entity_id = ?"
+        conditions.append("entity_id = ?")
         params.append(entity_id)
     if status:
-        query += " AND status = ?"
+        conditions.append("status = ?")
         params.append(status)
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    
-    return [{
-        "id": row[0],
-        "entity_type": row[1],
-        "entity_id": row[2],
-        "name": row[3],
-        "description": row[4],
-        "metrics": json.loads(row[5]) if row[5] else None,
-        "status": row[6],
-        "progress": row[7],
-        "start_date": row[8],
-        "target_date": row[9],
-        "is_active": bool(row[10]),
-        "created_at": row[11],
-        "updated_at": row[12]
-    } for row in rows]
+
+    return paginate(db, VFP_LISTING, page, conditions, params)
 
 @app.put("/vfp/{vfp_id}", response_model=VFP)
 def update_vfp(vfp_id: int, vfp: VFPBase, db: sqlite3.Connection = Depends(get_db)):
@@ -2629,25 +3085,12 @@ def update_vfp(vfp_id: int, vfp: VFPBase, db: sqlite3.Connection = Depends(get_d
         vfp_id
     ))
     db.commit()
+    vfp_rollup.apply(db, vfp_id)
     
     cursor.execute("SELECT * FROM valuable_final_products WHERE id = ?", (vfp_id,))
     row = cursor.fetchone()
     
-    return {
-        "id": row[0],
-        "entity_type": row[1],
-        "entity_id": row[2],
-        "name": row[3],
-        "description": row[4],
-        "metrics": json.loads(row[5]) if row[5] else None,
-        "status": row[6],
-        "progress": row[7],
-        "start_date": row[8],
-        "target_date": row[9],
-        "is_active": bool(row[10]),
-        "created_at": row[11],
-        "updated_at": row[12]
-    }
+    return row_response(row, VFP)
 
 @app.delete("/vfp/{vfp_id}")
 def delete_vfp(vfp_id: int, db: sqlite3.Connection = Depends(get_db)):
@@ -2658,6 +3101,7 @@ def delete_vfp(vfp_id: int, db: sqlite3.Connection = Depends(get_db)):
     
     cursor.execute("DELETE FROM valuable_final_products WHERE id = ?", (vfp_id,))
     db.commit()
+    vfp_rollup.apply(db, vfp_id)
     
     return {"message": "ЦКП успешно удален"}
 
@@ -2681,28 +3125,21 @@ if __name__ == "__main__":
     uvicorn.run("full_api:app", host="127.0.0.1", port=8000, reload=True) 
 
 # API для локаций (чтение организаций с типом 'location')
-@app.get("/locations/", response_model=List[LocationInfo])
-def read_locations(db: sqlite3.Connection = Depends(get_db)):
+LOCATIONS_LISTING = Listing("organizations", LocationInfo, default_columns=("id", "name"), order_by="name")
+
+@app.get("/locations/", response_model=List[LocationInfo], dependencies=[etag_dependency("organizations")])
+def read_locations(
+    page: PageParams = Depends(),
+    db: sqlite3.Connection = Depends(get_db)
+):
     """
     Получить список организаций с типом 'location'.
     """
-    logger.info("[read_locations] Запрос списка локаций")
     try:
-        cursor = db.execute(
-            "SELECT id, name FROM organizations WHERE org_type = ? AND is_active = 1 ORDER BY name", 
-            ('location',)
+        return paginate(
+            db, LOCATIONS_LISTING, page,
+            ["org_type = ?", "is_active = 1"], ["location"]
         )
-        locations_list = cursor.fetchall()
-        
-        result = []
-        for loc in locations_list:
-            result.append({"id": loc["id"], "name": loc["name"]})
-            
-        logger.info(f"[read_locations] Найдено {len(result)} активных локаций.")
-        return result
     except sqlite3.Error as e:
         logger.error(f"[read_locations] Ошибка SQLite при запросе локаций: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка базы данных при получении локаций")
-    except Exception as e:
-        logger.error(f"[read_locations] Непредвиденная ошибка при запросе локаций: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера при получении локаций")
\ No newline at end of file
@@ -0,0 +1,380 @@
+"""
+Советник по составным индексам.
+
+Воспроизводит снятую нагрузку (GET /admin/slow-queries/workload или список
+запросов в JSON) на копии базы в памяти и предлагает индексы:
+
+1. По тексту каждого запроса определяются таблицы, колонки в условиях
+   равенства со значением (=, IN, IS), в условиях соединения (a.x = b.y),
+   диапазона (<, >, BETWEEN) и в ORDER BY.
+2. Для таблицы строятся кандидаты: колонки равенства (сначала те, что уже
+   образуют существующий индекс, — он расширяется, а не дублируется, затем
+   по убыванию избирательности) с колонкой диапазона или ORDER BY в конце,
+   а также по кандидату на каждую колонку соединения, за которой идут
+   колонки равенства.
+3. Каждый кандидат создается в копии базы, для всех запросов к таблице
+   повторно снимаются EXPLAIN QUERY PLAN и время выполнения. Выигрыш запроса
+   (с учетом числа его выполнений) засчитывается лучшему для него кандидату
+   на таблице; рекомендуются кандидаты, которые планировщик выбирает и
+   которые заметно ускоряют хотя бы один запрос.
+
+Разбор SQL эвристический (регулярные выражения), поэтому рекомендации нужно
+проверять; зато советник ничего не меняет в исходной базе.
+
+Запрос, выполняющийся дольше --timeout секунд, прерывается; его время
+до индекса считается равным таймауту (т.е. выигрыш занижен).
+
+    python index_advisor.py full_api_new.db workload.json [--repeat 20] [--timeout 5]
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+# Сколько раз выполнять запрос при замере (медленные — меньше, см. _REPEAT_BUDGET)
+DEFAULT_REPEAT = 20
+# Предельное время одного выполнения, секунды
+DEFAULT_TIMEOUT = 5.0
+# Суммарное время повторов одного замера, секунды
+_REPEAT_BUDGET = 1.0
+MAX_INDEX_COLUMNS = 4
+# Минимальное относительное ускорение хотя бы одного запроса
+MIN_SPEEDUP = 0.10
+
+_IDENTIFIER = r"[A-Za-z_]\w*"
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_COMMENT = re.compile(r"--[^\n]*")
+_TABLE_REF = re.compile(rf"\b(?:FROM|JOIN)\s+({_IDENTIFIER})(?:\s+(?:AS\s+)?({_IDENTIFIER}))?", re.IGNORECASE)
+_UPDATE_REF = re.compile(rf"^\s*(?:UPDATE|DELETE\s+FROM)\s+({_IDENTIFIER})", re.IGNORECASE)
+_COLUMN = rf"(?:({_IDENTIFIER})\.)?({_IDENTIFIER})"
+_PREDICATE = re.compile(
+    _COLUMN + r"\s*(==|=|IN\b|IS\b|<=|>=|<|>|BETWEEN\b)(?:\s*" + _COLUMN + r"\b(?!\s*[.(]))?",
+    re.IGNORECASE,
+)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\s+(.+?)(?=\bLIMIT\b|\bOFFSET\b|\)|$)", re.IGNORECASE | re.DOTALL)
+_BINDINGS = re.compile(r"uses (\d+)")
+_KEYWORDS = {
+    "where", "on", "join", "left", "right", "inner", "outer", "cross", "natural", "order", "group",
+    "limit", "union", "using", "set", "values", "having", "window", "select", "as",
+}
+_EQUALITY = {"=", "==", "in", "is"}
+
+
+@dataclass
+class WorkloadQuery:
+    sql: str
+    params: Any = None
+    count: int = 1
+
+
+@dataclass
+class QueryShape:
+    """Колонки запроса по таблицам: равенства, соединения, диапазоны, сортировка."""
+    equality: Dict[str, List[str]] = field(default_factory=dict)
+    joins: Dict[str, List[str]] = field(default_factory=dict)
+    ranges: Dict[str, List[str]] = field(default_factory=dict)
+    order_by: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def tables(self) -> Set[str]:
+        return set(self.equality) | set(self.joins) | set(self.ranges) | set(self.order_by)
+
+
+@dataclass
+class Measurement:
+    plan: List[str]
+    ms: Optional[float]
+    timed_out: bool = False
+
+
+@dataclass
+class Recommendation:
+    table: str
+    columns: Tuple[str, ...]
+    gain_ms: float = 0.0
+    # SQL запроса -> (до, после)
+    queries: Dict[str, Tuple[Measurement, Measurement]] = field(default_factory=dict)
+    # Существующие индексы, которые становятся префиксом нового
+    redundant: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return "idx_" + self.table + "_" + "_".join(self.columns)
+
+    @property
+    def create_sql(self) -> str:
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table}({', '.join(self.columns)});"
+
+
+def load_workload(path: str) -> List[WorkloadQuery]:
+    """
+    Нагрузка из файла: ответ /admin/slow-queries/workload, ответ /admin/slow-queries
+    (только отпечатки, параметры подставляются как NULL) или список строк SQL.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("queries", [])
+    workload = []
+    for item in data:
+        if isinstance(item, str):
+            workload.append(WorkloadQuery(item))
+        else:
+            sql = item.get("sql") or item.get("fingerprint")
+            workload.append(WorkloadQuery(sql, item.get("params"), item.get("count", 1)))
+    return workload
+
+
+class Schema:
+    """Колонки, первичные ключи, индексы и избирательность колонок базы."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.columns: Dict[str, List[str]] = {}
+        self.rowid: Dict[str, Optional[str]] = {}
+        self.indexes: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        self._distinct: Dict[Tuple[str, str], int] = {}
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        for table in tables:
+            info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+            self.columns[table] = [row[1].lower() for row in info]
+            pk = [row for row in info if row[5]]
+            self.rowid[table] = pk[0][1].lower() if len(pk) == 1 and pk[0][2].upper() == "INTEGER" else None
+            self.indexes[table] = {}
+            for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+                columns = tuple(row[2].lower() for row in conn.execute(f"PRAGMA index_info({index[1]})")
+                                if row[2] is not None)
+                self.indexes[table][index[1]] = columns
+
+    def distinct(self, table: str, column: str) -> int:
+        key = (table, column)
+        if key not in self._distinct:
+            self._distinct[key] = self.conn.execute(f"SELECT COUNT(DISTINCT {column}) FROM {table}").fetchone()[0]
+        return self._distinct[key]
+
+    def is_indexed_prefix(self, table: str, columns: Sequence[str]) -> bool:
+        """Есть ли индекс, начинающийся с этих колонок (кандидат ничего не добавит)."""
+        columns = tuple(columns)
+        return any(index[:len(columns)] == columns for index in self.indexes.get(table, {}).values())
+
+
+def analyze_query(sql: str, schema: Schema) -> QueryShape:
+    """Эвристически определяет колонки условий и сортировки по таблицам."""
+    text = _COMMENT.sub(" ", _STRING_LITERAL.sub("?", sql))
+    aliases: Dict[str, str] = {}
+    tables: List[str] = []
+    refs = [(m.group(1), m.group(2)) for m in _TABLE_REF.finditer(text)]
+    update = _UPDATE_REF.match(text)
+    if update:
+        refs.append((update.group(1), None))
+    for table, alias in refs:
+        table = table.lower()
+        if table not in schema.columns:
+            continue  # CTE, json_each и т.п.
+        tables.append(table)
+        aliases[table] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias.lower()] = table
+
+    def resolve(qualifier: Optional[str], column: str) -> Optional[str]:
+        column = column.lower()
+        if qualifier:
+            table = aliases.get(qualifier.lower())
+            return table if table and column in schema.columns[table] else None
+        owners = {table for table in tables if column in schema.columns[table]}
+        return owners.pop() if len(owners) == 1 else None
+
+    shape = QueryShape()
+
+    def add(target: Dict[str, List[str]], table: str, column: str):
+        if column != schema.rowid.get(table) and column not in target.setdefault(table, []):
+            target[table].append(column)
+
+    for match in _PREDICATE.finditer(text):
+        table = resolve(match.group(1), match.group(2))
+        operator = match.group(3).lower()
+        other = resolve(match.group(4), match.group(5)) if match.group(5) else None
+        if other is None and match.group(4) and match.group(4).lower() not in aliases:
+            other = match.group(4).lower()  # колонка CTE или табличной функции
+        if operator in ("=", "==") and (other or match.group(4)):
+            # Соединение: индекс полезен на обеих сторонах
+            if table:
+                add(shape.joins, table, match.group(2).lower())
+            if other in schema.columns:
+                add(shape.joins, other, match.group(5).lower())
+        elif table:
+            add(shape.equality if operator in _EQUALITY else shape.ranges, table, match.group(2).lower())
+    for match in _ORDER_BY.finditer(text):
+        for term in match.group(1).split(","):
+            column = re.match(r"\s*" + _COLUMN + r"\s*(?:ASC|DESC)?\s*$", term, re.IGNORECASE)
+            table = resolve(column.group(1), column.group(2)) if column else None
+            if table:
+                shape.order_by.setdefault(table, []).append(column.group(2).lower())
+    return shape
+
+
+def _ordered_equality(table: str, columns: Sequence[str], schema: Schema) -> List[str]:
+    """Колонки равенства: сначала расширяемый существующий индекс, затем по избирательности."""
+    base: Tuple[str, ...] = ()
+    for index in schema.indexes.get(table, {}).values():
+        if set(index) <= set(columns) and (
+                len(index) > len(base)
+                or len(index) == len(base) and base and schema.distinct(table, index[0]) > schema.distinct(table, base[0])):
+            base = index
+    rest = sorted((c for c in columns if c not in base), key=lambda c: schema.distinct(table, c), reverse=True)
+    return list(base) + rest
+
+
+def candidate_indexes(table: str, shape: QueryShape, schema: Schema) -> List[Tuple[str, ...]]:
+    """Колонки индексов-кандидатов для таблицы запроса."""
+    ranges = shape.ranges.get(table, [])
+    equality = [c for c in shape.equality.get(table, []) if c not in ranges]
+    candidates = []
+    if equality or ranges:
+        columns = _ordered_equality(table, equality, schema)
+        if ranges:
+            columns.append(ranges[0])
+        elif shape.order_by.get(table) and set(shape.order_by) == {table}:
+            columns.extend(c for c in shape.order_by[table] if c not in columns and c != schema.rowid.get(table))
+        candidates.append(tuple(columns))
+    for join in shape.joins.get(table, []):
+        candidates.append((join,) + tuple(c for c in _ordered_equality(table, equality, schema) if c != join))
+    return [
+        columns[:MAX_INDEX_COLUMNS] for columns in dict.fromkeys(candidates)
+        if not schema.is_indexed_prefix(table, columns[:MAX_INDEX_COLUMNS])
+    ]
+
+
+def _bind(conn: sqlite3.Connection, sql: str, params: Any) -> Any:
+    """Параметры для запроса: заданные или NULL по числу ? (для отпечатков)."""
+    if params is not None:
+        return params
+    try:
+        conn.execute("EXPLAIN QUERY PLAN " + sql, ()).fetchall()
+        return ()
+    except sqlite3.ProgrammingError as e:
+        match = _BINDINGS.search(str(e))
+        if not match:
+            raise
+        return [None] * int(match.group(1))
+
+
+def measure(conn: sqlite3.Connection, query: WorkloadQuery, repeat: int,
+            timeout: float = DEFAULT_TIMEOUT) -> Measurement:
+    """План и медианное время запроса; изменяющие запросы откатываются."""
+    sql = query.sql.replace("IN (...)", "IN (?)")
+    params = _bind(conn, sql, query.params)
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    timings: List[float] = []
+    while len(timings) < repeat and sum(timings) < _REPEAT_BUDGET:
+        deadline = time.perf_counter() + timeout
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+        conn.execute("SAVEPOINT advisor")
+        started = time.perf_counter()
+        try:
+            conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                return Measurement(plan, timeout * 1000, timed_out=True)
+            return Measurement(plan, None)
+        except sqlite3.Error:
+            return Measurement(plan, None)
+        finally:
+            timings.append(time.perf_counter() - started)
+            conn.set_progress_handler(None, 0)
+            conn.execute("ROLLBACK TO advisor")
+            conn.execute("RELEASE advisor")
+    return Measurement(plan, statistics.median(timings) * 1000)
+
+
+def advise(source: sqlite3.Connection, workload: Sequence[WorkloadQuery],
+           repeat: int = DEFAULT_REPEAT, timeout: float = DEFAULT_TIMEOUT) -> List[Recommendation]:
+    """Рекомендации индексов для нагрузки, по убыванию суммарного выигрыша (мс)."""
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    source.backup(conn)
+    try:
+        schema = Schema(conn)
+        shapes = [analyze_query(query.sql, schema) for query in workload]
+        baseline = [measure(conn, query, repeat, timeout) for query in workload]
+
+        candidates: Dict[Tuple[str, Tuple[str, ...]], Recommendation] = {}
+        for shape in shapes:
+            for table in shape.tables:
+                for columns in candidate_indexes(table, shape, schema):
+                    candidates.setdefault((table, columns), Recommendation(table, columns))
+
+        # Запрос -> таблица -> лучший для него кандидат и время с ним
+        best: Dict[Tuple[int, str], Tuple[Recommendation, Measurement]] = {}
+        for recommendation in candidates.values():
+            conn.execute(recommendation.create_sql)
+            for number, (query, shape, before) in enumerate(zip(workload, shapes, baseline)):
+                if recommendation.table not in shape.tables or before.ms is None:
+                    continue
+                after = measure(conn, query, repeat, timeout)
+                if after.ms is None or not any(recommendation.name in step for step in after.plan):
+                    continue
+                key = (number, recommendation.table)
+                if key not in best or after.ms < best[key][1].ms:
+                    best[key] = (recommendation, after)
+            conn.execute(f"DROP INDEX {recommendation.name}")
+
+        recommended: Dict[str, Recommendation] = {}
+        for (number, _), (recommendation, after) in best.items():
+            query, before = workload[number], baseline[number]
+            if before.ms <= 0 or 1 - after.ms / before.ms < MIN_SPEEDUP:
+                continue
+            recommendation.queries[query.sql] = (before, after)
+            recommendation.gain_ms += (before.ms - after.ms) * query.count
+            recommended[recommendation.name] = recommendation
+        for recommendation in recommended.values():
+            recommendation.redundant = [
+                name for name, columns in schema.indexes[recommendation.table].items()
+                if not name.startswith("sqlite_autoindex") and recommendation.columns[:len(columns)] == columns
+            ]
+        return sorted(recommended.values(), key=lambda r: r.gain_ms, reverse=True)
+    finally:
+        conn.close()
+
+
+def _short(sql: str, width: int = 100) -> str:
+    text = " ".join(sql.split())
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Рекомендации составных индексов по снятой нагрузке")
+    parser.add_argument("database", help="файл базы SQLite (не изменяется)")
+    parser.add_argument("workload", help="JSON с нагрузкой (/admin/slow-queries/workload)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="повторов каждого запроса при замере")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="предельное время запроса, с")
+    args = parser.parse_args(argv)
+
+    source = sqlite3.connect(f"file:{args.database}?mode=ro", uri=True)
+    try:
+        recommendations = advise(source, load_workload(args.workload), args.repeat, args.timeout)
+    finally:
+        source.close()
+
+    if not recommendations:
+        print("Рекомендаций нет: планы запросов нагрузки не улучшаются составными индексами")
+        return
+    for recommendation in recommendations:
+        print(f"\n{recommendation.create_sql}  -- выигрыш {recommendation.gain_ms:.1f} мс на нагрузку")
+        for sql, (before, after) in recommendation.queries.items():
+            mark = ">" if before.timed_out else " "
+            print(f" {mark}{before.ms:9.3f} -> {after.ms:8.3f} мс  {_short(sql)}")
+            print(f"      было: {'; '.join(before.plan)}")
+            print(f"      стало: {'; '.join(after.plan)}")
+        for name in recommendation.redundant:
+            print(f"  индекс {name} становится префиксом нового и может быть удален")
+
+
+if __name__ == "__main__":
+    main()
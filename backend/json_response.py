@@ -0,0 +1,89 @@
+"""
+Быстрая сериализация JSON-ответов через orjson.
+
+FastJSONResponse — замена стандартного JSONResponse: если установлен orjson,
+ответ кодируется им (datetime/date, Enum, UUID и dataclass он поддерживает сам,
+Decimal и pydantic-модели обрабатывает _default). Без orjson, а также при
+OFS_JSON_BACKEND=json используется стандартный json с тем же _default, поэтому
+содержимое ответа от выбора библиотеки не зависит.
+
+Подключение:
+- для всего приложения — FastAPI(default_response_class=FastJSONResponse);
+- для отдельного роутера или маршрута — APIRouter(default_response_class=...)
+  или @app.get(..., response_class=FastJSONResponse);
+- готовые ответы row_mapper и pagination строятся этим же классом.
+
+Библиотека переключается на лету через configure(use_orjson=...).
+"""
+
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Optional
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+# "orjson" (по умолчанию, если установлен) или "json"
+JSON_BACKEND = os.environ.get("OFS_JSON_BACKEND", "orjson").lower()
+
+_use_orjson = ORJSON_AVAILABLE and JSON_BACKEND != "json"
+
+
+def _decimal(value: Decimal):
+    # Как fastapi.encoders.decimal_encoder: целые — int, остальные — float
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+
+def _default(obj: Any):
+    """Типы, которые не умеет кодировать сама библиотека JSON."""
+    if isinstance(obj, Decimal):
+        return _decimal(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Объект типа {type(obj).__name__} не сериализуется в JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """Кодирует content в JSON (UTF-8, без пробелов, как JSONResponse)."""
+    if _use_orjson:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_enabled() -> bool:
+    return _use_orjson
+
+
+def configure(use_orjson: Optional[bool] = None) -> bool:
+    """Включает или выключает orjson; без установленного orjson остается стандартный json."""
+    global _use_orjson
+    if use_orjson is not None:
+        _use_orjson = use_orjson and ORJSON_AVAILABLE
+    return _use_orjson
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse, кодирующий содержимое через orjson (если он доступен и включен)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,292 @@
+"""
+Метрики производительности в текстовом формате Prometheus (/metrics).
+
+MetricsMiddleware (чистый ASGI, без буферизации ответа) на каждый запрос
+записывает:
+- ofs_http_requests_total{method, route, status} — число запросов;
+- ofs_http_request_duration_seconds{method, route} — гистограмма длительности
+  (для потоковых ответов — до отправки последнего фрагмента);
+- ofs_http_response_size_bytes{method, route} — гистограмма размера тела;
+- ofs_http_requests_in_flight — запросы, обрабатываемые прямо сейчас;
+- ofs_sql_queries_per_request / ofs_sql_seconds_per_request{method, route} —
+  число SQL-выражений и их суммарное время за запрос.
+
+route — шаблон пути ("/staff/{staff_id}"), а не сам путь, чтобы число рядов
+не росло с числом идентификаторов. SQL-выражения считаются подписчиком
+sql_trace (соединения пула — TracingConnection); кроме того, каждое выражение
+попадает в ofs_sql_statement_duration_seconds{operation}.
+
+Метрики отключаются переменной OFS_METRICS=0 или configure(enabled=False):
+middleware тогда сразу передает запрос дальше, а SQL не замеряется.
+Сторонние счетчики (пул соединений, кэши) добавляются через add_collector.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+import sql_trace
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_ENABLED = os.environ.get("OFS_METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+# Шаблон для запросов, не совпавших ни с одним маршрутом (404)
+UNMATCHED_ROUTE = "<unmatched>"
+
+_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), value: float = 1) -> None:
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def samples(self):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+                for key, value in sorted(self._values.items())]
+
+    def reset(self):
+        self._values.clear()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, help):
+        super().__init__(name, help)
+        self.value = 0
+
+    def inc(self, value: float = 1) -> None:
+        with _lock:
+            self.value += value
+
+    def dec(self, value: float = 1) -> None:
+        with _lock:
+            self.value -= value
+
+    def samples(self):
+        return [f"{self.name} {_number(self.value)}"]
+
+    def reset(self):
+        self.value = 0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам (последняя — +Inf), сумма]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+    def reset(self):
+        self._values.clear()
+
+
+REQUESTS = Counter("ofs_http_requests_total", "Число HTTP-запросов", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("ofs_http_request_duration_seconds", "Длительность обработки запроса, с",
+                            ("method", "route"), LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram("ofs_http_response_size_bytes", "Размер тела ответа, байт",
+                           ("method", "route"), SIZE_BUCKETS)
+IN_FLIGHT = Gauge("ofs_http_requests_in_flight", "Запросы в обработке")
+SQL_PER_REQUEST = Histogram("ofs_sql_queries_per_request", "Число SQL-выражений за запрос",
+                            ("method", "route"), QUERY_COUNT_BUCKETS)
+SQL_SECONDS_PER_REQUEST = Histogram("ofs_sql_seconds_per_request", "Суммарное время SQL за запрос, с",
+                                    ("method", "route"), SQL_BUCKETS)
+SQL_STATEMENT_SECONDS = Histogram("ofs_sql_statement_duration_seconds", "Длительность SQL-выражения, с",
+                                  ("operation",), SQL_BUCKETS)
+
+_METRICS: List[Metric] = [
+    REQUESTS, REQUEST_SECONDS, RESPONSE_BYTES, IN_FLIGHT,
+    SQL_PER_REQUEST, SQL_SECONDS_PER_REQUEST, SQL_STATEMENT_SECONDS,
+]
+
+# Сторонние источники: функция возвращает {метки: значение} или число
+_collectors: List[Tuple[str, str, str, Sequence[str], Callable]] = []
+
+# [число выражений, суммарное время] текущего запроса
+_request_sql: ContextVar[Optional[list]] = ContextVar("ofs_request_sql", default=None)
+
+_enabled = False
+
+
+def add_collector(name: str, help: str, fn: Callable, labelnames: Sequence[str] = (),
+                  type: str = "gauge") -> None:
+    """Метрика, значение которой вычисляется при каждом запросе /metrics."""
+    _collectors.append((name, help, type, tuple(labelnames), fn))
+
+
+def _operation(sql: str) -> str:
+    head = sql.lstrip()[:8].split(None, 1)
+    return head[0].upper() if head else ""
+
+
+def _on_statement(sql: str, parameters, seconds: float) -> None:
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+    SQL_STATEMENT_SECONDS.observe((_operation(sql),), seconds)
+
+
+def configure(enabled: Optional[bool] = None) -> bool:
+    """Включает или выключает сбор метрик (вместе с замером SQL)."""
+    global _enabled
+    if enabled is not None:
+        _enabled = enabled
+        if enabled:
+            sql_trace.add_listener(_on_statement)
+        else:
+            sql_trace.remove_listener(_on_statement)
+    return _enabled
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        for metric in _METRICS:
+            metric.reset()
+
+
+def route_template(scope) -> str:
+    """Шаблон маршрута запроса; для ответов из кэша маршрут ищется по таблице маршрутов."""
+    route = scope.get("route")
+    if route is None:
+        app = scope.get("app")
+        for candidate in getattr(getattr(app, "router", None), "routes", ()):
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def render() -> str:
+    lines: List[str] = []
+    with _lock:
+        for metric in _METRICS:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+    for name, help, type, labelnames, fn in _collectors:
+        value = fn()
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {type}")
+        items: Iterable = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in items:
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            lines.append(f"{name}{_labels(labelnames, labels)} {_number(sample)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: длительность, размер ответа и SQL каждого HTTP-запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state = {"status": 500, "size": 0}
+        sql = [0, 0.0]
+        token = _request_sql.set(sql)
+        IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_sql.reset(token)
+            IN_FLIGHT.dec()
+            labels = (scope["method"], route_template(scope))
+            REQUESTS.inc(labels + (str(state["status"]),))
+            REQUEST_SECONDS.observe(labels, time.perf_counter() - started)
+            RESPONSE_BYTES.observe(labels, state["size"])
+            SQL_PER_REQUEST.observe(labels, sql[0])
+            SQL_SECONDS_PER_REQUEST.observe(labels, sql[1])
+
+
+configure(METRICS_ENABLED)
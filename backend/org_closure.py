@@ -0,0 +1,133 @@
+"""
+Запросы к таблицам замыканий (closure tables) организаций и подразделений.
+
+Таблицы organization_closure и division_closure (см. complete_schema.py)
+поддерживаются триггерами при создании, перемещении и удалении записей.
+Этот модуль дает индексные запросы «все потомки», «все предки», «размер
+поддерева», «X внутри Y» и команду полной перестройки для существующих баз:
+
+    python org_closure.py [путь_к_базе]
+"""
+
+import logging
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("ofs_api.org_closure")
+
+# Иерархические таблицы и соответствующие им таблицы замыканий
+CLOSURE_TABLES: Dict[str, str] = {
+    "organizations": "organization_closure",
+    "divisions": "division_closure",
+}
+
+
+def _closure_table(table: str) -> str:
+    try:
+        return CLOSURE_TABLES[table]
+    except KeyError:
+        raise ValueError(f"Для таблицы {table} нет таблицы замыканий")
+
+
+def get_descendant_ids(db: sqlite3.Connection, table: str, node_id: int,
+                       include_self: bool = False, max_depth: Optional[int] = None) -> List[int]:
+    """Возвращает id всех потомков вершины (ближайшие первыми)."""
+    query = f"SELECT descendant_id FROM {_closure_table(table)} WHERE ancestor_id = ? AND depth >= ?"
+    params = [node_id, 0 if include_self else 1]
+    if max_depth is not None:
+        query += " AND depth <= ?"
+        params.append(max_depth)
+    query += " ORDER BY depth, descendant_id"
+    return [row[0] for row in db.execute(query, params)]
+
+
+def get_ancestor_ids(db: sqlite3.Connection, table: str, node_id: int,
+                     include_self: bool = False) -> List[int]:
+    """Возвращает id всех предков вершины от непосредственного родителя до корня."""
+    rows = db.execute(
+        f"SELECT ancestor_id FROM {_closure_table(table)} "
+        f"WHERE descendant_id = ? AND depth >= ? ORDER BY depth",
+        (node_id, 0 if include_self else 1)
+    )
+    return [row[0] for row in rows]
+
+
+def subtree_size(db: sqlite3.Connection, table: str, node_id: int) -> int:
+    """Количество вершин в поддереве, включая саму вершину."""
+    row = db.execute(
+        f"SELECT COUNT(*) FROM {_closure_table(table)} WHERE ancestor_id = ?", (node_id,)
+    ).fetchone()
+    return row[0]
+
+
+def is_descendant(db: sqlite3.Connection, table: str, node_id: int, ancestor_id: int) -> bool:
+    """Проверяет, находится ли node_id внутри поддерева ancestor_id (или совпадает с ним)."""
+    row = db.execute(
+        f"SELECT 1 FROM {_closure_table(table)} WHERE ancestor_id = ? AND descendant_id = ?",
+        (ancestor_id, node_id)
+    ).fetchone()
+    return row is not None
+
+
+def rebuild_closure(db: sqlite3.Connection, table: Optional[str] = None) -> Dict[str, int]:
+    """
+    Полностью перестраивает таблицы замыканий по текущим значениям parent_id.
+    Записи, входящие в цикл, получают только ссылку на себя.
+    Возвращает количество строк в каждой перестроенной таблице.
+    """
+    tables = [table] if table else list(CLOSURE_TABLES)
+    result = {}
+    for name in tables:
+        closure = _closure_table(name)
+        db.execute(f"DELETE FROM {closure}")
+        # Обход от каждой вершины вверх по parent_id; путь в виде ',id,' защищает от циклов
+        db.execute(f"""
+            INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE chain(descendant_id, ancestor_id, depth, path) AS (
+                SELECT id, id, 0, ',' || id || ',' FROM {name}
+                UNION ALL
+                SELECT chain.descendant_id, t.parent_id, chain.depth + 1,
+                       chain.path || t.parent_id || ','
+                FROM chain
+                JOIN {name} t ON t.id = chain.ancestor_id
+                JOIN {name} parent ON parent.id = t.parent_id
+                WHERE instr(chain.path, ',' || t.parent_id || ',') = 0
+            )
+            SELECT ancestor_id, descendant_id, depth FROM chain
+        """)
+        result[closure] = db.execute(f"SELECT COUNT(*) FROM {closure}").fetchone()[0]
+        logger.info(f"Таблица замыканий {closure} перестроена: {result[closure]} строк")
+    db.commit()
+    return result
+
+
+def ensure_closure(db: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Перестраивает таблицы замыканий, если они не соответствуют данным
+    (например, база создана до появления таблиц замыканий).
+    """
+    rebuilt = {}
+    for name, closure in CLOSURE_TABLES.items():
+        nodes = db.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        self_links = db.execute(f"SELECT COUNT(*) FROM {closure} WHERE depth = 0").fetchone()[0]
+        if nodes != self_links:
+            logger.info(f"Таблица замыканий {closure} не соответствует {name} ({self_links} из {nodes}), перестраиваем")
+            rebuilt.update(rebuild_closure(db, name))
+    return rebuilt
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "full_api_new.db"
+
+    from complete_schema import ORGANIZATION_CLOSURE_SCHEMA, DIVISION_CLOSURE_SCHEMA
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(ORGANIZATION_CLOSURE_SCHEMA)
+        conn.executescript(DIVISION_CLOSURE_SCHEMA)
+        for closure, rows in rebuild_closure(conn).items():
+            print(f"{closure}: {rows} строк")
+    finally:
+        conn.close()
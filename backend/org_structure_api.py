@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 import sqlite3
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from db_pool import get_pool
+from org_tree import build_org_hierarchy
+from staff_tree import build_staff_tree
+from etag import conditional_get
+
+DB_PATH = "full_api_new.db"
 
 # Создаем свою функцию для получения соединения с БД
 def get_db():
-    """Предоставляет соединение с базой данных."""
-    DB_PATH = "full_api_new.db"
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Предоставляет соединение с базой данных из общего пула."""
+    pool = get_pool(DB_PATH)
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
 
 router = APIRouter(
     prefix="/org-structure",
@@ -36,6 +41,7 @@ class StaffNode(BaseModel):
     position: str
     email: Optional[str] = None
     relations: Optional[List[Dict[str, Any]]] = []
+    children: Optional[List[Any]] = []
 
 class MatrixRelation(BaseModel):
     id: int
@@ -48,339 +54,37 @@ class MatrixRelation(BaseModel):
     extra_info: Optional[str] = None
 
 # API эндпоинты для организационной структуры
-@router.get("/hierarchy", response_model=List[OrgStructureNode])
+# Иерархия строится из этих таблиц; при неизменных версиях отвечаем 304 по ETag
+HIERARCHY_TABLES = ("organizations", "divisions", "division_sections", "sections", "section_functions", "functions")
+
+@router.get("/hierarchy", response_model=List[OrgStructureNode],
+            dependencies=[Depends(conditional_get(get_db, *HIERARCHY_TABLES))])
 def get_org_hierarchy(db: sqlite3.Connection = Depends(get_db)):
     """
     Получает иерархическую структуру организации.
     Структура включает организации, подразделения, отделы.
+    Все сущности загружаются фиксированным числом пакетных запросов (см. org_tree).
     """
-    cursor = db.cursor()
-    
-    # Получаем все организации верхнего уровня (без parent_id или parent_id = NULL)
-    cursor.execute("""
-        SELECT id, name, code, org_type, description
-        FROM organizations
-        WHERE parent_id IS NULL
-        ORDER BY name
-    """)
-    
-    top_orgs = cursor.fetchall()
-    result = []
-    
-    # Для каждой организации верхнего уровня строим дерево
-    for org in top_orgs:
-        org_node = build_org_tree(db, org)
-        result.append(org_node)
-    
-    return result
-
-def build_org_tree(db, org):
-    """Рекурсивно строит дерево организационной структуры"""
-    org_id, name, code, org_type, desc = org
-    
-    # Создаем узел для текущей организации
-    node = {
-        "id": org_id,
-        "name": name,
-        "code": code,
-        "entity_type": "organization",
-        "org_type": org_type,
-        "children": []
-    }
-    
-    cursor = db.cursor()
-    
-    # Получаем дочерние организации
-    cursor.execute("""
-        SELECT id, name, code, org_type, description
-        FROM organizations
-        WHERE parent_id = ?
-        ORDER BY name
-    """, (org_id,))
-    
-    child_orgs = cursor.fetchall()
-    for child_org in child_orgs:
-        child_node = build_org_tree(db, child_org)
-        node["children"].append(child_node)
-    
-    # Если это HOLDING или LEGAL_ENTITY, получаем связанные подразделения
-    if org_type in ["holding", "legal_entity"]:
-        cursor.execute("""
-            SELECT id, name, code, description
-            FROM divisions
-            WHERE organization_id = ?
-            AND parent_id IS NULL
-            ORDER BY name
-        """, (org_id,))
-        
-        divisions = cursor.fetchall()
-        for div in divisions:
-            div_id, div_name, div_code, div_desc = div
-            div_node = {
-                "id": div_id,
-                "name": div_name,
-                "code": div_code,
-                "entity_type": "division",
-                "children": []
-            }
-            
-            # Получаем отделы этого подразделения
-            cursor.execute("""
-                SELECT s.id, s.name, s.code, s.description
-                FROM sections s
-                JOIN division_sections ds ON s.id = ds.section_id
-                WHERE ds.division_id = ?
-                ORDER BY s.name
-            """, (div_id,))
-            
-            sections = cursor.fetchall()
-            for section in sections:
-                sec_id, sec_name, sec_code, sec_desc = section
-                sec_node = {
-                    "id": sec_id,
-                    "name": sec_name,
-                    "code": sec_code,
-                    "entity_type": "section",
-                    "children": []
-                }
-                
-                # Получаем функции этого отдела
-                cursor.execute("""
-                    SELECT f.id, f.name, f.code, f.description
-                    FROM functions f
-                    JOIN section_functions sf ON f.id = sf.function_id
-                    WHERE sf.section_id = ?
-                    ORDER BY f.name
-                """, (sec_id,))
-                
-                functions = cursor.fetchall()
-                for func in functions:
-                    func_id, func_name, func_code, func_desc = func
-                    func_node = {
-                        "id": func_id,
-                        "name": func_name,
-                        "code": func_code,
-                        "entity_type": "function",
-                        "children": []
-                    }
-                    
-                    sec_node["children"].append(func_node)
-                
-                div_node["children"].append(sec_node)
-            
-            # Получаем дочерние подразделения
-            cursor.execute("""
-                SELECT id, name, code, description
-                FROM divisions
-                WHERE parent_id = ?
-                ORDER BY name
-            """, (div_id,))
-            
-            child_divisions = cursor.fetchall()
-            for child_div in child_divisions:
-                child_div_id, child_div_name, child_div_code, child_div_desc = child_div
-                child_div_node = build_division_tree(db, child_div)
-                div_node["children"].append(child_div_node)
-                
-            node["children"].append(div_node)
-    
-    return node
-
-def build_division_tree(db, division):
-    """Рекурсивно строит дерево подразделений"""
-    div_id, div_name, div_code, div_desc = division
-    
-    div_node = {
-        "id": div_id,
-        "name": div_name,
-        "code": div_code,
-        "entity_type": "division",
-        "children": []
-    }
-    
-    cursor = db.cursor()
-    
-    # Получаем отделы этого подразделения
-    cursor.execute("""
-        SELECT s.id, s.name, s.code, s.description
-        FROM sections s
-        JOIN division_sections ds ON s.id = ds.section_id
-        WHERE ds.division_id = ?
-        ORDER BY s.name
-    """, (div_id,))
-    
-    sections = cursor.fetchall()
-    for section in sections:
-        sec_id, sec_name, sec_code, sec_desc = section
-        sec_node = {
-            "id": sec_id,
-            "name": sec_name,
-            "code": sec_code,
-            "entity_type": "section",
-            "children": []
-        }
-        
-        # Получаем функции этого отдела
-        cursor.execute("""
-            SELECT f.id, f.name, f.code, f.description
-            FROM functions f
-            JOIN section_functions sf ON f.id = sf.function_id
-            WHERE sf.section_id = ?
-            ORDER BY f.name
-        """, (sec_id,))
-        
-        functions = cursor.fetchall()
-        for func in functions:
-            func_id, func_name, func_code, func_desc = func
-            func_node = {
-                "id": func_id,
-                "name": func_name,
-                "code": func_code,
-                "entity_type": "function",
-                "children": []
-            }
-            
-            sec_node["children"].append(func_node)
-        
-        div_node["children"].append(sec_node)
-    
-    # Получаем дочерние подразделения
-    cursor.execute("""
-        SELECT id, name, code, description
-        FROM divisions
-        WHERE parent_id = ?
-        ORDER BY name
-    """, (div_id,))
-    
-    child_divisions = cursor.fetchall()
-    for child_div in child_divisions:
-        child_div_node = build_division_tree(db, child_div)
-        div_node["children"].append(child_div_node)
-    
-    return div_node
+    return build_org_hierarchy(db)
 
 @router.get("/staff-tree", response_model=List[StaffNode])
-def get_staff_hierarchy(db: sqlite3.Connection = Depends(get_db)):
+def get_staff_hierarchy(
+    root_id: Optional[int] = None,
+    max_depth: Optional[int] = Query(None, ge=0),
+    db: sqlite3.Connection = Depends(get_db)
+):
     """
     Получает иерархию сотрудников на основе функциональных отношений.
     Показывает административное подчинение и другие типы отношений.
+    root_id — построить поддерево конкретного сотрудника,
+    max_depth — ограничить глубину (1 — только прямые подчиненные).
     """
-    cursor = db.cursor()
-    
-    # Находим топ-менеджеров (тех, кто не имеет менеджеров с типом отношения 'administrative')
-    cursor.execute("""
-        SELECT s.id, s.first_name, s.last_name, s.email 
-        FROM staff s
-        WHERE s.id NOT IN (
-            SELECT subordinate_id 
-            FROM functional_relations 
-            WHERE relation_type = 'administrative' AND is_active = 1
-        )
-        AND s.is_active = 1
-        ORDER BY s.last_name, s.first_name
-    """)
-    
-    top_managers = cursor.fetchall()
-    result = []
-    
-    # Для каждого топ-менеджера строим дерево подчиненных
-    for manager in top_managers:
-        manager_id, first_name, last_name, email = manager
-        
-        # Получаем основную должность менеджера
-        cursor.execute("""
-            SELECT p.name
-            FROM positions p
-            JOIN staff_positions sp ON p.id = sp.position_id
-            WHERE sp.staff_id = ? AND sp.is_primary = 1
-            LIMIT 1
-        """, (manager_id,))
-        
-        position_row = cursor.fetchone()
-        position = position_row[0] if position_row else "Неизвестная должность"
-        
-        manager_node = {
-            "id": manager_id,
-            "name": f"{first_name} {last_name}",
-            "position": position,
-            "email": email,
-            "relations": [],
-            "children": []
-        }
-        
-        # Строим дерево подчиненных для этого менеджера
-        build_staff_tree(db, manager_id, manager_node)
-        result.append(manager_node)
-    
-    return result
+    if root_id is not None:
+        cursor = db.execute("SELECT id FROM staff WHERE id = ?", (root_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail=f"Сотрудник с ID {root_id} не найден")
 
-def build_staff_tree(db, manager_id, node):
-    """Рекурсивно строит дерево подчиненных для менеджера"""
-    cursor = db.cursor()
-    
-    # Получаем прямых подчиненных текущего менеджера (административное подчинение)
-    cursor.execute("""
-        SELECT s.id, s.first_name, s.last_name, s.email, fr.relation_type, fr.description
-        FROM staff s
-        JOIN functional_relations fr ON s.id = fr.subordinate_id
-        WHERE fr.manager_id = ? AND fr.relation_type = 'administrative' AND fr.is_active = 1
-        ORDER BY s.last_name, s.first_name
-    """, (manager_id,))
-    
-    subordinates = cursor.fetchall()
-    
-    for sub in subordinates:
-        sub_id, first_name, last_name, email, relation_type, description = sub
-        
-        # Получаем основную должность сотрудника
-        cursor.execute("""
-            SELECT p.name
-            FROM positions p
-            JOIN staff_positions sp ON p.id = sp.position_id
-            WHERE sp.staff_id = ? AND sp.is_primary = 1
-            LIMIT 1
-        """, (sub_id,))
-        
-        position_row = cursor.fetchone()
-        position = position_row[0] if position_row else "Неизвестная должность"
-        
-        sub_node = {
-            "id": sub_id,
-            "name": f"{first_name} {last_name}",
-            "position": position,
-            "email": email,
-            "relations": [],
-            "children": []
-        }
-        
-        # Получаем другие типы отношений для этого сотрудника
-        cursor.execute("""
-            SELECT fr.id, fr.manager_id, fr.relation_type, fr.description, 
-                   m.first_name, m.last_name
-            FROM functional_relations fr
-            JOIN staff m ON fr.manager_id = m.id
-            WHERE fr.subordinate_id = ? 
-              AND fr.relation_type != 'administrative'
-              AND fr.is_active = 1
-        """, (sub_id,))
-        
-        other_relations = cursor.fetchall()
-        for rel in other_relations:
-            rel_id, rel_manager_id, rel_type, rel_desc, m_first, m_last = rel
-            relation = {
-                "id": rel_id,
-                "manager_id": rel_manager_id,
-                "manager_name": f"{m_first} {m_last}",
-                "relation_type": rel_type,
-                "description": rel_desc
-            }
-            sub_node["relations"].append(relation)
-        
-        # Рекурсивно строим дерево для этого подчиненного
-        build_staff_tree(db, sub_id, sub_node)
-        
-        # Добавляем подчиненного в дерево
-        node["children"].append(sub_node)
+    return build_staff_tree(db, root_id=root_id, max_depth=max_depth)
 
 @router.get("/matrix-relations", response_model=List[MatrixRelation])
 def get_matrix_relations(
@@ -0,0 +1,153 @@
+"""
+Построение иерархии организационной структуры за фиксированное число запросов.
+
+Вместо рекурсивного SELECT на каждую организацию, подразделение и отдел все
+сущности загружаются несколькими пакетными запросами, после чего дерево
+собирается в памяти за O(n) с помощью словарей «родитель -> дети».
+Формат узлов полностью совпадает с тем, что отдает /org-structure/hierarchy.
+"""
+
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+
+# Типы организаций, к которым привязываются подразделения
+ORG_TYPES_WITH_DIVISIONS = ("holding", "legal_entity")
+
+
+def _load_children_index(cursor: sqlite3.Cursor, query: str) -> Dict[Any, List[tuple]]:
+    """Выполняет запрос и группирует строки по первому столбцу (id родителя), сохраняя порядок."""
+    index = defaultdict(list)
+    for row in cursor.execute(query):
+        index[row[0]].append(tuple(row[1:]))
+    return index
+
+
+class OrgHierarchyLoader:
+    """
+    Загружает организации, подразделения, отделы и функции пакетно
+    и собирает из них дерево узлов OrgStructureNode.
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.orgs_by_parent: Dict[Optional[int], List[tuple]] = {}
+        self.root_divisions_by_org: Dict[int, List[tuple]] = {}
+        self.divisions_by_parent: Dict[int, List[tuple]] = {}
+        self.sections_by_division: Dict[int, List[tuple]] = {}
+        self.functions_by_section: Dict[int, List[tuple]] = {}
+        self._section_nodes: Dict[int, Dict[str, Any]] = {}
+
+    def load(self) -> "OrgHierarchyLoader":
+        cursor = self.db.cursor()
+
+        # 1. Все организации, сгруппированные по родителю
+        self.orgs_by_parent = _load_children_index(cursor, """
+            SELECT parent_id, id, name, code, org_type
+            FROM organizations
+            ORDER BY name, id
+        """)
+
+        # 2. Все подразделения: корневые группируем по организации, остальные по родителю
+        self.root_divisions_by_org = defaultdict(list)
+        self.divisions_by_parent = defaultdict(list)
+        for div_id, name, code, organization_id, parent_id in cursor.execute("""
+            SELECT id, name, code, organization_id, parent_id
+            FROM divisions
+            ORDER BY name, id
+        """):
+            if parent_id is None:
+                self.root_divisions_by_org[organization_id].append((div_id, name, code))
+            else:
+                self.divisions_by_parent[parent_id].append((div_id, name, code))
+
+        # 3. Отделы каждого подразделения
+        self.sections_by_division = _load_children_index(cursor, """
+            SELECT ds.division_id, s.id, s.name, s.code
+            FROM division_sections ds
+            JOIN sections s ON s.id = ds.section_id
+            ORDER BY s.name, s.id
+        """)
+
+        # 4. Функции каждого отдела
+        self.functions_by_section = _load_children_index(cursor, """
+            SELECT sf.section_id, f.id, f.name, f.code
+            FROM section_functions sf
+            JOIN functions f ON f.id = sf.function_id
+            ORDER BY f.name, f.id
+        """)
+
+        self._section_nodes = {}
+        return self
+
+    # ---------- Сборка узлов ----------
+
+    def _section_node(self, sec_id: int, name: str, code: str) -> Dict[str, Any]:
+        # Отдел может входить в несколько подразделений, его поддерево одинаково
+        node = self._section_nodes.get(sec_id)
+        if node is None:
+            node = {
+                "id": sec_id,
+                "name": name,
+                "code": code,
+                "entity_type": "section",
+                "children": [
+                    {
+                        "id": func_id,
+                        "name": func_name,
+                        "code": func_code,
+                        "entity_type": "function",
+                        "children": []
+                    }
+                    for func_id, func_name, func_code in self.functions_by_section.get(sec_id, ())
+                ]
+            }
+            self._section_nodes[sec_id] = node
+        return node
+
+    def _division_node(self, div_id: int, name: str, code: str, visited: set) -> Dict[str, Any]:
+        node = {
+            "id": div_id,
+            "name": name,
+            "code": code,
+            "entity_type": "division",
+            "children": []
+        }
+        visited.add(div_id)
+        node["children"].extend(
+            self._section_node(*section) for section in self.sections_by_division.get(div_id, ())
+        )
+        # Циклические ссылки parent_id в данных пропускаем, чтобы не зациклиться
+        for child_id, child_name, child_code in self.divisions_by_parent.get(div_id, ()):
+            if child_id not in visited:
+                node["children"].append(self._division_node(child_id, child_name, child_code, visited))
+        return node
+
+    def _org_node(self, org_id: int, name: str, code: str, org_type: str, visited: set) -> Dict[str, Any]:
+        node = {
+            "id": org_id,
+            "name": name,
+            "code": code,
+            "entity_type": "organization",
+            "org_type": org_type,
+            "children": []
+        }
+        visited.add(("organization", org_id))
+        for child in self.orgs_by_parent.get(org_id, ()):
+            if ("organization", child[0]) not in visited:
+                node["children"].append(self._org_node(*child, visited))
+
+        if org_type in ORG_TYPES_WITH_DIVISIONS:
+            for div_id, div_name, div_code in self.root_divisions_by_org.get(org_id, ()):
+                node["children"].append(self._division_node(div_id, div_name, div_code, set()))
+        return node
+
+    def build(self) -> List[Dict[str, Any]]:
+        """Возвращает список деревьев для организаций верхнего уровня."""
+        visited = set()
+        return [self._org_node(*org, visited) for org in self.orgs_by_parent.get(None, ())]
+
+
+def build_org_hierarchy(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Строит полную иерархию организационной структуры за 4 запроса."""
+    return OrgHierarchyLoader(db).load().build()
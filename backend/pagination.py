@@ -0,0 +1,236 @@
+"""
+Keyset-пагинация и проекция полей для списочных эндпоинтов full_api.
+
+Вместо OFFSET используется условие «после последнего id» (или после пары
+(колонка сортировки, id)), поэтому любая страница читается по индексу
+за одинаковое время. Параметры запроса:
+
+    limit    — размер страницы (без него возвращается весь список, как раньше);
+    after_id — вернуть записи после указанного id;
+    cursor   — непрозрачный курсор из заголовка X-Next-Cursor предыдущей страницы;
+    fields   — список колонок через запятую: SELECT читает только их.
+
+Заголовки ответа: X-Total-Count (общее число записей с учетом фильтров),
+X-Next-Cursor и Link rel="next" (если есть следующая страница).
+"""
+
+import base64
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Query, Request
+from pydantic import BaseModel
+
+import tracing
+from json_response import FastJSONResponse
+from row_mapper import RowMapper, get_mapper
+
+# Максимальный размер страницы
+MAX_PAGE_LIMIT = 1000
+
+# Колонки таблиц (PRAGMA table_info), кэшируются на время жизни процесса
+_TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {}
+
+# Значение по умолчанию для encode_cursor: листинг без колонки сортировки
+_NO_SORT = object()
+
+
+class PageParams:
+    """Параметры пагинации; подключается как Depends(PageParams)."""
+
+    def __init__(
+        self,
+        request: Request,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Размер страницы"),
+        after_id: Optional[int] = Query(None, description="Вернуть записи после указанного id"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы (X-Next-Cursor)"),
+        fields: Optional[str] = Query(None, description="Колонки через запятую, например id,name"),
+    ):
+        self.request = request
+        self.limit = limit
+        self.after_id = after_id
+        self.cursor = cursor
+        self.fields = fields
+
+
+def encode_cursor(last_id: int, sort_value: Any = _NO_SORT) -> str:
+    """Курсор после записи last_id; для листинга с order_by k пишется всегда, в т.ч. null."""
+    payload = {"id": last_id}
+    if sort_value is not _NO_SORT:
+        payload["k"] = sort_value
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict) or not isinstance(payload.get("id"), int):
+            raise ValueError(cursor)
+        return payload
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+
+
+def _after_condition(order_column: str, sort_value: Any, last_id: int) -> Tuple[str, List[Any]]:
+    """
+    Условие «после (sort_value, last_id)» в порядке ORDER BY order_column, id.
+
+    В SQLite NULL сортируются первыми, а сравнение (NULL, id) > (?, ?) не бывает
+    истинным, поэтому сегмент NULL сравнивается явно.
+    """
+    if sort_value is None:
+        return f"(({order_column} IS NULL AND id > ?) OR {order_column} IS NOT NULL)", [last_id]
+    return f"({order_column}, id) > (?, ?)", [sort_value, last_id]
+
+
+def table_columns(db: sqlite3.Connection, table: str) -> Tuple[str, ...]:
+    columns = _TABLE_COLUMNS.get(table)
+    if columns is None:
+        columns = tuple(row[1] for row in db.execute(f"PRAGMA table_info({table})"))
+        if columns:
+            _TABLE_COLUMNS[table] = columns
+    return columns
+
+
+class Listing:
+    """
+    Описание списочного эндпоинта: таблица, модель ответа, колонки по умолчанию,
+    колонка сортировки и колонки, требующие преобразования.
+    Строки преобразуются по полям model (см. row_mapper); без модели булевы
+    значения (колонки is_*) приводятся к bool, json_columns разбираются из JSON.
+    """
+
+    def __init__(self, table: str, model: Optional[Type[BaseModel]] = None,
+                 default_columns: Optional[Sequence[str]] = None,
+                 order_by: Optional[str] = None, json_columns: Sequence[str] = ()):
+        self.table = table
+        self.model = model
+        self.default_columns = tuple(default_columns) if default_columns else None
+        self.order_by = order_by
+        self.json_columns = frozenset(json_columns)
+
+    def select_columns(self, db: sqlite3.Connection, fields: Optional[str]) -> List[str]:
+        available = table_columns(db, self.table)
+        if not fields:
+            return list(self.default_columns or available)
+
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in available]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестные поля для {self.table}: {', '.join(unknown)}"
+            )
+        # id нужен для курсора, колонка сортировки — для курсора по ней.
+        # Остальные поля — в порядке колонок таблицы, а не запроса: перестановки
+        # fields= дают ту же выборку и тот же преобразователь (см. get_mapper)
+        required = ["id"] + ([self.order_by] if self.order_by else [])
+        requested = set(requested)
+        return required + [name for name in available if name in requested and name not in required]
+
+    def convert(self, columns: Sequence[str], partial: bool = False) -> RowMapper:
+        """Преобразователь строк выборки в dict (по полям model, если она задана)."""
+        return get_mapper(columns, self.model, partial, self.json_columns)
+
+
+def paginate(
+    db: sqlite3.Connection,
+    listing: Listing,
+    page: PageParams,
+    conditions: Sequence[str] = (),
+    params: Sequence[Any] = (),
+):
+    """
+    Выполняет постраничную выборку и возвращает FastJSONResponse с заголовками пагинации.
+
+    Строки преобразуются скомпилированным преобразователем листинга, повторной
+    валидации через response_model нет. При заданном fields= в ответе только
+    запрошенные поля (partial), т.к. частичные записи не соответствуют полной модели.
+    """
+    columns = listing.select_columns(db, page.fields)
+    conditions = list(conditions)
+    params = list(params)
+    filter_sql = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    # Позиция, с которой начинается страница
+    page_conditions = list(conditions)
+    page_params = list(params)
+    order_column = listing.order_by
+    if page.cursor is not None:
+        position = decode_cursor(page.cursor)
+        if order_column:
+            if "k" not in position:
+                raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+            condition, condition_params = _after_condition(order_column, position["k"], position["id"])
+            page_conditions.append(condition)
+            page_params.extend(condition_params)
+        else:
+            page_conditions.append("id > ?")
+            page_params.append(position["id"])
+    elif page.after_id is not None:
+        if order_column:
+            # Позиция в сортировке берется из самой записи: если ее удалили, страница
+            # оказалась бы пустой при X-Total-Count, обещающем продолжение
+            anchor = db.execute(
+                f"SELECT {order_column} FROM {listing.table} WHERE id = ?", (page.after_id,)
+            ).fetchone()
+            if anchor is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Запись after_id={page.after_id} не найдена в {listing.table}; "
+                           f"продолжите по курсору из X-Next-Cursor"
+                )
+            condition, condition_params = _after_condition(order_column, anchor[0], page.after_id)
+            page_conditions.append(condition)
+            page_params.extend(condition_params)
+        else:
+            page_conditions.append("id > ?")
+            page_params.append(page.after_id)
+
+    query = f"SELECT {', '.join(columns)} FROM {listing.table}"
+    if page_conditions:
+        query += " WHERE " + " AND ".join(page_conditions)
+    query += f" ORDER BY {order_column + ', ' if order_column else ''}id"
+    if page.limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница
+        query += " LIMIT ?"
+        page_params.append(page.limit + 1)
+
+    traced = tracing.tracing_enabled()
+    if traced:
+        started = time.perf_counter()
+
+    rows = db.execute(query, page_params).fetchall()
+
+    if traced:
+        tracing.trace("%s: %d строк за %.1f мс; %s %s", listing.table, len(rows),
+                      (time.perf_counter() - started) * 1000, query, page_params)
+
+    has_more = page.limit is not None and len(rows) > page.limit
+    if has_more:
+        del rows[page.limit:]
+
+    # Для первой неполной страницы число записей уже известно, COUNT(*) не нужен
+    if not has_more and page.cursor is None and page.after_id is None:
+        total = len(rows)
+    else:
+        total = db.execute(f"SELECT COUNT(*) FROM {listing.table}{filter_sql}", params).fetchone()[0]
+
+    headers = {"X-Total-Count": str(total)}
+    if has_more:
+        last = rows[-1]
+        if order_column:
+            next_cursor = encode_cursor(last[columns.index("id")], last[columns.index(order_column)])
+        else:
+            next_cursor = encode_cursor(last[columns.index("id")])
+        headers["X-Next-Cursor"] = next_cursor
+        next_url = page.request.url.remove_query_params("after_id").include_query_params(cursor=next_cursor)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    row_to_dict = listing.convert(columns, partial=bool(page.fields))
+    return FastJSONResponse(content=[row_to_dict(row) for row in rows], headers=headers)
+
@@ -0,0 +1,294 @@
+"""
+Кэш готовых ответов для справочных GET-эндпоинтов (LRU + TTL).
+
+Ключ — URL запроса (путь и параметры), значение — тело и заголовки ответа.
+Каждый кэшируемый путь объявляет таблицы, от которых зависит ответ (теги):
+
+    response_cache.cache_route("/positions/", "positions")
+
+Инвалидация. Любая запись в таблицу увеличивает ее версию в data_version
+(триггеры, см. complete_schema). Перед обслуживанием запроса кэш сверяет
+версии с запомненными (одна выборка из data_version в потоке через
+asyncio.to_thread, не в цикле событий) и удаляет ровно те
+записи, у которых изменилась хотя бы одна таблица-тег. После успешного
+изменяющего запроса (POST/PUT/PATCH/DELETE) сверка выполняется сразу,
+поэтому create_*/update_*/delete_* освобождают устаревшие записи без
+явных вызовов, а изменения из других процессов замечаются при следующем чтении.
+
+Ограничения: TTL записи и бюджет памяти (сумма размеров тел и заголовков);
+при превышении бюджета вытесняются давно не использованные записи.
+Одновременные промахи по одному ключу вычисляются один раз: остальные
+запросы ждут первый и получают его результат.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi import Request
+from starlette.responses import Response
+
+from etag import CACHE_CONTROL, ETAG_HEADER, etag_matches
+
+# Время жизни записи, секунды
+DEFAULT_TTL = float(os.environ.get("OFS_CACHE_TTL", "300"))
+# Бюджет памяти кэша, МБ
+DEFAULT_MAX_MB = float(os.environ.get("OFS_CACHE_MAX_MB", "64"))
+# OFS_RESPONSE_CACHE=0 отключает кэш
+CACHE_ENABLED = os.environ.get("OFS_RESPONSE_CACHE", "1") != "0"
+
+# Заголовки, которые относятся к конкретному запросу и не сохраняются
+_SKIP_HEADERS = frozenset({"date", "server", "x-trace-id", "content-length"})
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    status_code: int
+    headers: List[Tuple[str, str]]
+    tags: FrozenSet[str]
+    # Версии таблиц-тегов на момент вычисления ответа
+    versions: Dict[str, int]
+    etag: Optional[str]
+    expires_at: float
+    size: int
+
+
+class ResponseCache:
+    def __init__(self, db_path: str, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = int(DEFAULT_MAX_MB * 1024 * 1024), enabled: bool = CACHE_ENABLED):
+        self.db_path = db_path
+        # Собственное соединение только для чтения data_version: сверка не должна ждать
+        # свободного соединения из пула. Выборки идут из потоков одновременных запросов,
+        # поэтому соединение защищено блокировкой
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # Номер последней выборки версий и последней учтенной: выборки завершаются
+        # в потоках в произвольном порядке, устаревшая не должна затереть новую
+        self._read_seq = self._applied_seq = 0
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._routes: Dict[str, FrozenSet[str]] = {}
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._by_tag: Dict[str, set] = {}
+        self._versions: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self._size = 0
+        # Записи меняются и из middleware, и из синхронных вызовов (invalidate, stats)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+        self.evictions = self.expirations = self.invalidations = 0
+
+    # ---------- Регистрация и инвалидация ----------
+
+    def cache_route(self, path: str, *tables: str) -> None:
+        """Кэшировать GET-ответы пути path; tables — таблицы, от которых зависит ответ."""
+        self._routes[path] = frozenset(tables)
+
+    def invalidate(self, *tables: str) -> int:
+        """Удаляет записи, зависящие от любой из таблиц. Возвращает число удаленных."""
+        with self._lock:
+            return self._invalidate(tables)
+
+    def _invalidate(self, tables) -> int:
+        keys = set()
+        for table in tables:
+            keys.update(self._by_tag.get(table, ()))
+        for key in keys:
+            self._remove(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._by_tag.clear()
+        self._size = 0
+
+    def close(self) -> None:
+        self.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _read_versions(self) -> Tuple[int, Dict[str, int]]:
+        with self._db_lock:
+            if self._db is None:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            current = dict(self._db.execute("SELECT table_name, version FROM data_version").fetchall())
+            self._read_seq += 1
+            return self._read_seq, current
+
+    async def sync_versions(self) -> None:
+        """Сверяет версии таблиц с data_version и инвалидирует изменившиеся."""
+        seq, current = await asyncio.to_thread(self._read_versions)
+        with self._lock:
+            if seq < self._applied_seq:
+                # Более новую выборку уже учли
+                return
+            self._applied_seq = seq
+            # Таблица без строки в data_version еще не менялась: версия 0
+            changed = [table for table, version in current.items() if self._versions.get(table, 0) != version]
+            if current.get("*") != self._versions.get("*", current.get("*")):
+                # База пересоздана: версии начались заново
+                self._clear()
+            elif changed:
+                self._invalidate(changed)
+            self._versions = current
+
+    # ---------- Хранилище ----------
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+    def tag_versions(self, tags: FrozenSet[str]) -> Dict[str, int]:
+        return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def get(self, key: str, versions: Dict[str, int]) -> Optional[CacheEntry]:
+        """Свежая запись с теми же версиями таблиц или None (промахи считает вызывающий)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.versions != versions:
+                # Вычислена до записи, которую сверка версий уже учла
+                self._remove(key)
+                self.invalidations += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> bool:
+        # Одна запись не должна занимать больше четверти бюджета
+        if entry.size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._size += entry.size
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "routes": {path: sorted(tags) for path, tags in self._routes.items()},
+            }
+
+    # ---------- Middleware ----------
+
+    def _serve(self, request: Request, entry: CacheEntry) -> Response:
+        if entry.etag is not None:
+            # Заголовок ETag добавит etag_middleware, как и для вычисленного ответа
+            request.state.etag = entry.etag
+            if etag_matches(request.headers.get("if-none-match"), entry.etag):
+                return Response(status_code=304, headers={ETAG_HEADER: entry.etag, "Cache-Control": CACHE_CONTROL})
+        response = Response(content=entry.body, status_code=entry.status_code)
+        response.raw_headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in entry.headers]
+        response.headers["content-length"] = str(len(entry.body))
+        return response
+
+    async def _compute(self, request: Request, call_next, key: str, tags: FrozenSet[str],
+                       versions: Dict[str, int]):
+        with self._lock:
+            self.misses += 1
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = [(name, value) for name, value in response.headers.items() if name not in _SKIP_HEADERS]
+        entry = CacheEntry(
+            body=body,
+            status_code=response.status_code,
+            headers=headers,
+            tags=tags,
+            versions=versions,
+            etag=getattr(request.state, "etag", None),
+            expires_at=time.monotonic() + self.ttl,
+            size=len(body) + len(key) + sum(len(name) + len(value) for name, value in headers),
+        )
+        self.put(key, entry)
+        return Response(content=body, status_code=response.status_code, headers=dict(response.headers))
+
+    async def middleware(self, request: Request, call_next):
+        if not self.enabled:
+            return await call_next(request)
+
+        method = request.method
+        if method in WRITE_METHODS:
+            response = await call_next(request)
+            if response.status_code < 400 and self._entries:
+                await self.sync_versions()
+            return response
+
+        tags = self._routes.get(request.url.path) if method == "GET" else None
+        if tags is None:
+            return await call_next(request)
+
+        # Короткая выборка из data_version в потоке
+        await self.sync_versions()
+        versions = self.tag_versions(tags)
+        key = str(request.url)
+        entry = self.get(key, versions)
+        if entry is not None:
+            return self._serve(request, entry)
+
+        # Защита от «набега»: одновременные промахи ждут первый запрос
+        pending = self._inflight.get(key)
+        if pending is not None:
+            await pending.wait()
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions:
+                with self._lock:
+                    self.coalesced += 1
+                return self._serve(request, entry)
+            return await self._compute(request, call_next, key, tags, versions)
+
+        event = self._inflight[key] = asyncio.Event()
+        try:
+            return await self._compute(request, call_next, key, tags, versions)
+        finally:
+            del self._inflight[key]
+            event.set()
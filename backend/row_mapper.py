@@ -0,0 +1,192 @@
+"""
+Компилируемые преобразователи строк SQLite в ответы API.
+
+Раньше каждая строка превращалась в dict (dict(row) или вручную по индексам),
+а затем FastAPI повторно валидировал ее через response_model и сериализовал
+обратно. Для строк из собственной базы валидация не нужна: типы колонок
+известны заранее. get_mapper() один раз на пару (модель/таблица, список колонок)
+генерирует функцию, которая сразу строит JSON-совместимый dict в порядке полей
+модели — так же, как его отдал бы FastAPI:
+
+- bool-поля приводятся из 0/1;
+- datetime из SQLite ("2024-01-01 10:00:00") выводится в ISO-формате pydantic;
+- поля dict/list разбираются из JSON-строки;
+- отсутствующие в выборке поля заполняются значениями по умолчанию;
+- колонки, которых нет в модели, отбрасываются (partial=True оставляет их
+  в порядке выборки — для проекции fields=).
+
+Готовые dict отдаются через FastJSONResponse (orjson, см. json_response),
+поэтому response_model эндпоинта остается только для документации
+и не выполняется повторно.
+"""
+
+import json
+import sqlite3
+import threading
+import types
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined, to_jsonable_python
+
+from json_response import FastJSONResponse
+
+RowMapper = Callable[[Sequence[Any]], Dict[str, Any]]
+
+# Сколько скомпилированных преобразователей держать в кэше
+MAX_MAPPERS = 256
+
+# Скомпилированные преобразователи по (модель, колонки, partial, json-колонки);
+# порядок — для вытеснения давно не использованных
+_MAPPERS: "OrderedDict[Tuple, RowMapper]" = OrderedDict()
+_MAPPERS_LOCK = threading.Lock()
+
+_DATETIME = TypeAdapter(datetime)
+_DATE = TypeAdapter(date)
+
+
+def _datetime_to_json(value):
+    # Быстрый путь для формата CURRENT_TIMESTAMP, остальное разбирает pydantic
+    if value.__class__ is str and len(value) == 19 and value[10] == " ":
+        return value[:10] + "T" + value[11:]
+    return _DATETIME.dump_python(_DATETIME.validate_python(value), mode="json")
+
+
+def _date_to_json(value):
+    if value.__class__ is str and len(value) == 10:
+        return value
+    return _DATE.dump_python(_DATE.validate_python(value), mode="json")
+
+
+def _json_value(value):
+    if isinstance(value, (str, bytes)):
+        return json.loads(value) if value else None
+    return value
+
+
+def _base_type(annotation):
+    """Снимает Optional[...] с аннотации поля."""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _field_kind(annotation) -> Optional[str]:
+    """Вид преобразования для поля модели; None — значение из базы подходит как есть."""
+    annotation = _base_type(annotation)
+    origin = get_origin(annotation) or annotation
+    if annotation is bool:
+        return "bool"
+    if annotation is datetime:
+        return "datetime"
+    if annotation is date:
+        return "date"
+    if origin in (dict, list):
+        return "json"
+    return None
+
+
+_CONVERTERS = {"datetime": _datetime_to_json, "date": _date_to_json, "json": _json_value}
+
+
+def _value_expr(kind: Optional[str], index: int) -> str:
+    cell = f"row[{index}]"
+    if kind is None:
+        return cell
+    if kind == "bool":
+        return f"(None if {cell} is None else bool({cell}))"
+    if kind == "date" or kind == "datetime":
+        # None пропускаем без вызова функции
+        return f"(None if {cell} is None else {kind}_({cell}))"
+    return f"{kind}_({cell})"
+
+
+def _compile(columns: Tuple[str, ...], model: Optional[Type[BaseModel]], partial: bool,
+             json_columns: frozenset) -> RowMapper:
+    namespace: Dict[str, Any] = {f"{kind}_": func for kind, func in _CONVERTERS.items()}
+    index = {name: i for i, name in enumerate(columns)}
+    items: List[str] = []
+
+    def generic_kind(name):
+        if name in json_columns:
+            return "json"
+        return "bool" if name.startswith("is_") else None
+
+    fields = model.model_fields if model is not None else {}
+    if model is None or partial:
+        # Проекция: поля в порядке выборки, колонки вне модели — по общим правилам
+        for name in columns:
+            kind = _field_kind(fields[name].annotation) if name in fields else generic_kind(name)
+            items.append(f"{name!r}: {_value_expr(kind, index[name])}")
+    else:
+        for name, field in fields.items():
+            if name in index:
+                items.append(f"{name!r}: {_value_expr(_field_kind(field.annotation), index[name])}")
+            elif field.default_factory is not None:
+                # Например date.today: значение вычисляется для каждой строки
+                namespace[f"factory_{name}"] = field.default_factory
+                namespace["jsonable_"] = to_jsonable_python
+                items.append(f"{name!r}: jsonable_(factory_{name}())")
+            else:
+                default = None if field.default is PydanticUndefined else to_jsonable_python(field.default)
+                namespace[f"default_{name}"] = default
+                items.append(f"{name!r}: default_{name}")
+
+    source = "def map_row(row):\n    return {" + ", ".join(items) + "}\n"
+    exec(compile(source, f"<row_mapper {model.__name__ if model else 'row'}>", "exec"), namespace)
+    return namespace["map_row"]
+
+
+def get_mapper(columns: Iterable[str], model: Optional[Type[BaseModel]] = None,
+               partial: bool = False, json_columns: Iterable[str] = ()) -> RowMapper:
+    """
+    Возвращает (и кэширует) преобразователь строки с колонками columns в dict.
+
+    Без модели колонки is_* приводятся к bool, json_columns разбираются из JSON.
+    В кэше не больше MAX_MAPPERS преобразователей, лишние вытесняются (LRU).
+    """
+    columns = tuple(columns)
+    json_columns = frozenset(json_columns)
+    key = (model, columns, partial, json_columns)
+    with _MAPPERS_LOCK:
+        mapper = _MAPPERS.get(key)
+        if mapper is not None:
+            _MAPPERS.move_to_end(key)
+            return mapper
+    mapper = _compile(columns, model, partial, json_columns)
+    with _MAPPERS_LOCK:
+        mapper = _MAPPERS.setdefault(key, mapper)
+        _MAPPERS.move_to_end(key)
+        while len(_MAPPERS) > MAX_MAPPERS:
+            _MAPPERS.popitem(last=False)
+    return mapper
+
+
+def cursor_columns(cursor: sqlite3.Cursor) -> Tuple[str, ...]:
+    return tuple(description[0] for description in cursor.description)
+
+
+def map_row(row: sqlite3.Row, model: Type[BaseModel]) -> Dict[str, Any]:
+    """Преобразует одну строку sqlite3.Row в dict по полям модели."""
+    return get_mapper(row.keys(), model)(row)
+
+
+def map_rows(cursor: sqlite3.Cursor, model: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """Преобразует все строки курсора в список dict по полям модели."""
+    mapper = get_mapper(cursor_columns(cursor), model)
+    return [mapper(row) for row in cursor]
+
+
+def row_response(row: sqlite3.Row, model: Type[BaseModel], status_code: int = 200) -> FastJSONResponse:
+    """Ответ с одной записью без повторной валидации через response_model."""
+    return FastJSONResponse(content=map_row(row, model), status_code=status_code)
+
+
+def rows_response(cursor: sqlite3.Cursor, model: Type[BaseModel],
+                  headers: Optional[Dict[str, str]] = None) -> FastJSONResponse:
+    """Ответ со списком записей курсора без повторной валидации через response_model."""
+    return FastJSONResponse(content=map_rows(cursor, model), headers=headers)
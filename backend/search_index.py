@@ -0,0 +1,188 @@
+"""
+Полнотекстовый поиск по сотрудникам, организациям, оргструктуре, должностям и ЦКП.
+
+Индекс search_index (FTS5, см. SEARCH_SCHEMA в complete_schema.py) — одна
+таблица на все сущности; триггеры на исходных таблицах добавляют, заменяют
+и удаляют документы в той же транзакции, что и изменение данных.
+Этот модуль ставит триггеры на таблицу ЦКП (она создается отдельно,
+update_vfp_schema.py), проверяет полноту индекса при старте, перестраивает
+его и выполняет поиск для GET /search:
+
+- каждое слово запроса ищется по началу (префиксный поиск, «ива» -> «Иванов»),
+  все слова должны встретиться в документе;
+- регистр кириллицы не важен, «ё» и «е» не различаются;
+- результаты упорядочены по bm25 (совпадение в названии/ФИО весит больше,
+  чем в email, телефоне или коде), пагинация — курсором по (rank, rowid).
+
+Полная перестройка для существующих баз:
+
+    python search_index.py [путь_к_базе]
+"""
+
+import logging
+import re
+import sqlite3
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from complete_schema import (
+    SEARCH_ENTITIES, SEARCH_ROWID_FACTOR, SEARCH_SCHEMA,
+    search_document_sql, search_triggers_schema,
+)
+from pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger("ofs_api.search_index")
+
+# Разметка совпадений во фрагменте текста
+SNIPPET_MARK = ("<b>", "</b>")
+SNIPPET_TOKENS = 12
+
+_WORD = re.compile(r"\w+")
+
+
+def _table_exists(db: sqlite3.Connection, table: str) -> bool:
+    row = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def _entity_types(db: sqlite3.Connection, entity_type: Optional[str] = None) -> List[str]:
+    """Типы сущностей, исходные таблицы которых есть в базе."""
+    if entity_type is not None and entity_type not in SEARCH_ENTITIES:
+        raise ValueError(f"Неизвестный тип сущности {entity_type}")
+    types = [entity_type] if entity_type else list(SEARCH_ENTITIES)
+    return [name for name in types if _table_exists(db, SEARCH_ENTITIES[name][1])]
+
+
+def rebuild_search_index(db: sqlite3.Connection, entity_type: Optional[str] = None) -> Dict[str, int]:
+    """
+    Заново заполняет индекс документами указанного типа (по умолчанию всех типов).
+    Возвращает количество документов каждого перестроенного типа.
+    """
+    result = {}
+    for name in _entity_types(db, entity_type):
+        code, table, _, _ = SEARCH_ENTITIES[name]
+        db.execute(f"DELETE FROM search_index WHERE rowid % {SEARCH_ROWID_FACTOR} = {code}")
+        db.execute(f"""
+            INSERT INTO search_index (rowid, title, body, label, entity_type)
+            SELECT {search_document_sql(name)} FROM {table}
+        """)
+        result[name] = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        logger.info(f"Поисковый индекс {name} перестроен: {result[name]} документов")
+    db.commit()
+    return result
+
+
+def ensure_search_index(db: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Ставит триггеры на таблицу ЦКП (если она есть) и перестраивает документы
+    тех типов, число которых не совпадает с числом строк исходной таблицы
+    (например, база создана до появления поиска).
+    """
+    if _table_exists(db, SEARCH_ENTITIES["vfp"][1]):
+        db.executescript(search_triggers_schema("vfp"))
+
+    counts = dict(db.execute("SELECT entity_type, COUNT(*) FROM search_index GROUP BY entity_type").fetchall())
+    rebuilt = {}
+    for name in _entity_types(db):
+        rows = db.execute(f"SELECT COUNT(*) FROM {SEARCH_ENTITIES[name][1]}").fetchone()[0]
+        documents = counts.get(name, 0)
+        if rows != documents:
+            logger.info(f"Поисковый индекс {name} не соответствует данным ({documents} из {rows}), перестраиваем")
+            rebuilt.update(rebuild_search_index(db, name))
+    return rebuilt
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    Выражение MATCH из пользовательского запроса: каждое слово — префикс в кавычках,
+    слова объединяются через AND. Операторы FTS5 и кавычки в запросе не действуют.
+    None, если в запросе нет ни одного слова.
+    """
+    words = _WORD.findall(query.replace("ё", "е").replace("Ё", "Е"))
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(
+    db: sqlite3.Connection,
+    query: str,
+    types: Optional[Sequence[str]] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+    """
+    Ищет документы по запросу. Возвращает (страница результатов, всего найдено,
+    курсор следующей страницы или None). Неизвестный тип — ValueError.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], 0, None
+
+    conditions = ["search_index MATCH ?"]
+    params: List[Any] = [expression]
+    if types:
+        unknown = [name for name in types if name not in SEARCH_ENTITIES]
+        if unknown:
+            raise ValueError(f"Неизвестные типы: {', '.join(unknown)}; допустимы: {', '.join(SEARCH_ENTITIES)}")
+        conditions.append(f"entity_type IN ({', '.join('?' * len(types))})")
+        params.extend(types)
+
+    page_conditions = list(conditions)
+    page_params = list(params)
+    if cursor is not None:
+        position = decode_cursor(cursor)
+        page_conditions.append("(rank, rowid) > (?, ?)")
+        page_params.extend([position.get("k"), position["id"]])
+
+    open_mark, close_mark = SNIPPET_MARK
+    rows = db.execute(
+        f"""
+        SELECT rowid, entity_type, label,
+               snippet(search_index, -1, ?, ?, '…', {SNIPPET_TOKENS}), rank
+        FROM search_index
+        WHERE {' AND '.join(page_conditions)}
+        ORDER BY rank, rowid
+        LIMIT ?
+        """,
+        [open_mark, close_mark] + page_params + [limit + 1]
+    ).fetchall()
+
+    # Лишняя строка показывает, есть ли следующая страница
+    has_more = len(rows) > limit
+    if has_more:
+        del rows[limit:]
+
+    if not has_more and cursor is None:
+        total = len(rows)
+    else:
+        total = db.execute(
+            f"SELECT COUNT(*) FROM search_index WHERE {' AND '.join(conditions)}", params
+        ).fetchone()[0]
+
+    results = [
+        {
+            "entity_type": entity_type,
+            "id": rowid // SEARCH_ROWID_FACTOR,
+            "title": label,
+            "snippet": snippet,
+            "rank": rank,
+        }
+        for rowid, entity_type, label, snippet, rank in rows
+    ]
+    next_cursor = encode_cursor(rows[-1][0], rows[-1][4]) if has_more else None
+    return results, total, next_cursor
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "full_api_new.db"
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SEARCH_SCHEMA)
+        ensure_search_index(conn)
+        for name, rows in rebuild_search_index(conn).items():
+            print(f"{name}: {rows} документов")
+    finally:
+        conn.close()
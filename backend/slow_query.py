@@ -0,0 +1,294 @@
+"""
+Журнал медленных SQL-запросов.
+
+SlowQueryLog подписывается на sql_trace и для каждого выражения пула
+обновляет статистику по его «отпечатку» — тексту запроса, в котором
+литералы заменены на ?, списки IN (?, ?, ...) свернуты до IN (...),
+а пробелы нормализованы. Так запросы, отличающиеся только значениями,
+попадают в одну строку отчета /admin/slow-queries (число, сумма,
+перцентили по последним измерениям, максимум).
+
+Выражения дольше порога (OFS_SLOW_QUERY_MS, по умолчанию 100 мс; меняется
+через PUT /admin/slow-queries) пишутся в лог ofs_api.slow_query
+с длительностью и планом EXPLAIN QUERY PLAN. Шаги плана
+вида «SCAN таблица» (полный просмотр таблицы без индекса) выделяются
+отдельно — обычно это первое место, где не хватает индекса. План
+строится в отдельном соединении только для чтения и кэшируется по отпечатку.
+
+Для каждого отпечатка хранится пример запроса: workload()
+(GET /admin/slow-queries/workload) отдает их как «снятую нагрузку», которую
+index_advisor воспроизводит на копии базы. Исходный текст и параметры запросов
+(email, хеши паролей и т.п., в том числе литералами в тексте) хранятся и пишутся
+в лог только при включенном захвате (OFS_SLOW_QUERY_CAPTURE_PARAMS или
+capture_params в PUT /admin/slow-queries); без него примером служит отпечаток,
+а index_advisor подставляет NULL. Для запросов к таблице user и других запросов
+аутентификации исходный текст и параметры не сохраняются никогда.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+import sql_trace
+
+logger = logging.getLogger("ofs_api.slow_query")
+
+SLOW_QUERY_MS = float(os.environ.get("OFS_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_ENABLED = os.environ.get("OFS_SLOW_QUERY_LOG", "1") != "0"
+# Сохранять ли параметры запросов для workload() и лога (по умолчанию нет)
+SLOW_QUERY_CAPTURE_PARAMS = os.environ.get("OFS_SLOW_QUERY_CAPTURE_PARAMS", "0") == "1"
+
+# Сколько отпечатков отслеживать; новые сверх лимита учитываются только в dropped
+MAX_FINGERPRINTS = 2000
+# Сколько последних длительностей хранить на отпечаток для перцентилей
+_LATENCY_SAMPLES = 1000
+# Кэш «текст запроса -> отпечаток»: тексты в коде параметризованы и повторяются
+_FINGERPRINT_CACHE_SIZE = 4096
+_MAX_PARAMS_LOG_LENGTH = 500
+
+ORDER_FIELDS = ("total_ms", "p95_ms", "max_ms", "count", "slow_count")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+# «SCAN staff», в старых версиях SQLite «SCAN TABLE staff»; просмотр по индексу
+# («USING INDEX», «USING COVERING INDEX») и «SCAN CONSTANT ROW» не считаются
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?:\s+AS\s+\w+)?$", re.IGNORECASE)
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# Запросы аутентификации: таблица user (в том числе в кавычках) и колонки с секретами
+_SENSITIVE = re.compile(r"""(?:\b(?:FROM|INTO|UPDATE|JOIN)\s+["'`\[]?user\b|password|\btoken\b|\bsecret\b)""",
+                        re.IGNORECASE)
+_REDACTED = "<скрыты>"
+
+
+def fingerprint(sql: str) -> str:
+    """Нормализованный текст запроса без значений литералов."""
+    text = _STRING_LITERAL.sub("?", sql)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    return _WHITESPACE.sub(" ", text).strip().rstrip(";")
+
+
+def full_scans(plan: Sequence[str]) -> List[str]:
+    """Таблицы, которые по плану просматриваются целиком."""
+    tables = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail.strip())
+        if match and match.group(1).upper() != "CONSTANT":
+            tables.append(match.group(1))
+    return tables
+
+
+def is_sensitive(sql: str) -> bool:
+    """Запрос аутентификации, параметры которого нельзя сохранять и писать в лог."""
+    return _SENSITIVE.search(sql) is not None
+
+
+def _json_params(parameters: Any) -> Any:
+    simple = (type(None), int, float, str)
+    if isinstance(parameters, (list, tuple)) and all(isinstance(value, simple) for value in parameters):
+        return list(parameters)
+    if isinstance(parameters, dict) and all(isinstance(value, simple) for value in parameters.values()):
+        return dict(parameters)
+    return None
+
+
+class _Statement:
+    __slots__ = ("sql", "count", "slow_count", "total", "max", "latencies", "plan", "scans",
+                 "sensitive", "example_sql", "example_params")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = self.slow_count = 0
+        self.total = self.max = 0.0
+        self.latencies: Deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self.plan: Optional[List[str]] = None
+        self.scans: List[str] = []
+        self.sensitive = is_sensitive(sql)
+        self.example_sql: Optional[str] = None
+        self.example_params: Any = None
+
+
+class SlowQueryLog:
+    """Статистика SQL по отпечаткам и журнал выражений дольше порога."""
+
+    def __init__(self, db_path: str, threshold_ms: float = SLOW_QUERY_MS,
+                 max_fingerprints: int = MAX_FINGERPRINTS,
+                 capture_params: bool = SLOW_QUERY_CAPTURE_PARAMS):
+        self.db_path = db_path
+        self.threshold_ms = threshold_ms
+        self.capture_params = capture_params
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._statements: Dict[str, _Statement] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._explain_conn: Optional[sqlite3.Connection] = None
+        self._explain_lock = threading.Lock()
+        self.dropped = 0
+        self.enabled = False
+
+    def configure(self, enabled: Optional[bool] = None, threshold_ms: Optional[float] = None,
+                  capture_params: Optional[bool] = None) -> Dict[str, Any]:
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if capture_params is not None:
+            self.capture_params = capture_params
+            if not capture_params:
+                # Уже сохраненные тексты и параметры тоже удаляются
+                with self._lock:
+                    for statement in self._statements.values():
+                        statement.example_sql, statement.example_params = statement.sql, None
+        if enabled is not None:
+            self.enabled = enabled
+            if enabled:
+                sql_trace.add_listener(self.observe)
+            else:
+                sql_trace.remove_listener(self.observe)
+        return {"enabled": self.enabled, "threshold_ms": self.threshold_ms, "capture_params": self.capture_params}
+
+    def _fingerprint(self, sql: str) -> str:
+        result = self._fingerprints.get(sql)
+        if result is None:
+            result = fingerprint(sql)
+            if len(self._fingerprints) >= _FINGERPRINT_CACHE_SIZE:
+                self._fingerprints.clear()
+            self._fingerprints[sql] = result
+        return result
+
+    def observe(self, sql: str, parameters: Any, seconds: float) -> None:
+        """Подписчик sql_trace: вызывается после каждого выражения."""
+        key = self._fingerprint(sql)
+        slow = seconds * 1000 >= self.threshold_ms
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is None:
+                if len(self._statements) >= self.max_fingerprints:
+                    self.dropped += 1
+                else:
+                    statement = self._statements[key] = _Statement(key)
+            if statement is not None:
+                statement.count += 1
+                statement.total += seconds
+                statement.max = max(statement.max, seconds)
+                statement.latencies.append(seconds)
+                statement.slow_count += int(slow)
+                if self.capture_params and not statement.sensitive:
+                    statement.example_sql, statement.example_params = sql, parameters
+                else:
+                    # Текст тоже может содержать значения литералов: хранится отпечаток
+                    statement.example_sql, statement.example_params = key, None
+        if slow:
+            self._log_slow(key, sql, parameters, seconds, statement)
+
+    def _log_slow(self, key: str, sql: str, parameters: Any, seconds: float,
+                  statement: Optional[_Statement]) -> None:
+        plan = statement.plan if statement is not None else None
+        if plan is None:
+            plan = self.explain(sql, parameters)
+            if statement is not None:
+                statement.plan, statement.scans = plan, full_scans(plan)
+        scans = full_scans(plan)
+        if self.capture_params and not (statement.sensitive if statement is not None else is_sensitive(key)):
+            params = repr(parameters)
+            if len(params) > _MAX_PARAMS_LOG_LENGTH:
+                params = params[:_MAX_PARAMS_LOG_LENGTH] + "..."
+        else:
+            params = _REDACTED
+        logger.warning(
+            "Медленный запрос %.1f мс%s: %s | параметры: %s | план: %s",
+            seconds * 1000,
+            f" [SCAN: {', '.join(scans)}]" if scans else "",
+            key, params, "; ".join(plan) or "-",
+        )
+
+    def explain(self, sql: str, parameters: Any = ()) -> List[str]:
+        """Шаги EXPLAIN QUERY PLAN (поле detail) или пустой список, если план не построить."""
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            with self._explain_lock:
+                if self._explain_conn is None:
+                    uri = "file:" + os.path.abspath(self.db_path) + "?mode=ro"
+                    self._explain_conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                # Обычный курсор, а не TracingCursor: сам EXPLAIN не должен попадать в статистику
+                cursor = sqlite3.Cursor(self._explain_conn)
+                rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, parameters or ()).fetchall()
+        except sqlite3.Error as e:
+            # executemany/executescript (parameters=None для запроса с ?), временные таблицы и т.п.
+            logger.debug(f"Не удалось построить план запроса: {e}")
+            return []
+        return [row[3] for row in rows]
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Отпечатки, отсортированные по order_by (по убыванию), с перцентилями в мс."""
+        if order_by not in ORDER_FIELDS:
+            raise ValueError(f"Неизвестное поле сортировки {order_by}, допустимы: {', '.join(ORDER_FIELDS)}")
+        with self._lock:
+            rows = []
+            for statement in self._statements.values():
+                ordered = sorted(statement.latencies)
+
+                def percentile(q):
+                    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+                rows.append({
+                    "sql": statement.sql,
+                    "count": statement.count,
+                    "slow_count": statement.slow_count,
+                    "total_ms": round(statement.total * 1000, 3),
+                    "avg_ms": round(statement.total / statement.count * 1000, 3),
+                    "p50_ms": percentile(0.50),
+                    "p95_ms": percentile(0.95),
+                    "p99_ms": percentile(0.99),
+                    "max_ms": round(statement.max * 1000, 3),
+                    "plan": statement.plan,
+                    "full_scans": statement.scans,
+                })
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def workload(self) -> List[Dict[str, Any]]:
+        """
+        Снятая нагрузка: по одному исходному запросу с параметрами на отпечаток,
+        с числом выполнений и суммарным временем. Параметры без захвата,
+        запросов аутентификации и не сериализуемые в JSON (executemany, BLOB)
+        заменяются на null.
+        """
+        with self._lock:
+            statements = list(self._statements.values())
+        return [
+            {
+                "fingerprint": statement.sql,
+                "sql": statement.example_sql,
+                "params": _json_params(statement.example_params),
+                "count": statement.count,
+                "total_ms": round(statement.total * 1000, 3),
+            }
+            for statement in statements
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self.dropped = 0
+
+    def close(self) -> None:
+        with self._explain_lock:
+            if self._explain_conn is not None:
+                self._explain_conn.close()
+                self._explain_conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_ms": self.threshold_ms,
+                "capture_params": self.capture_params,
+                "fingerprints": len(self._statements),
+                "dropped": self.dropped,
+            }
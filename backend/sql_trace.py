@@ -0,0 +1,103 @@
+"""
+Наблюдение за SQL-выражениями, выполняемыми через соединения пула.
+
+Пул (db_pool) создает соединения класса TracingConnection: его курсоры
+замеряют время execute / executemany / executescript и передают выражение,
+параметры и длительность подписчикам:
+
+    sql_trace.add_listener(on_statement)   # on_statement(sql, parameters, seconds)
+
+Пока подписчиков нет, курсор только проверяет один флаг и вызывает
+стандартную реализацию. Время выборки строк (fetch*) после execute
+не учитывается: для SQLite основная работа обычно приходится на первый шаг.
+Подписчик вызывается в потоке, выполнившем запрос, и не должен бросать исключений.
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, List
+
+logger = logging.getLogger("ofs_api.sql_trace")
+
+Listener = Callable[[str, Any, float], None]
+
+_listeners: List[Listener] = []
+# Копия списка для горячего пути: добавление и удаление подписчиков редки
+_active: tuple = ()
+
+
+def add_listener(listener: Listener) -> None:
+    global _active
+    if listener not in _listeners:
+        _listeners.append(listener)
+        _active = tuple(_listeners)
+
+
+def remove_listener(listener: Listener) -> None:
+    global _active
+    if listener in _listeners:
+        _listeners.remove(listener)
+        _active = tuple(_listeners)
+
+
+def _notify(listeners: tuple, sql: str, parameters: Any, seconds: float) -> None:
+    for listener in listeners:
+        try:
+            listener(sql, parameters, seconds)
+        except Exception:
+            logger.exception("Ошибка подписчика SQL-трассировки")
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Курсор, сообщающий подписчикам длительность каждого выражения."""
+
+    def execute(self, sql, parameters=()):
+        listeners = _active
+        if not listeners:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _notify(listeners, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        listeners = _active
+        if not listeners:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # Параметры executemany — итератор, второй раз их не прочитать
+            _notify(listeners, sql, None, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        listeners = _active
+        if not listeners:
+            return super().executescript(sql_script)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _notify(listeners, sql_script, None, time.perf_counter() - started)
+
+
+class TracingConnection(sqlite3.Connection):
+    """
+    Соединение с TracingCursor. Сокращения Connection.execute* в CPython
+    создают курсор в обход метода cursor(), поэтому переопределены явно.
+    """
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
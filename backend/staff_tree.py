@@ -0,0 +1,195 @@
+"""
+Построение дерева административного подчинения сотрудников.
+
+Цепочка подчинения обходится одним рекурсивным запросом (WITH RECURSIVE),
+основные должности и неадминистративные связи загружаются пакетно для всех
+найденных сотрудников сразу, а дерево собирается за один проход в памяти.
+Циклы в functional_relations (некорректные данные) обнаруживаются и пропускаются.
+"""
+
+import json
+import logging
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger("ofs_api.staff_tree")
+
+UNKNOWN_POSITION = "Неизвестная должность"
+
+# Активные административные связи — ребра дерева
+_ADMIN_EDGE = "fr.relation_type = 'administrative' AND fr.is_active = 1"
+
+
+class StaffTreeLoader:
+    """
+    Загружает дерево подчиненных.
+
+    - root_id: построить поддерево конкретного сотрудника вместо всех топ-менеджеров;
+    - max_depth: ограничить число уровней подчиненных (1 — только прямые подчиненные).
+    """
+
+    def __init__(self, db: sqlite3.Connection, root_id: Optional[int] = None,
+                 max_depth: Optional[int] = None):
+        self.db = db
+        self.root_id = root_id
+        self.max_depth = max_depth
+        self.roots: List[tuple] = []
+        self.subordinates_by_manager: Dict[int, List[tuple]] = {}
+        self.positions: Dict[int, str] = {}
+        self.relations_by_staff: Dict[int, List[Dict[str, Any]]] = {}
+
+    def _load_roots(self, cursor: sqlite3.Cursor):
+        if self.root_id is not None:
+            cursor.execute("""
+                SELECT id, first_name, last_name, email
+                FROM staff
+                WHERE id = ?
+            """, (self.root_id,))
+        else:
+            # Топ-менеджеры — активные сотрудники без административного руководителя
+            cursor.execute("""
+                SELECT s.id, s.first_name, s.last_name, s.email
+                FROM staff s
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM functional_relations fr
+                    WHERE fr.subordinate_id = s.id AND """ + _ADMIN_EDGE + """
+                )
+                AND s.is_active = 1
+                ORDER BY s.last_name, s.first_name, s.id
+            """)
+        self.roots = [tuple(row) for row in cursor.fetchall()]
+
+    def _load_edges(self, cursor: sqlite3.Cursor):
+        """Одним рекурсивным запросом получает все административные связи поддеревьев."""
+        root_ids = json.dumps([root[0] for root in self.roots])
+        if self.max_depth is None:
+            # UNION убирает повторы, поэтому обход завершается даже при циклах
+            reach = """
+                reach(id) AS (
+                    SELECT value FROM json_each(?)
+                    UNION
+                    SELECT fr.subordinate_id
+                    FROM reach
+                    JOIN functional_relations fr ON fr.manager_id = reach.id
+                    WHERE """ + _ADMIN_EDGE + """
+                )
+            """
+            params = (root_ids,)
+            managers = "SELECT id FROM reach"
+        else:
+            reach = """
+                reach(id, depth) AS (
+                    SELECT value, 0 FROM json_each(?)
+                    UNION
+                    SELECT fr.subordinate_id, reach.depth + 1
+                    FROM reach
+                    JOIN functional_relations fr ON fr.manager_id = reach.id
+                    WHERE """ + _ADMIN_EDGE + """ AND reach.depth < ?
+                )
+            """
+            params = (root_ids, self.max_depth)
+            managers = "SELECT id FROM reach WHERE depth < " + str(int(self.max_depth))
+
+        cursor.execute("WITH RECURSIVE " + reach + """
+            SELECT fr.manager_id, s.id, s.first_name, s.last_name, s.email
+            FROM functional_relations fr
+            JOIN staff s ON s.id = fr.subordinate_id
+            WHERE fr.manager_id IN (""" + managers + """)
+              AND """ + _ADMIN_EDGE + """
+            ORDER BY s.last_name, s.first_name, s.id
+        """, params)
+
+        self.subordinates_by_manager = defaultdict(list)
+        for manager_id, *subordinate in cursor.fetchall():
+            self.subordinates_by_manager[manager_id].append(tuple(subordinate))
+
+    def _load_details(self, cursor: sqlite3.Cursor):
+        """Пакетно загружает основные должности и неадминистративные связи."""
+        staff_ids = {root[0] for root in self.roots}
+        for subordinates in self.subordinates_by_manager.values():
+            staff_ids.update(sub[0] for sub in subordinates)
+        ids_json = json.dumps(sorted(staff_ids))
+
+        self.positions = {}
+        cursor.execute("""
+            SELECT sp.staff_id, p.name
+            FROM staff_positions sp
+            JOIN positions p ON p.id = sp.position_id
+            WHERE sp.is_primary = 1
+              AND sp.staff_id IN (SELECT value FROM json_each(?))
+            ORDER BY sp.id
+        """, (ids_json,))
+        for staff_id, position_name in cursor.fetchall():
+            self.positions.setdefault(staff_id, position_name)
+
+        self.relations_by_staff = defaultdict(list)
+        cursor.execute("""
+            SELECT fr.subordinate_id, fr.id, fr.manager_id, fr.relation_type, fr.description,
+                   m.first_name, m.last_name
+            FROM functional_relations fr
+            JOIN staff m ON fr.manager_id = m.id
+            WHERE fr.subordinate_id IN (SELECT value FROM json_each(?))
+              AND fr.relation_type != 'administrative'
+              AND fr.is_active = 1
+            ORDER BY fr.id
+        """, (ids_json,))
+        for staff_id, rel_id, manager_id, rel_type, rel_desc, m_first, m_last in cursor.fetchall():
+            self.relations_by_staff[staff_id].append({
+                "id": rel_id,
+                "manager_id": manager_id,
+                "manager_name": f"{m_first} {m_last}",
+                "relation_type": rel_type,
+                "description": rel_desc
+            })
+
+    def load(self) -> "StaffTreeLoader":
+        cursor = self.db.cursor()
+        self._load_roots(cursor)
+        if self.roots:
+            self._load_edges(cursor)
+            self._load_details(cursor)
+        return self
+
+    def _node(self, staff_id: int, first_name: str, last_name: str, email: Optional[str],
+              with_relations: bool) -> Dict[str, Any]:
+        return {
+            "id": staff_id,
+            "name": f"{first_name} {last_name}",
+            "position": self.positions.get(staff_id, UNKNOWN_POSITION),
+            "email": email,
+            "relations": list(self.relations_by_staff.get(staff_id, ())) if with_relations else [],
+            "children": []
+        }
+
+    def build(self) -> List[Dict[str, Any]]:
+        """Собирает дерево; сотрудник, уже находящийся на пути от корня, повторно не добавляется."""
+        result = []
+        for root in self.roots:
+            root_node = self._node(*root, with_relations=False)
+            result.append(root_node)
+
+            # Стек: (узел, глубина, множество id на пути от корня)
+            stack = [(root_node, 0, frozenset((root[0],)))]
+            while stack:
+                node, depth, path = stack.pop()
+                if self.max_depth is not None and depth >= self.max_depth:
+                    continue
+                for sub in self.subordinates_by_manager.get(node["id"], ()):
+                    if sub[0] in path:
+                        logger.warning(
+                            f"Обнаружен цикл административного подчинения: "
+                            f"{node['id']} -> {sub[0]}, связь пропущена"
+                        )
+                        continue
+                    child = self._node(*sub, with_relations=True)
+                    node["children"].append(child)
+                    stack.append((child, depth + 1, path | {sub[0]}))
+        return result
+
+
+def build_staff_tree(db: sqlite3.Connection, root_id: Optional[int] = None,
+                     max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Строит дерево административного подчинения за фиксированное число запросов."""
+    return StaffTreeLoader(db, root_id=root_id, max_depth=max_depth).load().build()
@@ -0,0 +1,197 @@
+"""
+Логирование без блокировок и выборочная трассировка запросов.
+
+- setup_logging() вешает на корневой логгер QueueHandler: запись в файл
+  и консоль выполняет отдельный поток QueueListener, обработчик запроса
+  только кладет запись в очередь.
+- Трассировка включается для доли запросов (sampling) по префиксу пути,
+  либо принудительно заголовком X-Trace: 1 — только если заголовок разрешен
+  администратором (header_enabled), иначе любой клиент мог бы включить
+  DEBUG-запись для своих запросов. Флаг хранится в contextvar,
+  поэтому код в горячих циклах проверяет его один раз на запрос:
+
+      traced = tracing_enabled()
+      ...
+      if traced:
+          trace("обработано %d строк", count)
+
+- Уровни логгеров, доли трассировки и разрешение заголовка меняются на лету
+  через configure().
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi import Request
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Уровень по умолчанию; DEBUG для всего приложения включается только явно
+DEFAULT_LOG_LEVEL = os.environ.get("OFS_LOG_LEVEL", "INFO").upper()
+# Доля трассируемых запросов для путей без отдельной настройки (0.0 — выключено)
+DEFAULT_SAMPLE_RATE = float(os.environ.get("OFS_TRACE_SAMPLE_RATE", "0"))
+# Учитывать ли заголовок X-Trace (по умолчанию выключено)
+DEFAULT_HEADER_ENABLED = os.environ.get("OFS_TRACE_HEADER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+TRACE_HEADER = "X-Trace"
+TRACE_ID_HEADER = "X-Trace-Id"
+# Допустимый X-Trace-Id от клиента; остальные заменяются сгенерированным
+# (значение попадает в каждую запись лога и в заголовок ответа)
+TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+trace_logger = logging.getLogger("ofs_api.trace")
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("ofs_trace_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Доли трассировки по префиксу пути; выбирается самый длинный совпавший префикс
+_sample_rates: Dict[str, float] = {}
+_default_sample_rate = DEFAULT_SAMPLE_RATE
+_header_enabled = DEFAULT_HEADER_ENABLED
+
+
+def setup_logging(log_file: Optional[str] = "api_debug.log", level: str = DEFAULT_LOG_LEVEL) -> None:
+    """Настраивает корневой логгер на запись через очередь. Повторный вызов ничего не делает."""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    # Трассировка пишется на DEBUG, но только для выбранных запросов
+    trace_logger.setLevel(logging.DEBUG)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает поток записи."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ---------- Трассировка ----------
+
+def tracing_enabled() -> bool:
+    return _trace_id.get() is not None
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace(message: str, *args) -> None:
+    """Пишет сообщение трассировки, если текущий запрос трассируется."""
+    trace_id = _trace_id.get()
+    if trace_id is not None:
+        trace_logger.debug("[%s] " + message, trace_id, *args)
+
+
+def sample_rate_for(path: str) -> float:
+    best_prefix = None
+    for prefix in _sample_rates:
+        if path.startswith(prefix) and (best_prefix is None or len(prefix) > len(best_prefix)):
+            best_prefix = prefix
+    return _sample_rates[best_prefix] if best_prefix is not None else _default_sample_rate
+
+
+def should_trace(request: Request) -> bool:
+    if _header_enabled and request.headers.get(TRACE_HEADER) == "1":
+        return True
+    rate = sample_rate_for(request.url.path)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+async def tracing_middleware(request: Request, call_next):
+    """Middleware: решает, трассировать ли запрос, и пишет его начало и завершение."""
+    if not should_trace(request):
+        return await call_next(request)
+
+    trace_id = request.headers.get(TRACE_ID_HEADER)
+    if trace_id is None or not TRACE_ID_PATTERN.fullmatch(trace_id):
+        trace_id = uuid.uuid4().hex[:16]
+    token = _trace_id.set(trace_id)
+    started = time.perf_counter()
+    try:
+        trace("-> %s %s", request.method, request.url.path + (f"?{request.url.query}" if request.url.query else ""))
+        response = await call_next(request)
+        trace("<- %s %.1f мс", response.status_code, (time.perf_counter() - started) * 1000)
+        response.headers[TRACE_ID_HEADER] = trace_id
+        return response
+    finally:
+        _trace_id.reset(token)
+
+
+# ---------- Настройка на лету ----------
+
+def get_config() -> Dict:
+    loggers = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, item in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(item, logging.Logger) and name.startswith("ofs_api") and item.level != logging.NOTSET:
+            loggers[name] = logging.getLevelName(item.level)
+    return {
+        "loggers": loggers,
+        "default_sample_rate": _default_sample_rate,
+        "sample_rates": dict(_sample_rates),
+        "header_enabled": _header_enabled,
+    }
+
+
+def configure(levels: Optional[Dict[str, str]] = None,
+              default_sample_rate: Optional[float] = None,
+              sample_rates: Optional[Dict[str, Optional[float]]] = None,
+              header_enabled: Optional[bool] = None) -> Dict:
+    """
+    Меняет уровни логгеров ("root" — корневой), доли трассировки и разрешение
+    заголовка X-Trace. Доля None для префикса удаляет его настройку.
+    Возвращает новую конфигурацию.
+    """
+    global _default_sample_rate, _header_enabled
+    # Сначала проверяем все значения, чтобы не применить настройки частично
+    level_values = {}
+    for name, level in (levels or {}).items():
+        level_value = logging.getLevelName(level.upper())
+        if not isinstance(level_value, int):
+            raise ValueError(f"Неизвестный уровень логирования: {level}")
+        level_values[name] = level_value
+
+    rates = dict(sample_rates or {})
+    if default_sample_rate is not None:
+        rates[None] = default_sample_rate
+    for prefix, rate in rates.items():
+        if rate is not None and not 0 <= rate <= 1:
+            raise ValueError(f"Доля трассировки должна быть от 0 до 1: {rate}")
+
+    for name, level_value in level_values.items():
+        logging.getLogger(None if name == "root" else name).setLevel(level_value)
+    for prefix, rate in rates.items():
+        if prefix is None:
+            _default_sample_rate = rate
+        elif rate is None:
+            _sample_rates.pop(prefix, None)
+        else:
+            _sample_rates[prefix] = rate
+    if header_enabled is not None:
+        _header_enabled = header_enabled
+    return get_config()
@@ -0,0 +1,370 @@
+"""
+Сводные показатели ЦКП по иерархии оргструктуры (GET /vfp/rollup).
+
+ЦКП привязан к организации, подразделению, отделу или функции. Для каждого
+узла — организации (холдинг, юрлицо, ...), подразделения и отдела — и для
+всей базы в целом (узел «all») считаются по активным ЦКП поддерева:
+
+- vfp_count и средний progress;
+- число ЦКП по статусам;
+- суммы числовых показателей metrics (вложенные объекты — через точку:
+  {"revenue": {"plan": 10}} -> "revenue.plan").
+
+Цепочка вверх: функция -> отделы (section_functions) -> подразделения
+(division_sections) -> все подразделения-предки (division_closure) -> их
+организации -> все организации-предки (organization_closure). Связи
+многие-ко-многим, поэтому для каждой сущности вычисляется множество узлов,
+в которые она входит, и ЦКП учитывается в каждом узле ровно один раз, даже
+если до него ведут несколько путей.
+
+Кэш. Полный расчет — один проход по ЦКП с множествами узлов, построенными
+по таблицам связей, загруженным в память. Результат хранится вместе с
+версиями таблиц (data_version, см. etag.py). Эндпоинты ЦКП после записи
+вызывают apply(): если с момента расчета изменилась только эта запись, вклад
+ее старой версии вычитается, а новой — добавляется. Изменение иерархии или
+любые другие записи в ЦКП (например, в обход API) обнаруживаются по версиям
+при следующем чтении, и сводка пересчитывается целиком.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from etag import table_versions
+
+logger = logging.getLogger("ofs_api.vfp_rollup")
+
+VFP_TABLE = "valuable_final_products"
+
+# Таблицы, от которых зависит структура сводки (имена узлов и связи)
+HIERARCHY_TABLES = ("organizations", "divisions", "sections", "division_sections", "section_functions")
+
+# Типы узлов сводки в порядке вывода; «all» — вся база
+NODE_TYPES = ("all", "organization", "division", "section")
+
+# Версия ЦКП в data_version увеличивается ровно на 1 при каждой записи, влияющей
+# на сводку. UPDATE OF — по колонкам сводки: триггер update_vfp_timestamp
+# (update_vfp_schema.py) меняет только updated_at и версию не трогает.
+VFP_VERSION_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS valuable_final_products_version_insert
+AFTER INSERT ON valuable_final_products
+FOR EACH ROW
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES ('valuable_final_products', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS valuable_final_products_version_update
+AFTER UPDATE OF entity_type, entity_id, status, progress, metrics, is_active ON valuable_final_products
+FOR EACH ROW
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES ('valuable_final_products', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS valuable_final_products_version_delete
+AFTER DELETE ON valuable_final_products
+FOR EACH ROW
+BEGIN
+    INSERT INTO data_version (table_name, version) VALUES ('valuable_final_products', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+"""
+
+Node = Tuple[str, int]
+TOTAL_NODE: Node = ("all", 0)
+
+
+class Contribution(NamedTuple):
+    """Вклад одного активного ЦКП в узлы сводки."""
+    entity_type: str
+    entity_id: int
+    status: Optional[str]
+    progress: Optional[float]
+    metrics: Tuple[Tuple[str, float], ...]
+
+
+def metric_values(raw: Any, prefix: str = "") -> Dict[str, float]:
+    """Числовые показатели из JSON metrics; нечисловые значения пропускаются."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return {}
+    result: Dict[str, float] = {}
+    if isinstance(raw, dict):
+        for key, value in raw.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                result.update(metric_values(value, name + "."))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                result[name] = value
+    return result
+
+
+def contribution(row: Optional[sqlite3.Row]) -> Optional[Contribution]:
+    """Вклад строки ЦКП (entity_type, entity_id, status, progress, metrics, is_active) или None."""
+    if row is None or not row[5]:
+        return None
+    return Contribution(row[0], row[1], row[2], row[3], tuple(metric_values(row[4]).items()))
+
+
+def ensure_vfp_versioning(db: sqlite3.Connection) -> None:
+    """
+    Ставит триггеры data_version на таблицу ЦКП (она создается отдельно,
+    update_vfp_schema.py), чтобы изменения в обход API сбрасывали сводку.
+    """
+    exists = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (VFP_TABLE,)).fetchone()
+    if exists:
+        db.executescript(VFP_VERSION_TRIGGERS)
+
+
+class _Aggregate:
+    __slots__ = ("count", "progress_sum", "progress_count", "statuses", "metrics", "entry")
+
+    def __init__(self):
+        self.count = 0
+        self.progress_sum = 0.0
+        self.progress_count = 0
+        self.statuses: Dict[str, int] = {}
+        self.metrics: Dict[str, float] = {}
+        # Готовая запись ответа; сбрасывается при изменении
+        self.entry: Optional[Dict[str, Any]] = None
+
+    def add(self, item: Contribution, sign: int = 1) -> None:
+        self.entry = None
+        self.count += sign
+        if item.progress is not None:
+            self.progress_sum += sign * item.progress
+            self.progress_count += sign
+        if item.status is not None:
+            self.statuses[item.status] = self.statuses.get(item.status, 0) + sign
+            if not self.statuses[item.status]:
+                del self.statuses[item.status]
+        for name, value in item.metrics:
+            self.metrics[name] = self.metrics.get(name, 0) + sign * value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "vfp_count": self.count,
+            "progress": round(self.progress_sum / self.progress_count, 2) if self.progress_count else None,
+            "status_counts": dict(sorted(self.statuses.items())),
+            "metrics": {name: round(value, 6) for name, value in sorted(self.metrics.items())},
+        }
+
+
+_EMPTY: FrozenSet[Node] = frozenset()
+
+
+class VfpRollup:
+    """Кэш сводки ЦКП по узлам иерархии с инкрементальным обновлением."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Optional[Dict[str, int]] = None
+        self._aggregates: Dict[Node, _Aggregate] = {}
+        # Узлы с ЦКП в порядке вывода; None — нужно пересортировать
+        self._order: Optional[List[Node]] = None
+        self._rows: Dict[int, Contribution] = {}
+        self._names: Dict[Node, str] = {}
+        self._targets: Dict[Tuple[str, int], FrozenSet[Node]] = {}
+        self._org_ancestors: Dict[int, List[int]] = {}
+        self._division_ancestors: Dict[int, List[int]] = {}
+        self._division_organization: Dict[int, int] = {}
+        self._section_divisions: Dict[int, List[int]] = {}
+        self._function_sections: Dict[int, List[int]] = {}
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+    def _current_versions(self, db: sqlite3.Connection) -> Dict[str, int]:
+        return table_versions(db, HIERARCHY_TABLES + (VFP_TABLE,))
+
+    # --- Иерархия ---
+
+    def _load_hierarchy(self, db: sqlite3.Connection) -> None:
+        def grouped(query):
+            result: Dict[int, List[int]] = {}
+            for key, value in db.execute(query):
+                result.setdefault(key, []).append(value)
+            return result
+
+        self._org_ancestors = grouped("SELECT descendant_id, ancestor_id FROM organization_closure")
+        self._division_ancestors = grouped("SELECT descendant_id, ancestor_id FROM division_closure")
+        self._section_divisions = grouped("SELECT section_id, division_id FROM division_sections")
+        self._function_sections = grouped("SELECT function_id, section_id FROM section_functions")
+        self._division_organization = dict(db.execute("SELECT id, organization_id FROM divisions"))
+        self._names = {}
+        for node_type, table in (("organization", "organizations"), ("division", "divisions"),
+                                 ("section", "sections")):
+            self._names.update(((node_type, row[0]), row[1]) for row in db.execute(f"SELECT id, name FROM {table}"))
+        self._names[TOTAL_NODE] = "Все"
+        self._targets = {}
+
+    def _memo(self, key: Tuple[str, int], compute) -> FrozenSet[Node]:
+        # Множества узлов запоминаются на каждом уровне: у отделов одного
+        # подразделения общая цепочка предков, и она строится один раз
+        result = self._targets.get(key)
+        if result is None:
+            result = self._targets[key] = frozenset(compute())
+        return result
+
+    def _organization_nodes(self, organization_id: int) -> FrozenSet[Node]:
+        # Удаленной организации нет в замыкании: ее ЦКП учитываются только в «all»
+        return self._memo(("organization", organization_id), lambda: (
+            ("organization", ancestor) for ancestor in self._org_ancestors.get(organization_id, ())
+        ))
+
+    def _division_nodes(self, division_id: int) -> FrozenSet[Node]:
+        def compute():
+            nodes = set()
+            for ancestor in self._division_ancestors.get(division_id, ()):
+                nodes.add(("division", ancestor))
+                organization_id = self._division_organization.get(ancestor)
+                if organization_id is not None:
+                    nodes |= self._organization_nodes(organization_id)
+            return nodes
+
+        return self._memo(("division", division_id), compute)
+
+    def _section_nodes(self, section_id: int) -> FrozenSet[Node]:
+        def compute():
+            if ("section", section_id) not in self._names:
+                return _EMPTY
+            nodes = {("section", section_id)}
+            for division_id in self._section_divisions.get(section_id, ()):
+                nodes |= self._division_nodes(division_id)
+            return nodes
+
+        return self._memo(("section", section_id), compute)
+
+    def _function_nodes(self, function_id: int) -> FrozenSet[Node]:
+        def compute():
+            nodes = set()
+            for section_id in self._function_sections.get(function_id, ()):
+                nodes |= self._section_nodes(section_id)
+            return nodes
+
+        return self._memo(("function", function_id), compute)
+
+    def targets(self, entity_type: str, entity_id: int) -> FrozenSet[Node]:
+        """Узлы сводки, в которые входит ЦКП сущности, кроме «all»."""
+        if entity_type in ("organization", "board"):
+            return self._organization_nodes(entity_id)
+        if entity_type == "division":
+            return self._division_nodes(entity_id)
+        if entity_type == "section":
+            return self._section_nodes(entity_id)
+        if entity_type == "function":
+            return self._function_nodes(entity_id)
+        # director: привязан к человеку, а не к узлу структуры — только в «all»
+        return _EMPTY
+
+    # --- Агрегаты ---
+
+    def _add(self, item: Contribution, sign: int) -> None:
+        for node in (TOTAL_NODE, *self.targets(item.entity_type, item.entity_id)):
+            aggregate = self._aggregates.get(node)
+            if aggregate is None:
+                aggregate = self._aggregates[node] = _Aggregate()
+                self._order = None
+            aggregate.add(item, sign)
+            if not aggregate.count:
+                del self._aggregates[node]
+                self._order = None
+
+    def _rebuild(self, db: sqlite3.Connection, versions: Dict[str, int]) -> None:
+        self._load_hierarchy(db)
+        self._aggregates = {}
+        self._order = None
+        self._rows = {}
+        try:
+            rows = db.execute(
+                f"SELECT id, entity_type, entity_id, status, progress, metrics, is_active FROM {VFP_TABLE}"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Таблица ЦКП еще не создана (update_vfp_schema.py не запускался)
+            rows = []
+        for row in rows:
+            item = contribution(row[1:])
+            if item is not None:
+                self._rows[row[0]] = item
+                self._add(item, 1)
+        self._versions = versions
+        self.rebuilds += 1
+        logger.info(f"Сводка ЦКП пересчитана: {len(self._rows)} ЦКП, {len(self._aggregates)} узлов")
+
+    def apply(self, db: sqlite3.Connection, vfp_id: int) -> None:
+        """
+        Учитывает изменение одного ЦКП (создание, изменение, удаление) после commit.
+        Если кроме него в базе что-то менялось, сводка сбрасывается до следующего чтения.
+        """
+        with self._lock:
+            if self._versions is None:
+                return
+            versions = self._current_versions(db)
+            expected = dict(self._versions, **{VFP_TABLE: self._versions[VFP_TABLE] + 1})
+            if versions != expected:
+                self._versions = None
+                return
+            row = db.execute(
+                f"SELECT entity_type, entity_id, status, progress, metrics, is_active FROM {VFP_TABLE} WHERE id = ?",
+                (vfp_id,)
+            ).fetchone()
+            old = self._rows.pop(vfp_id, None)
+            if old is not None:
+                self._add(old, -1)
+            new = contribution(row)
+            if new is not None:
+                self._rows[vfp_id] = new
+                self._add(new, 1)
+            self._versions = versions
+            self.incremental_updates += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._versions = None
+
+    def _entry(self, node: Node) -> Dict[str, Any]:
+        aggregate = self._aggregates.get(node)
+        if aggregate is None:
+            aggregate = _Aggregate()
+        if aggregate.entry is None:
+            aggregate.entry = {"node_type": node[0], "node_id": node[1], "name": self._names.get(node),
+                               **aggregate.to_dict()}
+        return aggregate.entry
+
+    def get(self, db: sqlite3.Connection, node_type: Optional[str] = None,
+            node_id: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Сводка по узлам типа node_type (по умолчанию по всем узлам с ЦКП)
+        или по одному узлу (node_type + node_id). None — узел не найден.
+        Записи ответа общие для всех вызовов и не должны изменяться.
+        """
+        if node_type is not None and node_type not in NODE_TYPES:
+            raise ValueError(f"Неизвестный тип узла {node_type}, допустимы: {', '.join(NODE_TYPES)}")
+        if node_id is not None and node_type is None:
+            raise ValueError("Для node_id нужно указать node_type")
+        with self._lock:
+            versions = self._current_versions(db)
+            if versions != self._versions:
+                self._rebuild(db, versions)
+
+            if node_id is not None:
+                node = (node_type, node_id)
+                if node not in self._names:
+                    return None
+                return [self._entry(node)]
+
+            if self._order is None:
+                self._order = sorted(self._aggregates, key=lambda node: (NODE_TYPES.index(node[0]), node[1]))
+            return [self._entry(node) for node in self._order if node_type is None or node[0] == node_type]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rebuilds": self.rebuilds,
+            "incremental_updates": self.incremental_updates,
+            "nodes": len(self._aggregates),
+            "vfps": len(self._rows),
+        }
@@ -339,25 +339,32 @@ def create_position(position_data, function_id=None, api_prefix=""):
         print(f"❌ Исключение при создании должности: {str(e)}")
         return None
 
-def create_staff(staff_data, api_prefix=""):
-    """Создать сотрудника через API"""
+def create_staff_batch(staff_list, api_prefix=""):
+    """Создать сотрудников одним запросом через пакетный эндпоинт API"""
     try:
-        url = f"{API_URL}{api_prefix}/staff/"
-        debug_print(f"POST {url} с данными: {json.dumps(staff_data, ensure_ascii=False)}")
+        url = f"{API_URL}{api_prefix}/staff/batch"
+        debug_print(f"POST {url} с {len(staff_list)} сотрудниками")
         
-        response = requests.post(url, json=staff_data)
+        response = requests.post(url, json=staff_list)
         
         debug_print(f"Ответ: {response.status_code}, {response.text[:200]}...")
         
-        if response.status_code in (200, 201):
-            print(f"✅ Создан сотрудник: {staff_data['first_name']} {staff_data['last_name']}")
-            return response.json()
-        else:
-            print(f"❌ Ошибка при создании сотрудника {staff_data['first_name']} {staff_data['last_name']}: {response.text}")
-            return None
+        if response.status_code != 200:
+            print(f"❌ Ошибка при создании сотрудников: {response.text}")
+            return []
+        
+        created = []
+        for item in response.json()["items"]:
+            staff_data = staff_list[item["index"]]
+            if item["status"] == "created":
+                print(f"✅ Создан сотрудник: {staff_data['first_name']} {staff_data['last_name']}")
+                created.append(dict(staff_data, id=item["id"]))
+            else:
+                print(f"❌ Ошибка при создании сотрудника {staff_data['first_name']} {staff_data['last_name']}: {item['detail']}")
+        return created
     except Exception as e:
-        print(f"❌ Исключение при создании сотрудника: {str(e)}")
-        return None
+        print(f"❌ Исключение при создании сотрудников: {str(e)}")
+        return []
 
 def populate_database():
     """Заполнение базы данных тестовыми данными"""
@@ -422,7 +429,8 @@ def populate_database():
             created_positions[position["name"]] = position["id"]
     
     print("\n5. Создание сотрудников:")
-    # 7. Создание сотрудников
+    # 7. Создание сотрудников (одним пакетом)
+    staff_list = []
     for _ in range(20):  # Создадим 20 сотрудников
         # Выбираем случайную должность
         position_name = random.choice(list(created_positions.keys()))
@@ -455,9 +463,10 @@ def populate_database():
             "is_active": True
         }
         
-        staff = create_staff(staff_data, api_prefix=api_prefix)
-        if staff:
-            created_staff[f"{first_name} {last_name}"] = staff["id"]
+        staff_list.append(staff_data)
+    
+    for staff in create_staff_batch(staff_list, api_prefix=api_prefix):
+        created_staff[f"{staff['first_name']} {staff['last_name']}"] = staff["id"]
     
     print(f"\n✅ База данных успешно заполнена тестовыми данными!")
     print(f"📊 Статистика:")
@@ -10,7 +10,8 @@ import asyncio
 from database import BotDatabase
 from states import AdminStates
 import keyboards
-from api_client import ApiClient
+from api_client import api_client
+from reference_cache import reference_cache
 from config import Config
 
 # Настройка логирования
@@ -25,17 +26,19 @@ router = Router()
 
 # Инициализация зависимостей
 db = BotDatabase()
-api_client = ApiClient()
 config = Config()
 
-# Фильтр для проверки прав админа
-def is_admin_filter(message: Message) -> bool:
-    """Фильтр для проверки, является ли пользователь админом"""
-    return db.is_admin(str(message.from_user.id))
+# Фильтры прав проверяются на каждое сообщение: ответ дает реестр админов
+# в памяти, который перечитывается из БД раз в ADMIN_REFRESH_INTERVAL секунд.
+# Фильтры объявлены async, потому что синхронные фильтры aiogram выполняет
+# в пуле потоков (asyncio.to_thread)
+async def is_admin_filter(message: Message) -> bool:
+    """Фильтр для проверки, является ли пользователь админом (по ID или username)"""
+    return await db.is_admin(message.from_user.id, message.from_user.username)
 
-def is_superadmin_filter(message: Message) -> bool:
+async def is_superadmin_filter(message: Message) -> bool:
     """Фильтр для проверки, является ли пользователь супер-админом"""
-    return db.is_superadmin(str(message.from_user.id))
+    return await db.is_superadmin(message.from_user.id)
 
 # Команда для входа в админ-панель
 @router.message(Command("admin"))
@@ -74,7 +77,7 @@ async def admin_panel(message: Message):
 @router.message(F.text == "📋 Заявки", is_admin_filter)
 async def show_requests(message: Message):
     """Отображает список заявок на регистрацию"""
-    requests = db.get_pending_registration_requests()
+    requests = await db.get_pending_registration_requests()
     
     if not requests:
         await message.answer(
@@ -100,7 +103,7 @@ async def show_registration_requests(message: Message):
 @router.callback_query(F.data == "refresh_requests")
 async def refresh_requests(callback: CallbackQuery):
     """Обновляет список заявок"""
-    requests = db.get_pending_registration_requests()
+    requests = await db.get_pending_registration_requests()
     
     if not requests:
         await callback.message.edit_text(
@@ -136,7 +139,7 @@ async def back_to_admin(callback: CallbackQuery):
 async def select_request(callback: CallbackQuery):
     """Отображает данные конкретной заявки"""
     request_id = int(callback.data.split("_")[1])
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     if not request:
         await callback.message.edit_text(
@@ -171,7 +174,7 @@ async def select_request(callback: CallbackQuery):
 @router.callback_query(F.data == "back_to_requests")
 async def back_to_requests(callback: CallbackQuery):
     """Возврат к списку заявок"""
-    requests = db.get_pending_registration_requests()
+    requests = await db.get_pending_registration_requests()
     
     if not requests:
         await callback.message.edit_text(
@@ -194,7 +197,7 @@ async def reject_request(callback: CallbackQuery):
     request_id = int(callback.data.split("_")[2])
     
     # Обновляем статус заявки
-    success = db.process_registration_request(
+    success = await db.process_registration_request(
         request_id=request_id,
         status="rejected",
         admin_id=str(callback.from_user.id)
@@ -209,7 +212,7 @@ async def reject_request(callback: CallbackQuery):
         return
     
     # Получаем данные заявки
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     await callback.message.edit_text(
         f"✅ Заявка #{request_id} успешно отклонена.",
@@ -235,7 +238,7 @@ async def approve_request(callback: CallbackQuery, state: FSMContext):
     request_id = int(callback.data.split("_")[2])
     
     # Получаем данные заявки
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     if not request:
         await callback.message.edit_text(
@@ -250,8 +253,8 @@ async def approve_request(callback: CallbackQuery, state: FSMContext):
     
     # Получаем список должностей из API
     try:
-        # Запрашиваем должности через API
-        positions = await api_client.get_positions()
+        # Должности из кэша справочников (при необходимости загружаются из API)
+        positions = await reference_cache.get("positions")
         
         if not positions:
             # Если API не вернул должности, используем заглушки
@@ -280,7 +283,7 @@ async def approve_request(callback: CallbackQuery, state: FSMContext):
         )
         
         # Также запрашиваем список отделов, чтобы потом можно было выбрать
-        divisions = await api_client.get_divisions()
+        divisions = await reference_cache.get("divisions")
         if divisions:
             await state.update_data(divisions=divisions)
         
@@ -306,7 +309,7 @@ async def select_position(callback: CallbackQuery, state: FSMContext):
     divisions = data.get("divisions", [])
     
     # Получаем данные заявки
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     if not request:
         await callback.message.edit_text(
@@ -405,7 +408,7 @@ async def back_to_position_selection(callback: CallbackQuery, state: FSMContext)
     data = await state.get_data()
     request_id = data.get("request_id")
     positions = data.get("positions", [])
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     # Устанавливаем состояние выбора должности
     await state.set_state(AdminStates.waiting_for_position_selection)
@@ -427,7 +430,7 @@ async def generate_invitation_code(callback: CallbackQuery, state: FSMContext):
     # Получаем данные из состояния
     data = await state.get_data()
     request_id = data.get("request_id")
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     # Получаем данные о выбранной должности
     selected_position = data.get("selected_position")
@@ -461,7 +464,7 @@ async def generate_invitation_code(callback: CallbackQuery, state: FSMContext):
         expires_at = api_result.get("expires_at", "неизвестно")
         
         # Сохраняем код в БД
-        db.save_invitation_code(
+        await db.save_invitation_code(
             request_id=request_id,
             code=invitation_code,
             position_id=position_id,
@@ -505,7 +508,7 @@ async def generate_invitation_code(callback: CallbackQuery, state: FSMContext):
         )
     
     # Обновляем состояние заявки
-    db.update_registration_request(request_id, status="approved")
+    await db.update_registration_request(request_id, status="approved")
     
     # Очищаем состояние
     await state.clear()
@@ -517,7 +520,7 @@ async def generate_invitation_code(callback: CallbackQuery, state: FSMContext):
 async def back_to_request(callback: CallbackQuery, state: FSMContext):
     """Возврат к просмотру заявки"""
     request_id = int(callback.data.split("_")[3])
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     
     await state.clear()
     
@@ -557,11 +560,11 @@ async def show_stats(message: Message):
     admin_id = str(message.from_user.id)
     
     # Получаем статистику админа
-    admin_stats = db.get_admin_stats(admin_id)
+    admin_stats = await db.get_admin_stats(admin_id)
     
     # Получаем общую статистику
-    staff = db.get_all_staff()
-    requests = db.get_pending_registration_requests()
+    staff = await db.get_all_staff()
+    requests = await db.get_pending_registration_requests()
     
     # Формируем текст со статистикой
     text = (
@@ -604,7 +607,7 @@ async def user_management(message: Message):
 @router.message(F.text == "📜 Список админов", is_superadmin_filter)
 async def list_admins(message: Message):
     """Показывает список всех админов"""
-    admins = db.get_all_admins()
+    admins = await db.get_all_admins()
     
     if not admins:
         await message.answer(
@@ -669,7 +672,7 @@ async def process_admin_id(message: Message, state: FSMContext):
         return
     
     # Проверяем, существует ли уже такой админ
-    existing_admin = db.get_admin_by_telegram_id(telegram_id)
+    existing_admin = await db.get_admin_by_telegram_id(telegram_id)
     if existing_admin and existing_admin['is_active']:
         await message.answer(
             "❌ Этот пользователь уже является админом.",
@@ -724,7 +727,7 @@ async def confirm_add_admin(callback: CallbackQuery, state: FSMContext):
         data = await state.get_data()
         
         # Добавляем нового админа
-        success = db.add_admin(
+        success = await db.add_admin(
             telegram_id=data['admin_telegram_id'],
             full_name=data['admin_name'],
             created_by=str(callback.from_user.id)
@@ -795,7 +798,7 @@ async def main_menu_from_admin(message: Message):
 @router.message(F.text == "🧑‍💼 Сотрудники", is_admin_filter)
 async def show_staff(message: Message):
     """Отображает список сотрудников"""
-    staff = db.get_all_staff()
+    staff = await db.get_all_staff()
     
     if not staff:
         await message.answer(
@@ -814,7 +817,7 @@ async def show_staff(message: Message):
 @router.message(F.text == "➖ Удалить админа", is_superadmin_filter)
 async def remove_admin_start(message: Message):
     """Начинает процесс удаления админа"""
-    admins = db.get_all_admins()
+    admins = await db.get_all_admins()
     
     # Фильтруем только активных админов, кроме текущего
     active_admins = [
@@ -842,7 +845,7 @@ async def admin_actions(callback: CallbackQuery):
     admin_id = callback.data.split("_")[1]
     
     # Получаем данные админа
-    admin = db.get_admin_by_telegram_id(admin_id)
+    admin = await db.get_admin_by_telegram_id(admin_id)
     
     if not admin:
         await callback.message.edit_text(
@@ -877,7 +880,7 @@ async def admin_actions(callback: CallbackQuery):
 @router.callback_query(F.data == "back_to_admins_list")
 async def back_to_admins_list(callback: CallbackQuery):
     """Возврат к списку админов"""
-    admins = db.get_all_admins()
+    admins = await db.get_all_admins()
     
     await callback.message.edit_text(
         f"👥 <b>Список админов ({len(admins)})</b>\n\n"
@@ -903,7 +906,7 @@ async def remove_admin(callback: CallbackQuery):
         return
     
     # Получаем данные админа
-    admin = db.get_admin_by_telegram_id(admin_id)
+    admin = await db.get_admin_by_telegram_id(admin_id)
     
     if not admin:
         await callback.message.edit_text(
@@ -914,7 +917,7 @@ async def remove_admin(callback: CallbackQuery):
         return
     
     # Проверяем, не пытается ли обычный админ удалить супер-админа
-    if admin['permission_level'] == 2 and not db.is_superadmin(str(callback.from_user.id)):
+    if admin['permission_level'] == 2 and not await db.is_superadmin(str(callback.from_user.id)):
         await callback.message.edit_text(
             "❌ У вас недостаточно прав для удаления супер-админа.",
             reply_markup=keyboards.get_back_to_main_keyboard()
@@ -923,7 +926,7 @@ async def remove_admin(callback: CallbackQuery):
         return
     
     # Удаляем админа
-    success = db.remove_admin(admin_id)
+    success = await db.remove_admin(admin_id)
     
     if success:
         # Отправляем уведомление удаленному админу
@@ -955,7 +958,7 @@ async def admin_stats(callback: CallbackQuery):
     admin_id = callback.data.split("_")[2]
     
     # Получаем данные админа
-    admin = db.get_admin_by_telegram_id(admin_id)
+    admin = await db.get_admin_by_telegram_id(admin_id)
     
     if not admin:
         await callback.message.edit_text(
@@ -966,7 +969,7 @@ async def admin_stats(callback: CallbackQuery):
         return
     
     # Получаем статистику админа
-    stats = db.get_admin_stats(admin_id)
+    stats = await db.get_admin_stats(admin_id)
     
     # Формируем текст со статистикой
     text = (
@@ -980,7 +983,7 @@ async def admin_stats(callback: CallbackQuery):
     
     await callback.message.edit_text(
         text,
-        reply_markup=keyboards.get_admins_list_keyboard(db.get_all_admins())
+        reply_markup=keyboards.get_admins_list_keyboard(await db.get_all_admins())
     )
     
     await callback.answer()
@@ -1000,7 +1003,7 @@ async def send_invitation_to_user(
         position_name: Название должности
         division_name: Название отдела (опционально)
     """
-    request = db.get_registration_request(request_id)
+    request = await db.get_registration_request(request_id)
     if not request:
         logger.error(f"Не удалось найти заявку с ID {request_id}")
         return
@@ -1043,4 +1046,6 @@ async def send_invitation_to_user(
 
 def register_admin_handlers(dispatcher: Router):
     """Регистрирует все обработчики админских команд"""
-    dispatcher.include_router(router) 
\ No newline at end of file
+    dispatcher.include_router(router)
+    # Соединение с БД закрывается вместе с диспетчером
+    router.shutdown.register(db.close) 
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Реестр администраторов в памяти.
+
+Фильтры is_admin_filter / is_superadmin_filter срабатывают на каждое входящее
+сообщение, поэтому проверка прав не должна обращаться к БД. Реестр хранит
+активных администраторов из таблицы admins (по telegram_id и по username)
+и администраторов из Config.ADMIN_IDS; проверка — поиск в словаре/множестве.
+
+Реестр наполняет и обновляет BotDatabase: load() при запуске и каждые
+ADMIN_REFRESH_INTERVAL секунд (чтобы видеть изменения, сделанные другими
+процессами бота), set() / discard() из add_admin / remove_admin после commit.
+Эти методы выполняются в потоке
+базы данных, а проверки — в цикле событий; отдельные операции со словарями
+атомарны, а load() подменяет словари целиком, поэтому блокировки не нужны.
+"""
+
+from typing import Any, Dict, Iterable, Mapping, Optional, Set, Tuple, Union
+
+# Уровни прав в таблице admins
+ADMIN_LEVEL = 1
+SUPERADMIN_LEVEL = 2
+
+
+def normalize_username(username: Optional[str]) -> Optional[str]:
+    """Username без @ в нижнем регистре (в Telegram username не зависит от регистра)"""
+    if not username:
+        return None
+    return username.lstrip('@').lower() or None
+
+
+class AdminRegistry:
+    """Активные администраторы, проиндексированные по telegram_id и username"""
+    
+    def __init__(self, config_admins: Iterable[Union[int, str]] = ()):
+        # Администраторы из конфигурации: числовые ID и @username
+        self._config_ids: Set[str] = set()
+        self._config_usernames: Set[str] = set()
+        for admin in config_admins:
+            admin = str(admin).strip()
+            if admin.startswith('@'):
+                self._config_usernames.add(normalize_username(admin))
+            elif admin:
+                self._config_ids.add(admin)
+        # Из таблицы admins: telegram_id -> (уровень прав, username)
+        self._by_id: Dict[str, Tuple[int, Optional[str]]] = {}
+        # username -> telegram_id
+        self._by_username: Dict[str, str] = {}
+    
+    def load(self, rows: Iterable[Mapping[str, Any]]):
+        """Заменяет содержимое реестра активными администраторами из строк таблицы admins"""
+        by_id = {}
+        by_username = {}
+        for row in rows:
+            if not row['is_active']:
+                continue
+            telegram_id = str(row['telegram_id'])
+            username = normalize_username(row['username'])
+            by_id[telegram_id] = (row['permission_level'] or ADMIN_LEVEL, username)
+            if username:
+                by_username[username] = telegram_id
+        self._by_id, self._by_username = by_id, by_username
+    
+    def set(self, telegram_id: Union[int, str], permission_level: int = ADMIN_LEVEL,
+            username: Optional[str] = None):
+        """Добавляет или обновляет активного администратора"""
+        telegram_id = str(telegram_id)
+        self.discard(telegram_id)
+        username = normalize_username(username)
+        self._by_id[telegram_id] = (permission_level or ADMIN_LEVEL, username)
+        if username:
+            self._by_username[username] = telegram_id
+    
+    def discard(self, telegram_id: Union[int, str]):
+        """Убирает администратора (деактивирован)"""
+        entry = self._by_id.pop(str(telegram_id), None)
+        if entry is not None and entry[1] and self._by_username.get(entry[1]) == str(telegram_id):
+            del self._by_username[entry[1]]
+    
+    def is_admin(self, telegram_id: Union[int, str], username: Optional[str] = None) -> bool:
+        """
+        Проверяет, является ли пользователь администратором.
+        
+        Args:
+            telegram_id: Telegram ID (или "@username", как в прежнем BotDatabase.is_admin)
+            username: Username пользователя, если известен
+        """
+        telegram_id = str(telegram_id)
+        if telegram_id.startswith('@'):
+            username = telegram_id
+        elif telegram_id in self._by_id or telegram_id in self._config_ids:
+            return True
+        username = normalize_username(username)
+        return username is not None and (username in self._by_username or username in self._config_usernames)
+    
+    def is_superadmin(self, telegram_id: Union[int, str]) -> bool:
+        """Проверяет, является ли пользователь супер-администратором (уровень прав в таблице admins)"""
+        entry = self._by_id.get(str(telegram_id))
+        return entry is not None and entry[0] == SUPERADMIN_LEVEL
+    
+    def __len__(self) -> int:
+        return len(self._by_id)
@@ -1,4 +1,8 @@
+import asyncio
+import json
 import logging
+import random
+import time
 import aiohttp
 from typing import List, Dict, Any, Optional
 from config import Config
@@ -13,10 +17,86 @@ logger = logging.getLogger(__name__)
 # Загрузка конфигурации
 config = Config()
 
-class ApiClient:
-    """Класс для взаимодействия с API основной системы"""
+# Ответы, после которых запрос стоит повторить: сервис временно недоступен
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Методы, повтор которых безопасен; POST повторяется, только если соединение
+# не было установлено (запрос точно не дошел до сервера)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Верхняя граница задержки между повторами, секунд
+MAX_BACKOFF = 10.0
+
+
+class ApiError(Exception):
+    """Ответ API с неуспешным статусом"""
+    
+    def __init__(self, status: int, text: str):
+        super().__init__(f"Ошибка {status}: {text}")
+        self.status = status
+        self.text = text
+
+
+class ApiResponse:
+    """Прочитанный ответ API: статус и тело (соединение уже возвращено в пул)"""
+    
+    def __init__(self, status: int, text: str):
+        self.status = status
+        self.text = text
+    
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class EndpointStats:
+    """Счетчики одного эндпоинта: вызовы, ошибки, повторы и время ответа"""
+    
+    __slots__ = ("calls", "errors", "retries", "total_seconds", "max_seconds", "last_error")
     
     def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_error: Optional[str] = None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 1),
+            "last_error": self.last_error,
+        }
+
+
+class ApiClient:
+    """
+    Класс для взаимодействия с API основной системы.
+    
+    Все запросы идут через одну долгоживущую aiohttp-сессию с пулом соединений
+    (keep-alive, ограничение числа соединений на хост), поэтому TCP-соединение
+    и сессия не создаются заново на каждый вызов. Сессия создается при первом
+    запросе и закрывается методом close() при остановке бота.
+    Временные сбои (обрыв соединения, таймаут, 429/502/503/504) повторяются
+    с экспоненциальной задержкой; по каждому эндпоинту ведутся счетчики (stats()).
+    """
+    
+    def __init__(self, timeout: Optional[float] = None, connect_timeout: Optional[float] = None,
+                 retries: Optional[int] = None, retry_backoff: Optional[float] = None,
+                 pool_limit: Optional[int] = None, pool_limit_per_host: Optional[int] = None):
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout if timeout is not None else config.API_TIMEOUT,
+            connect=connect_timeout if connect_timeout is not None else config.API_CONNECT_TIMEOUT
+        )
+        self.retries = retries if retries is not None else config.API_RETRIES
+        self.retry_backoff = retry_backoff if retry_backoff is not None else config.API_RETRY_BACKOFF
+        self.pool_limit = pool_limit if pool_limit is not None else config.API_POOL_LIMIT
+        self.pool_limit_per_host = (pool_limit_per_host if pool_limit_per_host is not None
+                                    else config.API_POOL_LIMIT_PER_HOST)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, EndpointStats] = {}
+        
         self.base_url = config.API_URL
         self.webhook_endpoint = config.API_WEBHOOK_ENDPOINT
         self.token_validation_endpoint = config.API_TOKEN_VALIDATION_ENDPOINT
@@ -27,6 +107,114 @@ class ApiClient:
         self.divisions_endpoint = f"{self.base_url}/divisions"
         self.staff_endpoint = f"{self.base_url}/staff"
     
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая ее при первом обращении"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+    
+    async def close(self):
+        """Закрывает сессию и пул соединений; вызывается при остановке бота"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._stats:
+            logger.info(f"Статистика запросов к API: {self.stats()}")
+    
+    def _backoff(self, attempt: int) -> float:
+        # Экспоненциальная задержка со случайной добавкой, чтобы повторы разных
+        # запросов не приходили на сервер одновременно
+        delay = min(self.retry_backoff * (2 ** attempt), MAX_BACKOFF)
+        return delay + random.uniform(0, delay / 2)
+    
+    async def request(self, name: str, method: str, url: str, **kwargs) -> ApiResponse:
+        """
+        Выполняет запрос через общую сессию с повторами при временных сбоях.
+        
+        Args:
+            name: Имя эндпоинта для счетчиков (например, "get_positions")
+            method: HTTP-метод
+            url: Полный URL
+            **kwargs: Параметры aiohttp (json, params, headers, ...)
+            
+        Returns:
+            ApiResponse: Статус и тело последнего ответа
+            
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: если все попытки завершились ошибкой
+        """
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = EndpointStats()
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        session = await self._get_session()
+        
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    async with session.request(method, url, **kwargs) as response:
+                        result = ApiResponse(response.status, await response.text())
+                    if not (idempotent and result.status in RETRY_STATUSES and attempt < self.retries):
+                        if result.status >= 500:
+                            stats.errors += 1
+                            stats.last_error = f"HTTP {result.status}"
+                        return result
+                    reason = f"HTTP {result.status}"
+                except (aiohttp.ClientConnectorError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    # Без установленного соединения запрос не отправлен, повтор безопасен
+                    retryable = idempotent or isinstance(e, aiohttp.ClientConnectorError)
+                    if not retryable or attempt >= self.retries:
+                        stats.errors += 1
+                        stats.last_error = f"{type(e).__name__}: {e}"
+                        raise
+                    reason = f"{type(e).__name__}: {e}"
+                
+                delay = self._backoff(attempt)
+                attempt += 1
+                stats.retries += 1
+                logger.warning(f"Запрос {name} не удался ({reason}), повтор {attempt}/{self.retries} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+    
+    async def fetch_reference(self, name: str) -> List[Dict[str, Any]]:
+        """
+        Загружает справочник ("positions", "divisions" или "organizations") для кэша.
+        
+        В отличие от get_positions() и подобных, не подменяет ошибку пустым
+        списком или заглушкой, чтобы кэш не сохранил их вместо данных.
+        
+        Raises:
+            ApiError: если API ответил неуспешным статусом
+        """
+        endpoints = {
+            "positions": self.positions_endpoint,
+            "divisions": self.divisions_endpoint,
+            "organizations": self.organizations_endpoint,
+        }
+        if name not in endpoints:
+            raise ValueError(f"Неизвестный справочник: {name}")
+        endpoint = endpoints[name]
+        response = await self.request(f"get_{name}", "GET", endpoint)
+        if response.status != 200:
+            raise ApiError(response.status, response.text)
+        return response.json()
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счетчики по эндпоинтам: вызовы, ошибки, повторы, среднее и максимальное время"""
+        return {name: stats.as_dict() for name, stats in sorted(self._stats.items())}
+    
     async def get_positions(self) -> List[Dict[str, Any]]:
         """
         Получает список всех должностей из основной системы
@@ -35,16 +223,15 @@ class ApiClient:
             List[Dict[str, Any]]: Список словарей с данными о должностях
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.positions_endpoint) as response:
-                    if response.status == 200:
-                        positions = await response.json()
-                        logger.info(f"Получено {len(positions)} должностей из API")
-                        return positions
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при получении должностей: {response.status} - {error_text}")
-                        return []
+            response = await self.request("get_positions", "GET", self.positions_endpoint)
+            if response.status == 200:
+                positions = response.json()
+                logger.info(f"Получено {len(positions)} должностей из API")
+                return positions
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при получении должностей: {response.status} - {error_text}")
+                return []
         except Exception as e:
             logger.error(f"Исключение при получении должностей: {str(e)}")
             return []
@@ -62,16 +249,15 @@ class ApiClient:
         position_endpoint = f"{self.positions_endpoint}/{position_id}"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(position_endpoint) as response:
-                    if response.status == 200:
-                        position = await response.json()
-                        logger.info(f"Получена должность с ID {position_id}")
-                        return position
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при получении должности: {response.status} - {error_text}")
-                        return None
+            response = await self.request("get_position_by_id", "GET", position_endpoint)
+            if response.status == 200:
+                position = response.json()
+                logger.info(f"Получена должность с ID {position_id}")
+                return position
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при получении должности: {response.status} - {error_text}")
+                return None
         except Exception as e:
             logger.error(f"Исключение при получении должности: {str(e)}")
             return None
@@ -84,20 +270,19 @@ class ApiClient:
             List[Dict[str, Any]]: Список словарей с данными об организациях
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.organizations_endpoint) as response:
-                    if response.status == 200:
-                        organizations = await response.json()
-                        logger.info(f"Получено {len(organizations)} организаций из API")
-                        return organizations
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при получении организаций: {response.status} - {error_text}")
-                        # Возвращаем заглушку в случае ошибки
-                        logger.info("Возвращаем заглушку для организаций")
-                        return [
-                            {"id": 1, "name": "OFS Global", "description": "Основная организация"}
-                        ]
+            response = await self.request("get_organizations", "GET", self.organizations_endpoint)
+            if response.status == 200:
+                organizations = response.json()
+                logger.info(f"Получено {len(organizations)} организаций из API")
+                return organizations
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при получении организаций: {response.status} - {error_text}")
+                # Возвращаем заглушку в случае ошибки
+                logger.info("Возвращаем заглушку для организаций")
+                return [
+                    {"id": 1, "name": "OFS Global", "description": "Основная организация"}
+                ]
         except Exception as e:
             logger.error(f"Исключение при получении организаций: {str(e)}")
             # Возвращаем заглушку в случае ошибки соединения
@@ -114,16 +299,15 @@ class ApiClient:
             List[Dict[str, Any]]: Список словарей с данными об отделах
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.divisions_endpoint) as response:
-                    if response.status == 200:
-                        divisions = await response.json()
-                        logger.info(f"Получено {len(divisions)} отделов из API")
-                        return divisions
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при получении отделов: {response.status} - {error_text}")
-                        return []
+            response = await self.request("get_divisions", "GET", self.divisions_endpoint)
+            if response.status == 200:
+                divisions = response.json()
+                logger.info(f"Получено {len(divisions)} отделов из API")
+                return divisions
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при получении отделов: {response.status} - {error_text}")
+                return []
         except Exception as e:
             logger.error(f"Исключение при получении отделов: {str(e)}")
             return []
@@ -160,25 +344,24 @@ class ApiClient:
         adapted_data = {k: v for k, v in adapted_data.items() if v is not None}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info(f"Отправка данных сотрудника: {adapted_data}")
-                async with session.post(self.webhook_endpoint, json=adapted_data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(f"Данные сотрудника успешно отправлены: {result}")
-                        return {
-                            "success": True,
-                            "message": "Данные успешно отправлены",
-                            "result": result
-                        }
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при отправке данных сотрудника: {response.status} - {error_text}")
-                        return {
-                            "success": False,
-                            "message": f"Ошибка {response.status}: {error_text}",
-                            "result": None
-                        }
+            logger.info(f"Отправка данных сотрудника: {adapted_data}")
+            response = await self.request("send_employee_data", "POST", self.webhook_endpoint, json=adapted_data)
+            if response.status == 200:
+                result = response.json()
+                logger.info(f"Данные сотрудника успешно отправлены: {result}")
+                return {
+                    "success": True,
+                    "message": "Данные успешно отправлены",
+                    "result": result
+                }
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при отправке данных сотрудника: {response.status} - {error_text}")
+                return {
+                    "success": False,
+                    "message": f"Ошибка {response.status}: {error_text}",
+                    "result": None
+                }
         except Exception as e:
             error_message = str(e)
             logger.error(f"Исключение при отправке данных сотрудника: {error_message}")
@@ -199,25 +382,21 @@ class ApiClient:
             bool: True если токен валиден, False в противном случае
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.token_validation_endpoint, 
-                    json={"token": token}
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("status") == "valid":
-                            logger.info("Токен успешно валидирован")
-                            return True
-                        else:
-                            logger.error(f"Неверный статус валидации токена: {result}")
-                            return False
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка валидации токена: {response.status} - {error_text}")
-                        # В случае ошибки разрешаем использование бота
-                        logger.warning("Временно разрешаем использование бота без валидации токена")
-                        return True
+            response = await self.request("validate_token", "POST", self.token_validation_endpoint, json={"token": token})
+            if response.status == 200:
+                result = response.json()
+                if result.get("status") == "valid":
+                    logger.info("Токен успешно валидирован")
+                    return True
+                else:
+                    logger.error(f"Неверный статус валидации токена: {result}")
+                    return False
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка валидации токена: {response.status} - {error_text}")
+                # В случае ошибки разрешаем использование бота
+                logger.warning("Временно разрешаем использование бота без валидации токена")
+                return True
         except Exception as e:
             logger.error(f"Исключение при валидации токена: {str(e)}")
             # В случае ошибки соединения разрешаем использование бота
@@ -235,25 +414,24 @@ class ApiClient:
             Dict[str, Any]: Результат операции
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info(f"Создание сотрудника через эндпоинт /staff: {staff_data}")
-                async with session.post(self.staff_endpoint, json=staff_data) as response:
-                    if response.status in (200, 201):
-                        result = await response.json()
-                        logger.info(f"Сотрудник успешно создан: {result}")
-                        return {
-                            "success": True,
-                            "message": "Сотрудник успешно создан",
-                            "result": result
-                        }
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при создании сотрудника: {response.status} - {error_text}")
-                        return {
-                            "success": False,
-                            "message": f"Ошибка {response.status}: {error_text}",
-                            "result": None
-                        }
+            logger.info(f"Создание сотрудника через эндпоинт /staff: {staff_data}")
+            response = await self.request("create_staff", "POST", self.staff_endpoint, json=staff_data)
+            if response.status in (200, 201):
+                result = response.json()
+                logger.info(f"Сотрудник успешно создан: {result}")
+                return {
+                    "success": True,
+                    "message": "Сотрудник успешно создан",
+                    "result": result
+                }
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при создании сотрудника: {response.status} - {error_text}")
+                return {
+                    "success": False,
+                    "message": f"Ошибка {response.status}: {error_text}",
+                    "result": None
+                }
         except Exception as e:
             error_message = str(e)
             logger.error(f"Исключение при создании сотрудника: {error_message}")
@@ -283,27 +461,26 @@ class ApiClient:
         invitation_endpoint = f"{self.base_url}/telegram-bot/generate-invitation"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info(f"Генерация инвайт-кода: {data}")
-                async with session.post(invitation_endpoint, json=data) as response:
-                    if response.status in (200, 201):
-                        result = await response.json()
-                        logger.info(f"Инвайт-код успешно сгенерирован: {result}")
-                        return {
-                            "success": True,
-                            "message": "Инвайт-код успешно сгенерирован",
-                            "code": result.get("code"),
-                            "expires_at": result.get("expires_at"),
-                            "result": result
-                        }
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при генерации инвайт-кода: {response.status} - {error_text}")
-                        return {
-                            "success": False,
-                            "message": f"Ошибка {response.status}: {error_text}",
-                            "result": None
-                        }
+            logger.info(f"Генерация инвайт-кода: {data}")
+            response = await self.request("generate_invitation_code", "POST", invitation_endpoint, json=data)
+            if response.status in (200, 201):
+                result = response.json()
+                logger.info(f"Инвайт-код успешно сгенерирован: {result}")
+                return {
+                    "success": True,
+                    "message": "Инвайт-код успешно сгенерирован",
+                    "code": result.get("code"),
+                    "expires_at": result.get("expires_at"),
+                    "result": result
+                }
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при генерации инвайт-кода: {response.status} - {error_text}")
+                return {
+                    "success": False,
+                    "message": f"Ошибка {response.status}: {error_text}",
+                    "result": None
+                }
         except Exception as e:
             error_message = str(e)
             logger.error(f"Исключение при генерации инвайт-кода: {error_message}")
@@ -327,31 +504,27 @@ class ApiClient:
         validation_endpoint = f"{self.base_url}/telegram-bot/validate-invitation"
         
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info(f"Проверка инвайт-кода: {code} для пользователя {telegram_id}")
-                async with session.post(
-                    validation_endpoint, 
-                    json={"code": code, "telegram_id": telegram_id}
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(f"Инвайт-код успешно проверен: {result}")
-                        return {
-                            "success": True,
-                            "message": "Инвайт-код действителен",
-                            "position": result.get("position"),
-                            "division": result.get("division"),
-                            "organization": result.get("organization"),
-                            "result": result
-                        }
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при проверке инвайт-кода: {response.status} - {error_text}")
-                        return {
-                            "success": False,
-                            "message": f"Ошибка {response.status}: {error_text}",
-                            "result": None
-                        }
+            logger.info(f"Проверка инвайт-кода: {code} для пользователя {telegram_id}")
+            response = await self.request("validate_invitation_code", "POST", validation_endpoint, json={"code": code, "telegram_id": telegram_id})
+            if response.status == 200:
+                result = response.json()
+                logger.info(f"Инвайт-код успешно проверен: {result}")
+                return {
+                    "success": True,
+                    "message": "Инвайт-код действителен",
+                    "position": result.get("position"),
+                    "division": result.get("division"),
+                    "organization": result.get("organization"),
+                    "result": result
+                }
+            else:
+                error_text = response.text
+                logger.error(f"Ошибка при проверке инвайт-кода: {response.status} - {error_text}")
+                return {
+                    "success": False,
+                    "message": f"Ошибка {response.status}: {error_text}",
+                    "result": None
+                }
         except Exception as e:
             error_message = str(e)
             logger.error(f"Исключение при проверке инвайт-кода: {error_message}")
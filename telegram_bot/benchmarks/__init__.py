@@ -0,0 +1,6 @@
+"""
+Бенчмарки производительности Telegram-бота.
+
+Запуск из каталога telegram_bot:
+    python -m benchmarks.bench_admin_filter
+"""
@@ -0,0 +1,154 @@
+"""
+Бенчмарк фильтра администратора (is_admin_filter): сообщений в секунду.
+
+Фильтр вызывается для каждого входящего сообщения. Сравниваются:
+- исходная схема: синхронный фильтр с запросом к admins, открывающим и
+  закрывающим соединение SQLite на каждый вызов (синхронные фильтры aiogram
+  выполняет через asyncio.to_thread);
+- тот же запрос через долгоживущее WAL-соединение BotDatabase в потоке
+  базы данных (await);
+- реестр администраторов в памяти (db.is_admin), которым пользуется фильтр сейчас;
+  таблица перечитывается раз в admin_refresh_interval секунд.
+
+Сообщения (aiogram Message) прогоняются через FilterObject — так aiogram
+вызывает фильтры — пачками по CONCURRENCY задач, как при обработке обновлений
+задачами. Параллельно работает «тикер» (asyncio.sleep(0.001)), по нему
+измеряется максимальная задержка цикла событий, то есть насколько проверка
+пачки задерживает остальные задачи бота. Отдельно — стоимость одной проверки
+(await FilterObject.call подряд, без задач): в пачках ее скрывают накладные
+расходы на задачи.
+
+    python -m benchmarks.bench_admin_filter [сообщений]
+"""
+
+import asyncio
+import datetime
+import gc
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+
+from aiogram.dispatcher.event.handler import FilterObject
+from aiogram.types import Chat, Message, User
+
+from database import BotDatabase
+
+MESSAGES = 5000
+ADMINS = 50
+CONCURRENCY = (1, 100)
+
+
+ADMIN_QUERY = "SELECT COUNT(*) as count FROM admins WHERE telegram_id = ? AND is_active = 1"
+
+
+def legacy_is_admin(db_path: str, telegram_id: str) -> bool:
+    """Исходный is_admin: connect/запрос/close на каждый вызов"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        cursor.execute(ADMIN_QUERY, (str(telegram_id),))
+        return cursor.fetchone()["count"] > 0
+    finally:
+        conn.close()
+
+
+def make_messages(count: int):
+    date = datetime.datetime.now()
+    chat = Chat(id=1, type="private")
+    # Каждое десятое сообщение — от администратора
+    user_ids = (1000 + (i % ADMINS if i % 10 == 0 else ADMINS + i) for i in range(count))
+    return [
+        Message(message_id=i, date=date, chat=chat, text="📋 Заявки",
+                from_user=User(id=user_id, is_bot=False, first_name="U"))
+        for i, user_id in enumerate(user_ids)
+    ]
+
+
+async def run(filter_object: FilterObject, messages, concurrency: int):
+    """Прогоняет сообщения через фильтр; возвращает (сообщений/с, макс. задержка цикла, мс, админов)"""
+    lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal lag
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - started - 0.001)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.002)
+    admins = 0
+    started = time.perf_counter()
+    for i in range(0, len(messages), concurrency):
+        batch = messages[i:i + concurrency]
+        results = await asyncio.gather(*(asyncio.create_task(filter_object.call(m)) for m in batch))
+        admins += sum(1 for result in results if result)
+    elapsed = time.perf_counter() - started
+    running = False
+    await ticker_task
+    return len(messages) / elapsed, lag * 1000, admins
+
+
+async def per_check_us(filter_object: FilterObject, messages) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        await filter_object.call(message)
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGES
+    storage = tempfile.mkdtemp(prefix="bot_bench_")
+    try:
+        db = BotDatabase(storage_path=storage, admin_ids=[], admin_refresh_interval=30)
+        for i in range(ADMINS):
+            await db.add_admin(str(1000 + i), f"Админ {i}")
+        messages = make_messages(count)
+        # Тысячи объектов Message иначе вызывают полную сборку мусора посреди замера,
+        # и ее пауза попадает в задержку цикла событий
+        gc.collect()
+        gc.freeze()
+
+        def legacy_filter(message: Message) -> bool:
+            return legacy_is_admin(db.db_path, str(message.from_user.id))
+
+        def wal_is_admin(telegram_id: str) -> bool:
+            db.cursor.execute(ADMIN_QUERY, (telegram_id,))
+            return db.cursor.fetchone()["count"] > 0
+
+        async def executor_filter(message: Message) -> bool:
+            return await db._run(wal_is_admin, str(message.from_user.id))
+
+        async def registry_filter(message: Message) -> bool:
+            return await db.is_admin(message.from_user.id, message.from_user.username)
+
+        print(f"Сообщений: {count}, администраторов: {ADMINS}")
+        filters = (("connect на вызов, синхронно", legacy_filter),
+                   ("WAL-соединение в потоке БД, await", executor_filter),
+                   ("реестр админов в памяти", registry_filter))
+        print(f"{'фильтр':<40} {'параллельно':>11} {'сообщ./с':>10} {'задержка цикла, мс':>19}")
+        expected = None
+        for title, callback in filters:
+            for concurrency in CONCURRENCY:
+                rate, lag_ms, admins = await run(FilterObject(callback=callback), messages, concurrency)
+                expected = admins if expected is None else expected
+                assert admins == expected, (title, admins, expected)
+                print(f"{title:<40} {concurrency:>11} {rate:>10.0f} {lag_ms:>19.2f}")
+
+        print(f"\n{'фильтр':<40} {'мкс на проверку':>16}")
+        for title, callback in filters:
+            print(f"{title:<40} {await per_check_us(FilterObject(callback=callback), messages):>16.1f}")
+        await db.close()
+    finally:
+        shutil.rmtree(storage, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,15 +2,15 @@ import os
 import logging
 import asyncio
 import json
-import aiohttp
 from aiogram import Bot, Dispatcher, types
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command, StateFilter
 from dotenv import load_dotenv
 
 from database import BotDatabase
 from config import Config
+from api_client import api_client
+from fsm_storage import create_storage
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -32,7 +32,7 @@ API_TOKEN = config.BOT_TOKEN
 
 # Инициализация бота и диспетчера
 bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+storage = create_storage(config)
 dp = Dispatcher(storage=storage)
 
 # Инициализация базы данных
@@ -52,16 +52,15 @@ async def send_data_to_main_system(employee_data: dict) -> bool:
     try:
         endpoint = config.API_WEBHOOK_ENDPOINT
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(endpoint, json=employee_data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"Данные успешно отправлены в основную систему: {result}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка при отправке данных: {response.status} - {error_text}")
-                    return False
+        # Общая сессия api_client: пул соединений, таймауты и счетчики запросов
+        response = await api_client.request("webhook", "POST", endpoint, json=employee_data)
+        if response.status == 200:
+            result = response.json()
+            logger.info(f"Данные успешно отправлены в основную систему: {result}")
+            return True
+        else:
+            logger.error(f"Ошибка при отправке данных: {response.status} - {response.text}")
+            return False
     except Exception as e:
         logger.error(f"Исключение при отправке данных: {str(e)}")
         return False
@@ -82,7 +81,7 @@ async def confirm_employee_data_and_send(user_id: int, state: FSMContext):
     data = await state.get_data()
     
     # Сохраняем данные в локальную базу
-    db.add_employee(
+    await db.add_employee(
         name=data.get("name", ""),
         position=data.get("position", ""),
         email=data.get("email", ""),
@@ -100,7 +99,7 @@ async def confirm_employee_data_and_send(user_id: int, state: FSMContext):
 async def main():
     """Главная функция запуска бота"""
     # Инициализация базы данных при необходимости
-    db.init_db()
+    await db.init_db()
     
     # Импортируем зависимые модули здесь, чтобы избежать циклических импортов
     from handlers import register_handlers
@@ -108,6 +107,13 @@ async def main():
     # Регистрация обработчиков
     register_handlers(dp, confirm_employee_data_and_send)
     
+    # Закрываем соединение с БД при остановке
+    dp.shutdown.register(db.close)
+    dp.shutdown.register(storage.close)
+    
+    # Закрываем пул соединений к API при остановке
+    dp.shutdown.register(api_client.close)
+    
     # Запуск бота
     logger.info("Бот запущен")
     logger.info(f"API URL: {config.API_URL}")
@@ -45,6 +45,11 @@ class Config:
         # Логирование загруженных админов
         logger.info(f"Загружены администраторы: {self.ADMIN_IDS}")
         
+        # Как часто перечитывать таблицу admins, секунд: администраторов, добавленных
+        # или удаленных другим процессом бота, этот процесс видит не позже чем через
+        # этот интервал (0 — только при запуске, если процесс бота один)
+        self.ADMIN_REFRESH_INTERVAL = float(os.getenv("ADMIN_REFRESH_INTERVAL", "30"))
+        
         # Путь к хранилищу данных
         self.STORAGE_PATH = os.getenv("STORAGE_PATH", "./data")
         
@@ -55,6 +60,10 @@ class Config:
         # Настройки Redis для хранения состояний
         self.USE_REDIS = os.getenv("USE_REDIS", "False").lower() == "true"
         self.REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        # Без Redis состояния хранятся в SQLite (см. fsm_storage.py); пустой путь — в памяти.
+        # Состояния, не менявшиеся FSM_STATE_TTL секунд, удаляются (0 — бессрочно)
+        self.FSM_STORAGE_FILE = os.getenv("FSM_STORAGE_FILE", os.path.join(self.STORAGE_PATH, "fsm_storage.db"))
+        self.FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "86400"))
         
         # URL API основной системы
         self.API_URL = os.getenv("API_URL", "http://localhost:8000/api/v1")
@@ -62,6 +71,28 @@ class Config:
         self.API_TOKEN_VALIDATION_ENDPOINT = f"{self.API_URL}/telegram-bot/validate-token"
         self.API_ORGANIZATIONS_ENDPOINT = f"{self.API_URL}/telegram-bot/organizations"
         
+        # Настройки HTTP-клиента API (см. api_client.py): таймауты в секундах,
+        # число повторов и базовая задержка между ними, размер пула соединений
+        self.API_TIMEOUT = float(os.getenv("API_TIMEOUT", "15"))
+        self.API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+        self.API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+        self.API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.5"))
+        self.API_POOL_LIMIT = int(os.getenv("API_POOL_LIMIT", "100"))
+        self.API_POOL_LIMIT_PER_HOST = int(os.getenv("API_POOL_LIMIT_PER_HOST", "20"))
+        
+        # Кэш справочников (см. reference_cache.py): свежесть и предельный возраст
+        # данных в секундах, файл для сохранения между перезапусками
+        self.REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+        self.REFERENCE_CACHE_MAX_STALE = float(os.getenv("REFERENCE_CACHE_MAX_STALE", "86400"))
+        self.REFERENCE_CACHE_FILE = os.getenv(
+            "REFERENCE_CACHE_FILE", os.path.join(self.STORAGE_PATH, "reference_cache.json")
+        )
+        # Вебхук инвалидации кэша от бэкенда (0 — не запускать); без секрета не запускается.
+        # По умолчанию слушает только localhost: для бэкенда на другой машине задайте адрес явно
+        self.CACHE_WEBHOOK_HOST = os.getenv("CACHE_WEBHOOK_HOST", "127.0.0.1")
+        self.CACHE_WEBHOOK_PORT = int(os.getenv("CACHE_WEBHOOK_PORT", "0"))
+        self.CACHE_WEBHOOK_SECRET = os.getenv("CACHE_WEBHOOK_SECRET", "")
+        
         # Убедимся, что директория для логов существует
         self._ensure_log_directory()
         
@@ -1,14 +1,19 @@
 import os
 import json
+import asyncio
+import functools
 import logging
 import sqlite3
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Union
 from datetime import datetime, timedelta
 import random
 import string
 import time
 
+from admin_registry import AdminRegistry
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -16,18 +21,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Сколько ждать снятия блокировки записи другим процессом, секунд
+BUSY_TIMEOUT = 5.0
+
+
+def in_db_thread(method):
+    """
+    Делает метод BotDatabase асинхронным: тело выполняется в потоке базы данных,
+    вызывающий получает корутину и не блокирует цикл событий.
+    Синхронная версия доступна как method.sync (для вызова из другого такого метода).
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        return await self._run(method, self, *args, **kwargs)
+    wrapper.sync = method
+    return wrapper
+
+
 class BotDatabase:
-    """Класс для работы с базой данных бота"""
+    """
+    Класс для работы с базой данных бота.
     
-    def __init__(self, db_path: str = "bot_data.db", storage_path: str = "./data"):
-        """Инициализация базы данных"""
+    Все запросы выполняются в одном выделенном потоке через одно долгоживущее
+    соединение SQLite в режиме WAL (читатели не ждут писателя). Публичные методы —
+    корутины: обработчики aiogram вызывают их через await, и цикл событий не
+    блокируется ни открытием файла, ни самим запросом. Поток один, поэтому
+    соединение и курсор используются без блокировок, а запросы выполняются
+    по очереди. Соединение закрывается методом close() при остановке бота.
+    """
+    
+    def __init__(self, db_path: str = "bot_data.db", storage_path: str = "./data",
+                 admin_ids: Optional[List[Union[int, str]]] = None,
+                 admin_refresh_interval: Optional[float] = None):
+        """
+        Инициализация базы данных
+        
+        Args:
+            db_path: Имя файла БД внутри storage_path
+            storage_path: Каталог хранилища
+            admin_ids: Администраторы из конфигурации (по умолчанию Config.ADMIN_IDS)
+            admin_refresh_interval: Как часто перечитывать таблицу admins, секунд
+                (по умолчанию Config.ADMIN_REFRESH_INTERVAL; 0 — только при запуске)
+        """
+        if admin_ids is None or admin_refresh_interval is None:
+            from config import Config
+            config = Config()
+            admin_ids = config.ADMIN_IDS if admin_ids is None else admin_ids
+            if admin_refresh_interval is None:
+                admin_refresh_interval = config.ADMIN_REFRESH_INTERVAL
+        self.admin_ids = list(admin_ids)
+        # Реестр администраторов в памяти для проверок прав без запросов к БД.
+        # Другие процессы бота меняют таблицу admins независимо, поэтому реестр
+        # перечитывается не реже раза в admin_refresh_interval секунд
+        self.admins = AdminRegistry(self.admin_ids)
+        self.admin_refresh_interval = admin_refresh_interval
+        self._admins_loaded_at = float("-inf")
         self.storage_path = storage_path
         self.db_path = os.path.join(storage_path, db_path)
         self.staff_file = os.path.join(storage_path, "staff.json")
         self.conn = None
         self.cursor = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bot-db")
         self.ensure_storage_exists()
-        self._create_tables()
+        # Таблицы создаются синхронно при создании объекта (до запуска цикла событий)
+        self._executor.submit(self._call, self._create_tables).result()
+        self._executor.submit(self._call, self._load_admins).result()
+    
+    async def _run(self, func, *args, **kwargs):
+        """Выполняет func в потоке базы данных"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, func, *args, **kwargs))
+    
+    def _call(self, func, *args, **kwargs):
+        self._connect()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Метод завершился без commit (ошибка или ранний выход): откатываем,
+            # чтобы незавершенная транзакция не осталась на общем соединении
+            if self.conn is not None and self.conn.in_transaction:
+                self.conn.rollback()
+    
+    async def close(self):
+        """Закрывает соединение и поток базы данных; вызывается при остановке бота"""
+        if self._executor is None:
+            return
+        await self._run(self._disconnect)
+        self._executor.shutdown(wait=True)
+        self._executor = None
     
     def ensure_storage_exists(self):
         """Проверяет и создает директорию для хранения данных если она не существует"""
@@ -42,9 +123,15 @@ class BotDatabase:
             logger.info(f"Создан файл для хранения сотрудников: {self.staff_file}")
     
     def _connect(self):
-        """Устанавливает соединение с БД"""
-        self.conn = sqlite3.connect(self.db_path)
+        """Устанавливает соединение с БД (один раз, в потоке базы данных)"""
+        if self.conn is not None:
+            return
+        self.conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
         self.conn.row_factory = sqlite3.Row
+        # WAL: чтение не блокируется записью; NORMAL достаточно для WAL и
+        # избавляет от fsync на каждом commit
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.cursor = self.conn.cursor()
     
     def _disconnect(self):
@@ -56,8 +143,6 @@ class BotDatabase:
     
     def _create_tables(self):
         """Создает необходимые таблицы в БД"""
-        self._connect()
-        
         # Таблица для хранения сотрудников
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS staff (
@@ -128,10 +213,8 @@ class BotDatabase:
         self.cursor.execute('SELECT COUNT(*) as count FROM admins WHERE permission_level = 2')
         if self.cursor.fetchone()['count'] == 0:
             # Добавляем суперадмина по умолчанию
-            from config import Config
-            config = Config()
-            if config.ADMIN_IDS:
-                admin_id = config.ADMIN_IDS[0]
+            if self.admin_ids:
+                admin_id = self.admin_ids[0]
                 self.cursor.execute('''
                 INSERT INTO admins (telegram_id, full_name, permission_level)
                 VALUES (?, ?, 2)
@@ -139,20 +222,54 @@ class BotDatabase:
                 logger.info(f"Создан суперадмин с ID: {admin_id}")
         
         self.conn.commit()
-        self._disconnect()
     
+    def _load_admins(self):
+        """Заполняет реестр администраторов из таблицы admins"""
+        self.cursor.execute(
+            'SELECT telegram_id, username, permission_level, is_active FROM admins WHERE is_active = 1'
+        )
+        self.admins.load(self.cursor.fetchall())
+        self._admins_loaded_at = time.monotonic()
+        logger.debug(f"Загружено администраторов из БД: {len(self.admins)}")
+    
+    @in_db_thread
+    def reload_admins(self):
+        """Перечитывает реестр администраторов (например, после изменений другим процессом)"""
+        self._load_admins()
+    
+    def _admins_stale(self) -> bool:
+        return bool(self.admin_refresh_interval) and \
+            time.monotonic() - self._admins_loaded_at >= self.admin_refresh_interval
+    
+    def _reload_admins_if_stale(self):
+        # Проверка повторяется в потоке БД: проверки, вставшие в очередь одновременно,
+        # не перечитывают таблицу еще раз
+        if not self._admins_stale():
+            return
+        try:
+            self._load_admins()
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось перечитать администраторов: {e}")
+    
+    async def _refresh_admins(self):
+        """Перечитывает реестр, если он старше admin_refresh_interval"""
+        if self._admins_stale():
+            await self._run(self._reload_admins_if_stale)
+    
+    @in_db_thread
     def init_db(self):
         """Инициализирует базу данных и создает необходимые таблицы"""
         logger.info("Инициализация базы данных")
         self.ensure_storage_exists()
         self._create_tables()
+        self._load_admins()
         logger.info("База данных инициализирована")
         return True
     
+    @in_db_thread
     def create_employee(self, employee_data: Dict[str, Any]) -> int:
         """Создает нового сотрудника в БД"""
         try:
-            self._connect()
             self.cursor.execute('''
             INSERT INTO staff (
                 telegram_id,
@@ -175,13 +292,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при создании сотрудника: {e}")
             return 0
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_employee_by_telegram_id(self, telegram_id: str) -> Optional[Dict[str, Any]]:
         """Получает данные сотрудника по его Telegram ID"""
         try:
-            self._connect()
             self.cursor.execute('''
             SELECT * FROM staff WHERE telegram_id = ? AND is_active = 1
             ''', (telegram_id,))
@@ -190,27 +305,22 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при получении данных сотрудника: {e}")
             return None
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_all_staff(self) -> List[Dict[str, Any]]:
         """Получает список всех сотрудников"""
         try:
-            self._connect()
             self.cursor.execute('SELECT * FROM staff WHERE is_active = 1 ORDER BY created_at DESC')
             staff = [dict(row) for row in self.cursor.fetchall()]
             return staff
         except Exception as e:
             logger.error(f"Ошибка при получении списка сотрудников: {e}")
             return []
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def update_employee(self, employee_id: int, data: Dict[str, Any]) -> bool:
         """Обновляет данные сотрудника"""
         try:
-            self._connect()
-            
             # Формируем запрос динамически на основе переданных данных
             fields = []
             values = []
@@ -229,13 +339,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при обновлении данных сотрудника: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def delete_employee(self, telegram_id: str) -> bool:
         """Удаляет сотрудника (отмечает как неактивного)"""
         try:
-            self._connect()
             self.cursor.execute('''
             UPDATE staff SET is_active = 0 WHERE telegram_id = ?
             ''', (telegram_id,))
@@ -244,14 +352,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при удалении сотрудника: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def add_admin(self, telegram_id: str, full_name: str, created_by: str = None) -> bool:
         """Добавляет нового администратора"""
         try:
-            self._connect()
-            
             # Проверяем, существует ли уже этот админ
             self.cursor.execute('SELECT * FROM admins WHERE telegram_id = ?', (telegram_id,))
             existing_admin = self.cursor.fetchone()
@@ -267,6 +372,7 @@ class BotDatabase:
                     WHERE telegram_id = ?
                     ''', (full_name, created_by, telegram_id))
                     self.conn.commit()
+                    self.admins.set(telegram_id, existing_admin['permission_level'], existing_admin['username'])
                     logger.info(f"Администратор с ID {telegram_id} активирован")
                     return True
                 else:
@@ -285,115 +391,67 @@ class BotDatabase:
             ''', (telegram_id, full_name, created_by))
             
             self.conn.commit()
+            self.admins.set(telegram_id)
             logger.info(f"Добавлен новый администратор: {full_name} (ID: {telegram_id})")
             return True
         except Exception as e:
             logger.error(f"Ошибка при добавлении администратора: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def remove_admin(self, telegram_id: str) -> bool:
         """Удаляет администратора (отмечает как неактивного)"""
         try:
-            self._connect()
             self.cursor.execute('''
             UPDATE admins SET is_active = 0 WHERE telegram_id = ?
             ''', (telegram_id,))
             self.conn.commit()
+            self.admins.discard(telegram_id)
             logger.info(f"Администратор с ID {telegram_id} деактивирован")
             return True
         except Exception as e:
             logger.error(f"Ошибка при удалении администратора: {e}")
             return False
-        finally:
-            self._disconnect()
     
-    def is_admin(self, telegram_id: str) -> bool:
-        """Проверяет, является ли пользователь администратором"""
-        try:
-            self._connect()
-            
-            # Конвертируем telegram_id в строку для сравнения
-            telegram_id_str = str(telegram_id)
-            
-            # Проверяем сначала по telegram_id
-            self.cursor.execute('''
-            SELECT COUNT(*) as count FROM admins 
-            WHERE telegram_id = ? AND is_active = 1
-            ''', (telegram_id_str,))
-            
-            result = self.cursor.fetchone()
-            
-            # Проверяем, найден ли админ по ID
-            if result and result['count'] > 0:
-                return True
-                
-            # Если по ID не найден, и ID начинается с @, проверяем также по username
-            if telegram_id_str.startswith('@'):
-                username = telegram_id_str.lstrip('@')
-                self.cursor.execute('''
-                SELECT COUNT(*) as count FROM admins 
-                WHERE username = ? AND is_active = 1
-                ''', (username,))
-                
-                result = self.cursor.fetchone()
-                return result['count'] > 0
-                
-            return False
-        except Exception as e:
-            logger.error(f"Ошибка при проверке прав администратора: {e}")
-            return False
-        finally:
-            self._disconnect()
+    async def is_admin(self, telegram_id: str, username: Optional[str] = None) -> bool:
+        """
+        Проверяет, является ли пользователь администратором: по реестру в памяти,
+        запрос к БД — только раз в admin_refresh_interval секунд
+        """
+        await self._refresh_admins()
+        return self.admins.is_admin(telegram_id, username)
     
-    def is_superadmin(self, telegram_id: str) -> bool:
-        """Проверяет, является ли пользователь супер-администратором"""
-        try:
-            self._connect()
-            self.cursor.execute('''
-            SELECT COUNT(*) as count FROM admins 
-            WHERE telegram_id = ? AND permission_level = 2 AND is_active = 1
-            ''', (telegram_id,))
-            result = self.cursor.fetchone()
-            return result['count'] > 0
-        except Exception as e:
-            logger.error(f"Ошибка при проверке прав супер-администратора: {e}")
-            return False
-        finally:
-            self._disconnect()
+    async def is_superadmin(self, telegram_id: str) -> bool:
+        """Проверяет, является ли пользователь супер-администратором (по реестру в памяти)"""
+        await self._refresh_admins()
+        return self.admins.is_superadmin(telegram_id)
     
+    @in_db_thread
     def get_all_admins(self) -> List[Dict[str, Any]]:
         """Получает список всех администраторов"""
         try:
-            self._connect()
             self.cursor.execute('SELECT * FROM admins ORDER BY permission_level DESC, created_at DESC')
             admins = [dict(row) for row in self.cursor.fetchall()]
             return admins
         except Exception as e:
             logger.error(f"Ошибка при получении списка администраторов: {e}")
             return []
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_admin_by_telegram_id(self, telegram_id: str) -> Optional[Dict[str, Any]]:
         """Получает данные администратора по его Telegram ID"""
         try:
-            self._connect()
             self.cursor.execute('SELECT * FROM admins WHERE telegram_id = ?', (telegram_id,))
             result = self.cursor.fetchone()
             return dict(result) if result else None
         except Exception as e:
             logger.error(f"Ошибка при получении данных администратора: {e}")
             return None
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_admin_stats(self, admin_id: str) -> Dict[str, int]:
         """Получает статистику по действиям администратора"""
         try:
-            self._connect()
-            
             # Статистика по обработанным заявкам
             self.cursor.execute('''
             SELECT 
@@ -433,9 +491,8 @@ class BotDatabase:
                 'generated_codes': 0,
                 'used_codes': 0
             }
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def create_registration_request(self, telegram_id: str = None, user_full_name: str = None,
                                    telegram_username: str = '', approximate_position: str = '',
                                    request_data: Dict[str, Any] = None) -> int:
@@ -453,8 +510,6 @@ class BotDatabase:
             int: ID созданной заявки или 0 в случае ошибки
         """
         try:
-            self._connect()
-            
             # Если передан словарь с данными, используем его
             if request_data:
                 telegram_id = request_data.get('telegram_id', telegram_id)
@@ -494,26 +549,22 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при создании заявки на регистрацию: {e}")
             return 0
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_registration_request(self, request_id: int) -> Optional[Dict[str, Any]]:
         """Получает данные заявки по её ID"""
         try:
-            self._connect()
             self.cursor.execute('SELECT * FROM registration_requests WHERE id = ?', (request_id,))
             result = self.cursor.fetchone()
             return dict(result) if result else None
         except Exception as e:
             logger.error(f"Ошибка при получении данных заявки: {e}")
             return None
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_pending_registration_requests(self) -> List[Dict[str, Any]]:
         """Получает список всех ожидающих заявок на регистрацию"""
         try:
-            self._connect()
             self.cursor.execute('''
             SELECT * FROM registration_requests 
             WHERE status = 'pending' 
@@ -524,13 +575,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при получении списка заявок: {e}")
             return []
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_pending_request_by_telegram_id(self, telegram_id: str) -> Optional[Dict[str, Any]]:
         """Получает активную заявку пользователя по его Telegram ID"""
         try:
-            self._connect()
             self.cursor.execute('''
             SELECT * FROM registration_requests 
             WHERE telegram_id = ? AND status IN ('pending', 'approved')
@@ -541,13 +590,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при получении заявки по Telegram ID: {e}")
             return None
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def process_registration_request(self, request_id: int, status: str, admin_id: str, position_id: int = None, position_name: str = None, invitation_code: str = None) -> bool:
         """Обновляет статус заявки на регистрацию"""
         try:
-            self._connect()
             self.cursor.execute('''
             UPDATE registration_requests 
             SET status = ?, processed_at = CURRENT_TIMESTAMP, processed_by = ?
@@ -559,14 +606,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при обновлении статуса заявки: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def update_registration_request(self, request_id: int, **kwargs) -> bool:
         """Обновляет данные заявки на регистрацию"""
         try:
-            self._connect()
-            
             # Формируем запрос динамически на основе переданных данных
             fields = []
             values = []
@@ -585,9 +629,8 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при обновлении данных заявки: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def save_invitation_code(self, request_id: int, code: str, position_id: int, position_name: str, 
                              division_id: int = None, division_name: str = None, expires_at: str = None) -> bool:
         """
@@ -606,10 +649,8 @@ class BotDatabase:
             bool: True если код успешно сохранен, False в противном случае
         """
         try:
-            self._connect()
-            
             # Получаем данные заявки
-            request = self.get_registration_request(request_id)
+            request = self.get_registration_request.sync(self, request_id)
             if not request:
                 logger.error(f"Не удалось найти заявку с ID {request_id}")
                 return False
@@ -647,9 +688,8 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при сохранении кода приглашения: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def generate_position_code(self, telegram_id: str, position_id: int, position_name: str, admin_id: str) -> str:
         """Генерирует уникальный код для должности"""
         try:
@@ -664,7 +704,6 @@ class BotDatabase:
             # Устанавливаем срок действия кода (24 часа)
             expires_at = datetime.now() + timedelta(hours=24)
             
-            self._connect()
             self.cursor.execute('''
             INSERT INTO invitation_codes (
                 code,
@@ -682,14 +721,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при генерации кода: {e}")
             return ""
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def validate_invitation_code(self, telegram_id: str, code: str) -> Optional[Dict[str, Any]]:
         """Проверяет валидность кода приглашения"""
         try:
-            self._connect()
-            
             # Проверяем код на существование, срок действия и принадлежность пользователю
             self.cursor.execute('''
             SELECT * FROM invitation_codes 
@@ -701,13 +737,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при проверке кода приглашения: {e}")
             return None
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def mark_invitation_code_used(self, code: str) -> bool:
         """Отмечает код приглашения как использованный"""
         try:
-            self._connect()
             self.cursor.execute('''
             UPDATE invitation_codes 
             SET is_used = 1, used_at = CURRENT_TIMESTAMP
@@ -720,13 +754,11 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при отметке кода как использованного: {e}")
             return False
-        finally:
-            self._disconnect()
     
+    @in_db_thread
     def get_active_invitation_code(self, telegram_id: str) -> Optional[Dict[str, Any]]:
         """Получает активный код приглашения для пользователя"""
         try:
-            self._connect()
             self.cursor.execute('''
             SELECT * FROM invitation_codes 
             WHERE telegram_id = ? AND is_used = 0 AND expires_at > CURRENT_TIMESTAMP
@@ -738,5 +770,3 @@ class BotDatabase:
         except Exception as e:
             logger.error(f"Ошибка при получении активного кода приглашения: {e}")
             return None
-        finally:
-            self._disconnect() 
\ No newline at end of file
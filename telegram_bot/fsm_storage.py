@@ -0,0 +1,203 @@
+"""
+Хранилище состояний FSM (незавершенные регистрации и диалоги администраторов).
+
+MemoryStorage теряет состояния при перезапуске и не позволяет запустить
+несколько процессов бота за вебхуком. create_storage() выбирает хранилище
+по конфигурации:
+
+- USE_REDIS=true — RedisStorage aiogram по REDIS_URL;
+- иначе — SQLiteStorage в файле FSM_STORAGE_FILE: не требует отдельного
+  сервиса, файл общий для всех процессов бота на одной машине;
+- FSM_STORAGE_FILE пустой — MemoryStorage (как раньше, для отладки).
+
+Состояния, которые не менялись дольше FSM_STATE_TTL секунд, считаются
+брошенными: в Redis ключи истекают сами, в SQLite такие записи не читаются
+и периодически удаляются.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать снятия блокировки записи другим процессом, секунд
+BUSY_TIMEOUT = 5.0
+
+# Как часто удалять просроченные состояния, секунд
+PURGE_INTERVAL = 600.0
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в файле SQLite: одна строка (состояние и данные) на ключ.
+    
+    Запросы выполняются в отдельном потоке через одно соединение в режиме WAL,
+    как в BotDatabase. update_data читает и записывает данные в одной
+    транзакции BEGIN IMMEDIATE, поэтому одновременные обновления из нескольких
+    процессов не теряют друг друга.
+    
+    Args:
+        path: Файл базы данных
+        ttl: Срок жизни неизменявшегося состояния в секундах (None или 0 — бессрочно)
+        key_builder: Построитель ключей (по умолчанию с bot_id и destiny)
+    """
+    
+    def __init__(self, path: str, ttl: Optional[float] = None, key_builder: Optional[KeyBuilder] = None):
+        self.path = path
+        self.ttl = ttl or None
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.conn = None
+        self._purged_at = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-db")
+        # Таблица создается синхронно при создании объекта (до запуска цикла событий)
+        self._executor.submit(self._connect).result()
+    
+    def _connect(self):
+        # isolation_level=None: транзакции открываются явно, только там, где нужны
+        self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL NOT NULL
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at ON fsm_storage(updated_at)')
+        self._purge()
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+    
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl if self.ttl else float("-inf")
+    
+    def _purge(self) -> int:
+        """Удаляет просроченные состояния; возвращает число удаленных"""
+        self._purged_at = time.monotonic()
+        if not self.ttl:
+            return 0
+        deleted = self.conn.execute(
+            'DELETE FROM fsm_storage WHERE updated_at < ?', (self._expired_before(),)
+        ).rowcount
+        if deleted:
+            logger.info(f"Удалено просроченных состояний FSM: {deleted}")
+        return deleted
+    
+    def _read(self, key: str):
+        row = self.conn.execute(
+            'SELECT state, data FROM fsm_storage WHERE key = ? AND updated_at >= ?',
+            (key, self._expired_before())
+        ).fetchone()
+        return row if row is not None else (None, None)
+    
+    def _write(self, key: str, state: Optional[str], data: Optional[str]):
+        """Записывает строку ключа; пустые состояние и данные — удаление"""
+        if state is None and data is None:
+            self.conn.execute('DELETE FROM fsm_storage WHERE key = ?', (key,))
+            return
+        self.conn.execute('''
+        INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET
+            state = excluded.state,
+            data = excluded.data,
+            updated_at = excluded.updated_at
+        ''', (key, state, data, time.time()))
+    
+    def _update(self, key: str, field: str, value: Optional[str] = None,
+                patch: Optional[Mapping[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Меняет состояние или данные ключа в одной транзакции.
+        
+        Args:
+            field: "state" или "data"
+            value: Новое значение поля
+            patch: Для field="data": частичное обновление текущих данных (как dict.update)
+        """
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            state, data = self._read(key)
+            result = None
+            if patch is not None:
+                result = json.loads(data) if data else {}
+                result.update(patch)
+                value = json.dumps(result, ensure_ascii=False) if result else None
+            if field == "state":
+                state = value
+            else:
+                data = value
+            self._write(key, state, data)
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        if time.monotonic() - self._purged_at > PURGE_INTERVAL:
+            self._purge()
+        return result
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._run(self._update, self.key_builder.build(key), "state", state)
+    
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._run(self._read, self.key_builder.build(key))
+        return state
+    
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError(f"Данные FSM должны быть словарем, а не {type(data).__name__}")
+        value = json.dumps(data, ensure_ascii=False) if data else None
+        await self._run(self._update, self.key_builder.build(key), "data", value)
+    
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._run(self._read, self.key_builder.build(key))
+        return json.loads(data) if data else {}
+    
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        result = await self._run(self._update, self.key_builder.build(key), "data", None, dict(data))
+        return result.copy()
+    
+    async def purge(self) -> int:
+        """Удаляет просроченные состояния сейчас; возвращает число удаленных"""
+        return await self._run(self._purge)
+    
+    async def close(self) -> None:
+        """Закрывает соединение и поток; вызывается при остановке бота"""
+        if self._executor is None:
+            return
+        await self._run(self.conn.close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+
+def create_storage(config) -> BaseStorage:
+    """Создает хранилище FSM по конфигурации (см. описание модуля)"""
+    ttl = config.FSM_STATE_TTL or None
+    if config.USE_REDIS:
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        logger.info("Используется Redis для хранения состояний")
+        return RedisStorage.from_url(config.REDIS_URL, state_ttl=ttl, data_ttl=ttl)
+    if config.FSM_STORAGE_FILE:
+        logger.info(f"Используется SQLite для хранения состояний: {config.FSM_STORAGE_FILE}")
+        return SQLiteStorage(config.FSM_STORAGE_FILE, ttl=ttl)
+    logger.info("Используется MemoryStorage для хранения состояний")
+    return MemoryStorage()
@@ -3,13 +3,14 @@ import logging
 import sys
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.storage.redis import RedisStorage
 
 from config import Config
 from admin_handlers import register_admin_handlers
 from registration_handlers import register_registration_handlers
 from database import BotDatabase
+from api_client import api_client
+from reference_cache import reference_cache, start_webhook
+from fsm_storage import create_storage
 
 # Настройка логирования
 logging.basicConfig(
@@ -33,15 +34,8 @@ async def main():
     # Инициализация базы данных
     db = BotDatabase()
     
-    # Инициализация хранилища состояний
-    if config.USE_REDIS:
-        # Используем Redis для хранения состояний, если настроено
-        storage = RedisStorage.from_url(config.REDIS_URL)
-        logger.info("Используется Redis для хранения состояний")
-    else:
-        # Используем память для хранения состояний
-        storage = MemoryStorage()
-        logger.info("Используется MemoryStorage для хранения состояний")
+    # Инициализация хранилища состояний: Redis или SQLite, переживает перезапуск
+    storage = create_storage(config)
 
     # Инициализация бота и диспетчера - совместимо с aiogram 3.x
     bot = Bot(token=config.BOT_TOKEN)
@@ -50,6 +44,24 @@ async def main():
     # Регистрация обработчиков
     register_admin_handlers(dp)
     register_registration_handlers(dp)
+    dp.shutdown.register(db.close)
+    dp.shutdown.register(storage.close)
+    
+    # Справочники, сохраненные прошлым запуском: бот отвечает сразу, обновляя их в фоне
+    reference_cache.load()
+    dp.shutdown.register(reference_cache.close)
+    
+    # Вебхук, через который бэкенд сообщает об изменении справочников
+    if config.CACHE_WEBHOOK_PORT and not config.CACHE_WEBHOOK_SECRET:
+        logger.error("CACHE_WEBHOOK_PORT задан без CACHE_WEBHOOK_SECRET: вебхук инвалидации кэша не запущен")
+    elif config.CACHE_WEBHOOK_PORT:
+        webhook_runner = await start_webhook(
+            reference_cache, config.CACHE_WEBHOOK_HOST, config.CACHE_WEBHOOK_PORT, config.CACHE_WEBHOOK_SECRET
+        )
+        dp.shutdown.register(webhook_runner.cleanup)
+    
+    # Закрываем общую сессию API-клиента (пул соединений) при остановке
+    dp.shutdown.register(api_client.close)
     
     # Удаляем все обновления, накопившиеся за время остановки бота
     await bot.delete_webhook(drop_pending_updates=True)
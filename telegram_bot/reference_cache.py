@@ -0,0 +1,314 @@
+"""
+Кэш справочников бота: должности, подразделения и организации.
+
+Клавиатуры выбора должности и подразделения строятся из полных списков API;
+раньше каждое нажатие кнопки администратором заново загружало их. Кэш отдает
+списки из памяти:
+
+- свежие данные (моложе REFERENCE_CACHE_TTL) — сразу;
+- устаревшие, но моложе REFERENCE_CACHE_MAX_STALE — тоже сразу, а обновление
+  запускается в фоне (stale-while-revalidate);
+- при отсутствии данных или после инвалидации — ждет загрузку.
+
+Одновременные обновления одного справочника выполняются одной загрузкой.
+Если загрузка не удалась, возвращаются прежние данные (или пустой список,
+если их нет — обработчики в этом случае подставляют заглушки).
+
+Успешно загруженные списки сохраняются в REFERENCE_CACHE_FILE и читаются
+при запуске (load()), поэтому после перезапуска бот отвечает без ожидания API.
+
+Бэкенд может сообщать об изменениях справочников (backend/bot_notify.py):
+при CACHE_WEBHOOK_PORT бот поднимает HTTP-сервер с POST /cache/invalidate
+(тело {"names": [...]}, без тела — все справочники) и GET /cache/stats.
+Оба запроса требуют секрет CACHE_WEBHOOK_SECRET в заголовке X-Cache-Secret;
+без настроенного секрета вебхук не запускается.
+"""
+
+import asyncio
+import functools
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+from api_client import api_client
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+
+# Справочники, которые кэширует бот (имена совпадают с таблицами бэкенда)
+REFERENCE_NAMES = ("positions", "divisions", "organizations")
+
+SECRET_HEADER = "X-Cache-Secret"
+
+# Версия формата файла кэша; файл другой версии игнорируется
+FILE_VERSION = 1
+
+Loader = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+
+class CacheEntry:
+    """Загруженный список и время загрузки (time.time(), переживает перезапуск)"""
+    
+    __slots__ = ("data", "fetched_at", "invalidated")
+    
+    def __init__(self, data: List[Dict[str, Any]], fetched_at: float):
+        self.data = data
+        self.fetched_at = fetched_at
+        self.invalidated = False
+
+
+class CacheStats:
+    """Счетчики одного справочника"""
+    
+    __slots__ = ("hits", "stale_hits", "misses", "refreshes", "refresh_errors", "invalidations")
+    
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.invalidations = 0
+    
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "invalidations": self.invalidations,
+        }
+
+
+class ReferenceCache:
+    """
+    Асинхронный TTL-кэш справочников с фоновым обновлением.
+    
+    Args:
+        loaders: Имя справочника -> корутина загрузки; ошибка загрузки — исключение
+        ttl: Сколько секунд данные считаются свежими
+        max_stale: До какого возраста устаревшие данные отдаются без ожидания
+        path: Файл для сохранения между перезапусками (None — не сохранять)
+    """
+    
+    def __init__(self, loaders: Dict[str, Loader], ttl: float, max_stale: float, path: Optional[str] = None):
+        self._loaders = dict(loaders)
+        self.ttl = ttl
+        self.max_stale = max(max_stale, ttl)
+        self.path = path
+        self._entries: Dict[str, CacheEntry] = {}
+        self._stats = {name: CacheStats() for name in self._loaders}
+        # Текущие загрузки; поколение растет при каждой инвалидации
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._generations = dict.fromkeys(self._loaders, 0)
+    
+    def _check_name(self, name: str):
+        if name not in self._loaders:
+            raise ValueError(f"Неизвестный справочник: {name}")
+    
+    async def get(self, name: str) -> List[Dict[str, Any]]:
+        """
+        Возвращает список справочника (общий для всех вызовов, не изменяйте его).
+        
+        Args:
+            name: Имя справочника, например "positions"
+        """
+        self._check_name(name)
+        stats = self._stats[name]
+        entry = self._entries.get(name)
+        if entry is not None and not entry.invalidated:
+            age = time.time() - entry.fetched_at
+            if age < self.ttl:
+                stats.hits += 1
+                return entry.data
+            if age < self.max_stale:
+                stats.stale_hits += 1
+                self._start_refresh(name)
+                return entry.data
+        
+        stats.misses += 1
+        await self.refresh(name)
+        entry = self._entries.get(name)
+        # Если загрузить не удалось, устаревшие данные лучше пустого списка
+        return entry.data if entry is not None else []
+    
+    async def refresh(self, name: str) -> bool:
+        """Загружает справочник (или ждет уже идущую загрузку). True — если успешно."""
+        self._check_name(name)
+        # shield: отмена ожидающего обработчика не должна прерывать общую загрузку
+        return await asyncio.shield(self._start_refresh(name))
+    
+    def _start_refresh(self, name: str) -> asyncio.Task:
+        task = self._refreshing.get(name)
+        if task is None:
+            task = asyncio.create_task(self._refresh(name))
+            self._refreshing[name] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(name, None))
+        return task
+    
+    async def _refresh(self, name: str) -> bool:
+        stats = self._stats[name]
+        while True:
+            generation = self._generations[name]
+            stats.refreshes += 1
+            try:
+                data = await self._loaders[name]()
+            except Exception as e:
+                stats.refresh_errors += 1
+                logger.warning(f"Не удалось обновить справочник {name}: {e}")
+                return False
+            if self._generations[name] == generation:
+                break
+            # Пока шла загрузка, пришла инвалидация: данные могли устареть
+            logger.info(f"Справочник {name} изменился во время загрузки, загружаем заново")
+        
+        self._entries[name] = CacheEntry(data, time.time())
+        logger.info(f"Справочник {name} обновлен: {len(data)} записей")
+        if self.path:
+            try:
+                await asyncio.to_thread(self._save)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"Не удалось сохранить кэш справочников в {self.path}: {e}")
+        return True
+    
+    def invalidate(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Помечает справочники устаревшими и запускает их загрузку в фоне.
+        До ее завершения get() ждет загрузку, а не отдает старые данные.
+        
+        Args:
+            names: Имена справочников (None — все)
+        
+        Returns:
+            List[str]: Инвалидированные справочники
+        """
+        names = list(self._loaders) if names is None else list(names)
+        for name in names:
+            self._check_name(name)
+        for name in names:
+            self._generations[name] += 1
+            self._stats[name].invalidations += 1
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.invalidated = True
+            self._start_refresh(name)
+        logger.info(f"Справочники помечены устаревшими: {names}")
+        return names
+    
+    def load(self) -> int:
+        """Читает сохраненные списки из файла. Возвращает число загруженных справочников."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш справочников {self.path}: {e}")
+            return 0
+        if not isinstance(payload, dict) or payload.get("version") != FILE_VERSION:
+            return 0
+        
+        loaded = 0
+        for name, item in payload.get("entries", {}).items():
+            if name in self._loaders and name not in self._entries:
+                self._entries[name] = CacheEntry(item["data"], float(item["fetched_at"]))
+                loaded += 1
+        logger.info(f"Из {self.path} загружено справочников: {loaded}")
+        return loaded
+    
+    def _save(self):
+        payload = {
+            "version": FILE_VERSION,
+            "entries": {
+                name: {"fetched_at": entry.fetched_at, "data": entry.data}
+                for name, entry in self._entries.items()
+            },
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Запись через временный файл: при сбое старый файл остается целым
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счетчики по справочникам: попадания, промахи, обновления, возраст и размер данных"""
+        now = time.time()
+        result = {}
+        for name, stats in self._stats.items():
+            entry = self._entries.get(name)
+            result[name] = stats.as_dict()
+            result[name]["size"] = len(entry.data) if entry is not None else 0
+            result[name]["age_seconds"] = round(now - entry.fetched_at, 1) if entry is not None else None
+        return result
+    
+    async def close(self):
+        """Отменяет фоновые загрузки; вызывается при остановке бота"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"Статистика кэша справочников: {self.stats()}")
+
+
+def create_webhook_app(cache: ReferenceCache, secret: str) -> web.Application:
+    """HTTP-приложение вебхука инвалидации: POST /cache/invalidate и GET /cache/stats"""
+    # Без секрета любой, кто достучится до порта, мог бы сбрасывать кэш в цикле
+    if not secret:
+        raise ValueError("Для вебхука инвалидации кэша нужен секрет (CACHE_WEBHOOK_SECRET)")
+    
+    def authorized(request: web.Request) -> bool:
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret)
+    
+    async def invalidate(request: web.Request) -> web.Response:
+        if not authorized(request):
+            return web.json_response({"detail": "Неверный секрет"}, status=403)
+        try:
+            payload = await request.json() if request.can_read_body else {}
+            names = payload.get("names") if isinstance(payload, dict) else None
+            if names is not None and not isinstance(names, list):
+                raise ValueError("Поле names должно быть списком")
+            invalidated = cache.invalidate(names)
+        except ValueError as e:
+            return web.json_response({"detail": str(e)}, status=400)
+        return web.json_response({"invalidated": invalidated})
+    
+    async def stats(request: web.Request) -> web.Response:
+        if not authorized(request):
+            return web.json_response({"detail": "Неверный секрет"}, status=403)
+        return web.json_response(cache.stats())
+    
+    app = web.Application()
+    app.router.add_post("/cache/invalidate", invalidate)
+    app.router.add_get("/cache/stats", stats)
+    return app
+
+
+async def start_webhook(cache: ReferenceCache, host: str, port: int, secret: str) -> web.AppRunner:
+    """Запускает сервер вебхука; остановка — await runner.cleanup()"""
+    runner = web.AppRunner(create_webhook_app(cache, secret))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Вебхук инвалидации кэша слушает {host}:{port}")
+    return runner
+
+
+# Создаем глобальный экземпляр кэша справочников
+reference_cache = ReferenceCache(
+    {name: functools.partial(api_client.fetch_reference, name) for name in REFERENCE_NAMES},
+    ttl=config.REFERENCE_CACHE_TTL,
+    max_stale=config.REFERENCE_CACHE_MAX_STALE,
+    path=config.REFERENCE_CACHE_FILE
+)
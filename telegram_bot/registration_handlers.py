@@ -10,7 +10,7 @@ from aiogram.fsm.context import FSMContext
 from database import BotDatabase
 from states import RegistrationStates
 import keyboards
-from api_client import ApiClient
+from api_client import api_client
 from config import Config
 
 # Настройка логирования
@@ -25,7 +25,6 @@ router = Router()
 
 # Инициализация зависимостей
 db = BotDatabase()
-api_client = ApiClient()
 config = Config()
 
 # Команда начала работы с ботом
@@ -35,7 +34,7 @@ async def cmd_start(message: Message):
     user_id = str(message.from_user.id)
     
     # Проверяем, зарегистрирован ли пользователь
-    staff = db.get_employee_by_telegram_id(user_id)
+    staff = await db.get_employee_by_telegram_id(user_id)
     
     if staff:
         # Пользователь уже зарегистрирован
@@ -49,7 +48,7 @@ async def cmd_start(message: Message):
         return
     
     # Проверяем, есть ли активная заявка на регистрацию
-    pending_request = db.get_pending_request_by_telegram_id(user_id)
+    pending_request = await db.get_pending_request_by_telegram_id(user_id)
     
     if pending_request:
         # У пользователя уже есть заявка на рассмотрении
@@ -62,7 +61,7 @@ async def cmd_start(message: Message):
         return
     
     # Проверяем, есть ли код приглашения для этого пользователя
-    invitation_code = db.get_active_invitation_code(user_id)
+    invitation_code = await db.get_active_invitation_code(user_id)
     
     if invitation_code:
         # У пользователя есть активный код, переходим к вводу кода
@@ -91,7 +90,7 @@ async def registration_start(message: Message, state: FSMContext):
     user_id = str(message.from_user.id)
     
     # Проверяем, зарегистрирован ли пользователь
-    staff = db.get_employee_by_telegram_id(user_id)
+    staff = await db.get_employee_by_telegram_id(user_id)
     
     if staff:
         await message.answer(
@@ -101,7 +100,7 @@ async def registration_start(message: Message, state: FSMContext):
         return
     
     # Проверяем, есть ли активная заявка на регистрацию
-    pending_request = db.get_pending_request_by_telegram_id(user_id)
+    pending_request = await db.get_pending_request_by_telegram_id(user_id)
     
     if pending_request:
         await message.answer(
@@ -112,7 +111,7 @@ async def registration_start(message: Message, state: FSMContext):
         return
     
     # Проверяем, есть ли код приглашения для этого пользователя
-    invitation_code = db.get_active_invitation_code(user_id)
+    invitation_code = await db.get_active_invitation_code(user_id)
     
     if invitation_code:
         await message.answer(
@@ -269,7 +268,7 @@ async def process_request_confirmation(callback: CallbackQuery, state: FSMContex
     }
     
     # Сохраняем заявку в локальной БД
-    request_id = db.create_registration_request(request_data=request_data)
+    request_id = await db.create_registration_request(request_data=request_data)
     
     if not request_id:
         await callback.message.edit_text(
@@ -404,7 +403,7 @@ async def check_status(message: Message):
     user_id = str(message.from_user.id)
     
     # Проверяем, зарегистрирован ли пользователь
-    staff = db.get_employee_by_telegram_id(user_id)
+    staff = await db.get_employee_by_telegram_id(user_id)
     
     if staff:
         await message.answer(
@@ -417,7 +416,7 @@ async def check_status(message: Message):
         return
     
     # Проверяем, есть ли активная заявка на регистрацию
-    pending_request = db.get_pending_request_by_telegram_id(user_id)
+    pending_request = await db.get_pending_request_by_telegram_id(user_id)
     
     if pending_request:
         status_text = "Ожидает рассмотрения"
@@ -435,7 +434,7 @@ async def check_status(message: Message):
         return
     
     # Проверяем, есть ли код приглашения для этого пользователя
-    invitation_code = db.get_active_invitation_code(user_id)
+    invitation_code = await db.get_active_invitation_code(user_id)
     
     if invitation_code:
         await message.answer(
@@ -460,7 +459,7 @@ async def have_code(message: Message, state: FSMContext):
     user_id = str(message.from_user.id)
     
     # Проверяем, зарегистрирован ли пользователь
-    staff = db.get_employee_by_telegram_id(user_id)
+    staff = await db.get_employee_by_telegram_id(user_id)
     
     if staff:
         await message.answer(
@@ -517,4 +516,6 @@ async def show_help(message: Message):
 
 def register_registration_handlers(dispatcher: Router):
     """Регистрирует все обработчики регистрации"""
-    dispatcher.include_router(router) 
\ No newline at end of file
+    dispatcher.include_router(router)
+    # Соединение с БД закрывается вместе с диспетчером
+    router.shutdown.register(db.close) 
\ No newline at end of file
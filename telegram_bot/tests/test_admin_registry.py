@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "test_token")
+
+import pytest
+
+from admin_registry import AdminRegistry, SUPERADMIN_LEVEL
+from database import BotDatabase
+
+
+def test_registry_lookups():
+    """Тест проверок по telegram_id и username, включая администраторов из конфигурации"""
+    registry = AdminRegistry(["42", "@Config_Admin"])
+    registry.load([
+        {"telegram_id": "100", "username": "@Boss", "permission_level": SUPERADMIN_LEVEL, "is_active": 1},
+        {"telegram_id": "101", "username": None, "permission_level": 1, "is_active": 1},
+        {"telegram_id": "102", "username": "gone", "permission_level": 1, "is_active": 0},
+    ])
+    assert len(registry) == 2
+    assert registry.is_admin(100) and registry.is_admin("101") and registry.is_admin("42")
+    assert registry.is_admin(555, "boss") and registry.is_admin("@BOSS")
+    assert registry.is_admin(556, "config_admin") and registry.is_admin("@config_admin")
+    assert not registry.is_admin("102", "gone") and not registry.is_admin(777)
+    assert registry.is_superadmin("100") and not registry.is_superadmin("101")
+
+    registry.set("101", username="Deputy")
+    registry.discard("100")
+    assert registry.is_admin(888, "deputy")
+    assert not registry.is_admin("100", "boss") and not registry.is_superadmin("100")
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = BotDatabase(storage_path=str(tmp_path), admin_ids=["1"], admin_refresh_interval=0)
+    yield database
+    asyncio.run(database.close())
+
+
+def test_database_keeps_registry_in_sync(db):
+    """Тест: add_admin / remove_admin обновляют реестр, reload_admins читает таблицу"""
+    async def scenario():
+        await db._run(lambda: None)
+        assert db.admins.is_superadmin("1")
+        assert await db.add_admin("200", "Админ", created_by="1")
+        assert await db.is_admin("200")
+        assert await db.remove_admin("200")
+        removed = await db.is_admin("200")
+
+        def add_directly():
+            db.cursor.execute(
+                "INSERT INTO admins (telegram_id, username, full_name) VALUES ('300', 'Helper', 'Напрямую')"
+            )
+            db.conn.commit()
+
+        await db._run(add_directly)
+        before_reload = await db.is_admin(999, "helper")
+        await db.reload_admins()
+        return removed, before_reload, await db.is_admin(999, "@HELPER")
+
+    assert asyncio.run(scenario()) == (False, False, True)
+
+
+def test_changes_by_another_worker_are_seen_after_interval(tmp_path):
+    """Тест: администратор, добавленный или удаленный другим процессом, виден после интервала"""
+    first = BotDatabase(storage_path=str(tmp_path), admin_ids=[], admin_refresh_interval=0.05)
+    second = BotDatabase(storage_path=str(tmp_path), admin_ids=[], admin_refresh_interval=0.05)
+
+    async def scenario():
+        await first.add_admin("200", "Админ")
+        added = [await second.is_admin("200")]
+        time.sleep(0.06)
+        added.append(await second.is_admin("200"))
+        await first.remove_admin("200")
+        time.sleep(0.06)
+        removed = await second.is_admin("200")
+        await first.close()
+        await second.close()
+        return added, removed
+
+    added, removed = asyncio.run(scenario())
+    assert added == [False, True]
+    assert removed is False
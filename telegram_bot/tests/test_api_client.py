@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+os.environ.setdefault("BOT_TOKEN", "test_token")
+
+from aiohttp import web
+
+from api_client import ApiClient
+
+
+async def _serve(handler):
+    """Поднимает локальный сервер с одним маршрутом /items"""
+    app = web.Application()
+    app.router.add_route("*", "/items", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/items"
+
+
+def test_requests_share_session_and_connection():
+    """Тест повторного использования сессии и keep-alive соединения"""
+    peers = []
+
+    async def handler(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response([{"id": 1}])
+
+    async def scenario():
+        runner, url = await _serve(handler)
+        client = ApiClient()
+        client.positions_endpoint = url
+        try:
+            for _ in range(3):
+                assert await client.get_positions() == [{"id": 1}]
+            session = client._session
+            await client.get_positions()
+            assert client._session is session
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return client.stats()
+
+    stats = asyncio.run(scenario())
+    # Все запросы пришли по одному TCP-соединению
+    assert len(peers) == 4 and len(set(peers)) == 1
+    assert stats["get_positions"]["calls"] == 4 and stats["get_positions"]["errors"] == 0
+
+
+def test_get_is_retried_on_unavailable():
+    """Тест повтора GET при 503 с экспоненциальной задержкой"""
+    attempts = []
+
+    async def handler(request):
+        attempts.append(request.method)
+        if len(attempts) < 3:
+            return web.Response(status=503, text="busy")
+        return web.json_response([{"id": 7}])
+
+    async def scenario():
+        runner, url = await _serve(handler)
+        client = ApiClient(retries=3, retry_backoff=0.01)
+        client.divisions_endpoint = url
+        try:
+            return await client.get_divisions(), client.stats()["get_divisions"]
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    divisions, stats = asyncio.run(scenario())
+    assert divisions == [{"id": 7}]
+    assert len(attempts) == 3
+    assert stats["retries"] == 2 and stats["errors"] == 0
+
+
+def test_post_is_not_retried_after_server_error():
+    """Тест: POST не повторяется, если сервер уже получил запрос"""
+    attempts = []
+
+    async def handler(request):
+        attempts.append(await request.json())
+        return web.Response(status=503, text="busy")
+
+    async def scenario():
+        runner, url = await _serve(handler)
+        client = ApiClient(retries=3, retry_backoff=0.01)
+        client.staff_endpoint = url
+        try:
+            return await client.create_staff({"email": "a@b.c"}), client.stats()["create_staff"]
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    result, stats = asyncio.run(scenario())
+    assert result["success"] is False and result["message"] == "Ошибка 503: busy"
+    assert attempts == [{"email": "a@b.c"}]
+    assert stats["retries"] == 0 and stats["errors"] == 1 and stats["last_error"] == "HTTP 503"
+
+
+def test_connection_errors_exhaust_retries():
+    """Тест: после исчерпания повторов метод возвращает прежний ответ об ошибке"""
+    async def scenario():
+        client = ApiClient(retries=2, retry_backoff=0.01, connect_timeout=1)
+        # Порт 9 (discard) на localhost закрыт: соединение не устанавливается
+        client.positions_endpoint = "http://127.0.0.1:9/items"
+        try:
+            return await client.get_positions(), client.stats()["get_positions"]
+        finally:
+            await client.close()
+
+    positions, stats = asyncio.run(scenario())
+    assert positions == []
+    assert stats["calls"] == 1 and stats["retries"] == 2 and stats["errors"] == 1
+    assert stats["last_error"].startswith("ClientConnectorError")
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import threading
+
+os.environ.setdefault("BOT_TOKEN", "test_token")
+
+import pytest
+
+from database import BotDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = BotDatabase(storage_path=str(tmp_path))
+    yield database
+    asyncio.run(database.close())
+
+
+def test_methods_run_on_one_connection_in_db_thread(db):
+    """Тест: запросы идут через одно WAL-соединение в потоке базы данных"""
+    threads = set()
+
+    async def scenario():
+        connection = db.conn
+        assert await db.add_admin("100", "Админ", created_by="1")
+        assert await db.is_admin("100")
+        assert not await db.is_admin("200")
+        threads.add(await db._run(lambda: threading.current_thread().name))
+        assert db.conn is connection
+        return await db._run(lambda: db.conn.execute("PRAGMA journal_mode").fetchone()[0])
+
+    assert asyncio.run(scenario()) == "wal"
+    assert len(threads) == 1 and threads.pop().startswith("bot-db")
+
+
+def test_concurrent_calls_and_nested_sync_call(db):
+    """Тест параллельных вызовов и метода, вызывающего другой метод БД"""
+    async def scenario():
+        request_ids = await asyncio.gather(*(
+            db.create_registration_request(telegram_id=str(i), user_full_name=f"Пользователь {i}")
+            for i in range(20)
+        ))
+        saved = await db.save_invitation_code(request_ids[0], "CODE01", 5, "Инженер",
+                                              expires_at="2999-01-01 00:00:00")
+        return request_ids, saved, await db.get_active_invitation_code("0")
+
+    request_ids, saved, code = asyncio.run(scenario())
+    assert sorted(request_ids) == list(range(1, 21))
+    assert saved and code["position_name"] == "Инженер"
+
+
+def test_failed_write_is_rolled_back(db):
+    """Тест: ошибка в методе не оставляет открытую транзакцию на общем соединении"""
+    async def scenario():
+        employee_id = await db.create_employee(
+            {"telegram_id": "7", "full_name": "Иванов", "position_id": 1, "position_name": "Инженер"}
+        )
+        assert not await db.update_employee(employee_id, {"full_name": "Петров", "no_such_column": 1})
+        assert not db.conn.in_transaction
+        return await db.get_employee_by_telegram_id("7")
+
+    assert asyncio.run(scenario())["full_name"] == "Иванов"
+
+
+def test_close_is_idempotent(tmp_path):
+    database = BotDatabase(storage_path=str(tmp_path))
+    asyncio.run(database.close())
+    asyncio.run(database.close())
+    assert database.conn is None
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("BOT_TOKEN", "test_token")
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+
+from fsm_storage import SQLiteStorage, create_storage
+from states import RegistrationStates
+
+
+def make_key(user_id=1):
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+
+async def registration_scenario(storage):
+    """Начало регистрации, как в обработчиках: состояние и накопленные данные"""
+    context = FSMContext(storage=storage, key=make_key())
+    await context.set_state(RegistrationStates.waiting_for_name)
+    await context.update_data(full_name="Иванов Иван")
+    data = await context.update_data({"position_id": 3})
+    assert data == {"full_name": "Иванов Иван", "position_id": 3}
+    other = FSMContext(storage=storage, key=make_key(2))
+    assert await other.get_state() is None and await other.get_data() == {}
+    return await context.get_state(), await context.get_data()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "redis"])
+def test_storage_keeps_registration_state(tmp_path, backend):
+    """Тест: SQLite и Redis (fakeredis) хранят состояние и данные регистрации"""
+    if backend == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        if backend == "sqlite":
+            storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+        else:
+            storage = RedisStorage(fakeredis.FakeAsyncRedis())
+        try:
+            state, data = await registration_scenario(storage)
+            await FSMContext(storage=storage, key=make_key()).clear()
+            cleared = await storage.get_state(make_key()), await storage.get_data(make_key())
+        finally:
+            await storage.close()
+        return state, data, cleared
+
+    state, data, cleared = asyncio.run(scenario())
+    assert state == RegistrationStates.waiting_for_name.state
+    assert data == {"full_name": "Иванов Иван", "position_id": 3}
+    assert cleared == (None, {})
+
+
+def test_sqlite_state_survives_restart_and_is_shared(tmp_path):
+    """Тест: состояние видно после перезапуска и из другого процесса с тем же файлом"""
+    path = str(tmp_path / "fsm.db")
+
+    async def scenario():
+        first, second = SQLiteStorage(path), SQLiteStorage(path)
+        await registration_scenario(first)
+        # Одновременные update_data из двух «процессов» не теряют изменения
+        await asyncio.gather(*(
+            (first if i % 2 else second).update_data(make_key(), {f"field_{i}": i}) for i in range(20)
+        ))
+        await first.close()
+        await second.close()
+        restarted = SQLiteStorage(path)
+        try:
+            return await restarted.get_state(make_key()), await restarted.get_data(make_key())
+        finally:
+            await restarted.close()
+
+    state, data = asyncio.run(scenario())
+    assert state == RegistrationStates.waiting_for_name.state
+    assert data["full_name"] == "Иванов Иван" and all(data[f"field_{i}"] == i for i in range(20))
+
+
+def test_sqlite_stale_states_expire(tmp_path):
+    """Тест TTL: брошенный диалог не читается и удаляется при очистке"""
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.db"), ttl=60)
+        try:
+            await registration_scenario(storage)
+            await storage.set_state(make_key(2), "RegistrationStates:waiting_for_position")
+            # Диалог первого пользователя брошен два часа назад
+            await storage._run(lambda: storage.conn.execute(
+                "UPDATE fsm_storage SET updated_at = ? WHERE key = ?",
+                (time.time() - 7200, storage.key_builder.build(make_key()))
+            ))
+            expired = await storage.get_state(make_key()), await storage.get_data(make_key())
+            purged = await storage.purge()
+            # Новый диалог после истечения начинается с пустых данных
+            fresh = await storage.update_data(make_key(), {"full_name": "Петров"})
+            return expired, purged, fresh, await storage.get_state(make_key(2))
+        finally:
+            await storage.close()
+
+    expired, purged, fresh, alive = asyncio.run(scenario())
+    assert expired == (None, {})
+    assert purged == 1
+    assert fresh == {"full_name": "Петров"}
+    assert alive == "RegistrationStates:waiting_for_position"
+
+
+def test_create_storage_follows_config(tmp_path):
+    def config(**overrides):
+        values = dict(USE_REDIS=False, REDIS_URL="redis://localhost:6379/0",
+                      FSM_STORAGE_FILE=str(tmp_path / "fsm.db"), FSM_STATE_TTL=3600)
+        values.update(overrides)
+        return SimpleNamespace(**values)
+
+    redis_storage = create_storage(config(USE_REDIS=True))
+    sqlite_storage = create_storage(config())
+    assert isinstance(redis_storage, RedisStorage) and redis_storage.state_ttl == 3600
+    assert isinstance(sqlite_storage, SQLiteStorage) and sqlite_storage.ttl == 3600
+    assert isinstance(create_storage(config(FSM_STORAGE_FILE="")), MemoryStorage)
+    asyncio.run(redis_storage.close())
+    asyncio.run(sqlite_storage.close())
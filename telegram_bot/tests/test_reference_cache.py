@@ -0,0 +1,141 @@
+import asyncio
+import os
+
+os.environ.setdefault("BOT_TOKEN", "test_token")
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from reference_cache import ReferenceCache, SECRET_HEADER, create_webhook_app
+
+
+class FakeLoader:
+    """Загрузчик справочника: возвращает очередную версию списка или ошибку"""
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("API недоступен")
+        return [{"id": self.calls, "name": f"Должность {self.calls}"}]
+
+
+def make_cache(loader, path=None, ttl=60.0, max_stale=3600.0):
+    return ReferenceCache({"positions": loader}, ttl=ttl, max_stale=max_stale, path=path)
+
+
+def test_concurrent_misses_load_once_then_hit():
+    """Тест: одновременные промахи ждут одну загрузку, затем попадания"""
+    loader = FakeLoader(delay=0.01)
+    cache = make_cache(loader)
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get("positions") for _ in range(5)))
+        results.append(await cache.get("positions"))
+        return results
+
+    results = asyncio.run(scenario())
+    assert loader.calls == 1
+    assert all(result == [{"id": 1, "name": "Должность 1"}] for result in results)
+    stats = cache.stats()["positions"]
+    assert stats["misses"] == 5 and stats["hits"] == 1 and stats["size"] == 1
+
+
+def test_stale_data_is_served_while_refreshing():
+    """Тест stale-while-revalidate и сохранения прежних данных при ошибке"""
+    loader = FakeLoader()
+    cache = make_cache(loader, ttl=0.0)
+
+    async def scenario():
+        first = await cache.get("positions")
+        # Данные устарели: ответ сразу из кэша, загрузка — в фоне
+        stale = await cache.get("positions")
+        await cache.refresh("positions")
+        loader.fail = True
+        cache.invalidate(["positions"])
+        after_error = await cache.get("positions")
+        return first, stale, after_error
+
+    first, stale, after_error = asyncio.run(scenario())
+    assert first == stale == [{"id": 1, "name": "Должность 1"}]
+    # Загрузка после инвалидации не удалась: отдается последний успешный список
+    assert after_error == [{"id": 2, "name": "Должность 2"}]
+    stats = cache.stats()["positions"]
+    assert stats["stale_hits"] == 1 and stats["invalidations"] == 1 and stats["refresh_errors"] == 1
+    assert loader.calls == 3
+
+
+def test_missing_data_and_failed_load_returns_empty_list():
+    loader = FakeLoader()
+    loader.fail = True
+    cache = make_cache(loader)
+    assert asyncio.run(cache.get("positions")) == []
+    assert cache.stats()["positions"]["age_seconds"] is None
+
+
+def test_lists_survive_restart(tmp_path):
+    """Тест сохранения справочников на диск и чтения после перезапуска"""
+    path = str(tmp_path / "cache" / "reference_cache.json")
+    cache = make_cache(FakeLoader(), path=path)
+    asyncio.run(cache.get("positions"))
+
+    loader = FakeLoader()
+    restarted = make_cache(loader, path=path)
+    assert restarted.load() == 1
+    assert asyncio.run(restarted.get("positions")) == [{"id": 1, "name": "Должность 1"}]
+    assert loader.calls == 0 and restarted.stats()["positions"]["hits"] == 1
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{broken")
+    assert make_cache(loader, path=path).load() == 0
+
+
+def test_invalidation_webhook():
+    """Тест вебхука инвалидации: секрет, неизвестный справочник, перезагрузка"""
+    loader = FakeLoader()
+    cache = make_cache(loader)
+
+    async def scenario():
+        await cache.get("positions")
+        runner = web.AppRunner(create_webhook_app(cache, secret="s3cret"))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/cache"
+        statuses = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(f"{url}/invalidate", json={"names": ["positions"]}) as response:
+                    statuses.append(response.status)
+                headers = {SECRET_HEADER: "s3cret"}
+                async with session.post(f"{url}/invalidate", json={"names": ["staff"]}, headers=headers) as response:
+                    statuses.append(response.status)
+                async with session.post(f"{url}/invalidate", json={"names": ["positions"]},
+                                        headers=headers) as response:
+                    statuses.append(response.status)
+                    body = await response.json()
+                positions = await cache.get("positions")
+                async with session.get(f"{url}/stats", headers=headers) as response:
+                    stats = await response.json()
+        finally:
+            await runner.cleanup()
+        return statuses, body, positions, stats
+
+    statuses, body, positions, stats = asyncio.run(scenario())
+    assert statuses == [403, 400, 200]
+    assert body == {"invalidated": ["positions"]}
+    assert positions == [{"id": 2, "name": "Должность 2"}]
+    assert loader.calls == 2 and stats["positions"]["invalidations"] == 1
+
+
+def test_webhook_requires_secret():
+    """Тест: без секрета вебхук не создается, а не пропускает всех"""
+    with pytest.raises(ValueError):
+        create_webhook_app(make_cache(FakeLoader()), secret="")